@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+复权因子引擎耗时
+按 --events 个除权日各推送一条全市场 ex_rights_data_queue 消息建立事件表，然后测量:
+    增量事件     单只股票追加一个新事件 / 补推一个历史事件（从该事件起重算）
+    全市场复权   adjust_market 对某一交易日全市场、全部历史日线一次复权，对比按股票逐只 adjust
+    单股复权     adjusted 首次读取复权（缓存未命中）与缓存命中
+
+用法: python benchmarks/bench_adjust.py [--symbols 5500] [--days 1000] [--events 30]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mq_adjust import AdjustmentEngine
+from mq_sample_data import make_ex_rights_records, make_stock_codes
+
+
+def make_bars(symbols, days, seed=0):
+    """全市场日线列（按股票、日期排序），列名与 DailyBarStore.read_symbol 一致"""
+    rng = np.random.default_rng(seed)
+    codes = np.array([code for code, _ in make_stock_codes(symbols)], dtype='U12')
+    dates = np.busday_offset('2020-01-02', np.arange(days), roll='forward')
+    close = rng.uniform(3, 200, (symbols, 1)) * np.cumprod(rng.uniform(0.95, 1.05, (symbols, days)), axis=1)
+    close = close.ravel()
+    return {
+        'stock_code': np.repeat(codes, days),
+        'trade_date': np.tile(dates, symbols),
+        'open_price': close * rng.uniform(0.97, 1.03, close.size),
+        'high_price': close * 1.03,
+        'low_price': close * 0.97,
+        'close_price': close,
+        'volume': rng.integers(10000, 50000000, close.size).astype(np.float64),
+        'amount': rng.integers(1000000, 900000000, close.size).astype(np.float64),
+    }
+
+
+def timed(func):
+    """运行一次，返回 (结果, 耗时秒)"""
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="复权因子引擎耗时")
+    parser.add_argument('--symbols', type=int, default=5500, help="股票数（默认5500）")
+    parser.add_argument('--days', type=int, default=1000, help="每只股票的交易日数（默认1000）")
+    parser.add_argument('--events', type=int, default=30, help="每只股票的除权事件数（默认30）")
+    args = parser.parse_args()
+
+    bars = make_bars(args.symbols, args.days)
+    codes = bars['stock_code'][::args.days]
+    by_code = {code: slice(i * args.days, (i + 1) * args.days) for i, code in enumerate(codes.tolist())}
+    engine = AdjustmentEngine(lambda code: {name: column[by_code[code]] for name, column in bars.items()})
+    first_day = datetime(2020, 1, 2)
+    step = max(1, args.days * 7 // 5 // (args.events + 1))
+    messages = [{'records': make_ex_rights_records(args.symbols, seed=i,
+                                                   ex_rights_date=first_day + timedelta(days=step * (i + 1)))}
+                for i in range(args.events)]
+    print(f"股票: {args.symbols}, 日线: {len(bars['stock_code'])} 条, 除权事件: {args.symbols * args.events} 个")
+
+    _, seconds = timed(lambda: [engine.on_message('ex_rights_data_queue', m) for m in messages])
+    print(f"建立事件表: {seconds:.2f} 秒, {engine.events / seconds:,.0f} 事件/秒")
+    _, seconds = timed(lambda: engine.on_message('ex_rights_data_queue', messages[-1]))
+    print(f"重推相同消息: {seconds * 1000:.1f} 毫秒（{engine.unchanged} 个事件不变，不重算）")
+
+    code = codes[0].item()
+    last = engine.symbols[code].days[-1]
+    new_event = dict(messages[0]['records'][0], stock_code=code, profit_per_share=0.5, pei_per_10_shares=0.0)
+    day = lambda d: str(np.datetime64(d, 'D'))
+    _, append_s = timed(lambda: engine.add_events([dict(new_event, ex_rights_date=day(last + 1))]))
+    _, insert_s = timed(lambda: engine.add_events([dict(new_event, ex_rights_date=day(engine.symbols[code].days[0] + 1))]))
+    print(f"单个新事件: 追加 {append_s * 1e6:.0f} 微秒, 补推历史事件 {insert_s * 1e6:.0f} 微秒"
+          f"（从该事件起重算 {len(engine.symbols[code].days) - 1} 项）")
+
+    one_day = {name: column[args.days - 1::args.days] for name, column in bars.items()}
+    engine.market_table()
+    _, seconds = timed(lambda: engine.adjust_market(one_day))
+    print(f"全市场单日复权（{len(one_day['stock_code'])} 条）: {seconds * 1000:.1f} 毫秒")
+    _, seconds = timed(lambda: engine.adjust_market(bars))
+    print(f"全市场全部历史复权（{len(bars['stock_code'])} 条）: {seconds:.2f} 秒, "
+          f"{len(bars['stock_code']) / seconds / 1e6:.1f}M 条/秒")
+
+    def per_symbol():
+        return [engine.adjust(code, {name: column[by_code[code]] for name, column in bars.items()})
+                for code in by_code]
+    _, loop_s = timed(per_symbol)
+    print(f"逐只股票 adjust: {loop_s:.2f} 秒（含用前收盘修正近似比例，{engine.resolved} 个）")
+    engine.market_table()
+    check, seconds = timed(lambda: engine.adjust_market(bars))
+    print(f"修正后全市场复权: {seconds:.2f} 秒, 与逐只结果一致: "
+          f"{np.allclose(check['close_price'], np.concatenate([r['close_price'] for r in per_symbol()]))}")
+
+    _, miss_s = timed(lambda: engine.adjusted(code))
+    _, hit_s = timed(lambda: engine.adjusted(code))
+    print(f"单股复权 {args.days} 条: 首次 {miss_s * 1000:.2f} 毫秒, 缓存命中 {hit_s * 1e6:.1f} 微秒 "
+          f"(命中 {engine.cache_hits}, 未命中 {engine.cache_misses})")
+
+
+if __name__ == '__main__':
+    main()
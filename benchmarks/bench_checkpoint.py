@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检查点的开销和热重启耗时
+接收器启用最新行情表、紧凑记录和安静模式，先处理一条 --symbols 只股票的码表和一个全市场实时行情快照，
+然后测量每次检查点的两步耗时（复制状态时接收线程等待；序列化和写盘含fsync，在后台线程）以及文件大小，
+按 --interval 秒的间隔折算开销；再测量新接收器从检查点恢复（映射、校验、恢复符号表和行情表）的耗时，
+并与不用检查点时重新处理码表和快照（冷启动接收端自身的耗时，不含等待下一次推送的时间）对比。
+最后检查恢复的行情表和符号表与原接收器完全相同。
+
+用法: python benchmarks/bench_checkpoint.py [--symbols 5500] [--repeat 20] [--interval 5]
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mq_checkpoint import Checkpointer
+from mq_receiver_host import MQReceiverHost
+from mq_sample_data import make_market_table_records, make_realtime_records, to_json_payload
+
+
+def make_receiver():
+    receiver = MQReceiverHost()
+    receiver.enable_quiet(interval=3600)
+    receiver.enable_quote_book()
+    receiver.enable_compact_records()
+    receiver.add_handler('market_table', receiver.record_decoder.table.on_market_table)
+    return receiver
+
+
+def feed(receiver, bodies):
+    for queue_name, body in bodies:
+        receiver.process_message(queue_name, body, len(body))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查点的开销和热重启耗时")
+    parser.add_argument('--symbols', type=int, default=5500, help="股票数（默认5500）")
+    parser.add_argument('--repeat', type=int, default=20, help="重复次数（默认20，取中位数）")
+    parser.add_argument('--interval', type=float, default=5.0, help="折算开销的检查点间隔秒数（默认5）")
+    args = parser.parse_args()
+
+    bodies = [('market_table_queue', to_json_payload(make_market_table_records(args.symbols))),
+              ('realtime_data_queue', to_json_payload(make_realtime_records(args.symbols)))]
+    directory = tempfile.mkdtemp(prefix='mq_checkpoint_')
+    path = os.path.join(directory, 'state.ckpt')
+
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            source = make_receiver()
+            feed(source, bodies)
+        checkpointer = Checkpointer(path, source.capture_state)
+        for _ in range(args.repeat):
+            checkpointer.save(force=True)
+
+        restore_times, cold_times = [], []
+        for _ in range(args.repeat):
+            with contextlib.redirect_stdout(devnull):
+                restored = make_receiver()
+                started = time.perf_counter()
+                restored.restore_checkpoint(path)
+                restore_times.append(time.perf_counter() - started)
+
+                cold = make_receiver()
+                started = time.perf_counter()
+                feed(cold, bodies)
+                cold_times.append(time.perf_counter() - started)
+                for receiver in (restored, cold):
+                    receiver.stop()
+        with contextlib.redirect_stdout(devnull):
+            source.stop()
+
+    capture = checkpointer.capture_time.quantile(0.5) / 1000
+    write = checkpointer.write_time.quantile(0.5) / 1000
+    print(f"股票: {args.symbols}, 行情表 {len(source.quote_book)} 只, 符号表 {len(source.record_decoder.table)} 只")
+    print(f"检查点文件: {checkpointer.size / 1024:.0f} KB")
+    print(f"复制状态（接收线程等待）: p50 {capture:.2f} ms, 最大 {checkpointer.capture_time.max / 1000:.2f} ms")
+    print(f"序列化和写盘（后台线程）: p50 {write:.2f} ms, 最大 {checkpointer.write_time.max / 1000:.2f} ms")
+    print(f"每 {args.interval:g} 秒一次的开销: 接收线程 {capture / 1000 / args.interval:.3%}, "
+          f"合计 {(capture + write) / 1000 / args.interval:.3%}")
+    restore = float(np.median(restore_times)) * 1000
+    cold = float(np.median(cold_times)) * 1000
+    print(f"从检查点恢复: {restore:.1f} ms")
+    print(f"重新处理码表和快照: {cold:.1f} ms（另需等待下一次码表推送和实时行情）")
+
+    same = (np.array_equal(restored.quote_book.snapshot(), source.quote_book.snapshot())
+            and restored.record_decoder.table.codes == source.record_decoder.table.codes
+            and restored.record_decoder.table.names == source.record_decoder.table.names
+            and restored.total_messages == source.total_messages)
+    os.remove(path)
+    os.rmdir(directory)
+    if same:
+        print("恢复的行情表、符号表和统计与原接收器相同 ✓")
+    else:
+        print("恢复的状态与原接收器不同 ✗")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
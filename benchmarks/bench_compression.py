@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧压缩收益与CPU开销
+对模拟的各队列消息体，比较不同zlib级别的压缩率、发送端压缩耗时、接收端解压耗时，
+并按给定链路带宽估算单帧传输时间（压缩 + 传输 + 解压 对比 直接传输），
+最后一列是默认启发式（阈值 + 最小节省比例）对该帧的决定。
+
+用法: python benchmarks/bench_compression.py [--link-mbps 100] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mq_protocol import DEFAULT_COMPRESS_LEVEL, DEFAULT_COMPRESS_THRESHOLD, compress_body
+from mq_sample_data import (make_daily_records, make_ex_rights_records, make_market_table_records,
+                            make_realtime_records, to_json_payload)
+
+LEVELS = (1, 6, 9)
+
+
+def make_payloads():
+    """(名称, 消息体) 列表，记录数与各C#发送端的典型批量一致"""
+    payloads = [
+        ('daily 全量同步 50只x250天', to_json_payload(make_daily_records(50, 250))),
+        ('daily 增量 5500只x1天', to_json_payload(make_daily_records(5500, 1))),
+        ('market_table 5500条', to_json_payload(make_market_table_records(5500))),
+        ('ex_rights 100条', to_json_payload(make_ex_rights_records(100))),
+        ('realtime JSON 200条', to_json_payload(make_realtime_records(200))),
+        ('realtime JSON 20条', to_json_payload(make_realtime_records(20))),
+    ]
+    try:
+        from mq_codec import encode_realtime_columnar
+        payloads.append(('realtime 列式 200条', encode_realtime_columnar(make_realtime_records(200))))
+    except (ImportError, TypeError, AttributeError):
+        pass  # 列式编码需要NumPy
+    return payloads
+
+
+def best_of(func, repeat):
+    """多次运行取最快一次（秒），返回 (结果, 耗时)"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="帧压缩收益与CPU开销")
+    parser.add_argument('--link-mbps', type=float, default=100, help="估算用的链路带宽 Mbit/s（默认100）")
+    parser.add_argument('--repeat', type=int, default=5, help="每项重复次数，取最快一次（默认5）")
+    args = parser.parse_args()
+    bytes_per_second = args.link_mbps * 1e6 / 8
+
+    print(f"链路带宽: {args.link_mbps:g} Mbit/s | 默认阈值: {DEFAULT_COMPRESS_THRESHOLD} 字节 | "
+          f"默认级别: {DEFAULT_COMPRESS_LEVEL}")
+    print(f"{'消息':<26}{'原始(KB)':>10}{'级别':>6}{'压缩率':>8}{'压缩(ms)':>10}{'压缩MB/s':>10}"
+          f"{'解压(ms)':>10}{'传输(ms)':>10}{'原文(ms)':>10}  启发式")
+    for name, body in make_payloads():
+        raw_ms = len(body) / bytes_per_second * 1000
+        _, flags = compress_body(body)
+        decision = "压缩" if flags else ("低于阈值" if len(body) < DEFAULT_COMPRESS_THRESHOLD else "节省不足")
+        for level in LEVELS:
+            compressed, compress_s = best_of(lambda: zlib.compress(body, level), args.repeat)
+            _, decompress_s = best_of(lambda: zlib.decompress(compressed), args.repeat)
+            # 发送端压缩 + 按带宽传输压缩后数据 + 接收端解压（不考虑流水线重叠）
+            total_ms = (compress_s + len(compressed) / bytes_per_second + decompress_s) * 1000
+            first = level == LEVELS[0]
+            print(f"{name if first else '':<26}{f'{len(body) / 1024:.1f}' if first else '':>10}"
+                  f"{level:>6}{len(body) / len(compressed):>8.1f}{compress_s * 1000:>10.2f}"
+                  f"{len(body) / compress_s / 1024 / 1024:>10.0f}{decompress_s * 1000:>10.2f}"
+                  f"{total_ms:>10.2f}{raw_ms:>10.2f}  {decision if level == DEFAULT_COMPRESS_LEVEL else ''}")
+
+
+if __name__ == '__main__':
+    main()
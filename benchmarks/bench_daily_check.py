@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日线批量校验耗时
+生成一个抓包目录（每条消息为一批股票的全部历史，模拟DailyDataAutoSync全量推送），
+随机注入少量异常后用 mq_daily_check.run_batch 校验，输出吞吐并外推全A股历史的耗时
+
+用法: python benchmarks/bench_daily_check.py [--symbols 1000] [--days 1000] [--workers 0]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mq_capture import CaptureWriter
+from mq_daily_check import run_batch
+from mq_sample_data import make_daily_records, make_stock_codes, to_json_payload
+
+FULL_HISTORY_RECORDS = 5500 * 4000  # 全A股约5500只，平均上市约16年
+
+
+def write_capture(directory, symbols, days, symbols_per_message, segment_mb, seed=0):
+    """写入抓包目录，返回注入的异常数"""
+    rng = random.Random(seed)
+    codes = make_stock_codes(symbols)
+    injected = 0
+    writer = CaptureWriter(directory, segment_size=segment_mb * 1024 * 1024)
+    for start in range(0, symbols, symbols_per_message):
+        batch = codes[start:start + symbols_per_message]
+        records = make_daily_records(len(batch), days, seed=start)
+        for i, record in enumerate(records):
+            record['stock_code'], record['market_code'] = batch[i // days]
+        for _ in range(len(records) // 10000):
+            record = rng.choice(records)
+            record['low_price'] = record['high_price'] + 0.01
+            injected += 1
+        writer.append('daily_data_queue', to_json_payload(records))
+    writer.close()
+    return injected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日线批量校验耗时")
+    parser.add_argument('--symbols', type=int, default=1000, help="股票数（默认1000）")
+    parser.add_argument('--days', type=int, default=1000, help="交易日数（默认1000）")
+    parser.add_argument('--symbols-per-message', type=int, default=50, help="每条消息的股票数（默认50）")
+    parser.add_argument('--segment-mb', type=int, default=64, help="抓包段大小MB，即并行粒度（默认64）")
+    parser.add_argument('--workers', type=int, default=0, help="工作进程数（默认CPU核数）")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='bench_daily_check_')
+    try:
+        start = time.perf_counter()
+        injected = write_capture(directory, args.symbols, args.days, args.symbols_per_message, args.segment_mb)
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"生成抓包: {args.symbols} 只 x {args.days} 天, {size / 1024 / 1024:.0f} MB, "
+              f"注入OHLC异常 {injected} 条, 耗时 {time.perf_counter() - start:.1f} 秒")
+
+        summary, entries, errors = run_batch([directory], args.workers, progress=False)
+        rate = summary['records'] / summary['seconds']
+        workers = args.workers or os.cpu_count()
+        print(f"工作进程: {workers}, 工作单元: {summary['units']}, 记录: {summary['records']}, "
+              f"OHLC异常: {summary['ohlc']}, 缺失交易日: {summary['missing']}, 解析失败: {len(errors)}")
+        print(f"校验耗时: {summary['seconds']:.1f} 秒, {rate:,.0f} 条/秒, {size / 1024 / 1024 / summary['seconds']:.1f} MB/秒")
+        print(f"全A股历史（约{FULL_HISTORY_RECORDS / 1e6:.0f}M条）预计: {FULL_HISTORY_RECORDS / rate / 60:.1f} 分钟"
+              f"（{workers} 个进程）")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
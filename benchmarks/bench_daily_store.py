@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日线存储写入与查询耗时
+先写入全部历史，再模拟DailyDataAutoSync重推最近若干交易日（重叠部分去重合并），
+最后测试按股票读取全部历史和按日期读取全市场的耗时
+
+用法: python benchmarks/bench_daily_store.py [--symbols 5500] [--days 250] [--resend-days 20]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mq_daily_store import DailyBarStore, records_to_columns
+from mq_sample_data import make_daily_records
+
+
+def timed(func):
+    """返回 (结果, 耗时毫秒)"""
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日线存储写入与查询耗时")
+    parser.add_argument('--symbols', type=int, default=5500, help="股票数（默认5500）")
+    parser.add_argument('--days', type=int, default=250, help="交易日数（默认250）")
+    parser.add_argument('--resend-days', type=int, default=20, help="重推的最近交易日数（默认20）")
+    args = parser.parse_args()
+
+    records = make_daily_records(args.symbols, args.days)
+    columns = records_to_columns(records)
+    # 重推最近的交易日（每只股票的最后resend_days条）
+    resend = [r for i, r in enumerate(records) if i % args.days >= args.days - args.resend_days]
+    resend_columns = records_to_columns(resend)
+    last_date = records[args.days - 1]['trade_date']
+
+    directory = tempfile.mkdtemp(prefix='bench_daily_store_')
+    try:
+        store = DailyBarStore(directory)
+        inserted, full_ms = timed(lambda: store.upsert(columns))
+        _, same_ms = timed(lambda: store.upsert(resend_columns))
+        unchanged = store.partitions_unchanged
+        for record in resend:
+            record['close_price'] = round(record['close_price'] * 1.01, 2)
+        _, changed_ms = timed(lambda: store.upsert(records_to_columns(resend)))
+
+        reader = DailyBarStore(directory)
+        history, symbol_ms = timed(lambda: reader.read_symbol('SH600000'))
+        market, date_ms = timed(lambda: reader.read_date(last_date))
+        size = sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(directory) for name in names)
+
+        print(f"股票数: {args.symbols}, 交易日: {args.days}, 记录数: {len(records)}, "
+              f"分区数: {len(reader.partitions())}, 磁盘占用: {size / 1024 / 1024:.1f} MB")
+        print(f"{'操作':<28}{'行数':>10}{'耗时(ms)':>12}")
+        print(f"{'首次写入全部历史':<28}{inserted:>10}{full_ms:>12.1f}")
+        print(f"{'重推最近交易日（数据相同）':<28}{len(resend):>10}{same_ms:>12.1f}   未重写分区: {unchanged}")
+        print(f"{'重推最近交易日（收盘价变化）':<28}{len(resend):>10}{changed_ms:>12.1f}")
+        print(f"{'按股票读取全部历史':<28}{len(history['stock_code']):>10}{symbol_ms:>12.1f}")
+        print(f"{'按日期读取全市场':<28}{len(market['stock_code']):>10}{date_ms:>12.1f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线解码吞吐对比
+在本机启动同步模式的 MQReceiverHost，用v2流水线协议发送大批日线数据，
+分别测试读线程直接解码、线程池解码、进程池解码时的接收吞吐。
+处理函数只计数不打印，避免输出成为瓶颈。
+
+用法: python benchmarks/bench_decode_pool.py [--frames 20] [--symbols 500] [--days 40] [--workers 4]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mq_receiver_host import MQReceiverHost
+from mq_sample_data import make_daily_records, to_json_payload
+from test_mq_send import MQTestSender
+
+
+class CountingReceiver(MQReceiverHost):
+    """只统计记录数的接收器"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.records = 0
+        self.done = threading.Event()
+        self.expected = 0
+
+    def handle_message(self, queue_name, data, message_length, decode_ns=None):
+        self.total_messages += 1
+        self.records += len(data['records'])
+        if self.total_messages >= self.expected:
+            self.done.set()
+
+
+def run_once(body, frames, pool_kind, workers, max_in_flight):
+    """启动接收器并发送frames帧，返回 (耗时秒, 记录数)"""
+    receiver = CountingReceiver('127.0.0.1', 0)
+    receiver.expected = frames
+    if pool_kind:
+        receiver.enable_decode_pool(workers, pool_kind, max_in_flight)
+
+    # 绑定随机端口后在后台线程运行
+    with contextlib.redirect_stdout(io.StringIO()):
+        thread = threading.Thread(target=receiver.start, daemon=True)
+        thread.start()
+        while not receiver.running:
+            time.sleep(0.01)
+
+        sender = MQTestSender('127.0.0.1', receiver.port)
+        sender.connect()
+        sender.enable_pipelining(8)
+        start = time.perf_counter()
+        sender.send_pipelined(("daily_data_queue", body) for _ in range(frames))
+        receiver.done.wait()
+        elapsed = time.perf_counter() - start
+        sender.close()
+        receiver.stop()
+        thread.join()
+    return elapsed, receiver.records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流水线解码吞吐对比")
+    parser.add_argument('--frames', type=int, default=20, help="发送帧数（默认20）")
+    parser.add_argument('--symbols', type=int, default=500, help="每帧股票数（默认500）")
+    parser.add_argument('--days', type=int, default=40, help="每只股票的交易日数（默认40）")
+    parser.add_argument('--workers', type=int, default=4, help="解码池大小（默认4）")
+    parser.add_argument('--max-in-flight', type=int, default=16, help="最大在途消息数（默认16）")
+    args = parser.parse_args()
+
+    body = to_json_payload(make_daily_records(args.symbols, args.days))
+    print(f"每帧 {args.symbols * args.days} 条日线记录, {len(body) / 1024 / 1024:.1f} MB, 共 {args.frames} 帧")
+    print(f"{'模式':<16}{'耗时(s)':>10}{'帧/秒':>10}{'MB/秒':>10}{'记录/秒':>14}")
+
+    for label, kind in [("读线程直接解码", None), (f"线程池 x{args.workers}", 'thread'), (f"进程池 x{args.workers}", 'process')]:
+        elapsed, records = run_once(body, args.frames, kind, args.workers, args.max_in_flight)
+        mb = len(body) * args.frames / 1024 / 1024
+        print(f"{label:<16}{elapsed:>10.2f}{args.frames / elapsed:>10.1f}{mb / elapsed:>10.1f}{records / elapsed:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
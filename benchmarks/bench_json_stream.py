@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大日线消息的 json.loads 与流式解析对比（耗时和峰值内存）
+生成一个约200MB的 {"records":[...]} 消息写到临时文件，每种方式在独立子进程中运行，
+先把整个消息读入内存（模拟接收端已收齐一帧），再统计解析阶段增加的峰值内存（Linux /proc）:
+    loads   json.loads 后整体转为列（当前非流式接收路径）
+    stream  RecordStream 每批（--chunk条）转为列再合并（日线存储的流式路径）
+    count   只逐条解析计数，不保留记录（check_daily_data 的大文件路径）
+
+用法: python benchmarks/bench_json_stream.py [--symbols 3000] [--days 250] [--chunk 10000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ('loads', 'stream', 'count')
+
+
+def proc_status_mb(field):
+    """/proc/self/status 中的内存项（MB）。ru_maxrss 会跨exec继承父进程的峰值，不能用"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_mode(mode, path, chunk_records):
+    """子进程中运行一种解析方式，输出一行JSON结果"""
+    from mq_daily_store import concat, records_to_columns
+    from mq_json_stream import RecordStream
+
+    with open(path, 'rb') as f:
+        body = f.read()
+    base = proc_status_mb('VmRSS')
+    start = time.perf_counter()
+    if mode == 'loads':
+        records = json.loads(body)['records']
+        rows = len(records_to_columns(records)['stock_code'])
+    elif mode == 'stream':
+        stream = RecordStream(body)
+        columns = concat([records_to_columns(chunk) for chunk in stream.chunks(chunk_records)])
+        rows = len(columns['stock_code'])
+    else:
+        rows = len(RecordStream(body))
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'mode': mode, 'rows': rows, 'seconds': elapsed,
+                      'base_mb': base, 'peak_mb': proc_status_mb('VmHWM')}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大日线消息的json.loads与流式解析对比")
+    parser.add_argument('--symbols', type=int, default=3000, help="股票数（默认3000）")
+    parser.add_argument('--days', type=int, default=250, help="交易日数（默认250，约200MB）")
+    parser.add_argument('--chunk', type=int, default=10000, help="流式转换每批记录数（默认10000）")
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.path, args.chunk)
+        return
+
+    from mq_sample_data import make_daily_records, to_json_payload
+
+    fd, path = tempfile.mkstemp(prefix='bench_json_stream_', suffix='.json')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(to_json_payload(make_daily_records(args.symbols, args.days)))
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"消息大小: {size_mb:.1f} MB, 记录数: {args.symbols * args.days}, 流式每批: {args.chunk} 条")
+        print(f"{'方式':<8}{'耗时(秒)':>10}{'MB/秒':>10}{'解析前(MB)':>12}{'峰值(MB)':>10}{'解析增加(MB)':>14}")
+        for mode in MODES:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--mode', mode,
+                                     '--path', path, '--chunk', str(args.chunk)],
+                                    check=True, capture_output=True, text=True).stdout
+            result = json.loads(output)
+            print(f"{mode:<8}{result['seconds']:>10.2f}{size_mb / result['seconds']:>10.1f}"
+                  f"{result['base_mb']:>12.0f}{result['peak_mb']:>10.0f}"
+                  f"{result['peak_mb'] - result['base_mb']:>14.0f}")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+1分钟K线聚合测试
+模拟 --symbols 只股票每 --interval 秒一个快照、持续 --minutes 分钟的全市场行情，按批交给聚合器，
+其中按比例注入重复快照和乱序（晚到一批的）快照；每批之后按模拟时钟收盘已结束的分钟。
+乱序快照被丢弃时成交量由下一个快照的累计值补上，因此成交量必须守恒：
+收盘K线 + 未收盘K线的成交量之和 = 各股票最后累计成交量 - 第一个快照的累计成交量。
+
+用法: python benchmarks/bench_minute_bars.py [--symbols 5500] [--minutes 10] [--interval 3] [--disorder 0.02]
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mq_minute_bars import MinuteBarAggregator
+
+START = 1700000000 // 86400 * 86400 + 9 * 3600 + 30 * 60  # 某日 09:30:00
+
+
+def main():
+    parser = argparse.ArgumentParser(description="1分钟K线聚合测试")
+    parser.add_argument('--symbols', type=int, default=5500, help="股票数（默认5500）")
+    parser.add_argument('--minutes', type=int, default=10, help="模拟分钟数（默认10）")
+    parser.add_argument('--interval', type=int, default=3, help="每只股票的快照间隔秒数（默认3）")
+    parser.add_argument('--disorder', type=float, default=0.02, help="重复和乱序快照各占的比例（默认0.02）")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    codes = np.array([f"SH{600000 + i}" for i in range(args.symbols)], dtype='U12')
+    volume = rng.integers(0, 1000, args.symbols).astype('<f8') * 100
+    amount = volume * 10
+    price = rng.uniform(5, 50, args.symbols)
+    first_volume = volume.copy()
+
+    bars = []
+    aggregator = MinuteBarAggregator(capacity=args.symbols, grace=0,
+                                     on_bars=lambda queue_name, data: bars.extend(data['records']))
+    delayed = deque()
+    apply_ns = 0
+    batches = snapshots = 0
+    for second in range(0, args.minutes * 60, args.interval):
+        now = START + second
+        batch = (codes, np.full(args.symbols, now, dtype='<i8'), price.copy(), volume.copy(), amount.copy())
+        price *= rng.uniform(0.998, 1.002, args.symbols)
+        traded = rng.integers(0, 50, args.symbols) * 100
+        volume += traded
+        amount += traded * price
+
+        # 重复：本批中再放一份；乱序：抽出一部分晚两批再发（此时同一股票更新的快照已经处理过）。
+        # 第一批是各股票的基准快照，不打乱
+        duplicate = rng.random(args.symbols) < args.disorder
+        late = rng.random(args.symbols) < args.disorder if second else np.zeros(args.symbols, dtype=bool)
+        parts = [[column[~late] for column in batch], [column[duplicate] for column in batch]]
+        if len(delayed) == 2:
+            parts.append(delayed.popleft())
+        delayed.append([column[late] for column in batch])
+        merged = [np.concatenate(columns) for columns in zip(*parts)]
+
+        started = time.perf_counter_ns()
+        with aggregator.lock:
+            aggregator.apply(*merged)
+            aggregator.close_due_locked(now)
+        aggregator.publish_pending()
+        apply_ns += time.perf_counter_ns() - started
+        batches += 1
+        snapshots += len(merged[0])
+        last_volume = batch[3]
+
+    with aggregator.lock:
+        for columns in delayed:  # 最后两批留下的乱序快照
+            aggregator.apply(*columns)
+    open_bars = aggregator.open_bars()
+    total = sum(bar['volume'] for bar in bars) + float(open_bars['volume'].sum())
+    expected = float((last_volume - first_volume).sum())
+
+    print(f"股票: {args.symbols}, 分钟: {args.minutes}, 快照间隔: {args.interval} 秒, "
+          f"重复/乱序比例: {args.disorder:.0%}")
+    print(f"批次: {batches}, 快照: {snapshots:,}, 平均每批 {apply_ns / batches / 1e6:.2f} ms, "
+          f"{snapshots / (apply_ns / 1e9):,.0f} 快照/秒")
+    print(f"收盘K线: {len(bars):,} 根, 未收盘: {len(open_bars)} 根")
+    print(f"重复: {aggregator.duplicate}, 乱序: {aggregator.stale}, 迟到: {aggregator.late}, "
+          f"丢弃: {aggregator.overflow}")
+    ok = abs(total - expected) <= 1e-6 * max(1.0, expected)
+    print(f"成交量: K线合计 {total:,.0f}, 累计值之差 {expected:,.0f}" + (" ✓" if ok else " ✗"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日线补发期间的实时行情延迟
+在本机启动 MQReceiverHost（最新行情表 + 日线存储），一个连接用v2流水线补发大批日线，
+同时另一个连接按固定速率发送实时行情（与C#发送端一样各用各的连接，ACK由后台线程读取）。
+实时行情的处理函数记录 发送 -> 处理 的延迟，对比原来的串行处理和 --priority 优先级调度：
+    同步串行    同一时间只处理一个连接，实时行情要等日线连接断开
+    异步串行    事件循环中逐帧处理，实时帧排在正在处理的日线帧后面
+    优先级调度  实时行情由专用线程优先处理
+
+用法: python benchmarks/bench_priority.py [--daily-frames 4] [--symbols 500] [--days 200] [--rate 50]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mq_protocol import build_frame
+from mq_receiver_host import MQReceiverHost
+from mq_sample_data import make_daily_records, make_realtime_records, to_json_payload
+from test_mq_send import MQTestSender
+
+REALTIME_QUEUE = 'realtime_data_queue'
+DAILY_QUEUE = 'daily_data_queue'
+
+
+def percentile(values, q):
+    """values已排序"""
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def drain(sock):
+    """读取并丢弃ACK，直到连接关闭"""
+    try:
+        while sock.recv(65536):
+            pass
+    except OSError:
+        pass
+
+
+def send_realtime(port, records, rate, stop):
+    """按rate帧/秒发送实时行情，消息体带发送时间 sent_ns；ACK由后台线程读取丢弃"""
+    sender = MQTestSender('127.0.0.1', port)
+    sender.connect()
+    sender.socket.settimeout(None)
+    drainer = threading.Thread(target=drain, args=(sender.socket,), daemon=True)
+    drainer.start()
+    interval = 1 / rate
+    next_time = time.perf_counter()
+    sent = 0
+    while not stop.is_set():
+        body = to_json_payload(records)[:-1] + f',"sent_ns":{time.perf_counter_ns()}}}'.encode()
+        sender.socket.sendall(build_frame(REALTIME_QUEUE, body))
+        sent += 1
+        next_time += interval
+        time.sleep(max(0.0, next_time - time.perf_counter()))
+    # 先半关闭，等接收端读完并关闭连接；直接close时未读的ACK会让内核发RST，接收端丢弃还没读的帧
+    sender.socket.shutdown(socket.SHUT_WR)
+    drainer.join()
+    sender.close()
+    return sent
+
+
+def run_once(mode, priority, daily_body, daily_frames, realtime_records, rate):
+    """返回 (实时延迟列表毫秒（已排序）, 发送的实时帧数, 日线处理完的耗时秒)"""
+    with tempfile.TemporaryDirectory() as directory:
+        receiver = MQReceiverHost('127.0.0.1', 0)
+        receiver.enable_quiet(3600)
+        receiver.enable_quote_book()
+        receiver.enable_daily_store(directory)
+        if priority:
+            receiver.enable_priority()
+        latencies = []
+        receiver.add_handler('realtime', lambda queue_name, data: latencies.append(
+            (time.perf_counter_ns() - data['sent_ns']) / 1e6))
+        daily_done = threading.Semaphore(0)
+        receiver.add_handler('daily', lambda queue_name, data: daily_done.release())
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            target = receiver.start_async if mode == 'async' else receiver.start
+            server = threading.Thread(target=target, daemon=True)
+            server.start()
+            while not receiver.running:
+                time.sleep(0.01)
+
+            stop = threading.Event()
+            result = {}
+            realtime = threading.Thread(target=lambda: result.update(
+                sent=send_realtime(receiver.port, realtime_records, rate, stop)))
+
+            daily = MQTestSender('127.0.0.1', receiver.port)
+            daily.connect()
+            daily.socket.settimeout(None)
+            daily.enable_pipelining(8)
+            realtime.start()
+            time.sleep(0.5)  # 先测一段没有日线时的延迟
+            started = time.perf_counter()
+            daily.send_pipelined((DAILY_QUEUE, daily_body) for _ in range(daily_frames))
+            daily.close()
+            for _ in range(daily_frames):  # 启用调度时ACK在入队后就发出，以处理完为准
+                daily_done.acquire()
+            elapsed = time.perf_counter() - started
+            time.sleep(0.5)
+            stop.set()
+            realtime.join()
+            # 等积压的实时帧处理完
+            deadline = time.monotonic() + 30
+            while len(latencies) < result['sent'] and time.monotonic() < deadline:
+                time.sleep(0.05)
+            if mode == 'async':
+                # 异步模式没有从其他线程停止的接口，等连接关闭后留在后台空闲
+                while receiver.active_connections:
+                    time.sleep(0.05)
+                time.sleep(0.1)  # 连接关闭的提示在计数之后输出
+            else:
+                receiver.stop()
+                server.join()
+    return sorted(latencies), result['sent'], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日线补发期间的实时行情延迟")
+    parser.add_argument('--daily-frames', type=int, default=4, help="补发的日线帧数（默认4）")
+    parser.add_argument('--symbols', type=int, default=500, help="每帧日线的股票数（默认500）")
+    parser.add_argument('--days', type=int, default=200, help="每只股票的交易日数（默认200）")
+    parser.add_argument('--realtime-records', type=int, default=200, help="每帧实时行情记录数（默认200）")
+    parser.add_argument('--rate', type=float, default=50, help="实时行情帧速率（默认50帧/秒）")
+    args = parser.parse_args()
+
+    daily_body = to_json_payload(make_daily_records(args.symbols, args.days))
+    realtime_records = make_realtime_records(args.realtime_records)
+    print(f"日线: {args.daily_frames} 帧 x {args.symbols * args.days} 条 ({len(daily_body) / 1024 / 1024:.1f} MB), "
+          f"实时行情: {args.rate:g} 帧/秒 x {args.realtime_records} 条, CPU: {os.cpu_count()}")
+    print(f"{'模式':<14}{'日线耗时(s)':>12}{'实时帧':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'最大(ms)':>10}")
+    for label, mode, priority in [("同步串行", 'sync', False), ("异步串行", 'async', False),
+                                  ("同步+优先级", 'sync', True), ("异步+优先级", 'async', True)]:
+        latencies, sent, elapsed = run_once(mode, priority, daily_body, args.daily_frames, realtime_records,
+                                            args.rate)
+        print(f"{label:<14}{elapsed:>12.2f}{len(latencies):>6}/{sent:<4}{percentile(latencies, 0.5):>10.1f}"
+              f"{percentile(latencies, 0.99):>10.1f}{(latencies[-1] if latencies else float('nan')):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+最新行情表更新耗时
+全市场（默认5500只股票）每批更新的耗时，分别测试列式解码结果和JSON记录两种输入，
+以及逐条dict写入的对照实现
+
+用法: python benchmarks/bench_quote_book.py [--symbols 5500] [--batches 50]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mq_codec import decode_realtime_columnar, encode_realtime_columnar
+from mq_quote_book import QuoteBook, records_to_columns
+from mq_sample_data import make_realtime_records
+
+
+def per_batch(func, batches):
+    """返回每批平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for i in range(batches):
+        func(i)
+    return (time.perf_counter() - start) / batches * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="最新行情表更新耗时")
+    parser.add_argument('--symbols', type=int, default=5500, help="股票数（默认5500）")
+    parser.add_argument('--batches', type=int, default=50, help="批次数（默认50）")
+    args = parser.parse_args()
+
+    records = make_realtime_records(args.symbols)
+    payload = encode_realtime_columnar(records)
+    columns = decode_realtime_columnar(payload)
+
+    book = QuoteBook()
+    columnar_ms = per_batch(lambda i: book.apply(columns), args.batches)
+    memory = book.table.nbytes
+
+    book = QuoteBook()
+    json_ms = per_batch(lambda i: book.apply(records_to_columns(records)), args.batches)
+
+    # 对照：按股票代码逐条写入dict
+    latest = {}
+
+    def dict_update(i):
+        for record in records:
+            latest[record['stock_code']] = dict(record)
+
+    dict_ms = per_batch(dict_update, args.batches)
+
+    print(f"股票数: {args.symbols}, 批次: {args.batches}")
+    print(f"行情表内存: {memory / 1024 / 1024:.2f} MB（容量 {book.capacity} 行，固定）")
+    print(f"{'输入':<24}{'每批耗时(ms)':>14}{'记录/秒':>14}")
+    for label, ms in [("列式解码结果 apply", columnar_ms), ("JSON记录 -> 列 -> apply", json_ms),
+                      ("对照: 逐条写dict", dict_ms)]:
+        print(f"{label:<24}{ms:>14.3f}{args.symbols / ms * 1000:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时行情编码性能对比：JSON vs 二进制列式格式
+比较每条记录的字节数和接收端解码耗时
+
+用法: python benchmarks/bench_realtime_codec.py [--records 5000] [--repeat 20]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from mq_codec import decode_realtime_columnar, encode_realtime_columnar
+from mq_sample_data import make_realtime_records, to_json_payload
+
+NUMERIC_FIELDS = ['last_close', 'open', 'high', 'low', 'new_price', 'volume', 'amount']
+BOOK_FIELDS = ['buy_price', 'buy_volume', 'sell_price', 'sell_volume']
+
+
+def json_to_arrays(payload):
+    """JSON路径：json.loads后再转换为与列式解码相同的NumPy数组"""
+    records = json.loads(payload.decode('utf-8'))['records']
+    columns = {name: np.array([r[name] for r in records], dtype=np.float32) for name in NUMERIC_FIELDS}
+    for name in BOOK_FIELDS:
+        columns[name] = np.array([r[name] for r in records], dtype=np.float32)
+    columns['stock_code'] = np.array([r['stock_code'] for r in records])
+    return columns
+
+
+def best_of(func, arg, repeat):
+    """多次运行取最快一次（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="实时行情编码性能对比")
+    parser.add_argument('--records', type=int, default=5000, help="每批记录数（默认5000）")
+    parser.add_argument('--repeat', type=int, default=20, help="重复次数（默认20）")
+    args = parser.parse_args()
+
+    records = make_realtime_records(args.records)
+    json_payload = to_json_payload(records)
+    columnar_payload = encode_realtime_columnar(records)
+
+    results = [
+        ("JSON json.loads", len(json_payload), best_of(lambda p: json.loads(p.decode('utf-8')), json_payload, args.repeat)),
+        ("JSON -> NumPy数组", len(json_payload), best_of(json_to_arrays, json_payload, args.repeat)),
+        ("列式 -> NumPy数组", len(columnar_payload), best_of(decode_realtime_columnar, columnar_payload, args.repeat)),
+    ]
+
+    print(f"记录数: {args.records}, 重复: {args.repeat} 次（取最快）")
+    print(f"{'路径':<20}{'字节/条':>10}{'解码耗时(ms)':>14}{'记录/秒':>14}")
+    for name, size, seconds in results:
+        print(f"{name:<20}{size / args.records:>10.1f}{seconds * 1000:>14.3f}{args.records / seconds:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+记录表示的内存占用
+解码 --snapshots 个全市场实时行情快照（每个 --symbols 只股票，JSON格式），全部保留在内存中，
+对比JSON解码得到的dict记录与紧凑记录（mq_records.RecordBatch，先由码表建立符号表）增加的常驻内存，
+以及解码（含转换）和读取全部 new_price 的耗时。两种表示各在一个新进程中测量，互不影响。
+最后检查紧凑记录还原的dict与JSON解码的结果完全相同。
+
+用法: python benchmarks/bench_records.py [--symbols 5000] [--snapshots 240]
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mq_records import RecordDecoder
+from mq_sample_data import make_market_table_records, make_realtime_records, to_json_payload
+
+START = datetime(2024, 6, 14, 9, 30)
+
+
+def make_bodies(symbols, snapshots):
+    """每3秒一个快照：同一份行情只替换更新时间（解码得到的对象数与内容无关）"""
+    body = to_json_payload(make_realtime_records(symbols, update_time=START))
+    old = START.strftime('%Y-%m-%d %H:%M:%S').encode()
+    return [body.replace(old, (START + timedelta(seconds=3 * k)).strftime('%Y-%m-%d %H:%M:%S').encode())
+            for k in range(snapshots)]
+
+
+def resident_bytes():
+    """当前进程的常驻内存（Linux）"""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def run(compact, symbols, snapshots):
+    """
+    在子进程中运行：解码并保留全部快照
+    返回 (增加的常驻内存字节, 解码耗时秒, 读取耗时秒, 还原结果是否相同)
+    """
+    bodies = make_bodies(symbols, snapshots)
+    convert = lambda data: data
+    if compact:
+        decoder = RecordDecoder()
+        decoder.decode('market_table', json.loads(to_json_payload(make_market_table_records(symbols))))
+        convert = lambda data: decoder.decode('realtime', data)
+    gc.collect()
+    base = resident_bytes()
+    started = time.perf_counter()
+    kept = [convert(json.loads(body)) for body in bodies]
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    used = resident_bytes() - base
+
+    started = time.perf_counter()
+    total = 0.0
+    for data in kept:
+        for record in data['records']:
+            total += record.get('new_price')
+    scanned = time.perf_counter() - started
+
+    same = True
+    if compact:
+        same = kept[-1]['records'].to_dicts() == json.loads(bodies[-1])['records']
+    return used, elapsed, scanned, same
+
+
+def main():
+    parser = argparse.ArgumentParser(description="记录表示的内存占用")
+    parser.add_argument('--symbols', type=int, default=5000, help="每个快照的股票数（默认5000）")
+    parser.add_argument('--snapshots', type=int, default=240, help="保留的快照数（默认240）")
+    args = parser.parse_args()
+
+    records = args.symbols * args.snapshots
+    print(f"快照: {args.snapshots} x {args.symbols} 只股票 = {records:,} 条记录")
+    print(f"{'表示':<10}{'内存(MB)':>12}{'字节/条':>10}{'解码(s)':>10}{'读取(s)':>10}")
+    results = {}
+    for label, compact in (("dict", False), ("紧凑", True)):
+        with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as pool:
+            used, elapsed, scanned, same = results[compact] = pool.submit(
+                run, compact, args.symbols, args.snapshots).result()
+        print(f"{label:<10}{used / 1024 / 1024:>12.1f}{used / records:>10.0f}{elapsed:>10.2f}{scanned:>10.2f}")
+    print(f"内存节省: {1 - results[True][0] / results[False][0]:.1%}")
+
+    if results[True][3]:
+        print("还原的记录与JSON解码结果相同 ✓")
+    else:
+        print("还原的记录与JSON解码结果不同 ✗")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
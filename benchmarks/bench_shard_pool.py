@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分片多进程处理的扩展性
+全市场 --symbols 只股票的实时行情（列式）连续推送 --batches 批，处理函数为每个进程一个最新行情表
+加一个1分钟K线聚合器。对比在本进程中直接处理，以及交给1..N个按股票分片的工作进程处理时的吞吐，
+并检查各种进程数下收盘的K线与本进程处理的结果完全相同。
+吞吐受限于CPU核数（分片和写共享内存在接收端进程中，处理在工作进程中）。
+
+用法: python benchmarks/bench_shard_pool.py [--symbols 5500] [--batches 200] [--max-workers 4]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mq_minute_bars import MinuteBarAggregator
+from mq_quote_book import QuoteBook, records_to_columns
+from mq_sample_data import make_realtime_records
+from mq_shard_pool import ShardPool
+
+QUEUE = 'realtime_data_queue'
+START = 1700000000 // 60 * 60
+
+
+class StatefulHandlers:
+    """最新行情表 + 1分钟K线（K线只在分钟切换时收盘，结果与时钟无关）"""
+
+    def __init__(self, emit):
+        self.quote_book = QuoteBook()
+        self.minute_bars = MinuteBarAggregator(grace=float('inf'), on_bars=emit)
+
+    def on_message(self, queue_name, data):
+        self.quote_book.on_message(queue_name, data)
+        self.minute_bars.on_message(queue_name, data)
+
+
+def factory(shard, shards, emit):
+    return {'realtime': StatefulHandlers(emit).on_message}
+
+
+def make_batches(symbols, batches):
+    """每3秒一批全市场快照，价格随机游走，成交量累计递增"""
+    rng = np.random.default_rng(0)
+    base = records_to_columns(make_realtime_records(symbols))
+    result = []
+    price = base['new_price'].astype(np.float64)
+    volume = base['volume'].astype(np.float64)
+    for k in range(batches):
+        price *= rng.uniform(0.998, 1.002, symbols)
+        volume += rng.integers(0, 50, symbols) * 100
+        columns = dict(base)
+        columns['new_price'] = price.astype('<f4')
+        columns['volume'] = volume.astype('<f4')
+        columns['amount'] = (volume * price).astype('<f4')
+        columns['update_time'] = np.full(symbols, START + 3 * k, dtype='<i8').view('datetime64[s]')
+        columns['time_stamp'] = np.full(symbols, START + 3 * k, dtype='<i4')
+        result.append(columns)
+    return result
+
+
+def bar_key(bar):
+    return bar['stock_code'], bar['trade_time']
+
+
+def run_inline(batches):
+    bars = []
+    handlers = StatefulHandlers(lambda queue_name, data: bars.extend(data['records']))
+    started = time.perf_counter()
+    for columns in batches:
+        handlers.on_message(QUEUE, {"count": len(columns['stock_code']), "columns": columns})
+    return time.perf_counter() - started, bars
+
+
+def run_pool(batches, workers):
+    bars = []
+    pool = ShardPool(workers, factory, on_emit=lambda queue_name, data: bars.extend(data['records']))
+    try:
+        pool.submit(QUEUE, batches[0])  # 预热（进程启动、导入模块）
+        pool.drain()
+        started = time.perf_counter()
+        for columns in batches[1:]:
+            pool.submit(QUEUE, columns)
+        pool.drain()
+        elapsed = time.perf_counter() - started
+    finally:
+        stats = pool.close()
+    return elapsed, bars, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片多进程处理的扩展性")
+    parser.add_argument('--symbols', type=int, default=5500, help="股票数（默认5500）")
+    parser.add_argument('--batches', type=int, default=200, help="批数（默认200，每批间隔3秒行情时间）")
+    parser.add_argument('--max-workers', type=int, default=max(4, os.cpu_count() or 1),
+                        help="最多工作进程数（默认 max(4, CPU核数)）")
+    args = parser.parse_args()
+
+    batches = make_batches(args.symbols, args.batches)
+    records = args.symbols * (args.batches - 1)
+    print(f"股票: {args.symbols}, 批数: {args.batches}, CPU: {os.cpu_count()}")
+    print(f"{'模式':<14}{'耗时(s)':>10}{'记录/秒':>14}{'加速比':>8}{'K线':>10}  各进程处理耗时(s)")
+
+    elapsed, expected = run_inline(batches)
+    elapsed *= (args.batches - 1) / args.batches
+    expected = sorted(expected, key=bar_key)
+    baseline = elapsed
+    print(f"{'本进程':<14}{elapsed:>10.2f}{records / elapsed:>14,.0f}{1:>8.2f}{len(expected):>10}")
+
+    workers = 1
+    while workers <= args.max_workers:
+        elapsed, bars, stats = run_pool(batches, workers)
+        same = sorted(bars, key=bar_key) == expected
+        busy = ' '.join(f"{s['busy']:.2f}" for s in stats if s)
+        print(f"{f'{workers} 个进程':<14}{elapsed:>10.2f}{records / elapsed:>14,.0f}{baseline / elapsed:>8.2f}"
+              f"{len(bars):>10}{' ✓' if same else ' ✗'} {busy}")
+        if not same:
+            sys.exit(1)
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
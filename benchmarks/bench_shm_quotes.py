@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享内存行情表多读端压力测试
+写端（本进程）按码表建立股票目录后，持续以每批 --batch 只股票更新行情，同一行的所有数值字段
+都写成同一个递增值k；--readers 个读端进程（spawn启动，按名称附加）交替做整表快照和单股读取，
+检查每一行的所有字段是否一致。同时对照统计不经seqlock直接复制得到的撕裂行数。
+seqlock读出的不一致行数必须为0。
+
+用法: python benchmarks/bench_shm_quotes.py [--readers 4] [--seconds 5] [--symbols 5500] [--batch 200]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mq_codec import ORDER_BOOK_DEPTH
+from mq_sample_data import make_market_table_records
+from mq_shm_quotes import QuoteReader, SharedQuoteBook
+
+VALUE_MODULUS = 1 << 20  # float32能精确表示的整数范围内循环
+SCALAR_FIELDS = ('last_close', 'open', 'high', 'low', 'new_price', 'volume', 'amount')
+BOOK_FIELDS = ('buy_price', 'buy_volume', 'sell_price', 'sell_volume')
+
+
+def torn(rows):
+    """每行的数值字段是否不全相等（按time_stamp推出写入时的k）"""
+    expected = (rows['time_stamp'] % VALUE_MODULUS).astype(np.float32)
+    bad = np.zeros(len(rows), dtype=bool)
+    for name in SCALAR_FIELDS:
+        bad |= rows[name] != expected
+    for name in BOOK_FIELDS:
+        bad |= (rows[name] != expected[:, None]).any(axis=1)
+    return bad
+
+
+def reader_main(name, seconds, results):
+    """读端进程：交替整表快照 / 随机单股读取 / 不加保护的直接复制"""
+    reader = QuoteReader(name)
+    codes = list(reader.index) or None
+    snapshots = gets = bad_snapshot = bad_get = raw_copies = raw_torn = 0
+    snapshot_ns = get_ns = 0
+    rng = random.Random(os.getpid())
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        start = time.perf_counter_ns()
+        table = reader.snapshot()
+        snapshot_ns += time.perf_counter_ns() - start
+        snapshots += 1
+        bad_snapshot += int(torn(table).sum())
+        if codes is None or len(codes) < len(reader.index):
+            codes = list(reader.index)
+        sample = rng.sample(codes, 100)
+        start = time.perf_counter_ns()
+        rows = [reader.get(code) for code in sample]
+        get_ns += time.perf_counter_ns() - start
+        bad_get += int(torn(np.array(rows)).sum())
+        gets += 100
+        raw = reader.table[:reader.size].copy()  # 对照：不检查序号
+        raw_copies += 1
+        raw_torn += int(torn(raw).sum())
+    results.put({
+        'snapshots': snapshots, 'gets': gets, 'bad_snapshot': bad_snapshot, 'bad_get': bad_get,
+        'snapshot_us': snapshot_ns / max(1, snapshots) / 1000, 'get_us': get_ns / max(1, gets) / 1000,
+        'retries': reader.retries, 'raw_copies': raw_copies, 'raw_torn': raw_torn,
+    })
+    reader.close()
+
+
+def make_batch(codes, k):
+    """一批行情：所有数值字段都等于k（time_stamp为k，保证比已有数据新）"""
+    count = len(codes)
+    value = np.float32(k % VALUE_MODULUS)
+    columns = {'stock_code': codes, 'time_stamp': np.full(count, k, dtype='<i4')}
+    for name in SCALAR_FIELDS:
+        columns[name] = np.full(count, value, dtype='<f4')
+    for name in BOOK_FIELDS:
+        columns[name] = np.full((count, ORDER_BOOK_DEPTH), value, dtype='<f4')
+    return columns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="共享内存行情表多读端压力测试")
+    parser.add_argument('--readers', type=int, default=4, help="读端进程数（默认4）")
+    parser.add_argument('--seconds', type=float, default=5, help="持续时间秒数（默认5）")
+    parser.add_argument('--symbols', type=int, default=5500, help="股票数（默认5500）")
+    parser.add_argument('--batch', type=int, default=200, help="每批更新的股票数（默认200）")
+    args = parser.parse_args()
+
+    name = f'bench_shm_quotes_{os.getpid()}'
+    book = SharedQuoteBook(name)
+    try:
+        book.on_market_table('market_table_queue', {'records': make_market_table_records(args.symbols)})
+        codes = book.table['stock_code'][:book.size].copy()
+        book.apply(make_batch(codes, 1))
+
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        readers = [context.Process(target=reader_main, args=(name, args.seconds, results))
+                   for _ in range(args.readers)]
+        for process in readers:
+            process.start()
+
+        rng = np.random.default_rng(0)
+        k = 1
+        batches = 0
+        started = time.perf_counter()
+        while any(process.is_alive() for process in readers) and results.qsize() < len(readers):
+            k += 1
+            book.apply(make_batch(codes[rng.choice(len(codes), args.batch, replace=False)], k))
+            batches += 1
+        elapsed = time.perf_counter() - started
+        stats = [results.get() for _ in readers]
+        for process in readers:
+            process.join()
+    finally:
+        book.close()
+
+    print(f"股票: {args.symbols}, 读端: {args.readers}, 每批: {args.batch} 只, CPU: {os.cpu_count()}")
+    print(f"写端: {batches} 批, {batches / elapsed:,.0f} 批/秒, {batches * args.batch / elapsed:,.0f} 行/秒")
+    print(f"{'读端':<6}{'快照':>8}{'快照(us)':>10}{'单股读取':>10}{'单股(us)':>10}{'重读':>8}"
+          f"{'不一致':>8}{'直接复制撕裂行':>16}")
+    for i, s in enumerate(stats):
+        print(f"{i:<6}{s['snapshots']:>8}{s['snapshot_us']:>10.0f}{s['gets']:>10}{s['get_us']:>10.1f}"
+              f"{s['retries']:>8}{s['bad_snapshot'] + s['bad_get']:>8}"
+              f"{s['raw_torn']:>10} / {s['raw_copies']}次")
+    total_bad = sum(s['bad_snapshot'] + s['bad_get'] for s in stats)
+    print(f"seqlock读取不一致行数: {total_bad}" + (" ✓" if total_bad == 0 else " ✗"))
+    if total_bad:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+接收路径微基准套件（保存JSON基线，对比回退）
+覆盖接收端热路径的各段，每个用例测量每次操作的耗时（多次重复取最快一次）:
+    frame/...     通过socketpair分帧：原始的逐段 recv_all 与 FrameDecoder（recv_into + 缓冲区内解析）
+    json/...      四种队列各批量大小的 json.loads
+    process/...   MQReceiverHost.process_message（解码+统计+显示），逐条打印（输出到/dev/null）与安静模式
+    stats/...     只更新统计：宿主机端 handle_message（安静模式）、指标直方图、测试接收器的分队列统计
+结果保存为JSON（含Python版本、平台、CPU数和提交），compare 与基线逐项对比，
+耗时增加超过阈值的用例标记为回退并以退出码1结束，可放在改动热路径的提交检查中；
+直接运行对比时，超过阈值的用例会重新测量一次再判定，减少共享机器上偶发干扰造成的误报。
+基线与机器相关，benchmarks/baselines/ 中的基线只作参考，对比前应在同一台机器上重新生成。
+
+用法:
+    python benchmarks/bench_suite.py run [--output FILE] [--filter 子串] [--quick]
+    python benchmarks/bench_suite.py compare BASELINE [--current FILE] [--threshold 15] [--filter 子串]
+    python benchmarks/bench_suite.py list
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mq_protocol import FrameDecoder, build_frame
+from mq_receiver_host import MQReceiverHost
+from mq_sample_data import (make_daily_records, make_ex_rights_records, make_market_table_records,
+                            make_realtime_records, to_json_payload)
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+DEFAULT_THRESHOLD = 15.0    # 耗时增加超过该百分比视为回退
+FRAME_STREAM_BYTES = 32 * 1024 * 1024   # 分帧用例每轮发送的总字节数（约）
+
+QUEUES = {
+    'realtime': 'realtime_data_queue',
+    'daily': 'daily_data_queue',
+    'ex_rights': 'ex_rights_data_queue',
+    'market_table': 'market_table_queue',
+}
+BATCH_SIZES = (1, 100, 1000, 5000)
+
+
+def make_records(queue_type, count):
+    """各队列类型的样例记录"""
+    if queue_type == 'realtime':
+        return make_realtime_records(count)
+    if queue_type == 'daily':
+        return make_daily_records(count, 1)
+    if queue_type == 'ex_rights':
+        return make_ex_rights_records(count)
+    return make_market_table_records(count)
+
+
+def recv_all(sock, n):
+    """原始接收端的逐段读取（每次recv后拼接bytes）"""
+    data = b''
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def parse_recv_all(sock):
+    """原始接收端的分帧：长度、队列名称长度、队列名称、消息体各读一次，返回帧数"""
+    frames = 0
+    while True:
+        header = recv_all(sock, 8)
+        if not header:
+            return frames
+        message_length, queue_name_length = struct.unpack('>II', header)
+        recv_all(sock, queue_name_length).decode('utf-8')
+        recv_all(sock, message_length - 8 - queue_name_length)
+        frames += 1
+
+
+def parse_decoder(sock):
+    """FrameDecoder：recv_into预分配缓冲区，一次recv解析出全部完整帧，返回帧数"""
+    decoder = FrameDecoder()
+    frames = 0
+    while decoder.recv_into(sock):
+        for frame in decoder.frames():
+            frames += 1
+    return frames
+
+
+def frame_case(parse, body, queue_name):
+    """每次调用通过一对本地套接字发送一批相同的帧，由parse读完；返回 (函数, 每次调用的帧数, 帧字节数, 记录数)"""
+    frame = build_frame(queue_name, body)
+    count = max(8, min(20000, FRAME_STREAM_BYTES // len(frame)))
+    stream = frame * count
+
+    def run():
+        receiver, sender = socket.socketpair()
+        with receiver, sender:
+            thread = threading.Thread(target=lambda: (sender.sendall(stream), sender.shutdown(socket.SHUT_WR)))
+            thread.start()
+            frames = parse(receiver)
+            thread.join()
+        assert frames == count, f"收到 {frames} 帧，应为 {count}"
+
+    return run, count, len(frame), 0
+
+
+def json_case(queue_type, count):
+    payload = to_json_payload(make_records(queue_type, count))
+    return lambda: json.loads(payload), 1, len(payload), count
+
+
+@contextlib.contextmanager
+def receiver_host(quiet):
+    """不监听端口的宿主机端接收器，逐条打印的输出写到/dev/null"""
+    receiver = MQReceiverHost()
+    if quiet:
+        receiver.enable_quiet(interval=3600)
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            yield receiver
+        finally:
+            receiver.stop()
+
+
+@contextlib.contextmanager
+def process_call(quiet, queue_name, payload):
+    with receiver_host(quiet) as receiver:
+        yield lambda: receiver.process_message(queue_name, payload, len(payload))
+
+
+def process_case(quiet, queue_type, count):
+    payload = to_json_payload(make_records(queue_type, count))
+    return process_call(quiet, QUEUES[queue_type], payload), 1, len(payload), count
+
+
+@contextlib.contextmanager
+def host_stats_call(queue_name, data, size):
+    with receiver_host(True) as receiver:
+        yield lambda: receiver.handle_message(queue_name, data, size)
+
+
+def host_stats_case(queue_type, count):
+    payload = to_json_payload(make_records(queue_type, count))
+    return host_stats_call(QUEUES[queue_type], json.loads(payload), len(payload)), 1, 0, 0
+
+
+def metrics_case(queue_type, count):
+    from mq_metrics import ReceiverMetrics
+    payload = to_json_payload(make_records(queue_type, count))
+    data = json.loads(payload)
+    metrics = ReceiverMetrics()
+    queue_name = QUEUES[queue_type]
+    return lambda: metrics.record_message(queue_name, data, len(payload), 1000), 1, 0, 0
+
+
+@contextlib.contextmanager
+def test_receiver_stats_call(queue_name, data, size):
+    from mq_receiver_test import MQReceiver
+    receiver = MQReceiver(quiet=True, report_interval=3600)
+    try:
+        yield lambda: receiver.process_message(queue_name, data, size)
+    finally:
+        receiver.reporter.close()
+
+
+def test_receiver_stats_case(queue_type, count):
+    payload = to_json_payload(make_records(queue_type, count))
+    return test_receiver_stats_call(QUEUES[queue_type], json.loads(payload), len(payload)), 1, 0, 0
+
+
+def make_cases():
+    """
+    用例名称 -> 构造函数（构造时才生成样例数据）
+    构造函数返回 (函数或产生函数的上下文, 每次调用的操作数, 每次操作字节数, 每次操作记录数)，
+    字节数/记录数为0时不输出对应的吞吐
+    """
+    cases = {}
+    for queue_type, count in (('ex_rights', 1), ('realtime', 200), ('daily', 10000)):
+        for parser_name, parse in (('recv_all', parse_recv_all), ('decoder', parse_decoder)):
+            cases[f'frame/{parser_name}/{queue_type}-{count}'] = (
+                lambda parse=parse, queue_type=queue_type, count=count:
+                frame_case(parse, to_json_payload(make_records(queue_type, count)), QUEUES[queue_type]))
+    for queue_type in QUEUES:
+        for count in BATCH_SIZES:
+            cases[f'json/{queue_type}-{count}'] = lambda queue_type=queue_type, count=count: json_case(queue_type, count)
+    for mode, quiet in (('print', False), ('quiet', True)):
+        for queue_type, count in (('realtime', 200), ('daily', 1000)):
+            cases[f'process/{mode}/{queue_type}-{count}'] = (
+                lambda quiet=quiet, queue_type=queue_type, count=count: process_case(quiet, queue_type, count))
+    cases['stats/host/realtime-200'] = lambda: host_stats_case('realtime', 200)
+    cases['stats/metrics/realtime-200'] = lambda: metrics_case('realtime', 200)
+    cases['stats/test_receiver/realtime-200'] = lambda: test_receiver_stats_case('realtime', 200)
+    return cases
+
+
+def measure(func, repeat):
+    """每次调用的最快耗时（秒）：自动确定每轮调用次数（每轮至少0.2秒），重复repeat轮取最快"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def run_case(build, repeat):
+    """返回 {seconds: 每次操作耗时, bytes: 每次操作字节数, records: 每次操作记录数}"""
+    func, ops, size, records = build()
+    if isinstance(func, contextlib.AbstractContextManager):  # 需要接收器的用例，退出时关闭
+        with func as call:
+            seconds = measure(call, repeat) / ops
+    else:
+        seconds = measure(func, repeat) / ops
+    return {"seconds": seconds, "bytes": size, "records": records}
+
+
+def format_rate(result):
+    parts = []
+    if result['bytes']:
+        parts.append(f"{result['bytes'] / result['seconds'] / 1024 / 1024:,.1f} MB/s")
+    if result['records']:
+        parts.append(f"{result['records'] / result['seconds']:,.0f} 条/秒")
+    return ', '.join(parts)
+
+
+def environment():
+    """基线的运行环境（对比时环境不同会给出提示）"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(BASELINE_DIR), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "created": datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+    }
+
+
+def run_suite(pattern=None, repeat=5):
+    """运行名称包含pattern的用例，逐项打印，返回结果（可直接保存为基线）"""
+    results = {}
+    print(f"{'用例':<40}{'耗时(us)':>14}  吞吐")
+    for name, build in make_cases().items():
+        if pattern and pattern not in name:
+            continue
+        result = results[name] = run_case(build, repeat)
+        print(f"{name:<40}{result['seconds'] * 1e6:>14,.2f}  {format_rate(result)}")
+    return dict(environment(), results=results)
+
+
+def recheck(baseline, current, threshold, repeat):
+    """
+    超过阈值的用例重新测量一次，取两次中较快的结果（排除测量期间偶发的干扰，
+    真正的回退两次都会超过阈值）
+    """
+    cases = make_cases()
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is not None and name in cases and result['seconds'] > base['seconds'] * (1 + threshold / 100):
+            again = run_case(cases[name], repeat)
+            print(f"重新测量 {name}: {result['seconds'] * 1e6:,.2f} -> {again['seconds'] * 1e6:,.2f} us")
+            result['seconds'] = min(result['seconds'], again['seconds'])
+
+
+def compare(baseline, current, threshold):
+    """逐项对比，返回回退的用例名称列表"""
+    for key in ('python', 'machine', 'cpus'):
+        if baseline.get(key) != current.get(key):
+            print(f"⚠ 运行环境不同 ({key}: 基线 {baseline.get(key)}, 当前 {current.get(key)})，对比结果仅供参考")
+    regressions = []
+    print(f"{'用例':<40}{'基线(us)':>12}{'当前(us)':>12}{'变化':>10}")
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f"{name:<40}{'-':>12}{result['seconds'] * 1e6:>12,.2f}{'新用例':>10}")
+            continue
+        change = (result['seconds'] / base['seconds'] - 1) * 100
+        mark = ''
+        if change > threshold:
+            mark = ' ✗ 回退'
+            regressions.append(name)
+        elif change < -threshold:
+            mark = ' ✓ 改善'
+        print(f"{name:<40}{base['seconds'] * 1e6:>12,.2f}{result['seconds'] * 1e6:>12,.2f}{change:>+9.1f}%{mark}")
+    return regressions
+
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接收路径微基准套件")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help="运行套件，可保存为基线")
+    run_parser.add_argument('--output', '-o', metavar='FILE', help="把结果保存为JSON基线")
+    compare_parser = commands.add_parser('compare', help="与基线对比，回退时退出码为1")
+    compare_parser.add_argument('baseline', help="基线JSON文件")
+    compare_parser.add_argument('--current', metavar='FILE', help="已保存的本次结果（默认现在运行套件）")
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help=f"耗时增加超过该百分比视为回退（默认{DEFAULT_THRESHOLD:g}）")
+    compare_parser.add_argument('--output', '-o', metavar='FILE', help="同时保存本次运行的结果")
+    for sub in (run_parser, compare_parser):
+        sub.add_argument('--filter', metavar='子串', help="只运行名称包含该子串的用例")
+        sub.add_argument('--quick', action='store_true', help="每个用例只重复3轮（默认5轮）")
+    commands.add_parser('list', help="列出全部用例")
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        print('\n'.join(make_cases()))
+        return
+
+    repeat = 3 if args.quick else 5
+    if args.command == 'run':
+        results = run_suite(args.filter, repeat)
+        if args.output:
+            save(args.output, results)
+        return
+
+    baseline = load(args.baseline)
+    if args.current:
+        current = load(args.current)
+    else:
+        current = run_suite(args.filter or None, repeat)
+        print()
+        recheck(baseline, current, args.threshold, repeat)
+        if args.output:
+            save(args.output, current)
+    if args.filter:
+        current['results'] = {name: result for name, result in current['results'].items() if args.filter in name}
+    regressions = compare(baseline, current, args.threshold)
+    print()
+    if regressions:
+        print(f"✗ {len(regressions)} 个用例回退超过 {args.threshold:g}%: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"✓ 没有超过 {args.threshold:g}% 的回退")
+
+
+if __name__ == '__main__':
+    main()
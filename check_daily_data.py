@@ -3,12 +3,16 @@
 """
 检查日线数据是否在推送
 用于验证接收到的消息中是否包含日线数据
+--batch 模式并行校验抓包目录或消息文件目录中的全部日线记录（见 mq_daily_check）
 """
 
+import argparse
 import json
 import sys
 from datetime import datetime
 
+from mq_json_stream import load_json_file
+
 def check_message_for_daily_data(message_file=None):
     """检查消息中是否包含日线数据"""
     
@@ -20,8 +24,7 @@ def check_message_for_daily_data(message_file=None):
     # 如果提供了文件，从文件读取
     if message_file:
         try:
-            with open(message_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = load_json_file(message_file)
             print(f"从文件读取: {message_file}")
         except Exception as e:
             print(f"读取文件失败: {e}")
@@ -120,11 +123,29 @@ def check_message_for_daily_data(message_file=None):
     
     print()
 
+def check_batch(paths, workers=0, top=50, output=None):
+    """批量校验，打印按股票的异常报告"""
+    from mq_daily_check import print_report, run_batch
+    
+    summary, entries, errors = run_batch(paths, workers)
+    print_report(summary, entries, errors, top)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'symbols': entries, 'errors': errors}, f, ensure_ascii=False, indent=2)
+        print(f"完整报告已写入: {output}")
+
 if __name__ == '__main__':
-    if len(sys.argv) > 1:
-        # 从文件读取
-        check_message_for_daily_data(sys.argv[1])
+    parser = argparse.ArgumentParser(description="检查日线数据是否在推送")
+    parser.add_argument('message_file', nargs='?', help="消息JSON文件（不指定时从标准输入读取）")
+    parser.add_argument('--batch', nargs='+', metavar='PATH',
+                        help="批量校验：抓包目录、.seg文件、JSON消息文件或包含JSON文件的目录")
+    parser.add_argument('--workers', type=int, default=0, help="批量校验的工作进程数（默认CPU核数）")
+    parser.add_argument('--top', type=int, default=50, help="报告中显示的股票数（默认50）")
+    parser.add_argument('--output', metavar='FILE', help="把完整的按股票报告写入JSON文件")
+    args = parser.parse_args()
+    
+    if args.batch:
+        check_batch(args.batch, args.workers, args.top, args.output)
     else:
-        # 从标准输入读取
-        check_message_for_daily_data()
-
+        # 不指定文件时从标准输入读取
+        check_message_for_daily_data(args.message_file)
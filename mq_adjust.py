@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+除权复权因子
+由 ex_rights_data_queue 消息驱动，按股票维护除权事件和累计复权因子:
+    除权参考价 = (前收盘 - 每股红利 + 配股价 x 每股配股) / (1 + 每股送股 + 每股配股)
+    事件比例   = 前收盘 / 除权参考价
+    后复权因子 = 除权日不晚于该交易日的事件比例之积（最早的价格不变）
+    前复权因子 = 后复权因子 / 全部事件比例之积（最新的价格不变）
+每只股票保存 [1, r0, r0*r1, ...] 形式的累计积，新事件的除权日在已有事件之后时只追加一项，
+补推历史事件（插入/修改）时只从该事件开始重算这只股票；相同的重推不做任何改动。
+
+前收盘在事件到达时通常未知，先按只含送配股的比例（1 + 送 + 配）近似，
+复权时用传入日线中除权日前一个交易日的收盘价修正为精确比例。
+复权结果按 (股票, 前/后复权) 缓存，该股票有新事件或新日线时失效。
+"""
+
+import bisect
+
+import numpy as np
+
+from mq_records import field_values
+
+MODES = ('forward', 'backward')
+PRICE_COLUMNS = ('open_price', 'high_price', 'low_price', 'close_price')
+
+
+def day_numbers(dates):
+    """'yyyy-mm-dd' 字符串或datetime64数组 -> 1970-01-01起的天数（int64）"""
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+
+def event_ratio(event, prev_close):
+    """
+    一次除权事件的价格比例，返回 (比例, 是否精确)
+    :param event: (每10股送股, 每10股配股, 配股价, 每股红利)
+    :param prev_close: 除权日前一个交易日的收盘价，未知时传None，按只含送配股的比例近似
+    """
+    give, pei, pei_price, dividend = event
+    shares = 1 + give / 10 + pei / 10
+    if not dividend and not pei:
+        return shares, True  # 只有送股（或没有任何变动）时与前收盘无关
+    if prev_close and prev_close > 0:
+        ex_price = (prev_close - dividend + pei_price * pei / 10) / shares
+        if ex_price > 0:
+            return prev_close / ex_price, True
+    return shares, False
+
+
+class SymbolEvents:
+    """一只股票的除权事件（按除权日排序）和累计比例"""
+    __slots__ = ('days', 'events', 'ratios', 'exact', 'cumulative', 'version')
+
+    def __init__(self):
+        self.days = []          # 除权日天数
+        self.events = []        # (送, 配, 配股价, 红利)
+        self.ratios = []
+        self.exact = []         # 比例是否已用前收盘修正
+        self.cumulative = [1.0]  # cumulative[i] = ratios[0..i-1]之积
+        self.version = 0        # 每次变动加1，用于缓存失效
+
+    def add(self, day, event):
+        """
+        加入一个事件，返回 'append' / 'insert' / 'update' / 'same'
+        追加到末尾只计算一项累计积，插入或修改从该位置重算
+        """
+        i = bisect.bisect_left(self.days, day)
+        if i < len(self.days) and self.days[i] == day:
+            if self.events[i] == event:
+                return 'same'
+            self.events[i] = event
+            self.ratios[i], self.exact[i] = event_ratio(event, None)
+            self.recompute(i)
+            return 'update'
+        ratio, exact = event_ratio(event, None)
+        self.days.insert(i, day)
+        self.events.insert(i, event)
+        self.ratios.insert(i, ratio)
+        self.exact.insert(i, exact)
+        if i == len(self.days) - 1:
+            self.cumulative.append(self.cumulative[-1] * ratio)
+            self.version += 1
+            return 'append'
+        self.cumulative.append(0.0)
+        self.recompute(i)
+        return 'insert'
+
+    def recompute(self, start):
+        """从第start个事件开始重算累计积"""
+        cumulative = self.cumulative
+        for j in range(start, len(self.ratios)):
+            cumulative[j + 1] = cumulative[j] * self.ratios[j]
+        self.version += 1
+
+    def resolve(self, bar_days, closes):
+        """用日线（按日期排序）修正近似比例，返回修正的事件数"""
+        first = None
+        count = 0
+        for i, exact in enumerate(self.exact):
+            if exact:
+                continue
+            position = np.searchsorted(bar_days, self.days[i], 'left') - 1
+            if position < 0:
+                continue
+            ratio, exact = event_ratio(self.events[i], float(closes[position]))
+            if exact:
+                self.ratios[i], self.exact[i] = ratio, True
+                first = i if first is None else first
+                count += 1
+        if first is not None:
+            self.recompute(first)
+        return count
+
+    def factors(self, days, mode='forward'):
+        """交易日天数数组 -> 复权因子数组"""
+        cumulative = np.array(self.cumulative)
+        back = cumulative[np.searchsorted(self.days, days, 'right')]
+        return back if mode == 'backward' else back / cumulative[-1]
+
+
+def apply_factors(bars, factors):
+    """价格乘以因子，成交量除以因子（股数随送配股变化），成交额不变；返回新的列dict"""
+    result = dict(bars)
+    for name in PRICE_COLUMNS:
+        if name in bars:
+            result[name] = np.asarray(bars[name], dtype=np.float64) * factors
+    if 'volume' in bars:
+        result['volume'] = np.asarray(bars['volume'], dtype=np.float64) / factors
+    result['adjust_factor'] = factors
+    return result
+
+
+class AdjustmentEngine:
+    def __init__(self, bar_source=None):
+        """
+        :param bar_source: bar_source(stock_code) 返回该股票按日期排序的日线列dict（如 DailyBarStore.read_symbol），
+                           adjusted() 用它读取日线
+        """
+        self.bar_source = bar_source
+        self.symbols = {}   # 股票代码 -> SymbolEvents
+        self.cache = {}     # (股票代码, mode) -> (version, 复权结果)
+        self.market = None  # 全市场事件表（adjust_market用），事件变动时重建
+        self.events = 0
+        self.appended = 0   # 增量追加的事件数
+        self.updated = 0    # 插入/修改导致该股票重算的事件数
+        self.unchanged = 0  # 重推的相同事件数
+        self.resolved = 0   # 用日线前收盘修正的近似比例数
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def on_message(self, queue_name, data):
+        """接收器的处理函数：应用一条 ex_rights_data_queue 消息"""
+        if isinstance(data, dict) and data.get('records'):
+            self.add_events(data['records'])
+
+    def on_daily(self, queue_name, data):
+        """接收器的处理函数：daily_data_queue 有新日线时，使相关股票的复权缓存失效"""
+        records = data.get('records') if isinstance(data, dict) else None
+        if not records:
+            return
+        if hasattr(records, 'chunks'):
+            self.invalidate()  # 流式解析的大消息（全量同步）：不再逐条扫描，整体失效
+        else:
+            for code in set(field_values(records, 'stock_code')):
+                self.invalidate(code)
+
+    def add_events(self, records):
+        """加入一批除权记录，返回发生变动的股票数"""
+        changed = set()
+        days = day_numbers([value or 'NaT' for value in field_values(records, 'ex_rights_date')])
+        for record, day in zip(records, days.tolist()):
+            code = record.get('stock_code')
+            if not code or day < 0:
+                continue
+            event = (float(record.get('give_per_10_shares') or 0), float(record.get('pei_per_10_shares') or 0),
+                     float(record.get('pei_price') or 0), float(record.get('profit_per_share') or 0))
+            symbol = self.symbols.get(code)
+            if symbol is None:
+                symbol = self.symbols[code] = SymbolEvents()
+            result = symbol.add(day, event)
+            if result == 'same':
+                self.unchanged += 1
+                continue
+            if result == 'append':
+                self.appended += 1
+            else:
+                self.updated += 1
+            if result != 'update':
+                self.events += 1
+            changed.add(code)
+        if changed:
+            self.market = None
+        return len(changed)
+
+    def invalidate(self, stock_code=None):
+        """丢弃复权缓存（不指定股票时全部丢弃）"""
+        if stock_code is None:
+            self.cache.clear()
+        else:
+            for mode in MODES:
+                self.cache.pop((stock_code, mode), None)
+
+    def factors(self, stock_code, dates, mode='forward'):
+        """某只股票在给定交易日的复权因子"""
+        if mode not in MODES:
+            raise ValueError(f"未知的复权方式: {mode}")
+        days = day_numbers(dates)
+        symbol = self.symbols.get(stock_code)
+        if symbol is None:
+            return np.ones(len(days))
+        return symbol.factors(days, mode)
+
+    def adjust(self, stock_code, bars, mode='forward'):
+        """
+        对一只股票的日线（列dict，按日期排序）做复权，返回新的列dict（多一列 adjust_factor）
+        日线中的收盘价会用于修正该股票的近似事件比例
+        """
+        if mode not in MODES:
+            raise ValueError(f"未知的复权方式: {mode}")
+        days = day_numbers(bars['trade_date'])
+        symbol = self.symbols.get(stock_code)
+        if symbol is None:
+            return apply_factors(bars, np.ones(len(days)))
+        if not all(symbol.exact):
+            resolved = symbol.resolve(days, bars['close_price'])
+            if resolved:
+                self.resolved += resolved
+                self.market = None
+        return apply_factors(bars, symbol.factors(days, mode))
+
+    def adjusted(self, stock_code, mode='forward'):
+        """读取并复权一只股票的全部日线，结果缓存到该股票的下一个事件或下一批日线"""
+        symbol = self.symbols.get(stock_code)
+        version = symbol.version if symbol is not None else 0
+        cached = self.cache.get((stock_code, mode))
+        if cached is not None and cached[0] == version:
+            self.cache_hits += 1
+            return cached[1]
+        self.cache_misses += 1
+        if self.bar_source is None:
+            raise ValueError("未设置日线数据来源（bar_source）")
+        bars = self.bar_source(stock_code)
+        if bars is None:
+            return None
+        result = self.adjust(stock_code, bars, mode)
+        # adjust可能修正了近似比例，按修正后的版本缓存
+        self.cache[(stock_code, mode)] = (symbol.version if symbol is not None else 0, result)
+        return result
+
+    def market_table(self):
+        """
+        全市场事件表：按 (股票编号, 除权日) 排序的键、每个事件之后的累计积、每只股票的起点和总积
+        """
+        if self.market is None:
+            codes = list(self.symbols)
+            ids = {code: i for i, code in enumerate(codes)}
+            counts = np.array([len(self.symbols[code].days) for code in codes], dtype=np.int64)
+            keys = np.concatenate([(np.int64(i) << 32) | np.array(self.symbols[code].days, dtype=np.int64)
+                                   for i, code in enumerate(codes)]) if codes else np.empty(0, np.int64)
+            cumulative = np.concatenate([self.symbols[code].cumulative[1:] for code in codes]) if codes \
+                else np.empty(0)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1])) if codes else np.empty(0, np.int64)
+            totals = np.array([self.symbols[code].cumulative[-1] for code in codes])
+            self.market = (ids, keys, cumulative, starts, totals)
+        return self.market
+
+    def adjust_market(self, bars, mode='forward'):
+        """
+        对多只股票的日线（如 DailyBarStore.read_date 的结果）一次向量化复权
+        每行按 (股票编号, 交易日) 在全市场事件表中二分查找，不按股票循环；
+        使用当前的事件比例，尚未被 adjust()/adjusted() 修正的事件按近似比例计算
+        """
+        if mode not in MODES:
+            raise ValueError(f"未知的复权方式: {mode}")
+        days = day_numbers(bars['trade_date'])
+        ids, keys, cumulative, starts, totals = self.market_table()
+        # 日线通常按股票连续排列，按连续段查股票编号，比对整列字符串去重排序快得多
+        codes = np.asarray(bars['stock_code'])
+        bounds = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+        run_starts = np.concatenate(([0], bounds)) if len(codes) else bounds
+        run_ids = np.array([ids.get(code, -1) for code in codes[run_starts].tolist()], dtype=np.int64)
+        symbol_ids = np.repeat(run_ids, np.diff(np.append(run_starts, len(codes))))
+        has_events = symbol_ids >= 0
+        safe_ids = np.where(has_events, symbol_ids, 0)
+        position = np.searchsorted(keys, (safe_ids << 32) | days, 'right') - 1
+        if len(keys):
+            has_events &= position >= starts[safe_ids]
+            back = np.where(has_events, cumulative[np.maximum(position, 0)], 1.0)
+        else:
+            back = np.ones(len(days))
+        if mode == 'backward':
+            factors = back
+        else:
+            factors = back / np.where(symbol_ids >= 0, totals[safe_ids] if len(totals) else 1.0, 1.0)
+        return apply_factors(bars, factors)
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地发布/订阅转发
+C#端只推送到一个接收端口，接收端（mq_receiver_host.py --broker PATH）在Unix域套接字上
+把收到的数据转发给任意多个本机订阅者（策略进程），订阅按队列和股票代码过滤。
+
+订阅者连接后先发送一个队列名为 __mq_subscribe__ 的v1帧，内容为JSON:
+    {"queues": ["realtime"], "symbols": ["SH600000"], "policy": "conflate", "buffer": 1024, "raw": false}
+    queues   队列名称或队列类型（daily / realtime / ex_rights / market_table），空表示全部
+    symbols  股票代码，空表示全部
+    policy   缓冲区满时的处理: drop-oldest 丢弃最旧的帧 / conflate 每只股票只保留最新行情 / disconnect 断开
+    buffer   缓冲的最大帧数
+    raw      true 转发原始帧（编码和压缩标志不变，不能按股票过滤），否则转发解码后按股票过滤的JSON记录
+接收端回复一个 __mq_subscribed__ 帧（JSON，出错时带 "error" 后关闭连接），之后持续推送v1帧，
+订阅者不回复ACK，可以直接用 FrameDecoder 分帧。
+
+每个订阅者有自己的有界缓冲区和发送线程，接收线程只做过滤和入队，慢订阅者不会阻塞接收。
+
+用法（订阅端示例）:
+    python mq_broker.py /tmp/mq_broker.sock --queue realtime --symbol SH600000 --policy conflate
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from mq_codec import columnar_records, decode_payload
+from mq_json_stream import RecordStream
+from mq_protocol import CODEC_JSON, FrameDecoder, build_frame, get_queue_type
+from mq_records import RecordBatch
+
+SUBSCRIBE_QUEUE = '__mq_subscribe__'
+SUBSCRIBED_QUEUE = '__mq_subscribed__'
+
+POLICY_DROP_OLDEST = 'drop-oldest'
+POLICY_CONFLATE = 'conflate'
+POLICY_DISCONNECT = 'disconnect'
+POLICIES = (POLICY_DROP_OLDEST, POLICY_CONFLATE, POLICY_DISCONNECT)
+
+DEFAULT_BUFFER = 1024
+# conflate订阅者的内核发送缓冲区：缓冲区大了，合并之前的旧行情会积压在内核里
+CONFLATE_SNDBUF = 4 * 1024
+SUBSCRIBE_TIMEOUT = 5.0
+STREAM_CHUNK_RECORDS = 10000  # 流式解析的大日线消息按此条数分帧转发
+
+
+def json_body(data):
+    """序列化为C#发送端使用的JSON格式"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def message_records(data, symbols=None):
+    """
+    解码后的消息 -> 记录列表（只保留symbols中的股票）；没有记录的消息返回None
+    列式数据在这里还原为dict（接收线程中完成，之后不再引用消息体缓冲区）
+    """
+    if not isinstance(data, dict):
+        return None
+    records = data.get('records')
+    if isinstance(records, RecordBatch):  # 紧凑表示还原为dict才能序列化
+        records = records.to_dicts()
+    if isinstance(records, list):
+        if symbols is None:
+            return records
+        return [r for r in records if isinstance(r, dict) and r.get('stock_code') in symbols]
+    columns = data.get('columns')
+    if columns is not None:
+        if symbols is None:
+            return columnar_records(columns)
+        import numpy as np
+        return columnar_records(columns, np.flatnonzero(np.isin(columns['stock_code'], list(symbols))))
+    return None
+
+
+class SharedFrame:
+    """多个订阅者共用的一帧，由第一个取用的发送线程序列化"""
+    __slots__ = ('queue_name', 'data', 'frame', 'lock')
+
+    def __init__(self, queue_name, data):
+        self.queue_name = queue_name
+        self.data = data
+        self.frame = None
+        self.lock = threading.Lock()
+
+    def build(self):
+        with self.lock:
+            if self.frame is None:
+                self.frame = build_frame(self.queue_name, json_body(self.data))
+                self.data = None
+            return self.frame
+
+
+class Subscriber:
+    def __init__(self, conn, name, queues=(), symbols=(), policy=POLICY_DROP_OLDEST, buffer=DEFAULT_BUFFER,
+                 raw=False, on_close=None):
+        self.conn = conn
+        self.name = name
+        self.queues = set(queues)
+        self.symbols = set(symbols) or None
+        self.policy = policy
+        self.buffer = buffer
+        self.raw = raw
+        self.on_close = on_close  # on_close(subscriber)，发送线程退出时调用
+        self.frames = deque()   # bytes 或 SharedFrame
+        self.latest = {}        # conflate: (队列名称, 股票代码) -> 最新记录
+        self.cond = threading.Condition()
+        self.closed = False
+        self.reason = None
+        self.published = 0
+        self.sent = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.thread = threading.Thread(target=self.run, name=f'mq-subscriber-{name}', daemon=True)
+
+    def wants(self, queue_name):
+        """是否订阅了该队列"""
+        return not self.queues or queue_name in self.queues or get_queue_type(queue_name) in self.queues
+
+    def put(self, item):
+        """加入一帧（接收线程调用，不阻塞），缓冲区满时按策略处理"""
+        with self.cond:
+            if self.closed:
+                return
+            self.published += 1
+            if len(self.frames) >= self.buffer:
+                if self.policy == POLICY_DISCONNECT:
+                    self.close_locked(f"缓冲区已满（{self.buffer} 帧）")
+                    return
+                self.frames.popleft()
+                self.dropped += 1
+            self.frames.append(item)
+            self.cond.notify()
+
+    def put_latest(self, queue_name, records):
+        """conflate策略：按股票覆盖尚未发送的行情，只保留最新一条"""
+        with self.cond:
+            if self.closed:
+                return
+            self.published += 1
+            latest = self.latest
+            for record in records:
+                key = (queue_name, record.get('stock_code'))
+                if key in latest:
+                    self.conflated += 1
+                latest[key] = record
+            self.cond.notify()
+
+    def take(self):
+        """发送线程取出待发送的全部数据，没有数据时等待；已关闭返回None"""
+        with self.cond:
+            while not self.frames and not self.latest and not self.closed:
+                self.cond.wait()
+            if self.closed:
+                return None
+            frames, self.frames = self.frames, deque()
+            latest, self.latest = self.latest, {}
+        # 合并的最新行情按队列各组成一帧
+        by_queue = {}
+        for (queue_name, _), record in latest.items():
+            by_queue.setdefault(queue_name, []).append(record)
+        for queue_name, records in by_queue.items():
+            frames.append(build_frame(queue_name, json_body({"records": records})))
+        return frames
+
+    def run(self):
+        """发送线程：阻塞发送只影响本订阅者"""
+        try:
+            while True:
+                frames = self.take()
+                if frames is None:
+                    break
+                for item in frames:
+                    self.conn.sendall(item if isinstance(item, bytes) else item.build())
+                    self.sent += 1
+        except OSError as e:
+            self.close(f"发送失败: {e}")
+        finally:
+            self.close()
+            try:
+                self.conn.close()
+            except OSError:
+                pass
+            if self.on_close is not None:
+                self.on_close(self)
+
+    def close_locked(self, reason=None):
+        if self.closed:
+            return
+        self.closed = True
+        self.reason = reason
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)  # 让阻塞在sendall中的发送线程立即返回
+        except OSError:
+            pass
+        self.cond.notify_all()
+
+    def close(self, reason=None):
+        with self.cond:
+            self.close_locked(reason)
+
+
+class Broker:
+    def __init__(self, path):
+        """
+        :param path: Unix域套接字路径（已存在的旧套接字文件会被删除）
+        """
+        self.path = path
+        self.subscribers = []
+        self.lock = threading.Lock()  # 保护subscribers列表
+        self.total_subscribers = 0
+        if os.path.exists(path):
+            os.unlink(path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(path)
+        self.socket.listen(16)
+        self.thread = threading.Thread(target=self.accept_loop, name='mq-broker', daemon=True)
+        self.thread.start()
+
+    def accept_loop(self):
+        """接受订阅连接（后台线程）"""
+        while True:
+            try:
+                conn, _ = self.socket.accept()
+            except OSError:
+                break
+            self.total_subscribers += 1
+            name = f"#{self.total_subscribers}"
+            threading.Thread(target=self.register, args=(conn, name), daemon=True).start()
+
+    def register(self, conn, name):
+        """读取订阅请求，校验后开始推送"""
+        try:
+            conn.settimeout(SUBSCRIBE_TIMEOUT)
+            request = read_frame(conn)
+            if request is None or request.queue_name != SUBSCRIBE_QUEUE:
+                raise ValueError("第一帧必须是订阅请求")
+            subscriber = parse_subscription(conn, name, request.body)
+            subscriber.on_close = self.remove
+            conn.settimeout(None)
+            if subscriber.policy == POLICY_CONFLATE:
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, CONFLATE_SNDBUF)
+        except (OSError, ValueError) as e:
+            try:
+                conn.sendall(build_frame(SUBSCRIBED_QUEUE, json_body({"error": str(e)})))
+            except OSError:
+                pass
+            conn.close()
+            print(f"[{datetime.now()}] ✗ 订阅请求无效 ({name}): {e}")
+            return
+        try:
+            conn.sendall(build_frame(SUBSCRIBED_QUEUE, json_body({
+                "name": name, "policy": subscriber.policy, "buffer": subscriber.buffer, "raw": subscriber.raw})))
+        except OSError:
+            conn.close()
+            return
+        with self.lock:
+            self.subscribers = self.subscribers + [subscriber]
+        subscriber.thread.start()
+        print(f"[{datetime.now()}] ✓ 新订阅者 {name}: 队列 {sorted(subscriber.queues) or '全部'}, "
+              f"股票 {len(subscriber.symbols) if subscriber.symbols else '全部'}, {subscriber.policy}, "
+              f"缓冲 {subscriber.buffer} 帧{', 原始帧' if subscriber.raw else ''}")
+
+    def remove(self, subscriber):
+        """订阅者断开（或被断开）后从列表中移除并输出统计"""
+        with self.lock:
+            self.subscribers = [s for s in self.subscribers if s is not subscriber]
+        reason = f"（{subscriber.reason}）" if subscriber.reason else ""
+        print(f"[{datetime.now()}] 订阅者 {subscriber.name} 已断开{reason}: 发送 {subscriber.sent} 帧, "
+              f"丢弃 {subscriber.dropped} 帧, 合并 {subscriber.conflated} 条")
+
+    def publish_frame(self, queue_name, body, codec=CODEC_JSON, flags=0):
+        """转发原始帧给raw订阅者（接收线程调用，body可以是FrameDecoder的memoryview）"""
+        frame = None
+        for subscriber in self.subscribers:
+            if subscriber.raw and subscriber.wants(queue_name):
+                if frame is None:
+                    frame = build_frame(queue_name, body, codec=codec, flags=flags)
+                subscriber.put(frame)
+
+    def publish(self, queue_name, data):
+        """转发解码后的消息（接收线程调用）"""
+        subscribers = [s for s in self.subscribers if not s.raw and s.wants(queue_name)]
+        if not subscribers:
+            return
+        if isinstance(data, dict) and isinstance(data.get('records'), RecordStream):
+            # 流式解析的大消息：分批转发，不在内存中展开整条消息
+            for chunk in data['records'].chunks(STREAM_CHUNK_RECORDS):
+                self.publish_records(subscribers, queue_name, {"records": chunk})
+            return
+        self.publish_records(subscribers, queue_name, data)
+
+    def publish_records(self, subscribers, queue_name, data):
+        shared = None
+        all_records = None
+        for subscriber in subscribers:
+            if subscriber.policy == POLICY_CONFLATE and get_queue_type(queue_name) == 'realtime':
+                records = message_records(data, subscriber.symbols)
+                if records:
+                    subscriber.put_latest(queue_name, records)
+                continue
+            if subscriber.symbols is None:
+                # 不按股票过滤的订阅者共用同一帧，只序列化一次
+                if shared is None:
+                    if all_records is None:
+                        all_records = message_records(data)
+                    shared = SharedFrame(queue_name, data if all_records is None else {"records": all_records})
+                subscriber.put(shared)
+                continue
+            records = message_records(data, subscriber.symbols)
+            if records:
+                subscriber.put(SharedFrame(queue_name, {"records": records}))
+
+    def close(self):
+        """停止接受订阅并断开全部订阅者"""
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+        subscribers = self.subscribers
+        for subscriber in subscribers:
+            subscriber.close("接收端关闭")
+        for subscriber in subscribers:
+            subscriber.thread.join(1.0)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def read_frame(sock, decoder=None):
+    """阻塞读取一帧（订阅握手用），连接关闭返回None"""
+    decoder = decoder or FrameDecoder()
+    while True:
+        for frame in decoder.frames():
+            return frame
+        if not decoder.recv_into(sock):
+            return None
+
+
+def parse_subscription(conn, name, body):
+    """解析订阅请求，返回Subscriber；参数无效抛出ValueError"""
+    try:
+        request = json.loads(str(body, 'utf-8'))
+    except ValueError:
+        raise ValueError("订阅请求不是有效的JSON") from None
+    if not isinstance(request, dict):
+        raise ValueError("订阅请求必须是JSON对象")
+    policy = request.get('policy') or POLICY_DROP_OLDEST
+    if policy not in POLICIES:
+        raise ValueError(f"未知的慢订阅者策略: {policy}")
+    buffer = int(request.get('buffer') or DEFAULT_BUFFER)
+    if buffer < 1:
+        raise ValueError(f"缓冲区大小必须为正数: {buffer}")
+    raw = bool(request.get('raw'))
+    symbols = request.get('symbols') or ()
+    if raw and symbols:
+        raise ValueError("原始帧不能按股票过滤")
+    if raw and policy == POLICY_CONFLATE:
+        raise ValueError("原始帧不支持conflate策略")
+    return Subscriber(conn, name, request.get('queues') or (), symbols, policy, buffer, raw)
+
+
+def subscribe(path, queues=(), symbols=(), policy=POLICY_DROP_OLDEST, buffer=DEFAULT_BUFFER, raw=False):
+    """
+    连接接收端的转发套接字并订阅，逐个生成收到的 Frame
+    body是memoryview，只在取下一帧之前有效；订阅被拒绝时抛出ValueError
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    try:
+        request = {"queues": list(queues), "symbols": list(symbols), "policy": policy, "buffer": buffer,
+                   "raw": raw}
+        sock.sendall(build_frame(SUBSCRIBE_QUEUE, json_body(request)))
+        decoder = FrameDecoder()
+        reply = read_frame(sock, decoder)
+        if reply is None:
+            raise ValueError("接收端关闭了连接")
+        result = json.loads(str(reply.body, 'utf-8'))
+        if 'error' in result:
+            raise ValueError(result['error'])
+        while True:
+            yield from decoder.frames()
+            if not decoder.recv_into(sock):
+                return
+    finally:
+        sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="订阅接收端转发的数据（示例订阅者）")
+    parser.add_argument('path', help="接收端的转发套接字路径（mq_receiver_host.py --broker PATH）")
+    parser.add_argument('--queue', action='append', default=[], help="队列名称或类型，可重复指定（默认全部）")
+    parser.add_argument('--symbol', action='append', default=[], help="股票代码，可重复指定（默认全部）")
+    parser.add_argument('--policy', choices=POLICIES, default=POLICY_DROP_OLDEST,
+                        help=f"缓冲区满时的处理（默认{POLICY_DROP_OLDEST}）")
+    parser.add_argument('--buffer', type=int, default=DEFAULT_BUFFER, help=f"缓冲帧数（默认{DEFAULT_BUFFER}）")
+    parser.add_argument('--raw', action='store_true', help="接收原始帧（不解码、不按股票过滤）")
+    parser.add_argument('--slow', type=float, default=0, metavar='SECONDS',
+                        help="每帧处理后暂停的秒数（模拟慢订阅者）")
+    args = parser.parse_args()
+
+    frames = records = 0
+    try:
+        for frame in subscribe(args.path, args.queue, args.symbol, args.policy, args.buffer, args.raw):
+            data = decode_payload(frame.codec, frame.body, frame.flags)
+            count = len(message_records(data) or ())
+            frames += 1
+            records += count
+            print(f"[{datetime.now()}] {frame.queue_name} | {count} 条 | {frame.message_length} 字节"
+                  f" | 累计 {frames} 帧 {records} 条")
+            if args.slow:
+                time.sleep(args.slow)
+    except ValueError as e:
+        print(f"✗ 订阅失败: {e}")
+        sys.exit(1)
+    print(f"接收端已断开: 共 {frames} 帧, {records} 条记录")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n已停止订阅")
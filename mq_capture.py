@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+原始帧抓包日志
+接收端把每一帧（队列名称、接收时间、codec、消息体）追加写入滚动的段文件，
+每个段文件配一个稀疏偏移索引，回放时用mmap读取（见 mq_replay.py）。
+
+段文件 NNNNNNNN.seg:  文件头 "MQCAP001"，之后是连续的记录:
+    记录长度(4) + 接收时间纳秒(8) + codec(1) + 帧标志位(1) + 队列名称长度(2) + 队列名称 + 消息体
+    消息体按收到的原样保存，压缩帧（FLAG_ZLIB）保存压缩数据
+索引文件 NNNNNNNN.idx: 每写入一批记录追加一项 批内第一条记录的接收时间纳秒(8) + 段内偏移(8)
+所有整数均为小端序。
+
+写入在后台线程中批量进行，接收线程只把帧复制到内存队列；
+待写数据超过上限时丢弃新帧并计数，不阻塞接收。
+"""
+
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from mq_protocol import CODEC_JSON
+
+SEGMENT_MAGIC = b'MQCAP001'
+RECORD_HEADER = struct.Struct('<IQBBH')
+INDEX_ENTRY = struct.Struct('<QQ')
+
+DEFAULT_SEGMENT_SIZE = 256 * 1024 * 1024
+DEFAULT_FLUSH_INTERVAL = 0.2
+DEFAULT_BATCH_BYTES = 4 * 1024 * 1024
+DEFAULT_MAX_PENDING = 256 * 1024 * 1024
+
+CapturedFrame = namedtuple('CapturedFrame', ['timestamp_ns', 'queue_name', 'codec', 'body', 'flags'], defaults=(0,))
+
+
+def segment_paths(directory):
+    """按顺序列出目录中的段文件"""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.seg'))
+    return [os.path.join(directory, name) for name in names]
+
+
+def index_path(segment_path):
+    """段文件对应的索引文件"""
+    return segment_path[:-len('.seg')] + '.idx'
+
+
+class CaptureWriter:
+    def __init__(self, directory, segment_size=DEFAULT_SEGMENT_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 batch_bytes=DEFAULT_BATCH_BYTES, max_pending=DEFAULT_MAX_PENDING):
+        """
+        :param directory: 段文件目录
+        :param segment_size: 单个段文件的大小上限（字节），超过后滚动到新文件
+        :param flush_interval: 后台线程最长多久写一次（秒）
+        :param batch_bytes: 待写数据达到该大小时立即唤醒后台线程
+        :param max_pending: 待写数据上限，超过时丢弃新帧
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.flush_interval = flush_interval
+        self.batch_bytes = batch_bytes
+        self.max_pending = max_pending
+        os.makedirs(directory, exist_ok=True)
+
+        self.pending = []
+        self.pending_bytes = 0
+        self.pending_first_ts = 0
+        self.last_ts = 0
+        self.cond = threading.Condition()
+        self.closed = False
+
+        self.frames = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.segments = 0
+
+        self.segment_file = None
+        self.index_file = None
+        self.segment_offset = 0
+        existing = segment_paths(directory)
+        self.segment_number = int(os.path.basename(existing[-1])[:-4]) + 1 if existing else 0
+
+        self.thread = threading.Thread(target=self.run, name='mq-capture', daemon=True)
+        self.thread.start()
+
+    def append(self, queue_name, body, codec=CODEC_JSON, flags=0):
+        """追加一帧（在接收线程中调用，只做一次内存复制）"""
+        name = queue_name.encode('utf-8')
+        with self.cond:
+            if self.closed:
+                return False
+            if self.pending_bytes >= self.max_pending:
+                self.dropped += 1
+                return False
+            # 在锁内取时间，保证日志中的接收时间单调递增
+            ts = max(time.time_ns(), self.last_ts)
+            self.last_ts = ts
+            header = RECORD_HEADER.pack(RECORD_HEADER.size + len(name) + len(body), ts, codec, flags, len(name))
+            record = b''.join((header, name, body))
+            if not self.pending:
+                self.pending_first_ts = ts
+            self.pending.append(record)
+            self.pending_bytes += len(record)
+            if self.pending_bytes >= self.batch_bytes:
+                self.cond.notify()
+        return True
+
+    def run(self):
+        """后台写线程"""
+        while True:
+            with self.cond:
+                if not self.pending and not self.closed:
+                    self.cond.wait(self.flush_interval)
+                batch, first_ts, size = self.pending, self.pending_first_ts, self.pending_bytes
+                self.pending, self.pending_bytes = [], 0
+                closed = self.closed
+            if batch:
+                self.write_batch(batch, first_ts, size)
+            if closed and not batch:
+                break
+        self.close_segment()
+
+    def write_batch(self, batch, first_ts, size):
+        """把一批记录写入当前段文件，必要时滚动"""
+        if self.segment_file is None or (self.segment_offset > len(SEGMENT_MAGIC)
+                                         and self.segment_offset + size > self.segment_size):
+            self.open_segment()
+        self.index_file.write(INDEX_ENTRY.pack(first_ts, self.segment_offset))
+        self.segment_file.writelines(batch)
+        self.segment_file.flush()
+        self.index_file.flush()
+        self.segment_offset += size
+        self.frames += len(batch)
+        self.bytes += size
+
+    def open_segment(self):
+        """关闭当前段文件并新建下一个"""
+        self.close_segment()
+        path = os.path.join(self.directory, f'{self.segment_number:08d}.seg')
+        self.segment_number += 1
+        self.segment_file = open(path, 'wb')
+        self.index_file = open(index_path(path), 'wb')
+        self.segment_file.write(SEGMENT_MAGIC)
+        self.segment_offset = len(SEGMENT_MAGIC)
+        self.segments += 1
+
+    def close_segment(self):
+        """关闭当前段文件"""
+        if self.segment_file is not None:
+            self.segment_file.close()
+            self.index_file.close()
+            self.segment_file = None
+            self.index_file = None
+
+    def close(self):
+        """写完剩余数据并关闭"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+
+
+def read_index(segment_path):
+    """读取段索引，返回 (时间列表, 偏移列表)"""
+    try:
+        with open(index_path(segment_path), 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return [], []
+    usable = len(data) - len(data) % INDEX_ENTRY.size
+    entries = list(INDEX_ENTRY.iter_unpack(data[:usable]))
+    return [ts for ts, _ in entries], [offset for _, offset in entries]
+
+
+def iter_captured_frames(directory, queues=None, start_ns=None, end_ns=None, segments=None):
+    """
+    用mmap按顺序读取抓包日志，生成 CapturedFrame
+    :param queues: 只返回这些队列的帧（None表示全部）
+    :param start_ns/end_ns: 接收时间范围（纳秒，含两端）
+    :param segments: 只读取这些段文件（segment_paths 的子集，用于按段并行处理）
+    消息体是mmap上的memoryview，只在迭代到下一帧之前有效
+    """
+    queues = set(queues) if queues else None
+    segments = segment_paths(directory) if segments is None else list(segments)
+    first_ts = [read_index(path)[0][:1] for path in segments]
+
+    for i, path in enumerate(segments):
+        times, offsets = read_index(path)
+        # 下一个段的起始时间早于start的段可以整个跳过
+        if start_ns is not None and i + 1 < len(segments) and first_ts[i + 1] and first_ts[i + 1][0] < start_ns:
+            continue
+        if end_ns is not None and times and times[0] > end_ns:
+            return
+
+        offset = len(SEGMENT_MAGIC)
+        if start_ns is not None and times:
+            # 从最后一个起始时间不晚于start的批次开始扫描
+            position = bisect.bisect_right(times, start_ns) - 1
+            if position > 0:
+                offset = offsets[position]
+
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size <= offset:
+                continue
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        try:
+            if mm[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                raise ValueError(f"不是抓包段文件: {path}")
+            size = len(mm)
+            while offset + RECORD_HEADER.size <= size:
+                length, ts, codec, flags, name_length = RECORD_HEADER.unpack_from(mm, offset)
+                if length < RECORD_HEADER.size + name_length or offset + length > size:
+                    break  # 写了一半的记录
+                if end_ns is not None and ts > end_ns:
+                    return
+                if start_ns is None or ts >= start_ns:
+                    name_start = offset + RECORD_HEADER.size
+                    queue_name = str(view[name_start:name_start + name_length], 'utf-8')
+                    if queues is None or queue_name in queues:
+                        yield CapturedFrame(ts, queue_name, codec, view[name_start + name_length:offset + length], flags)
+                offset += length
+        finally:
+            try:
+                view.release()
+                mm.close()
+            except BufferError:
+                pass  # 调用方仍持有消息体切片，由垃圾回收关闭
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+接收端状态检查点（热重启）
+接收端重启后符号表、最新行情表和累计统计都是空的，要等下一次码表推送和若干批实时行情才能恢复。
+启用检查点后由后台线程每隔interval秒把内存中的状态写入一个二进制文件，启动时映射（mmap）该文件
+在几毫秒内恢复:
+    meta      JSON：累计消息数/字节数/连接数、各队列计数（安静模式）、各队列已提交序号（续传）、行情表计数
+    symbols   JSON：符号表（紧凑记录，见 mq_records.py）的股票代码、名称、市场代码，按编号顺序
+    quotes    最新行情表的行，QUOTE_DTYPE定长记录原样存放（8字节对齐），恢复时直接在映射上按列读取
+
+文件布局（小端序）:
+    头部        magic "MQCK" + 版本 + 段数 + 保留 + 写入时间(double)
+    段目录      每段: 名称(8字节) + 偏移(8) + 长度(8) + CRC32(4) + 填充(4)
+    各段数据
+先写临时文件并fsync，再替换原文件，写到一半崩溃不会留下不完整的检查点；CRC不符或版本不同的检查点忽略。
+
+每次检查点分两步：在接收线程使用的锁内复制状态（capture，会短暂阻塞处理），然后在后台线程序列化并写盘
+（write）。两步的耗时分别记入直方图，接收器停止时输出，便于按间隔评估检查点的开销。
+用法（查看检查点内容）:
+    python mq_checkpoint.py FILE
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from mq_metrics import Histogram
+
+CHECKPOINT_MAGIC = b'MQCK'
+CHECKPOINT_VERSION = 1
+HEADER = struct.Struct('<4sIIId')
+SECTION = struct.Struct('<8sQQI4x')
+ALIGNMENT = 8
+
+DEFAULT_CHECKPOINT_INTERVAL = 5.0
+
+
+def write_checkpoint(path, meta, symbols=None, quotes=None):
+    """
+    写入检查点（先写临时文件再替换），返回文件字节数
+    :param meta: 可JSON序列化的dict
+    :param symbols: [股票代码列表, 名称列表, 市场代码列表]，None表示没有
+    :param quotes: QUOTE_DTYPE结构化数组，None表示没有
+    """
+    sections = [(b'meta', json.dumps(meta, ensure_ascii=False).encode('utf-8'))]
+    if symbols is not None:
+        sections.append((b'symbols', json.dumps(symbols, ensure_ascii=False).encode('utf-8')))
+    if quotes is not None:
+        sections.append((b'quotes', quotes.view('u1')))  # datetime64字段不支持缓冲区协议，按字节视图写出
+
+    offset = HEADER.size + SECTION.size * len(sections)
+    table = []
+    for name, data in sections:
+        offset += -offset % ALIGNMENT
+        table.append(SECTION.pack(name, offset, len(data), zlib.crc32(data)))
+        offset += len(data)
+
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, len(sections), 0, time.time()))
+        f.write(b''.join(table))
+        for name, data in sections:
+            f.write(b'\0' * (-f.tell() % ALIGNMENT))
+            f.write(data)
+        size = f.tell()
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return size
+
+
+def quote_rows(table):
+    """最新行情表的行转换为QUOTE_DTYPE（共享内存行情表的行多一个seqlock序号字段）"""
+    import numpy as np
+    from mq_quote_book import QUOTE_DTYPE
+    if table.dtype == QUOTE_DTYPE:
+        return table
+    rows = np.empty(len(table), dtype=QUOTE_DTYPE)
+    for name in QUOTE_DTYPE.names:
+        rows[name] = table[name]
+    return rows
+
+
+class Checkpoint:
+    """映射读取的检查点：meta/symbols在打开时解析，quotes按需取出映射上的数组视图"""
+
+    def __init__(self, path):
+        """文件不完整、CRC不符或版本不同时抛出ValueError"""
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self.mmap) < HEADER.size:
+                raise ValueError("检查点文件不完整")
+            magic, version, count, _, self.created = HEADER.unpack_from(self.mmap, 0)
+            if magic != CHECKPOINT_MAGIC:
+                raise ValueError("不是检查点文件")
+            if version != CHECKPOINT_VERSION:
+                raise ValueError(f"检查点版本不同: {version}")
+            self.sections = {}
+            for i in range(count):
+                name, offset, length, crc = SECTION.unpack_from(self.mmap, HEADER.size + i * SECTION.size)
+                name = name.rstrip(b'\0').decode()
+                if offset + length > len(self.mmap):
+                    raise ValueError(f"检查点段 {name} 不完整")
+                with memoryview(self.mmap)[offset:offset + length] as view:
+                    if zlib.crc32(view) != crc:
+                        raise ValueError(f"检查点段 {name} 校验失败")
+                self.sections[name] = (offset, length)
+            self.meta = self.load_json('meta') or {}
+            self.symbols = self.load_json('symbols')
+        except Exception:
+            self.mmap.close()
+            raise
+
+    def load_json(self, name):
+        if name not in self.sections:
+            return None
+        offset, length = self.sections[name]
+        return json.loads(self.mmap[offset:offset + length])
+
+    def quotes(self, dtype):
+        """映射上的行情表视图（dtype与写入时不同或没有该段时返回None），须在close()之前释放"""
+        import numpy as np
+        if 'quotes' not in self.sections or self.meta.get('quote_dtype') != str(dtype.descr):
+            return None
+        offset, length = self.sections['quotes']
+        return np.frombuffer(self.mmap, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+    def close(self):
+        try:
+            self.mmap.close()
+        except BufferError:  # 仍有quotes()的视图（恢复时出错），映射在视图释放后回收
+            pass
+
+
+class Checkpointer:
+    def __init__(self, path, capture, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        """
+        :param capture: 复制当前状态的函数，返回 write_checkpoint 的关键字参数
+                        (meta, symbols, quotes)；meta['messages']与上次相同时跳过写入
+        :param interval: 检查点间隔（秒）
+        """
+        self.path = path
+        self.capture = capture
+        self.interval = interval
+        self.lock = threading.Lock()  # 后台线程与停止时的最后一次写入互斥
+        self.saved = None       # 上次写入时的消息数
+        self.checkpoints = 0
+        self.failures = 0
+        self.size = 0
+        self.capture_time = Histogram()     # 复制状态的耗时（微秒，接收线程在此期间等待）
+        self.write_time = Histogram()       # 序列化和写盘的耗时（微秒，后台线程）
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='mq-checkpoint', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.save()
+
+    def save(self, force=False):
+        """写一次检查点，返回是否写入（状态没有变化时跳过，force时总是写入）"""
+        with self.lock:
+            try:
+                started = time.perf_counter_ns()
+                state = self.capture()
+                captured = time.perf_counter_ns()
+                messages = state['meta'].get('messages')
+                if not force and messages == self.saved:
+                    return False
+                self.size = write_checkpoint(self.path, **state)
+            except Exception as e:
+                self.failures += 1
+                print(f"[{datetime.now()}] ✗ 写入检查点失败: {e}")
+                return False
+            self.capture_time.record((captured - started) // 1000)
+            self.write_time.record((time.perf_counter_ns() - captured) // 1000)
+            self.saved = messages
+            self.checkpoints += 1
+            return True
+
+    def close(self):
+        """停止后台线程并写入最后一次检查点"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.save()
+
+    def summary(self):
+        """检查点开销的一行汇总"""
+        if not self.checkpoints:
+            return "检查点: 没有新消息，未写入" + (f", 失败 {self.failures} 次" if self.failures else "")
+        return (f"检查点: {self.checkpoints} 次, {self.size / 1024:.0f} KB, "
+                f"复制状态 p50 {self.capture_time.quantile(0.5) / 1000:.2f} ms / 最大 {self.capture_time.max / 1000:.2f} ms, "
+                f"写盘 p50 {self.write_time.quantile(0.5) / 1000:.2f} ms / 最大 {self.write_time.max / 1000:.2f} ms"
+                + (f", 失败 {self.failures} 次" if self.failures else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看接收端检查点")
+    parser.add_argument('path', help="检查点文件")
+    args = parser.parse_args()
+    try:
+        checkpoint = Checkpoint(args.path)
+    except (OSError, ValueError) as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    print(f"写入时间: {datetime.fromtimestamp(checkpoint.created)}")
+    for name, (offset, length) in checkpoint.sections.items():
+        print(f"段 {name:<8} 偏移 {offset:>10}  {length:>12} 字节")
+    meta = dict(checkpoint.meta)
+    meta.pop('quote_dtype', None)
+    print(json.dumps(meta, ensure_ascii=False, indent=2))
+    if checkpoint.symbols:
+        print(f"符号表: {len(checkpoint.symbols[0])} 只股票")
+    checkpoint.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MQ消息体编解码
+CODEC_JSON: C#发送端使用的 {"records":[...]} JSON格式
+CODEC_REALTIME_COLUMNAR: realtime_data_queue 的二进制列式格式（版本1）
+
+列式格式（小端序），头部16字节:
+    版本(1) + 保留(1) + 股票代码宽度(2) + 股票名称宽度(2) + 保留(6) + 记录数(4)
+之后按顺序存放各列，每列 记录数 x 元素 个定长数值:
+    update_time     int64    秒（按UTC解释的本地时间，不做时区换算）
+    time_stamp      int32
+    last_close/open/high/low/new_price/volume/amount    float32
+    buy_price/buy_volume/sell_price/sell_volume         float32 x 5
+    market_code     uint16
+最后是符号块:
+    stock_code      定长ASCII，不足补\\0
+    stock_name      定长UTF-8，不足补\\0
+数值列都按自身宽度对齐，可以用 numpy.frombuffer 直接映射。
+行情源（StockDrv）给出的价格和成交量本来就是单精度浮点，float32不会丢失精度。
+"""
+
+import calendar
+import json
+import struct
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # 列式编解码需要NumPy，JSON路径不受影响
+    np = None
+
+from mq_protocol import CODEC_JSON, CODEC_REALTIME_COLUMNAR, decompress_body
+
+REALTIME_COLUMNAR_VERSION = 1
+REALTIME_HEADER = struct.Struct('<BBHH6xI')
+
+ORDER_BOOK_DEPTH = 5
+
+# (列名, 类型, 每条记录的元素个数)
+REALTIME_COLUMNS = [
+    ('update_time', '<i8', 1),
+    ('time_stamp', '<i4', 1),
+    ('last_close', '<f4', 1),
+    ('open', '<f4', 1),
+    ('high', '<f4', 1),
+    ('low', '<f4', 1),
+    ('new_price', '<f4', 1),
+    ('volume', '<f4', 1),
+    ('amount', '<f4', 1),
+    ('buy_price', '<f4', ORDER_BOOK_DEPTH),
+    ('buy_volume', '<f4', ORDER_BOOK_DEPTH),
+    ('sell_price', '<f4', ORDER_BOOK_DEPTH),
+    ('sell_volume', '<f4', ORDER_BOOK_DEPTH),
+    ('market_code', '<u2', 1),
+]
+
+UPDATE_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def require_numpy():
+    """列式编解码依赖NumPy"""
+    if np is None:
+        raise RuntimeError("二进制列式编解码需要安装NumPy: pip install numpy")
+
+
+def parse_update_time(value):
+    """把 'yyyy-MM-dd HH:mm:ss' 转换为秒数（按UTC解释，不做时区换算）"""
+    if not value:
+        return 0
+    return calendar.timegm(datetime.strptime(value, UPDATE_TIME_FORMAT).timetuple())
+
+
+def encode_realtime_columnar(records):
+    """
+    把实时数据记录（字段与C# RealTimeDataMQSender.SerializeToJson一致的dict列表）编码为列式二进制
+    """
+    require_numpy()
+    count = len(records)
+    codes = [r.get('stock_code', '').encode('ascii') for r in records]
+    names = [r.get('stock_name', '').encode('utf-8') for r in records]
+    code_width = max((len(c) for c in codes), default=1) or 1
+    name_width = max((len(n) for n in names), default=1) or 1
+
+    parts = [REALTIME_HEADER.pack(REALTIME_COLUMNAR_VERSION, 0, code_width, name_width, count)]
+    for name, dtype, width in REALTIME_COLUMNS:
+        if name == 'update_time':
+            values = [parse_update_time(r.get(name)) for r in records]
+        else:
+            values = [r.get(name, [0] * width if width > 1 else 0) for r in records]
+        column = np.array(values, dtype=dtype)
+        if width > 1:
+            column = column.reshape(count, width)
+        parts.append(column.tobytes())
+    parts.append(np.array(codes, dtype=f'S{code_width}').tobytes())
+    parts.append(np.array(names, dtype=f'S{name_width}').tobytes())
+    return b''.join(parts)
+
+
+def decode_realtime_columnar(body):
+    """
+    解码列式二进制实时数据，返回 {列名: numpy数组}
+    数值列直接映射消息体缓冲区（不复制），消息体来自FrameDecoder时，
+    数组只在本次处理期间有效，需要保留请 .copy()
+    update_time 为 datetime64[s]，stock_code/stock_name 为字符串数组
+    """
+    require_numpy()
+    view = memoryview(body)
+    version, _, code_width, name_width, count = REALTIME_HEADER.unpack_from(view, 0)
+    if version != REALTIME_COLUMNAR_VERSION:
+        raise ValueError(f"不支持的列式格式版本: {version}")
+
+    offset = REALTIME_HEADER.size
+    columns = {}
+    for name, dtype, width in REALTIME_COLUMNS:
+        column = np.frombuffer(view, dtype=dtype, count=count * width, offset=offset)
+        offset += column.nbytes
+        columns[name] = column.reshape(count, width) if width > 1 else column
+    columns['update_time'] = columns['update_time'].view('datetime64[s]')
+
+    codes = np.frombuffer(view, dtype=f'S{code_width}', count=count, offset=offset)
+    offset += codes.nbytes
+    names = np.frombuffer(view, dtype=f'S{name_width}', count=count, offset=offset)
+    offset += names.nbytes
+    if offset != len(view):
+        raise ValueError(f"列式数据长度不符: 期望 {offset} 字节, 实际 {len(view)} 字节")
+
+    symbols = {
+        'stock_code': codes.astype(f'U{code_width}'),
+        'stock_name': np.char.decode(names, 'utf-8'),
+    }
+    symbols.update(columns)
+    return symbols
+
+
+def decode_payload(codec, body, flags=0):
+    """
+    按codec解码消息体（压缩帧先按flags解压）
+    JSON返回原始结构；列式格式返回 {"count": 记录数, "columns": {列名: 数组}}
+    """
+    if flags:
+        body = decompress_body(flags, body)
+    if codec == CODEC_JSON:
+        return json.loads(str(body, 'utf-8'))
+    if codec == CODEC_REALTIME_COLUMNAR:
+        columns = decode_realtime_columnar(body)
+        return {"count": len(columns['stock_code']), "columns": columns}
+    raise ValueError(f"未知的消息体编码: {codec}")
+
+
+def columnar_records(columns, rows=None):
+    """
+    把列式数据（或其中rows指定的行）还原为C#格式的记录dict列表
+    update_time 还原为 'yyyy-MM-dd HH:mm:ss'，float32按最短表示转为float（10.37而不是10.369999885559082）
+    """
+    require_numpy()
+    values = {}
+    for name, column in columns.items():
+        if rows is not None:
+            column = column[rows]
+        if name == 'update_time':
+            column = np.char.replace(np.datetime_as_string(column, unit='s'), 'T', ' ')
+        elif column.dtype == np.float32:
+            column = column.astype('U16').astype(np.float64)
+        values[name] = column.tolist()
+    names = list(values)
+    return [dict(zip(names, row)) for row in zip(*values.values())]
+
+
+def columnar_row(columns, index):
+    """取列式数据中的一行，转换为dict（用于显示）"""
+    row = {}
+    for name, column in columns.items():
+        value = column[index]
+        row[name] = value.tolist() if hasattr(value, 'tolist') else value
+    return row
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日线数据批量校验
+扫描抓包目录（按段）或JSON消息文件目录（按文件组），用进程池并行检查每一条记录:
+    OHLC      low <= open/close <= high 不成立（含价格为null）
+    量额      volume 或 amount 为负或为null
+    重复      同一条消息内 (stock_code, trade_date) 重复出现
+    无效键    stock_code 为空或 trade_date 无法解析
+    缺失      股票首末交易日之间，全市场出现过而该股票没有的交易日（含停牌）
+工作进程只返回去重后的 (股票, 交易日) 键和异常行，主进程合并后计算缺失交易日并生成按股票的报告。
+DailyDataAutoSync会重推重叠的历史，跨消息的重复属于正常重推，只在汇总中计数。
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+
+from mq_capture import iter_captured_frames, segment_paths
+from mq_codec import decode_payload
+from mq_json_stream import DEFAULT_STREAM_THRESHOLD, RecordStream, load_json_file
+from mq_protocol import CODEC_JSON, decompress_body, get_queue_type
+
+UNIT_BYTES = 64 * 1024 * 1024  # JSON文件按总大小分组，每组交给一个工作进程
+INVALID_DAY = -1
+MAX_SAMPLES = 3  # 每只股票每类异常最多列出的日期数
+
+# 异常类型位
+OHLC = 1
+NEGATIVE = 2
+DUPLICATE = 4
+BAD_KEY = 8
+KINDS = [(OHLC, 'ohlc', 'OHLC'), (NEGATIVE, 'negative', '量额'),
+         (DUPLICATE, 'duplicate', '重复'), (BAD_KEY, 'bad_key', '无效键')]
+
+
+class Interner(dict):
+    """值 -> 从0开始的编号，第一次出现时分配"""
+
+    def __missing__(self, key):
+        value = self[key] = len(self)
+        return value
+
+
+class DayNumbers(dict):
+    """'yyyy-mm-dd' -> 1970-01-01起的天数，无法解析记为INVALID_DAY（交易日只有几千个，缓存后只解析一次）"""
+
+    def __missing__(self, key):
+        try:
+            value = int(np.datetime64(str(key)[:10], 'D').astype(np.int64))
+        except (ValueError, TypeError):
+            value = INVALID_DAY
+        if value < 0:
+            value = INVALID_DAY
+        self[key] = value
+        return value
+
+
+def day_text(day):
+    """天数 -> 'yyyy-mm-dd'"""
+    return str(np.datetime64(int(day), 'D'))
+
+
+def column(records, name):
+    """取出一个数值字段，null记为NaN"""
+    return np.array([r.get(name) for r in records], dtype=np.float64)
+
+
+def check_records(records, code_ids, day_numbers):
+    """
+    检查一批记录（向量化），返回 (股票编号, 交易日天数, 异常类型位) 三个数组
+    重复要在整条消息的范围内判断，由 check_message 处理
+    """
+    count = len(records)
+    codes = np.fromiter(map(code_ids.__getitem__, [r.get('stock_code') or None for r in records]),
+                        np.int32, count)
+    days = np.fromiter(map(day_numbers.__getitem__, [r.get('trade_date') for r in records]), np.int32, count)
+    open_price = column(records, 'open_price')
+    high_price = column(records, 'high_price')
+    low_price = column(records, 'low_price')
+    close_price = column(records, 'close_price')
+    # 写成"不成立"的形式，NaN参与比较为False，null价格也算异常
+    ohlc_ok = ((low_price <= open_price) & (open_price <= high_price)
+               & (low_price <= close_price) & (close_price <= high_price))
+    amounts_ok = (column(records, 'volume') >= 0) & (column(records, 'amount') >= 0)
+    kinds = np.where(ohlc_ok, 0, OHLC).astype(np.uint8)
+    kinds[~amounts_ok] |= NEGATIVE
+    kinds[(days == INVALID_DAY) | (codes == code_ids[None])] |= BAD_KEY
+    return codes, days, kinds
+
+
+def check_message(records, code_ids, day_numbers, chunk_records=10000):
+    """检查一条消息的全部记录（RecordStream按块检查），并标记消息内的重复键"""
+    if isinstance(records, RecordStream):
+        parts = [check_records(chunk, code_ids, day_numbers) for chunk in records.chunks(chunk_records)]
+        if not parts:
+            return None
+        codes, days, kinds = (np.concatenate(arrays) for arrays in zip(*parts))
+    else:
+        codes, days, kinds = check_records(records, code_ids, day_numbers)
+    valid = np.flatnonzero((kinds & BAD_KEY) == 0)
+    if len(valid) > 1:
+        order = valid[np.lexsort((days[valid], codes[valid]))]
+        repeated = (codes[order[1:]] == codes[order[:-1]]) & (days[order[1:]] == days[order[:-1]])
+        kinds[order[1:][repeated]] |= DUPLICATE
+    return codes, days, kinds
+
+
+def iter_unit_messages(kind, directory, paths, stats):
+    """生成一个工作单元中的日线消息 records（列表或RecordStream）"""
+    if kind == 'capture':
+        for frame in iter_captured_frames(directory, segments=paths):
+            if get_queue_type(frame.queue_name) != 'daily':
+                stats['skipped'] += 1
+                continue
+            try:
+                body = decompress_body(frame.flags, frame.body) if frame.flags else frame.body
+                if frame.codec == CODEC_JSON and len(body) >= DEFAULT_STREAM_THRESHOLD:
+                    # 消息体是mmap切片（或解压结果），在取下一帧之前已检查完，可以直接流式解析
+                    data = {'records': RecordStream(body)}
+                else:
+                    data = decode_payload(frame.codec, body)
+            except Exception as e:
+                stats['errors'].append(f"{frame.queue_name}@{frame.timestamp_ns}: {e}")
+                continue
+            yield frame.queue_name, data.get('records') if isinstance(data, dict) else None
+    else:
+        for path in paths:
+            try:
+                # 大文件与抓包段一样直接在mmap上流式解析：信封只读到queue_name，records在检查时解析一次
+                data = load_json_file(path, keys=('queue_name',))
+            except Exception as e:
+                stats['errors'].append(f"{path}: {e}")
+                continue
+            queue_name = data.get('queue_name') if isinstance(data, dict) else None
+            if queue_name and get_queue_type(queue_name) != 'daily':
+                stats['skipped'] += 1
+                continue
+            yield path, data.get('records') if isinstance(data, dict) else None
+
+
+def scan_unit(kind, directory, paths):
+    """
+    工作进程：检查一个工作单元（一个抓包段或一组JSON文件）
+    股票编号只在单元内有效，返回codes列表供主进程换算为全局编号
+    """
+    code_ids = Interner()
+    code_ids[None] = 0  # 编号0保留给空股票代码
+    day_numbers = DayNumbers()
+    stats = {'messages': 0, 'records': 0, 'skipped': 0, 'errors': []}
+    keys = []
+    anomalies = []
+    for source, records in iter_unit_messages(kind, directory, paths, stats):
+        # 不用 len()/bool() 判断是否为空：RecordStream计数要把整条消息解析一遍，取第一条只解析到第一条
+        try:
+            first = records[0]
+        except (IndexError, KeyError, TypeError):
+            stats['skipped'] += 1  # 空消息或没有records
+            continue
+        if not isinstance(first, dict) or 'trade_date' not in first:
+            stats['skipped'] += 1  # 不是日线记录
+            continue
+        try:
+            result = check_message(records, code_ids, day_numbers)
+        except Exception as e:
+            stats['errors'].append(f"{source}: {e}")
+            continue
+        if result is None:
+            continue
+        codes, days, kinds = result
+        stats['messages'] += 1
+        stats['records'] += len(codes)
+        valid = (kinds & BAD_KEY) == 0
+        keys.append(np.unique((codes[valid].astype(np.int64) << 32) | days[valid]))
+        flagged = np.flatnonzero(kinds)
+        if len(flagged):
+            anomalies.append((codes[flagged], days[flagged], kinds[flagged]))
+    codes = [None] * len(code_ids)
+    for code, index in code_ids.items():
+        codes[index] = code
+    return {
+        'codes': codes,
+        'keys': np.unique(np.concatenate(keys)) if keys else np.empty(0, np.int64),
+        'anomalies': tuple(np.concatenate(arrays) for arrays in zip(*anomalies)) if anomalies else None,
+        'stats': stats,
+    }
+
+
+def plan_units(paths, unit_bytes=UNIT_BYTES):
+    """
+    把输入路径拆成工作单元 (类型, 抓包目录, 文件列表)
+    含 .seg 的目录按段拆分；其他目录递归查找 .json 文件，按总大小分组
+    """
+    units = []
+    json_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            segments = segment_paths(path)
+            if segments:
+                units.extend(('capture', path, [segment]) for segment in segments)
+                continue
+            for root, _, names in os.walk(path):
+                json_files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith('.json'))
+        elif path.endswith('.seg'):
+            units.append(('capture', os.path.dirname(path) or '.', [path]))
+        else:
+            json_files.append(path)
+
+    group, size = [], 0
+    for path in json_files:
+        group.append(path)
+        size += os.path.getsize(path)
+        if size >= unit_bytes:
+            units.append(('json', None, group))
+            group, size = [], 0
+    if group:
+        units.append(('json', None, group))
+    return units
+
+
+class BatchReport:
+    """在主进程中合并各工作单元的结果"""
+
+    def __init__(self):
+        self.code_ids = Interner()
+        self.code_ids[None] = 0
+        self.keys = []
+        self.anomalies = []
+        self.messages = 0
+        self.records = 0
+        self.skipped = 0
+        self.errors = []
+
+    def add(self, result):
+        """合并一个工作单元：单元内的股票编号换算为全局编号"""
+        mapping = np.array([self.code_ids[code] for code in result['codes']], dtype=np.int64)
+        keys = result['keys']
+        if len(keys):
+            self.keys.append((mapping[keys >> 32] << 32) | (keys & 0xFFFFFFFF))
+        if result['anomalies'] is not None:
+            codes, days, kinds = result['anomalies']
+            self.anomalies.append((mapping[codes], days, kinds))
+        stats = result['stats']
+        self.messages += stats['messages']
+        self.records += stats['records']
+        self.skipped += stats['skipped']
+        self.errors.extend(stats['errors'])
+
+    def build(self):
+        """
+        计算每只股票的统计，返回 (汇总, 按股票的报告列表)
+        缺失交易日 = 全市场交易日中落在该股票首末交易日之间、该股票没有数据的天数
+        """
+        keys = np.unique(np.concatenate(self.keys)) if self.keys else np.empty(0, np.int64)
+        symbols = keys >> 32
+        days = (keys & 0xFFFFFFFF).astype(np.int32)
+        market_days = np.unique(days)
+        codes = [None] * len(self.code_ids)
+        for code, index in self.code_ids.items():
+            codes[index] = code
+
+        report = {}
+        present = np.flatnonzero(np.bincount(symbols, minlength=len(codes)))
+        starts = np.searchsorted(symbols, present, 'left')
+        ends = np.searchsorted(symbols, present, 'right')
+        first_days, last_days = days[starts], days[ends - 1]
+        expected = np.searchsorted(market_days, last_days, 'right') - np.searchsorted(market_days, first_days, 'left')
+        for symbol, start, end, first, last, total in zip(present, starts, ends, first_days, last_days, expected):
+            entry = report[symbol] = self.entry(codes[symbol])
+            entry.update(days=int(end - start), first=day_text(first), last=day_text(last),
+                         missing=int(total - (end - start)))
+            if entry['missing']:
+                span = market_days[(market_days >= first) & (market_days <= last)]
+                missing_days = np.setdiff1d(span, days[start:end], assume_unique=True)
+                entry['samples']['missing'] = [day_text(day) for day in missing_days[:MAX_SAMPLES]]
+
+        if self.anomalies:
+            anomaly_codes, anomaly_days, kinds = (np.concatenate(arrays) for arrays in zip(*self.anomalies))
+            order = np.lexsort((anomaly_days, anomaly_codes))
+            for symbol, day, kind in zip(anomaly_codes[order], anomaly_days[order], kinds[order]):
+                entry = report.get(symbol)
+                if entry is None:
+                    entry = report[symbol] = self.entry(codes[symbol])
+                for bit, name, _ in KINDS:
+                    if kind & bit:
+                        entry[name] += 1
+                        samples = entry['samples'].setdefault(name, [])
+                        if len(samples) < MAX_SAMPLES and day != INVALID_DAY:
+                            samples.append(day_text(day))
+
+        entries = sorted(report.values(), key=lambda e: (-sum(e[name] for _, name, _ in KINDS), -e['missing'],
+                                                         e['stock_code'] or ''))
+        summary = {
+            'messages': self.messages,
+            'records': self.records,
+            'unique_rows': len(keys),
+            'symbols': len(present),
+            'trading_days': len(market_days),
+            'first_day': day_text(market_days[0]) if len(market_days) else None,
+            'last_day': day_text(market_days[-1]) if len(market_days) else None,
+            'skipped': self.skipped,
+            'errors': len(self.errors),
+        }
+        for _, name, _ in KINDS:
+            summary[name] = sum(e[name] for e in entries)
+        summary['missing'] = sum(e['missing'] for e in entries)
+        summary['symbols_with_anomalies'] = sum(1 for e in entries if any(e[name] for _, name, _ in KINDS))
+        summary['symbols_with_missing'] = sum(1 for e in entries if e['missing'])
+        return summary, entries
+
+    @staticmethod
+    def entry(stock_code):
+        entry = {'stock_code': stock_code, 'days': 0, 'first': None, 'last': None, 'missing': 0, 'samples': {}}
+        for _, name, _ in KINDS:
+            entry[name] = 0
+        return entry
+
+
+def run_batch(paths, workers=0, progress=True):
+    """
+    并行检查，返回 (汇总, 按股票的报告列表, 错误列表)
+    :param workers: 工作进程数（0表示CPU核数，1表示在当前进程中执行）
+    """
+    units = plan_units(paths)
+    report = BatchReport()
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    def finished(done, result):
+        report.add(result)
+        if progress:
+            print(f"[{datetime.now()}] 进度 {done}/{len(units)} | 消息 {report.messages} | "
+                  f"记录 {report.records} | {time.perf_counter() - started:.1f} 秒", flush=True)
+
+    if workers == 1 or len(units) <= 1:
+        for done, unit in enumerate(units, 1):
+            finished(done, scan_unit(*unit))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(units))) as executor:
+            futures = [executor.submit(scan_unit, *unit) for unit in units]
+            for done, future in enumerate(as_completed(futures), 1):
+                finished(done, future.result())
+    summary, entries = report.build()
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    summary['units'] = len(units)
+    return summary, entries, report.errors
+
+
+def fit(text, width, left=False):
+    """按显示宽度对齐（中文字符占两列）"""
+    pad = ' ' * max(0, width - len(text) - sum(1 for c in text if ord(c) > 0x2E80))
+    return text + pad if left else pad + text
+
+
+def print_report(summary, entries, errors, top=50):
+    """打印紧凑的按股票异常报告"""
+    print("=" * 70)
+    print(f"消息 {summary['messages']} 条 | 记录 {summary['records']} 条 | 去重后 {summary['unique_rows']} 条 | "
+          f"股票 {summary['symbols']} 只")
+    print(f"交易日 {summary['trading_days']} 个（{summary['first_day']} ~ {summary['last_day']}）| "
+          f"跳过 {summary['skipped']} 条消息 | 解析失败 {summary['errors']} | "
+          f"工作单元 {summary['units']} | 耗时 {summary['seconds']:.1f} 秒")
+    print(f"跨消息重推: {summary['records'] - summary['duplicate'] - summary['bad_key'] - summary['unique_rows']} 条")
+    print("异常合计: " + " | ".join(f"{label} {summary[name]}" for _, name, label in KINDS)
+          + f" | 缺失交易日 {summary['missing']}")
+    print(f"有数据异常的股票 {summary['symbols_with_anomalies']} 只，有缺失交易日的股票 {summary['symbols_with_missing']} 只")
+    print("=" * 70)
+
+    shown = [e for e in entries if e['missing'] or any(e[name] for _, name, _ in KINDS)][:top]
+    if shown:
+        print(fit('股票代码', 10, True) + fit('天数', 6) + '  ' + fit('区间', 23, True)
+              + "".join(fit(label, 8) for _, _, label in KINDS) + fit('缺失', 8) + '  示例')
+    for e in shown:
+        span = f"{e['first']}~{e['last']}" if e['first'] else '-'
+        samples = "; ".join(f"{name} {','.join(dates)}" for name, dates in e['samples'].items() if dates)
+        print(f"{e['stock_code'] or '(空)':<10}{e['days']:>6}  {span:<23}"
+              + "".join(f"{e[name]:>8}" for _, name, _ in KINDS) + f"{e['missing']:>8}  {samples}")
+    remaining = sum(1 for e in entries if e['missing'] or any(e[name] for _, name, _ in KINDS)) - len(shown)
+    if remaining > 0:
+        print(f"... 另有 {remaining} 只股票有异常（--top 调整显示数量，--output 输出完整报告）")
+    for error in errors[:10]:
+        print(f"✗ {error}")
+    if len(errors) > 10:
+        print(f"✗ ... 另有 {len(errors) - 10} 个解析失败")
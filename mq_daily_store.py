@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日线数据存储
+由 daily_data_queue 消息驱动，按 市场/月份 分区保存为列式文件:
+    <目录>/market=<market_code>/<yyyy-mm>/<字段>.npy    每列一个文件，行按 (stock_code, trade_date) 排序
+    <目录>/symbols.json                           股票代码 -> market_code
+DailyDataAutoSync每次同步都会重推重叠的历史数据，写入时按 (stock_code, trade_date) 去重合并，
+同一键以最新推送为准；合并结果与已有分区完全相同时不重写文件。
+读取时用mmap打开列文件，按股票读取只需二分查找代码列并复制该股票的行。
+advance_count/decline_count 在C#端为0时输出null，存储为数值列加有效标志列，读取时返回掩码数组。
+"""
+
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+
+from mq_records import field_values
+
+SYMBOLS_FILE = 'symbols.json'
+
+# (字段, 类型)，与C# DailyDataRecord一致（decimal保存为float64）
+DAILY_COLUMNS = [
+    ('stock_code', 'U12'),
+    ('market_code', '<u2'),
+    ('trade_date', 'datetime64[D]'),
+    ('trade_datetime', 'datetime64[s]'),
+    ('time_stamp', '<i4'),
+    ('open_price', '<f8'),
+    ('high_price', '<f8'),
+    ('low_price', '<f8'),
+    ('close_price', '<f8'),
+    ('volume', '<f8'),
+    ('amount', '<f8'),
+    ('advance_count', '<u2'),
+    ('decline_count', '<u2'),
+]
+
+# 可为null的字段，另存 <字段>_valid 标志列
+NULLABLE_COLUMNS = ('advance_count', 'decline_count')
+
+STORED_COLUMNS = [name for name, _ in DAILY_COLUMNS] + [f'{name}_valid' for name in NULLABLE_COLUMNS]
+
+
+def records_to_columns(records):
+    """把JSON解码得到的日线记录列表整理为 {字段: 数组}，null记为0并在有效标志列中标为False"""
+    columns = {}
+    for name, dtype in DAILY_COLUMNS:
+        values = field_values(records, name)
+        if name in NULLABLE_COLUMNS:
+            valid = np.array([v is not None for v in values], dtype=bool)
+            columns[name] = np.array([v or 0 for v in values], dtype=dtype)
+            columns[f'{name}_valid'] = valid
+        elif name == 'trade_datetime':
+            columns[name] = np.array([(v or '').replace(' ', 'T') or 'NaT' for v in values], dtype=dtype)
+        elif name == 'trade_date':
+            columns[name] = np.array([v or 'NaT' for v in values], dtype=dtype)
+        elif name == 'stock_code':
+            columns[name] = np.array([v or '' for v in values], dtype=dtype)  # None不能记为字符串'None'
+        else:
+            columns[name] = np.array(values, dtype=dtype)
+    return columns
+
+
+def take(columns, index):
+    """按行号（或布尔掩码）取出所有列"""
+    return {name: column[index] for name, column in columns.items()}
+
+
+def concat(parts):
+    """按列拼接多组数据"""
+    return {name: np.concatenate([part[name] for part in parts]) for name in STORED_COLUMNS}
+
+
+def merge_upsert(existing, incoming):
+    """
+    按 (stock_code, trade_date) 合并，同一键保留incoming中最后一条
+    返回 (合并结果, 新增行数)；结果按 (stock_code, trade_date) 排序
+    """
+    merged = concat([existing, incoming]) if existing is not None else incoming
+    # 行的先后顺序作为最低优先级排序键，同一键的最后一行就是最新推送
+    order = np.lexsort((np.arange(len(merged['stock_code'])), merged['trade_date'], merged['stock_code']))
+    codes = merged['stock_code'][order]
+    dates = merged['trade_date'][order]
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = (codes[1:] != codes[:-1]) | (dates[1:] != dates[:-1])
+    result = take(merged, order[last])
+    existing_rows = len(existing['stock_code']) if existing is not None else 0
+    return result, len(result['stock_code']) - existing_rows
+
+
+def same_columns(a, b):
+    """两组列数据是否完全相同"""
+    return all(np.array_equal(a[name], b[name]) for name in STORED_COLUMNS)
+
+
+class DailyBarStore:
+    def __init__(self, directory):
+        """
+        :param directory: 存储根目录
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.symbols = {}  # 股票代码 -> market_code
+        symbols_path = os.path.join(directory, SYMBOLS_FILE)
+        if os.path.exists(symbols_path):
+            with open(symbols_path, 'r', encoding='utf-8') as f:
+                self.symbols = json.load(f)
+        self.batches = 0
+        self.inserted = 0
+        self.updated = 0
+        self.partitions_written = 0
+        self.partitions_unchanged = 0
+        self.invalid = 0    # 缺少股票代码或交易日期而丢弃的记录数
+
+    def on_message(self, queue_name, data):
+        """接收器的处理函数：写入一条 daily_data_queue 消息"""
+        if not isinstance(data, dict):
+            return
+        records = data.get('records')
+        if hasattr(records, 'chunks'):
+            # 流式解析的大消息：逐块转换为列，内存中只保留列数据，不保留全部dict
+            parts = [records_to_columns(chunk) for chunk in records.chunks()]
+            if parts:
+                self.upsert(concat(parts))
+        elif records:
+            self.upsert(records_to_columns(records))
+
+    def partition_path(self, market_code, month):
+        """分区目录，month为 'yyyy-mm'"""
+        return os.path.join(self.directory, f'market={market_code}', month)
+
+    def partitions(self, market_code=None, month=None):
+        """列出已有分区 (market_code, month)，可按市场或月份过滤"""
+        result = []
+        for entry in sorted(os.listdir(self.directory)):
+            if not entry.startswith('market='):
+                continue
+            market = int(entry[len('market='):])
+            if market_code is not None and market != market_code:
+                continue
+            for name in sorted(os.listdir(os.path.join(self.directory, entry))):
+                if '.' not in name and (month is None or name == month):
+                    result.append((market, name))
+        return result
+
+    def load_partition(self, market_code, month, mmap_mode='r'):
+        """打开一个分区的所有列（默认mmap只读），不存在返回None"""
+        path = self.partition_path(market_code, month)
+        if not os.path.isdir(path):
+            return None
+        return {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode) for name in STORED_COLUMNS}
+
+    def save_partition(self, market_code, month, columns):
+        """
+        写入一个分区：先写到临时目录再换名，读者不会看到写了一半的列
+        已经mmap打开旧文件的读者不受影响（文件删除后映射仍然有效）
+        """
+        path = self.partition_path(market_code, month)
+        temp_path, old_path = path + '.tmp', path + '.old'
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        for name in STORED_COLUMNS:
+            np.save(os.path.join(temp_path, f'{name}.npy'), columns[name])
+        if os.path.isdir(path):
+            shutil.rmtree(old_path, ignore_errors=True)
+            os.rename(path, old_path)
+            os.rename(temp_path, path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            os.rename(temp_path, path)
+
+    def upsert(self, columns):
+        """
+        写入一批日线（{字段: 数组}，来自records_to_columns）
+        按 市场/月份 拆分后逐个分区合并，返回新增行数；缺少股票代码或交易日期的记录丢弃并计入invalid
+        """
+        # 交易日期为NaT时月份序号是INT64_MIN，按位或进分区键会破坏高32位的市场代码，须先去掉
+        valid = ~np.isnat(columns['trade_date']) & (columns['stock_code'] != '')
+        if not valid.all():
+            self.invalid += int((~valid).sum())
+            columns = take(columns, valid)
+        count = len(columns['stock_code'])
+        if count == 0:
+            return 0
+        # 分区键编码为整数（市场代码在高32位，月份序号在低32位），避免对结构化数组排序
+        months = columns['trade_date'].astype('datetime64[M]').astype('<i8')
+        keys = (columns['market_code'].astype('<i8') << 32) | months
+        partition_keys, partition_index = np.unique(keys, return_inverse=True)
+
+        inserted = 0
+        for i, key in enumerate(partition_keys.tolist()):
+            market_code, month = key >> 32, str(np.datetime64(key & 0xFFFFFFFF, 'M'))
+            incoming = take(columns, partition_index == i)
+            # 合并时整个读入内存，不持有映射，替换分区目录不受影响（Windows上不能删除已映射的文件）
+            existing = self.load_partition(market_code, month, mmap_mode=None)
+            merged, added = merge_upsert(existing, incoming)
+            if existing is not None and added == 0 and same_columns(existing, merged):
+                self.partitions_unchanged += 1
+                continue
+            self.save_partition(market_code, month, merged)
+            self.partitions_written += 1
+            inserted += added
+
+        # 记录新出现的股票所在市场，按股票读取时只需打开该市场的分区
+        symbols = dict(zip(columns['stock_code'].tolist(), columns['market_code'].tolist()))
+        new_symbols = {code: market for code, market in symbols.items() if code not in self.symbols}
+        if new_symbols:
+            self.symbols.update(new_symbols)
+            symbols_path = os.path.join(self.directory, SYMBOLS_FILE)
+            with open(symbols_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(self.symbols, f, ensure_ascii=False)
+            os.replace(symbols_path + '.tmp', symbols_path)
+
+        self.batches += 1
+        self.inserted += inserted
+        self.updated += count - inserted
+        return inserted
+
+    def read_symbol(self, stock_code, start=None, end=None):
+        """
+        读取一只股票的日线历史（按日期排序），只打开该股票所在市场、日期范围内的分区
+        start/end 为 'yyyy-mm-dd'（含两端）
+        """
+        market_code = self.symbols.get(stock_code)
+        if market_code is None:
+            return None
+        start_month = start[:7] if start else None
+        end_month = end[:7] if end else None
+        parts = []
+        for market, month in self.partitions(market_code):
+            if (start_month and month < start_month) or (end_month and month > end_month):
+                continue
+            data = self.load_partition(market, month)
+            # 分区按股票代码排序，二分查找该股票的行
+            lo = np.searchsorted(data['stock_code'], stock_code, side='left')
+            hi = np.searchsorted(data['stock_code'], stock_code, side='right')
+            if hi > lo:
+                parts.append(take(data, slice(lo, hi)))
+        if not parts:
+            return None
+        result = concat(parts)
+        if start or end:
+            dates = result['trade_date']
+            keep = np.ones(len(dates), dtype=bool)
+            if start:
+                keep &= dates >= np.datetime64(start, 'D')
+            if end:
+                keep &= dates <= np.datetime64(end, 'D')
+            result = take(result, keep)
+        return to_output(result)
+
+    def read_date(self, trade_date, market_code=None):
+        """读取某个交易日全市场（或指定市场）的日线，只打开该月的分区"""
+        day = np.datetime64(trade_date, 'D')
+        parts = []
+        for market, month in self.partitions(market_code, str(day.astype('datetime64[M]'))):
+            data = self.load_partition(market, month)
+            parts.append(take(data, data['trade_date'] == day))
+        if not parts:
+            return None
+        return to_output(concat(parts))
+
+
+def to_output(columns):
+    """把存储格式转换为读取结果：可为null的字段合并为掩码数组"""
+    result = {name: columns[name] for name, _ in DAILY_COLUMNS}
+    for name in NULLABLE_COLUMNS:
+        result[name] = np.ma.MaskedArray(columns[name], mask=~columns[f'{name}_valid'])
+    return result
+
+
+def print_rows(result, limit):
+    """打印读取结果的前limit行"""
+    count = len(result['stock_code'])
+    print(f"共 {count} 条记录")
+    for i in range(min(count, limit)):
+        advance = result['advance_count'][i]
+        decline = result['decline_count'][i]
+        print(f"  {result['stock_code'][i]} | {result['trade_date'][i]} | "
+              f"开 {result['open_price'][i]:.2f} 高 {result['high_price'][i]:.2f} "
+              f"低 {result['low_price'][i]:.2f} 收 {result['close_price'][i]:.2f} | "
+              f"量 {result['volume'][i]:.0f} | "
+              f"涨跌家数 {'null' if advance is np.ma.masked else advance}/"
+              f"{'null' if decline is np.ma.masked else decline}")
+    if count > limit:
+        print(f"  ... 省略 {count - limit} 条")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="日线数据存储查询工具")
+    parser.add_argument('directory', help="存储根目录")
+    parser.add_argument('--symbol', help="查询一只股票的历史，如 SH600000")
+    parser.add_argument('--date', help="查询某个交易日全市场数据 'yyyy-mm-dd'")
+    parser.add_argument('--start', help="与--symbol一起使用的开始日期")
+    parser.add_argument('--end', help="与--symbol一起使用的结束日期")
+    parser.add_argument('--limit', type=int, default=20, help="最多显示的行数（默认20）")
+    args = parser.parse_args()
+
+    store = DailyBarStore(args.directory)
+    started = datetime.now()
+    if args.symbol:
+        result = store.read_symbol(args.symbol, args.start, args.end)
+    elif args.date:
+        result = store.read_date(args.date)
+    else:
+        partitions = store.partitions()
+        print(f"股票数: {len(store.symbols)} | 分区数: {len(partitions)}")
+        for market, month in partitions:
+            print(f"  market={market} {month}")
+        raise SystemExit(0)
+
+    if result is None:
+        print("没有数据")
+    else:
+        print_rows(result, args.limit)
+        print(f"耗时: {(datetime.now() - started).total_seconds() * 1000:.1f} ms")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线解码
+读线程只负责分帧，把消息体交给线程池或进程池解码（json.loads / 列式解码），
+每个队列一个分发线程，按该队列的到达顺序把解码结果交给处理函数。
+在途消息数有上限，达到上限时读线程阻塞，压力通过TCP窗口传回发送端。
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from mq_codec import decode_payload
+
+POOL_KINDS = ('thread', 'process')
+
+
+def decode_timed(codec, body, flags=0):
+    """解码（压缩帧先解压）并返回 (结果, 解码耗时纳秒)，在工作线程/进程中执行"""
+    start = time.perf_counter_ns()
+    data = decode_payload(codec, body, flags)
+    return data, time.perf_counter_ns() - start
+
+
+class DecodePipeline:
+    def __init__(self, handler, error_handler, workers=4, kind='process', max_in_flight=64, on_done=None):
+        """
+        :param handler: 处理函数 handler(queue_name, data, message_length, decode_ns)
+        :param error_handler: 解码失败时调用 error_handler(queue_name, body, exception)
+        :param workers: 解码工作线程/进程数
+        :param kind: 'thread' 线程池，'process' 进程池
+        :param max_in_flight: 已提交但尚未交给处理函数的最大消息数
+        :param on_done: 带队列序号的消息处理完（或解码失败）后调用 on_done(queue_name, queue_seq)，用于续传提交
+        """
+        if kind not in POOL_KINDS:
+            raise ValueError(f"未知的解码池类型: {kind}")
+        self.handler = handler
+        self.error_handler = error_handler
+        self.on_done = on_done
+        self.kind = kind
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        if kind == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mq-decode')
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.handler_lock = threading.Lock()  # 处理函数不要求线程安全，串行调用
+        self.queues = {}  # 队列名称 -> 分发队列（按到达顺序存放future）
+        self.dispatchers = []
+        self.lock = threading.Lock()
+
+    def submit(self, queue_name, body, message_length, codec, flags=0, queue_seq=None):
+        """
+        提交一条消息解码（在读线程中调用）
+        body会被复制为bytes，调用返回后原缓冲区可以复用；在途消息达到上限时阻塞
+        :param queue_seq: 续传的队列序号，处理完后交给on_done
+        """
+        self.slots.acquire()
+        body = bytes(body)
+        future = self.executor.submit(decode_timed, codec, body, flags)
+        self.dispatch_queue(queue_name).put((future, body, message_length, queue_seq))
+
+    def dispatch_queue(self, queue_name):
+        """获取队列对应的分发队列，第一次出现的队列启动一个分发线程"""
+        pending = self.queues.get(queue_name)
+        if pending is None:
+            with self.lock:
+                pending = self.queues.get(queue_name)
+                if pending is None:
+                    pending = queue.Queue()
+                    thread = threading.Thread(target=self.dispatch, args=(queue_name, pending),
+                                              name=f'mq-dispatch-{queue_name}', daemon=True)
+                    self.queues[queue_name] = pending
+                    self.dispatchers.append(thread)
+                    thread.start()
+        return pending
+
+    def dispatch(self, queue_name, pending):
+        """分发线程：按到达顺序等待解码结果并调用处理函数"""
+        while True:
+            item = pending.get()
+            if item is None:
+                break
+            future, body, message_length, queue_seq = item
+            try:
+                try:
+                    data, decode_ns = future.result()
+                except Exception as e:
+                    with self.handler_lock:
+                        self.error_handler(queue_name, body, e)
+                    continue
+                with self.handler_lock:
+                    self.handler(queue_name, data, message_length, decode_ns)
+            finally:
+                self.slots.release()
+                if queue_seq is not None and self.on_done is not None:
+                    self.on_done(queue_name, queue_seq)
+
+    def close(self):
+        """等待在途消息处理完并关闭解码池"""
+        with self.lock:
+            for pending in self.queues.values():
+                pending.put(None)
+            dispatchers = list(self.dispatchers)
+        for thread in dispatchers:
+            thread.join()
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式JSON记录解析
+C#发送端的消息体是 {"records":[{...},{...},...]}，全量日线一次可达数百MB，
+json.loads 会同时生成整个字符串和所有记录的dict。这里直接从帧缓冲区（bytes/memoryview/mmap）
+按窗口增量解码UTF-8，用 json 的C扫描器逐条解析records数组中的记录，
+内存占用与窗口大小和调用方保留的记录数有关，与消息大小无关。
+只需要信封中的其他键（如queue_name）时用 read_envelope，records数组只按括号匹配跳过，不生成记录。
+"""
+
+import codecs
+import json
+import mmap
+import os
+import re
+
+DEFAULT_WINDOW_BYTES = 1024 * 1024
+DEFAULT_CHUNK_RECORDS = 10000
+DEFAULT_STREAM_THRESHOLD = 16 * 1024 * 1024  # 接收端对超过该大小的日线消息使用流式解析
+STREAM_QUEUE_TYPES = ('daily',)
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+# 跳过值时一次匹配到下一个字符串外的括号：括号以外的字符和完整的字符串（含转义）
+SKIP = re.compile(r'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*', re.DOTALL)
+DECODER = json.JSONDecoder()
+SCAN_ONCE = DECODER.scan_once
+
+
+class RecordScanner:
+    """在帧缓冲区上滑动的解码窗口"""
+
+    def __init__(self, buffer, window_bytes):
+        self.view = memoryview(buffer).cast('B')
+        self.window_bytes = window_bytes
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.offset = 0   # 已解码的字节数
+        self.text = ''
+        self.index = 0    # 当前解析位置（text内）
+
+    @property
+    def exhausted(self):
+        return self.offset >= len(self.view)
+
+    def more(self):
+        """再解码一段字节追加到窗口，丢弃已解析部分；没有更多数据返回False"""
+        if self.exhausted:
+            return False
+        # 单条记录超过窗口时按剩余文本长度倍增，避免反复重试
+        size = max(self.window_bytes, len(self.text) - self.index)
+        chunk = self.view[self.offset:self.offset + size]
+        self.offset += len(chunk)
+        self.text = self.text[self.index:] + self.decoder.decode(chunk, final=self.exhausted)
+        self.index = 0
+        return True
+
+    def peek(self):
+        """跳过空白，返回下一个字符（数据结束返回''）"""
+        while True:
+            self.index = WHITESPACE.match(self.text, self.index).end()
+            if self.index < len(self.text):
+                return self.text[self.index]
+            if not self.more():
+                return ''
+
+    def expect(self, chars):
+        """读取下一个字符，必须是chars之一"""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"JSON格式错误: 字节偏移约 {self.offset} 处期望 {chars!r}，实际 {char!r}")
+        self.index += 1
+        return char
+
+    def value(self):
+        """解析下一个JSON值（窗口中不完整时扩大窗口重试）"""
+        self.peek()
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.text, self.index)
+            except json.JSONDecodeError as e:
+                if not self.more():
+                    raise ValueError(f"JSON格式错误: {e}") from None
+                continue
+            # 数字可能恰好在窗口末尾被截断
+            if end == len(self.text) and not self.exhausted:
+                self.more()
+                continue
+            self.index = end
+            return value
+
+    def skip(self):
+        """跳过下一个数组或对象（不解析其中的值，只在字符串之外匹配括号）"""
+        self.expect('[{')
+        depth = 1
+        text, index = self.text, self.index
+        while True:
+            index = SKIP.match(text, index).end()
+            # 到达窗口末尾，或字符串在窗口末尾被截断：保留未匹配部分，再解码一段
+            if index >= len(text) or text[index] == '"':
+                self.index = index
+                if not self.more():
+                    raise ValueError(f"JSON格式错误: 字节偏移约 {self.offset} 处数组或对象不完整")
+                text, index = self.text, self.index
+                continue
+            char = text[index]
+            index += 1
+            if char in '[{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    self.index = index
+                    return
+
+    def record(self):
+        """解析下一条记录：直接调用json的C扫描器，窗口末尾或有空白时退回value()"""
+        text = self.text
+        try:
+            value, end = SCAN_ONCE(text, self.index)
+        except (StopIteration, json.JSONDecodeError):
+            return self.value()
+        if end == len(text) and not self.exhausted:
+            return self.value()
+        self.index = end
+        return value
+
+
+def iter_records(buffer, window_bytes=DEFAULT_WINDOW_BYTES, envelope=None):
+    """
+    逐条生成消息体中 records 数组的记录
+    :param buffer: 消息体（bytes/bytearray/memoryview/mmap），迭代期间必须保持有效
+    :param envelope: 传入dict时收集信封中records以外的键（如queue_name、type），否则丢弃
+    """
+    scanner = RecordScanner(buffer, window_bytes)
+    scanner.expect('{')
+    if scanner.peek() == '}':
+        return
+    while True:
+        key = scanner.value()
+        scanner.expect(':')
+        if key == 'records':
+            scanner.expect('[')
+            if scanner.peek() == ']':
+                scanner.index += 1
+            else:
+                while True:
+                    yield scanner.record()
+                    # 快速路径：C#输出的记录之间没有空白
+                    text, index = scanner.text, scanner.index
+                    if index < len(text) and text[index] == ',':
+                        scanner.index = index + 1
+                    elif scanner.expect(',]') == ']':
+                        break
+        else:
+            value = scanner.value()
+            if envelope is not None:
+                envelope[key] = value
+        if scanner.expect(',}') == '}':
+            return
+
+
+def read_envelope(buffer, window_bytes=DEFAULT_WINDOW_BYTES, keys=None):
+    """
+    信封中records以外的键（如queue_name）；records数组整体跳过，不解析其中的记录
+    :param keys: 只需要其中几个键时传入，全部取得后立即返回，不再扫描后面的部分
+    """
+    scanner = RecordScanner(buffer, window_bytes)
+    envelope = {}
+    scanner.expect('{')
+    if scanner.peek() == '}':
+        return envelope
+    while True:
+        key = scanner.value()
+        scanner.expect(':')
+        if key == 'records' and scanner.peek() in '[{':
+            scanner.skip()
+        else:
+            envelope[key] = scanner.value()
+            if keys is not None and all(name in envelope for name in keys):
+                return envelope
+        if scanner.expect(',}') == '}':
+            return envelope
+
+
+def chunked(records, chunk_records):
+    """把记录迭代器按chunk_records条一组切分为列表"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_records:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_record_chunks(buffer, chunk_records=DEFAULT_CHUNK_RECORDS, window_bytes=DEFAULT_WINDOW_BYTES):
+    """按chunk_records条一组生成记录列表"""
+    return chunked(iter_records(buffer, window_bytes), chunk_records)
+
+
+class RecordStream:
+    """
+    消息体中的records数组，迭代时才逐条解析，不保留已迭代的记录
+    可以多次迭代（每次从缓冲区开头重新解析），因此可以交给多个处理函数；
+    len() 在还没有完整迭代过时会先解析一遍计数。只支持取第一条和最后一条（[0] / [-1]）
+    """
+
+    def __init__(self, buffer, window_bytes=DEFAULT_WINDOW_BYTES):
+        self.buffer = buffer
+        self.window_bytes = window_bytes
+        self.count = None
+        self.first = None
+        self.last = None
+        self.envelope = {}  # 信封中records以外的键，完整迭代后才齐全
+
+    def __iter__(self):
+        count = 0
+        record = None
+        for record in iter_records(self.buffer, self.window_bytes, self.envelope):
+            if count == 0:
+                self.first = record
+            count += 1
+            yield record
+        self.count = count
+        self.last = record
+
+    def chunks(self, chunk_records=DEFAULT_CHUNK_RECORDS):
+        """按chunk_records条一组迭代"""
+        return chunked(self, chunk_records)
+
+    def __len__(self):
+        if self.count is None:
+            for _ in self:
+                pass
+        return self.count
+
+    def __getitem__(self, index):
+        if index == 0:
+            if self.first is None:
+                for _ in self:
+                    break
+            if self.first is not None:
+                return self.first
+        elif index == -1:
+            if len(self):
+                return self.last
+        else:
+            raise IndexError("RecordStream只支持取第一条和最后一条记录")
+        raise IndexError("records为空")
+
+
+def load_json_file(path, threshold=DEFAULT_STREAM_THRESHOLD, keys=None):
+    """
+    读取JSON消息文件；不小于threshold的文件用mmap映射，records为RecordStream，按需逐条解析
+    信封中的其他键（如queue_name）用 read_envelope 取得，records只跳过不解析，记录只在迭代时解析一次
+    :param keys: 大文件只需要信封中的这几个键时传入（见read_envelope），键在records之前时不用跳过records
+    """
+    if os.path.getsize(path) < threshold:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    data = read_envelope(buffer, keys=keys)
+    data['records'] = RecordStream(buffer)
+    return data
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MQ压力测试工具
+用N个并发连接（MQTestSender）按目标速率向接收端发送四个队列的模拟数据，
+字段与C#各发送端的SerializeToJson一致。速率曲线:
+    steady  恒定速率
+    burst   基础速率，在 --burst-at 秒处放大 --burst-multiplier 倍持续 --burst-seconds 秒（模拟09:30开盘）
+    ramp    从 --ramp-start 倍线性增长到目标速率
+报告实际吞吐、ACK往返时间分位数、落后于计划的发送时间和错误数，结果可写入JSON用于对比。
+
+用法: python mq_load_gen.py 127.0.0.1 5678 --profile burst --rate 200 --duration 20 --output run.json
+"""
+
+import argparse
+import json
+import math
+import platform
+import threading
+import time
+from datetime import datetime
+
+from mq_codec import encode_realtime_columnar
+from mq_protocol import CODEC_JSON, CODEC_REALTIME_COLUMNAR
+from mq_sample_data import (make_daily_records, make_ex_rights_records, make_market_table_records,
+                            make_realtime_records, to_json_payload)
+from test_mq_send import MQTestSender
+
+PROFILES = ('steady', 'burst', 'ramp')
+
+# 队列名称 -> 每帧默认记录数
+QUEUE_RECORDS = {
+    'realtime_data_queue': 200,
+    'daily_data_queue': 1000,
+    'ex_rights_data_queue': 100,
+    'market_table_queue': 5500,
+}
+
+PAYLOAD_VARIANTS = 4  # 每个队列预先生成的不同消息体数量
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def make_payloads(queue_name, records_per_message, codec):
+    """预先生成若干个消息体，发送时循环使用，避免生成数据占用发送线程"""
+    payloads = []
+    for seed in range(PAYLOAD_VARIANTS):
+        if queue_name == 'realtime_data_queue':
+            records = make_realtime_records(records_per_message, seed=seed)
+        elif queue_name == 'daily_data_queue':
+            records = make_daily_records(records_per_message, 1, seed=seed)
+        elif queue_name == 'ex_rights_data_queue':
+            records = make_ex_rights_records(records_per_message, seed=seed)
+        else:
+            records = make_market_table_records(records_per_message, seed=seed)
+        if codec == CODEC_REALTIME_COLUMNAR and queue_name == 'realtime_data_queue':
+            payloads.append((encode_realtime_columnar(records), CODEC_REALTIME_COLUMNAR))
+        else:
+            payloads.append((to_json_payload(records), CODEC_JSON))
+    return payloads
+
+
+def rate_at(args, elapsed):
+    """速率曲线：elapsed秒时的总目标速率（帧/秒）"""
+    rate = args.rate
+    if args.profile == 'burst':
+        if args.burst_at <= elapsed < args.burst_at + args.burst_seconds:
+            rate *= args.burst_multiplier
+    elif args.profile == 'ramp':
+        rate *= args.ramp_start + (1 - args.ramp_start) * min(1.0, elapsed / args.duration)
+    return rate
+
+
+def schedule(args, start, share, queue_name, payloads):
+    """生成一个连接的发送计划 (计划时间, 队列名称, 消息体, codec)，share为该连接分担的速率比例"""
+    elapsed = 0.0
+    i = 0
+    while elapsed < args.duration:
+        body, codec = payloads[i % len(payloads)]
+        yield start + elapsed, queue_name, body, codec
+        i += 1
+        elapsed += 1.0 / (rate_at(args, elapsed) * share)
+
+
+def percentiles(values):
+    """返回 {'p50': 毫秒, ..., 'max': 毫秒}，没有数据返回None"""
+    if not values:
+        return None
+    values = sorted(values)
+    result = {}
+    for p in PERCENTILES:
+        index = min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))
+        result[f'p{p:g}'] = round(values[index] * 1000, 3)
+    result['max'] = round(values[-1] * 1000, 3)
+    return result
+
+
+def timeline(send_times, start, duration):
+    """每秒实际发送的帧数"""
+    counts = [0] * math.ceil(duration)
+    for t in send_times:
+        second = int(t - start)
+        if 0 <= second < len(counts):
+            counts[second] += 1
+    return counts
+
+
+def run_load(args):
+    """运行压力测试，返回结果dict"""
+    codec = CODEC_REALTIME_COLUMNAR if args.codec == 'columnar' else CODEC_JSON
+    queues = args.queue or list(QUEUE_RECORDS)
+    payloads = {}
+    for queue_name in set(queues[i % len(queues)] for i in range(args.connections)):
+        records = args.records or QUEUE_RECORDS[queue_name]
+        payloads[queue_name] = (records, make_payloads(queue_name, records, codec))
+
+    # 按记录数给定速率时，换算为帧速率（按各连接每帧记录数的平均值）
+    assignment = [queues[i % len(queues)] for i in range(args.connections)]
+    if args.records_per_sec:
+        average_records = sum(payloads[q][0] for q in assignment) / len(assignment)
+        args.rate = args.records_per_sec / average_records
+
+    senders = []
+    for queue_name in assignment:
+        sender = MQTestSender(args.host, args.port)
+        if not sender.connect() or (args.window > 0 and not sender.enable_pipelining(args.window, args.compress)):
+            sender.close()
+            for s in senders:
+                s.close()
+            return None
+        if args.compress and args.window == 0:
+            sender.enable_compression()
+        senders.append(sender)
+
+    started_at = datetime.now().isoformat(timespec='seconds')
+    start = time.perf_counter() + 0.2  # 给所有线程留出启动时间
+    results = [None] * len(senders)
+
+    def worker(index, queue_name, sender):
+        frames = list(schedule(args, start, 1.0 / len(senders), queue_name, payloads[queue_name][1]))
+        sent_times = []
+
+        def record(frames):
+            for frame in frames:
+                sent_times.append(frame[0])
+                yield frame
+
+        acked = sender.send_scheduled(record(frames))
+        results[index] = {
+            'queue': queue_name,
+            'planned': len(frames),
+            'sent': len(sender.send_lags),
+            'acked': acked,
+            'bytes': sum(len(frame[2]) for frame in frames[:len(sender.send_lags)]),
+            'records': len(sender.send_lags) * payloads[queue_name][0],
+            'finished': time.perf_counter(),
+            # 实际发送时间 = 计划时间 + 落后时间
+            'send_times': [t + lag for t, lag in zip(sent_times, sender.send_lags)],
+        }
+
+    threads = [threading.Thread(target=worker, args=(i, assignment[i], s), daemon=True)
+               for i, s in enumerate(senders)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for sender in senders:
+        sender.close()
+
+    elapsed = max(r['finished'] for r in results) - start
+    rtts = [rtt for s in senders for rtt in s.ack_rtts]
+    lags = [lag for s in senders for lag in s.send_lags]
+    sent = sum(r['sent'] for r in results)
+    per_queue = {}
+    for result, sender in zip(results, senders):
+        entry = per_queue.setdefault(result['queue'], {'connections': 0, 'sent': 0, 'acked': 0, 'records': 0,
+                                                       'bytes': 0, 'ack_rtts': []})
+        entry['connections'] += 1
+        for key in ('sent', 'acked', 'records', 'bytes'):
+            entry[key] += result[key]
+        entry['ack_rtts'].extend(sender.ack_rtts)
+    for entry in per_queue.values():
+        entry['ack_rtt_ms'] = percentiles(entry.pop('ack_rtts'))
+
+    return {
+        'started_at': started_at,
+        'machine': platform.node(),
+        'config': {
+            'target': f'{args.host}:{args.port}',
+            'profile': args.profile,
+            'connections': args.connections,
+            'duration': args.duration,
+            'rate': args.rate,
+            'records_per_sec': args.records_per_sec,
+            'window': args.window,
+            'codec': args.codec,
+            'compress': args.compress,
+            'burst_at': args.burst_at,
+            'burst_seconds': args.burst_seconds,
+            'burst_multiplier': args.burst_multiplier,
+            'ramp_start': args.ramp_start,
+        },
+        'elapsed': round(elapsed, 3),
+        'planned': sum(r['planned'] for r in results),
+        'sent': sent,
+        'acked': sum(r['acked'] for r in results),
+        'records': sum(r['records'] for r in results),
+        'bytes': sum(r['bytes'] for r in results),
+        'messages_per_sec': round(sent / elapsed, 1),
+        'records_per_sec': round(sum(r['records'] for r in results) / elapsed, 1),
+        'mb_per_sec': round(sum(r['bytes'] for r in results) / elapsed / 1024 / 1024, 3),
+        'ack_rtt_ms': percentiles(rtts),
+        'send_lag_ms': percentiles(lags),
+        'errors': {
+            'send_errors': sum(s.send_errors for s in senders),
+            'ack_timeouts': sum(s.ack_timeouts for s in senders),
+            'unacked': sent - sum(r['acked'] for r in results),
+        },
+        'compression': {
+            'frames': sum(s.compressed_frames for s in senders),
+            'bytes_before': sum(s.bytes_before_compression for s in senders),
+            'bytes_after': sum(s.bytes_after_compression for s in senders),
+        },
+        'per_queue': per_queue,
+        'timeline': timeline([t for r in results for t in r['send_times']], start, args.duration),
+    }
+
+
+def print_report(result):
+    """打印压力测试结果"""
+    config = result['config']
+    print()
+    print("=" * 70)
+    print(f"压力测试结果 | 曲线: {config['profile']} | 连接: {config['connections']} | "
+          f"窗口: {config['window'] or 'v1'} | 编码: {config['codec']}")
+    print("=" * 70)
+    print(f"计划/发送/确认: {result['planned']} / {result['sent']} / {result['acked']} 帧, "
+          f"耗时 {result['elapsed']:.2f} 秒")
+    print(f"吞吐: {result['messages_per_sec']:.0f} 帧/秒, {result['records_per_sec']:.0f} 条/秒, "
+          f"{result['mb_per_sec']:.2f} MB/秒")
+    for label, key in (("ACK往返(ms)", 'ack_rtt_ms'), ("发送落后(ms)", 'send_lag_ms')):
+        values = result[key]
+        if values:
+            print(f"{label}: " + ", ".join(f"{name} {value:.2f}" for name, value in values.items()))
+    compression = result.get('compression')
+    if compression and compression['frames']:
+        print(f"压缩: {compression['frames']} 帧, {compression['bytes_before']} -> {compression['bytes_after']} 字节 "
+              f"({compression['bytes_before'] / max(1, compression['bytes_after']):.1f} 倍)")
+    errors = result['errors']
+    print(f"错误: 发送失败 {errors['send_errors']} 次, ACK超时 {errors['ack_timeouts']} 次, "
+          f"未确认 {errors['unacked']} 帧")
+    print()
+    print(f"{'队列':<24}{'连接':>6}{'发送':>10}{'确认':>10}{'记录':>12}{'p99(ms)':>10}")
+    for queue_name, entry in result['per_queue'].items():
+        p99 = entry['ack_rtt_ms']['p99'] if entry['ack_rtt_ms'] else float('nan')
+        print(f"{queue_name:<24}{entry['connections']:>6}{entry['sent']:>10}{entry['acked']:>10}"
+              f"{entry['records']:>12}{p99:>10.2f}")
+    print()
+    print("每秒发送帧数: " + " ".join(str(count) for count in result['timeline']))
+    print("=" * 70)
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="MQ压力测试工具")
+    parser.add_argument('host', nargs='?', default='10.0.2.2', help="目标地址（默认10.0.2.2）")
+    parser.add_argument('port', nargs='?', type=int, default=5678, help="目标端口（默认5678）")
+    parser.add_argument('--connections', type=int, default=4, help="并发连接数（默认4，依次分配到各队列）")
+    parser.add_argument('--queue', action='append', choices=list(QUEUE_RECORDS),
+                        help="只发送指定队列，可重复指定（默认四个队列）")
+    parser.add_argument('--profile', choices=PROFILES, default='steady', help="速率曲线（默认steady）")
+    parser.add_argument('--duration', type=float, default=10, help="持续时间秒数（默认10）")
+    parser.add_argument('--rate', type=float, default=100, help="所有连接合计的目标帧速率（默认100帧/秒）")
+    parser.add_argument('--records-per-sec', type=float, default=0,
+                        help="按记录数给定目标速率（覆盖 --rate）")
+    parser.add_argument('--records', type=int, default=0,
+                        help="每帧记录数（默认按队列: 实时200, 日线1000, 除权100, 码表5500）")
+    parser.add_argument('--codec', choices=['json', 'columnar'], default='json',
+                        help="实时行情的消息体编码（其他队列总是JSON）")
+    parser.add_argument('--window', type=int, default=0,
+                        help="v2流水线确认窗口（0表示v1逐帧ACK，与C#发送端相同）")
+    parser.add_argument('--compress', action='store_true', help="握手请求zlib压缩（接收端支持时压缩大帧）")
+    parser.add_argument('--burst-at', type=float, default=3, help="burst: 开始放大的秒数（默认3）")
+    parser.add_argument('--burst-seconds', type=float, default=2, help="burst: 持续秒数（默认2）")
+    parser.add_argument('--burst-multiplier', type=float, default=10, help="burst: 速率倍数（默认10）")
+    parser.add_argument('--ramp-start', type=float, default=0.1, help="ramp: 起始速率倍数（默认0.1）")
+    parser.add_argument('--output', help="把结果写入JSON文件")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    print("=" * 70)
+    print("MQ压力测试工具")
+    print(f"目标: {args.host}:{args.port} | 曲线: {args.profile} | 持续: {args.duration} 秒")
+    print("=" * 70)
+
+    result = run_load(args)
+    if result is None:
+        print("连接失败，请确认接收器已启动")
+        return
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.output}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n测试已取消")
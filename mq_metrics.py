@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+接收端指标
+每个队列记录三个HDR风格的直方图（对数分段+线性子桶，相对误差不超过约6%）:
+    源头延迟   接收时间 - 发送端打的时间戳（实时行情用time_stamp，码表用update_time）
+    帧大小     字节
+    解码耗时   json.loads / 列式解码
+以及帧数、记录数、字节数的累计值和1秒/10秒/60秒滑动窗口速率。
+启用优先级调度（mq_scheduler.py）时还输出各调度队列的深度、等待时间、丢弃数和阻塞次数。
+
+热路径不加锁：每个线程写自己的分片（threading.local），/metrics 请求时才合并各分片，
+读到的可能是正在更新中的计数，误差最多为一帧。
+通过本地HTTP端口以Prometheus文本格式输出 /metrics。
+"""
+
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mq_protocol import get_queue_type
+
+SUB_BUCKET_BITS = 4         # 每个2的幂区间分为16个子桶
+MAX_VALUE_BITS = 40         # 最大可记录值约1.1e12（微秒约12天，字节约1TB）
+RATE_SLOTS = 64             # 滑动窗口按秒分槽，覆盖最长60秒的窗口
+RATE_WINDOWS = (1, 10, 60)
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+BUCKET_COUNT = (MAX_VALUE_BITS - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+
+# (指标名, 说明, 换算到输出单位的系数)
+HISTOGRAMS = [
+    ('source_latency_seconds', '发送端时间戳到接收的延迟', 1e-6),
+    ('frame_size_bytes', '帧大小', 1),
+    ('decode_seconds', '消息体解码耗时', 1e-6),
+]
+
+
+def bucket_index(value):
+    """值 -> 桶序号：小于16的值每个值一个桶，之后每个2的幂区间16个桶"""
+    if value < SUB_BUCKETS:
+        return max(0, value)
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    if shift >= MAX_VALUE_BITS - SUB_BUCKET_BITS:
+        return BUCKET_COUNT - 1
+    return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_upper(index):
+    """桶序号 -> 该桶内的最大值"""
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return ((index % SUB_BUCKETS + SUB_BUCKETS + 1) << shift) - 1
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def record(self, value):
+        """记录一个非负整数值（只由所属线程调用）"""
+        value = int(value)
+        if value < 0:
+            value = 0
+        self.counts[bucket_index(value)] += 1
+        self.total += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """把另一个直方图加到本直方图"""
+        counts = self.counts
+        for i, count in enumerate(other.counts):
+            if count:
+                counts[i] += count
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """分位数（返回所在桶的上界，不超过最大值）"""
+        if not self.total:
+            return 0
+        target = q * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(bucket_upper(i), self.max)
+        return self.max
+
+
+class QueueStats:
+    """一个线程内一个队列的统计（只由所属线程写入）"""
+
+    def __init__(self):
+        self.frames = 0
+        self.records = 0
+        self.bytes = 0
+        self.errors = 0
+        self.histograms = {name: Histogram() for name, _, _ in HISTOGRAMS}
+        # 按秒分槽的滑动窗口: 槽 -> (秒, 帧数, 记录数, 字节数)
+        self.slot_second = [0] * RATE_SLOTS
+        self.slot_frames = [0] * RATE_SLOTS
+        self.slot_records = [0] * RATE_SLOTS
+        self.slot_bytes = [0] * RATE_SLOTS
+
+    def add_rate(self, now, records, size):
+        """累加到当前秒的槽"""
+        second = int(now)
+        slot = second % RATE_SLOTS
+        if self.slot_second[slot] != second:
+            self.slot_frames[slot] = self.slot_records[slot] = self.slot_bytes[slot] = 0
+            self.slot_second[slot] = second
+        self.slot_frames[slot] += 1
+        self.slot_records[slot] += records
+        self.slot_bytes[slot] += size
+
+
+def source_time(queue_name, data):
+    """取消息中最新的发送端时间戳（秒），没有可用的时间戳返回None"""
+    queue_type = get_queue_type(queue_name)
+    if not isinstance(data, dict):
+        return None
+    if queue_type == 'realtime':
+        # time_stamp 是行情源的成交时间（Unix秒）
+        if 'columns' in data:
+            stamps = data['columns']['time_stamp']
+            return float(stamps.max()) if len(stamps) else None
+        records = data.get('records')
+        if records:
+            return max(r.get('time_stamp') or 0 for r in records) or None
+    elif queue_type == 'market_table':
+        # update_time 是发送端生成码表时的本地时间
+        records = data.get('records')
+        if records and records[-1].get('update_time'):
+            return datetime.strptime(records[-1]['update_time'], '%Y-%m-%d %H:%M:%S').timestamp()
+    return None
+
+
+def record_count(data):
+    """消息中的记录数"""
+    if isinstance(data, dict):
+        if 'records' in data:
+            return len(data['records'])
+        if 'columns' in data:
+            return data['count']
+    elif isinstance(data, list):
+        return len(data)
+    return 0
+
+
+class ReceiverMetrics:
+    def __init__(self):
+        self.local = threading.local()
+        self.shards = []  # 每个线程一个 {队列名称: QueueStats}
+        self.shards_lock = threading.Lock()  # 只在线程第一次记录时使用
+        self.started = time.time()
+        self.server = None
+        self.scheduler = None  # 启用优先级调度时输出各调度队列的深度、等待时间和丢弃数
+
+    def shard(self):
+        """当前线程的分片"""
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = {}
+            with self.shards_lock:
+                self.shards.append(shard)
+        return shard
+
+    def queue_stats(self, queue_name):
+        """当前线程中某个队列的统计"""
+        shard = self.shard()
+        stats = shard.get(queue_name)
+        if stats is None:
+            stats = shard[queue_name] = QueueStats()
+        return stats
+
+    def record_message(self, queue_name, data, size, decode_ns=None):
+        """记录一条解码成功的消息（热路径，不加锁）"""
+        now = time.time()
+        stats = self.queue_stats(queue_name)
+        records = record_count(data)
+        stats.frames += 1
+        stats.records += records
+        stats.bytes += size
+        stats.add_rate(now, records, size)
+        stats.histograms['frame_size_bytes'].record(size)
+        if decode_ns is not None:
+            stats.histograms['decode_seconds'].record(decode_ns // 1000)
+        stamp = source_time(queue_name, data)
+        if stamp:
+            stats.histograms['source_latency_seconds'].record((now - stamp) * 1e6)
+
+    def record_error(self, queue_name):
+        """记录一次解码失败"""
+        self.queue_stats(queue_name).errors += 1
+
+    def merged(self):
+        """合并所有线程的分片，返回 {队列名称: QueueStats}"""
+        with self.shards_lock:
+            shards = list(self.shards)
+        result = {}
+        for shard in shards:
+            for queue_name, stats in list(shard.items()):
+                total = result.get(queue_name)
+                if total is None:
+                    total = result[queue_name] = QueueStats()
+                total.frames += stats.frames
+                total.records += stats.records
+                total.bytes += stats.bytes
+                total.errors += stats.errors
+                for name, histogram in stats.histograms.items():
+                    total.histograms[name].merge(histogram)
+                total.slot_second.extend(stats.slot_second)
+                total.slot_frames.extend(stats.slot_frames)
+                total.slot_records.extend(stats.slot_records)
+                total.slot_bytes.extend(stats.slot_bytes)
+        return result
+
+    def render(self):
+        """生成Prometheus文本格式"""
+        now = time.time()
+        current = int(now)
+        queues = self.merged()
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP mq_{name} {help_text}')
+            lines.append(f'# TYPE mq_{name} {kind}')
+
+        for name, kind, help_text, attribute in [
+            ('frames_total', 'counter', '接收的帧数', 'frames'),
+            ('records_total', 'counter', '接收的记录数', 'records'),
+            ('bytes_total', 'counter', '接收的字节数', 'bytes'),
+            ('decode_errors_total', 'counter', '解码失败的帧数', 'errors'),
+        ]:
+            family(name, kind, help_text)
+            for queue_name, stats in queues.items():
+                lines.append(f'mq_{name}{{queue="{queue_name}"}} {getattr(stats, attribute)}')
+
+        # 滑动窗口速率：当前秒还没结束，窗口取已经结束的完整秒
+        for name, help_text, attribute in [
+            ('frames_per_second', '滑动窗口内的平均帧速率', 'slot_frames'),
+            ('records_per_second', '滑动窗口内的平均记录速率', 'slot_records'),
+            ('bytes_per_second', '滑动窗口内的平均字节速率', 'slot_bytes'),
+        ]:
+            family(name, 'gauge', help_text)
+            for queue_name, stats in queues.items():
+                values = getattr(stats, attribute)
+                for window in RATE_WINDOWS:
+                    total = sum(value for second, value in zip(stats.slot_second, values)
+                                if current - window <= second < current)
+                    lines.append(f'mq_{name}{{queue="{queue_name}",window="{window}s"}} {total / window:g}')
+
+        for name, help_text, scale in HISTOGRAMS:
+            family(name, 'summary', help_text)
+            for queue_name, stats in queues.items():
+                histogram = stats.histograms[name]
+                if not histogram.total:
+                    continue
+                for q in QUANTILES:
+                    lines.append(f'mq_{name}{{queue="{queue_name}",quantile="{q:g}"}} '
+                                 f'{histogram.quantile(q) * scale:g}')
+                lines.append(f'mq_{name}_sum{{queue="{queue_name}"}} {histogram.sum * scale:g}')
+                lines.append(f'mq_{name}_count{{queue="{queue_name}"}} {histogram.total}')
+            family(f'{name}_max', 'gauge', f'{help_text}（最大值）')
+            for queue_name, stats in queues.items():
+                histogram = stats.histograms[name]
+                if histogram.total:
+                    lines.append(f'mq_{name}_max{{queue="{queue_name}"}} {histogram.max * scale:g}')
+
+        if self.scheduler is not None:
+            lanes = self.scheduler.stats()
+            for name, kind, help_text, key in [
+                ('scheduler_queue_depth', 'gauge', '调度队列当前深度（帧）', 'depth'),
+                ('scheduler_queue_max_depth', 'gauge', '调度队列最大深度（帧）', 'max_depth'),
+                ('scheduler_enqueued_total', 'counter', '进入调度队列的帧数', 'enqueued'),
+                ('scheduler_dropped_total', 'counter', '调度队列满时丢弃的帧数', 'dropped'),
+                ('scheduler_blocked_total', 'counter', '调度队列满时读线程阻塞的次数', 'blocked'),
+            ]:
+                family(name, kind, help_text)
+                for lane in lanes:
+                    lines.append(f'mq_{name}{{lane="{lane["name"]}"}} {lane[key]}')
+            family('scheduler_wait_seconds', 'summary', '帧在调度队列中的等待时间')
+            for lane in lanes:
+                histogram = lane['wait']
+                if not histogram.total:
+                    continue
+                for q in QUANTILES:
+                    lines.append(f'mq_scheduler_wait_seconds{{lane="{lane["name"]}",quantile="{q:g}"}} '
+                                 f'{histogram.quantile(q) * 1e-6:g}')
+                lines.append(f'mq_scheduler_wait_seconds_sum{{lane="{lane["name"]}"}} {histogram.sum * 1e-6:g}')
+                lines.append(f'mq_scheduler_wait_seconds_count{{lane="{lane["name"]}"}} {histogram.total}')
+
+        family('uptime_seconds', 'gauge', '接收器运行时间')
+        lines.append(f'mq_uptime_seconds {now - self.started:.0f}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        """在后台线程中启动 /metrics HTTP服务，返回实际监听的端口"""
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 不打印每次抓取
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='mq-metrics', daemon=True).start()
+        return self.server.server_address[1]
+
+    def close(self):
+        """停止HTTP服务"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+1分钟K线聚合
+由 realtime_data_queue 的快照驱动。快照中的 volume / amount 是当日累计值，
+每分钟的成交量和成交额由相邻两次快照的累计值之差得到；价格取 new_price。
+
+每只股票一行，状态存放在预分配的结构化数组中（与最新行情表相同的dict索引），
+每批行情按行号向量化更新，同一批中同一股票有多个快照时按时间顺序分轮处理。
+    乱序    update_time 比该股票已接受的快照旧的直接丢弃（累计值会在下一个快照中补上，成交量不丢）
+    重复    时间和累计成交量都相同的快照丢弃
+    迟到    所在分钟的K线已经收盘的快照丢弃，成交量计入下一根K线
+    新交易日 累计值从0重新开始；接收端启动后某只股票的第一个快照只作为基准，不计入成交量
+K线在分钟结束（加上grace秒容忍时钟偏差）后按本机时钟收盘，不必等到该股票的下一个快照；
+收盘的K线以 minute_bar_queue 消息交给接收端的处理函数和抓包日志：持锁时只复制收盘的行放入待输出队列，
+释放锁之后才生成记录并调用 on_bars，处理函数可以再调用 open_bars() 等方法，也不会阻塞行情的应用。
+时间与 update_time 一样按本地时间的秒数处理（不做时区换算）。
+"""
+
+import calendar
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from mq_codec import parse_update_time
+from mq_records import field_values
+
+MINUTE_BAR_QUEUE = 'minute_bar_queue'
+DEFAULT_CAPACITY = 8192
+DEFAULT_GRACE = 2.0         # 分钟结束后再等待的秒数（发送端与本机的时钟偏差、传输延迟）
+DEFAULT_CLOSE_INTERVAL = 1.0
+SECONDS_PER_DAY = 86400
+
+STATE_DTYPE = np.dtype([
+    ('stock_code', 'U12'),
+    ('bar_minute', '<i8'),      # 未收盘K线的分钟序号（秒数 // 60），-1表示没有
+    ('closed_minute', '<i8'),   # 最近收盘的分钟序号
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+    ('amount', '<f8'),
+    ('last_time', '<i8'),       # 已接受的最新快照时间，0表示还没有
+    ('last_volume', '<f8'),     # 该快照的累计成交量
+    ('last_amount', '<f8'),
+])
+
+
+def local_now():
+    """本机当前时间，按与 update_time 相同的方式表示为秒数（本地时间按UTC解释）"""
+    return calendar.timegm(time.localtime())
+
+
+def snapshot_columns(data):
+    """从一条实时行情消息取出聚合需要的列，返回 (代码, 时间秒数, 价格, 累计成交量, 累计成交额)"""
+    if isinstance(data, dict) and 'columns' in data:
+        columns = data['columns']
+        return (np.asarray(columns['stock_code']), columns['update_time'].astype('<i8'),
+                columns['new_price'].astype('<f8'), columns['volume'].astype('<f8'),
+                columns['amount'].astype('<f8'))
+    records = data.get('records') if isinstance(data, dict) else None
+    if not records:
+        return None
+    # 同一批的更新时间通常只有少数几个取值，每个取值只解析一次
+    times = field_values(records, 'update_time')
+    parsed = {value: parse_update_time(value) for value in set(times)}
+    return (np.array([code or '' for code in field_values(records, 'stock_code')], dtype='U12'),
+            np.array([parsed[value] for value in times], dtype='<i8'),
+            np.array([value or 0 for value in field_values(records, 'new_price')], dtype='<f8'),
+            np.array([value or 0 for value in field_values(records, 'volume')], dtype='<f8'),
+            np.array([value or 0 for value in field_values(records, 'amount')], dtype='<f8'))
+
+
+class MinuteBarAggregator:
+    def __init__(self, capacity=DEFAULT_CAPACITY, grace=DEFAULT_GRACE, on_bars=None):
+        """
+        :param capacity: 最大股票数，超出的新股票会被丢弃并计数
+        :param grace: 分钟结束后再等待grace秒才收盘
+        :param on_bars: on_bars(queue_name, data) 接收收盘的K线，data为 {"records": [...]}
+        """
+        self.capacity = capacity
+        self.grace = grace
+        self.on_bars = on_bars
+        self.table = np.zeros(capacity, dtype=STATE_DTYPE)
+        self.table['bar_minute'] = -1
+        self.table['closed_minute'] = -1
+        self.index = {}     # 股票代码 -> 行号
+        self.size = 0
+        self.lock = threading.Lock()  # 接收线程和收盘定时线程共用
+        self.pending = deque()  # 已收盘、尚未交给on_bars的K线（每次收盘一个结构化数组副本，按收盘顺序）
+        self.publish_lock = threading.Lock()  # 同一时间只有一个线程调用on_bars，保持收盘顺序
+        self.stopped = threading.Event()
+        self.thread = None
+        self.snapshots = 0
+        self.bars = 0
+        self.stale = 0      # 比已接受快照旧的
+        self.duplicate = 0
+        self.late = 0       # 所在分钟已收盘的
+        self.overflow = 0   # 容量已满或价格无效的
+
+    def __len__(self):
+        return self.size
+
+    def on_message(self, queue_name, data):
+        """接收器的处理函数：应用一条 realtime_data_queue 消息，并收盘已经结束的分钟"""
+        columns = snapshot_columns(data)
+        with self.lock:
+            if columns is not None:
+                self.apply(*columns)
+            self.close_due_locked(local_now())
+        self.publish_pending()
+
+    def rows_for(self, codes):
+        """查找股票代码对应的行号，新股票分配新行，容量已满返回-1"""
+        index = self.index
+        codes = codes.tolist()
+        rows = np.empty(len(codes), dtype=np.intp)
+        for i, code in enumerate(codes):
+            row = index.get(code, -1)
+            if row < 0 and self.size < self.capacity:
+                row = index[code] = self.size
+                self.table['stock_code'][row] = code
+                self.size += 1
+            rows[i] = row
+        return rows
+
+    def apply(self, codes, times, prices, volumes, amounts):
+        """
+        应用一批快照（调用方持有self.lock，之后须调用publish_pending）
+        按 (行号, 时间) 排序后，同一股票的第k个快照在第k轮处理，每轮内行号不重复，可以整体向量化
+        """
+        count = len(codes)
+        if count == 0:
+            return
+        self.snapshots += count
+        rows = self.rows_for(codes)
+        valid = (rows >= 0) & (prices > 0)
+        if not valid.all():
+            self.overflow += int((~valid).sum())
+        order = np.flatnonzero(valid)
+        order = order[np.lexsort((times[order], rows[order]))]
+        rows, times, prices, volumes, amounts = (rows[order], times[order], prices[order], volumes[order],
+                                                 amounts[order])
+        positions = np.arange(len(rows))
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        occurrence = positions - np.maximum.accumulate(np.where(first, positions, 0))
+        rounds = int(occurrence.max()) + 1 if len(rows) else 0
+        for k in range(rounds):
+            selected = occurrence == k if rounds > 1 else slice(None)
+            self.apply_round(rows[selected], times[selected], prices[selected], volumes[selected],
+                             amounts[selected])
+
+    def apply_round(self, rows, times, prices, volumes, amounts):
+        """应用一轮快照（rows不重复）"""
+        table = self.table
+        last_time = table['last_time'][rows]
+        last_volume = table['last_volume'][rows]
+        newer = (times > last_time) | ((times == last_time) & (volumes > last_volume))
+        duplicate = (times == last_time) & (volumes == last_volume)
+        self.duplicate += int(duplicate.sum())
+        self.stale += int((~newer & ~duplicate).sum())
+        minutes = times // 60
+        late = newer & (minutes <= table['closed_minute'][rows])
+        self.late += int(late.sum())
+
+        keep = newer & ~late
+        if not keep.all():
+            rows, times, prices, volumes, amounts, minutes, last_time, last_volume = (
+                rows[keep], times[keep], prices[keep], volumes[keep], amounts[keep], minutes[keep],
+                last_time[keep], last_volume[keep])
+        if len(rows) == 0:
+            return
+        last_amount = table['last_amount'][rows]
+
+        # 本次快照带来的成交量/额：首个快照只作基准，新交易日累计值从0开始，累计值回退（行情源修正）按0计
+        initial = last_time == 0
+        new_day = ~initial & (times // SECONDS_PER_DAY != last_time // SECONDS_PER_DAY)
+        volume_delta = np.where(initial, 0.0, np.where(new_day, volumes, np.maximum(volumes - last_volume, 0.0)))
+        amount_delta = np.where(initial, 0.0, np.where(new_day, amounts, np.maximum(amounts - last_amount, 0.0)))
+
+        bar_minute = table['bar_minute'][rows]
+        rolled = (bar_minute >= 0) & (minutes > bar_minute)
+        if rolled.any():
+            self.emit(rows[rolled])
+
+        start = (bar_minute < 0) | rolled
+        if start.any():
+            started = rows[start]
+            for name in ('open', 'high', 'low', 'close'):
+                table[name][started] = prices[start]
+            table['volume'][started] = volume_delta[start]
+            table['amount'][started] = amount_delta[start]
+            table['bar_minute'][started] = minutes[start]
+        if not start.all():
+            cont = ~start
+            updated = rows[cont]
+            table['high'][updated] = np.maximum(table['high'][updated], prices[cont])
+            table['low'][updated] = np.minimum(table['low'][updated], prices[cont])
+            table['close'][updated] = prices[cont]
+            table['volume'][updated] += volume_delta[cont]
+            table['amount'][updated] += amount_delta[cont]
+
+        table['last_time'][rows] = times
+        table['last_volume'][rows] = volumes
+        table['last_amount'][rows] = amounts
+
+    def emit(self, rows):
+        """收盘rows行的K线，复制后放入待输出队列（调用方持有self.lock，之后须调用publish_pending）"""
+        table = self.table
+        bars = table[rows]  # 按行号取出即为副本
+        table['closed_minute'][rows] = bars['bar_minute']
+        table['bar_minute'][rows] = -1
+        self.bars += len(rows)
+        if self.on_bars is not None:
+            self.pending.append(bars)
+
+    def publish_pending(self):
+        """
+        把待输出的K线交给on_bars（调用方不能持有self.lock）
+        另一个线程正在输出时直接返回，由它取走；on_bars中再次进入时也直接返回
+        """
+        while self.pending:
+            if not self.publish_lock.acquire(blocking=False):
+                return
+            try:
+                while self.pending:
+                    self.publish(self.pending.popleft())
+            finally:
+                self.publish_lock.release()
+            # 释放前其他线程可能刚放入新的K线而没有取得输出锁，回到循环开头再检查
+
+    def publish(self, bars):
+        """一次收盘的K线生成 minute_bar_queue 消息交给on_bars"""
+        trade_time = np.char.replace(np.datetime_as_string((bars['bar_minute'] * 60).astype('datetime64[s]')), 'T', ' ')
+        names = ('stock_code', 'open', 'high', 'low', 'close', 'volume', 'amount')
+        records = [dict(zip(names, values), trade_time=when)
+                   for *values, when in zip(*(bars[name].tolist() for name in names), trade_time.tolist())]
+        self.on_bars(MINUTE_BAR_QUEUE, {"records": records})
+
+    def close_due_locked(self, now):
+        """收盘所有在 now 之前（含grace）已经结束的分钟（调用方持有self.lock，之后须调用publish_pending）"""
+        size = self.size
+        bar_minute = self.table['bar_minute'][:size]
+        due = np.flatnonzero((bar_minute >= 0) & ((bar_minute + 1) * 60 + self.grace <= now))
+        if len(due):
+            self.emit(due)
+        return len(due)
+
+    def close_due(self, now=None):
+        """按本机时钟收盘已经结束的分钟，返回收盘的K线数"""
+        with self.lock:
+            closed = self.close_due_locked(local_now() if now is None else now)
+        self.publish_pending()
+        return closed
+
+    def open_bars(self):
+        """尚未收盘的K线（结构化数组副本）"""
+        with self.lock:
+            table = self.table[:self.size]
+            return table[table['bar_minute'] >= 0].copy()
+
+    def start(self, interval=DEFAULT_CLOSE_INTERVAL):
+        """启动收盘定时线程：没有新行情（如午间休市）时K线也按时收盘"""
+        self.thread = threading.Thread(target=self.run, args=(interval,), name='mq-minute-bars', daemon=True)
+        self.thread.start()
+
+    def run(self, interval):
+        while not self.stopped.wait(interval):
+            self.close_due()
+
+    def close(self):
+        """停止定时线程（未收盘的K线不输出）"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行时分阶段性能剖析
+接收端落后时，分别统计每帧在各阶段花费的时间（微秒直方图，输出分位数），判断瓶颈在哪里:
+    frame       读取和分帧（recv_into / readexactly，含等待数据的时间：这一段长而其他阶段短说明是发送端慢）
+    decode      消息体解码（解压、json.loads、列式解码）
+    dispatch    交给处理函数（行情表、日线存储等）以及统计
+    output      逐条打印消息详情和累计统计
+默认关闭，关闭时每个阶段只多一次属性读取和函数调用。运行中可以用信号或管理套接字切换，不用重启接收端:
+    SIGUSR1     开/关阶段计时，关闭时打印各阶段分位数
+    SIGUSR2     开始一个 DEFAULT_WINDOW 秒的cProfile窗口
+    管理套接字  见 COMMANDS，客户端: python mq_profile.py PATH 命令
+cProfile窗口只剖析窗口期间处理帧的线程（Python 3.12起为全部线程），结束后在报告目录写入
+cprofile-时间.prof（pstats/snakeviz可读）和按累计耗时排序的 cprofile-时间.txt；
+tracemalloc窗口结束后写入 tracemalloc-时间.txt（窗口期间新增分配最多的代码行和当前占用最多的代码行）。
+
+热路径不加锁：每个线程写自己的分片（threading.local），输出时才合并。
+"""
+
+import argparse
+import cProfile
+import io
+import os
+import pstats
+import signal
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from mq_metrics import Histogram
+
+STAGES = ('frame', 'decode', 'dispatch', 'output')
+DEFAULT_PROFILE_DIR = 'profiles'
+DEFAULT_WINDOW = 30.0
+REPORT_LINES = 60       # 报告中列出的函数/代码行数
+TRACEMALLOC_FRAMES = 10
+
+COMMANDS = """命令:
+    stages on|off       开/关阶段计时（off时返回各阶段分位数）
+    stages              各阶段分位数
+    stages reset        清空阶段统计
+    cprofile [秒]       开始cProfile窗口（默认30秒），结束后写入报告目录
+    tracemalloc [秒]    开始tracemalloc窗口（默认30秒），结束后写入报告目录
+"""
+
+
+def report_path(directory, kind, suffix):
+    """报告文件路径：目录/类型-时间.后缀"""
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{kind}-{datetime.now():%Y%m%d-%H%M%S}{suffix}")
+
+
+class ProfileWindow:
+    """一个cProfile窗口：处理帧的线程在阶段开始时各自启用自己的Profile，到期后各自停用"""
+
+    def __init__(self, seconds, path):
+        self.deadline = time.monotonic() + seconds
+        self.path = path
+        self.lock = threading.Lock()
+        self.profilers = []
+        self.active = {}        # 线程id -> 正在剖析的Profile
+        self.global_profile = None
+        if sys.version_info >= (3, 12):
+            # 3.12起cProfile基于sys.monitoring，启用一次即剖析全部线程
+            self.global_profile = cProfile.Profile()
+            self.global_profile.enable()
+            self.profilers.append(self.global_profile)
+
+    @property
+    def done(self):
+        return time.monotonic() >= self.deadline and not self.active
+
+    def enter(self):
+        """在处理帧的线程中调用：窗口期内启用本线程的Profile，到期后停用"""
+        if self.global_profile is not None:
+            return
+        ident = threading.get_ident()
+        if time.monotonic() < self.deadline:
+            if ident not in self.active:
+                profile = cProfile.Profile()
+                with self.lock:
+                    self.active[ident] = profile
+                    self.profilers.append(profile)
+                profile.enable()
+        elif ident in self.active:
+            self.active[ident].disable()  # 只能由启用它的线程停用
+            with self.lock:
+                del self.active[ident]
+
+    def write(self):
+        """窗口到期后写出报告（仍在剖析的线程下次处理帧时停用，这里只取已有的数据）"""
+        if self.global_profile is not None:
+            self.global_profile.disable()
+        with self.lock:
+            profilers = list(self.profilers)
+        if not profilers:
+            return None
+        stats = pstats.Stats(*profilers)
+        stats.dump_stats(self.path + '.prof')
+        text = io.StringIO()
+        pstats.Stats(self.path + '.prof', stream=text).sort_stats('cumulative').print_stats(REPORT_LINES)
+        with open(self.path + '.txt', 'w', encoding='utf-8') as f:
+            f.write(text.getvalue())
+        return self.path + '.prof'
+
+
+class StageProfiler:
+    def __init__(self, report_dir=DEFAULT_PROFILE_DIR):
+        """:param report_dir: cProfile/tracemalloc报告的目录"""
+        self.report_dir = report_dir
+        self.enabled = False    # 阶段计时或cProfile窗口进行中（热路径只检查这一项）
+        self.timing = False
+        self.window = None
+        self.timing_since = None
+        self.local = threading.local()
+        self.shards = []        # 每个线程一个 {阶段: Histogram}
+        self.shards_lock = threading.Lock()  # 只在线程第一次记录时使用
+        self.tracing = False
+
+    def update_enabled(self):
+        self.enabled = self.timing or self.window is not None
+
+    def start(self):
+        """阶段开始，返回起始时间（纳秒）；没有启用阶段计时时返回0"""
+        if not self.enabled:
+            return 0
+        window = self.window
+        if window is not None:
+            window.enter()
+            if window.done:
+                self.window = None
+                self.update_enabled()
+        return time.perf_counter_ns() if self.timing else 0
+
+    def record(self, stage, started):
+        """阶段结束（started为start()的返回值）"""
+        if started:
+            self.add(stage, time.perf_counter_ns() - started)
+
+    def add(self, stage, elapsed_ns):
+        """记录一个阶段的耗时（已在别处测得），没有启用阶段计时时忽略"""
+        if not self.timing:
+            return
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = {}
+            with self.shards_lock:
+                self.shards.append(shard)
+        histogram = shard.get(stage)
+        if histogram is None:
+            histogram = shard[stage] = Histogram()
+        histogram.record(elapsed_ns // 1000)
+
+    def set_timing(self, on):
+        """开/关阶段计时，返回说明（关闭时附上各阶段分位数）"""
+        if on == self.timing:
+            return f"阶段计时已经{'开启' if on else '关闭'}"
+        self.timing = on
+        self.update_enabled()
+        if on:
+            self.timing_since = datetime.now()
+            return "已开启阶段计时"
+        return "已关闭阶段计时\n" + self.report()
+
+    def reset(self):
+        with self.shards_lock:
+            for shard in self.shards:
+                shard.clear()
+        self.timing_since = datetime.now() if self.timing else None
+        return "已清空阶段统计"
+
+    def merged(self):
+        """合并各线程的分片，返回 {阶段: Histogram}"""
+        with self.shards_lock:
+            shards = list(self.shards)
+        result = {}
+        for shard in shards:
+            for stage, histogram in list(shard.items()):
+                result.setdefault(stage, Histogram()).merge(histogram)
+        return result
+
+    def report(self):
+        """各阶段分位数（毫秒）和合计耗时"""
+        merged = self.merged()
+        total = sum(histogram.sum for histogram in merged.values()) or 1
+        lines = [f"阶段统计（自 {self.timing_since or '-'}）:",
+                 f"  {'阶段':<10}{'次数':>10}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}{'最大(ms)':>10}"
+                 f"{'合计(s)':>10}{'占比':>8}"]
+        for stage in list(STAGES) + sorted(set(merged) - set(STAGES)):
+            histogram = merged.get(stage)
+            if histogram is None or not histogram.total:
+                continue
+            lines.append(f"  {stage:<10}{histogram.total:>10}" +
+                         ''.join(f"{histogram.quantile(q) / 1000:>10.3f}" for q in (0.5, 0.9, 0.99)) +
+                         f"{histogram.max / 1000:>10.3f}{histogram.sum / 1e6:>10.2f}{histogram.sum / total:>8.1%}")
+        if len(lines) == 2:
+            lines.append("  （没有记录）")
+        return '\n'.join(lines)
+
+    def start_cprofile(self, seconds=DEFAULT_WINDOW):
+        """开始cProfile窗口，到期后在后台线程写出报告，返回说明"""
+        if self.window is not None:
+            if time.monotonic() < self.window.deadline:
+                return "已有cProfile窗口在进行中"
+            return "上一个cProfile窗口已结束，等待空闲线程处理下一帧时停用剖析"
+        path = report_path(self.report_dir, 'cprofile', '')
+        window = self.window = ProfileWindow(seconds, path)
+        self.update_enabled()
+
+        def finish():
+            time.sleep(seconds)
+            try:
+                if window.write():
+                    print(f"[{datetime.now()}] ✓ cProfile报告: {path}.prof / {path}.txt")
+                else:
+                    print(f"[{datetime.now()}] ⚠ cProfile窗口内没有处理帧，未写报告")
+            except Exception as e:
+                print(f"[{datetime.now()}] ✗ 写入cProfile报告失败: {e}")
+            # 仍在剖析的线程下次处理帧时自行停用，之后由 start() 移除窗口
+            if window.global_profile is not None or window.done:
+                self.window = None
+                self.update_enabled()
+
+        threading.Thread(target=finish, name='mq-cprofile', daemon=True).start()
+        return f"cProfile窗口 {seconds:g} 秒，报告: {path}.prof / {path}.txt"
+
+    def start_tracemalloc(self, seconds=DEFAULT_WINDOW):
+        """开始tracemalloc窗口，到期后在后台线程写出报告，返回说明"""
+        if self.tracing:
+            return "已有tracemalloc窗口在进行中"
+        self.tracing = True
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        baseline = tracemalloc.take_snapshot()
+        path = report_path(self.report_dir, 'tracemalloc', '.txt')
+
+        def finish():
+            time.sleep(seconds)
+            try:
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(f"tracemalloc窗口 {seconds:g} 秒，结束时 {current / 1024 / 1024:.1f} MB，"
+                            f"峰值 {peak / 1024 / 1024:.1f} MB\n\n窗口期间新增最多的代码行:\n")
+                    for stat in snapshot.compare_to(baseline, 'lineno')[:REPORT_LINES]:
+                        f.write(f"  {stat}\n")
+                    f.write("\n当前占用最多的代码行:\n")
+                    for stat in snapshot.statistics('lineno')[:REPORT_LINES]:
+                        f.write(f"  {stat}\n")
+                print(f"[{datetime.now()}] ✓ tracemalloc报告: {path}")
+            except Exception as e:
+                print(f"[{datetime.now()}] ✗ 写入tracemalloc报告失败: {e}")
+            finally:
+                if started_here:
+                    tracemalloc.stop()
+                self.tracing = False
+
+        threading.Thread(target=finish, name='mq-tracemalloc', daemon=True).start()
+        return f"tracemalloc窗口 {seconds:g} 秒，报告: {path}"
+
+    def command(self, line):
+        """执行一条管理命令，返回回复文本"""
+        words = line.split()
+        try:
+            if not words or words[0] == 'help':
+                return COMMANDS
+            if words[0] == 'stages':
+                action = words[1] if len(words) > 1 else 'show'
+                if action in ('on', 'off'):
+                    return self.set_timing(action == 'on')
+                if action == 'reset':
+                    return self.reset()
+                if action == 'show':
+                    return self.report()
+            if words[0] == 'cprofile':
+                return self.start_cprofile(float(words[1]) if len(words) > 1 else DEFAULT_WINDOW)
+            if words[0] == 'tracemalloc':
+                return self.start_tracemalloc(float(words[1]) if len(words) > 1 else DEFAULT_WINDOW)
+        except ValueError as e:
+            return f"参数错误: {e}"
+        return f"未知命令: {line.strip()}\n{COMMANDS}"
+
+    def install_signals(self):
+        """安装信号处理（须在主线程调用，没有SIGUSR1/SIGUSR2的平台忽略）"""
+        if not hasattr(signal, 'SIGUSR1'):
+            return False
+
+        def toggle(signum, frame):
+            print(f"[{datetime.now()}] {self.set_timing(not self.timing)}")
+
+        def profile(signum, frame):
+            print(f"[{datetime.now()}] {self.start_cprofile()}")
+
+        signal.signal(signal.SIGUSR1, toggle)
+        signal.signal(signal.SIGUSR2, profile)
+        return True
+
+
+class AdminServer:
+    """管理套接字：Unix域套接字，每个连接发送一行命令，收到回复后连接关闭"""
+
+    def __init__(self, path, profiler):
+        self.path = path
+        self.profiler = profiler
+        if os.path.exists(path):
+            os.unlink(path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(path)
+        self.socket.listen(4)
+        self.thread = threading.Thread(target=self.serve, name='mq-admin', daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.socket.accept()
+            except OSError:
+                return
+            with conn:
+                try:
+                    conn.settimeout(5.0)
+                    data = b''
+                    while not data.endswith(b'\n'):
+                        chunk = conn.recv(4096)
+                        if not chunk:
+                            break
+                        data += chunk
+                    reply = self.profiler.command(data.decode('utf-8'))
+                    conn.sendall(reply.encode('utf-8') + b'\n')
+                except OSError:
+                    pass
+
+    def close(self):
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def send_command(path, line, timeout=5.0):
+    """向接收端的管理套接字发送一条命令，返回回复"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(line.encode('utf-8') + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+        data = b''
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    return data.decode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接收端管理命令（分阶段计时、cProfile/tracemalloc窗口）",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=COMMANDS)
+    parser.add_argument('path', help="接收端的管理套接字（--admin PATH）")
+    parser.add_argument('command', nargs='*', help="命令，默认 stages")
+    args = parser.parse_args()
+    try:
+        print(send_command(args.path, ' '.join(args.command) or 'stages'), end='')
+    except OSError as e:
+        print(f"✗ 连接管理套接字失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MQ传输协议公共定义
+发送端（test_mq_send.py）和接收端（mq_receiver_host.py / mq_receiver_test.py）共用
+
+v1帧格式: 消息长度(4) + 队列名称长度(4) + 队列名称 + JSON数据
+          接收端每处理完一帧回复4字节 "ACK\\0"（C#发送端读取4字节并检查前3字节）
+
+v2帧格式（可选，需先握手）:
+          消息长度(4) + 序号(4) + 队列名称长度(4) + 队列名称 + JSON数据
+          发送端先发送一个队列名为 __mq_hello__ 的v1帧，内容为 {"protocol": 2, "window": N}，
+          接收端回复 "HELO" + 实际窗口大小(4)，之后该连接上的帧都带序号。
+          接收端按滑动窗口发送累积确认 "ACK2" + 已处理的最大序号(4)，
+          发送端最多可以有 window 帧未确认。
+
+队列名称长度字段(4字节)的拆分:
+          最高字节为帧标志位，次高字节为消息体编码(codec)，低16位为队列名称长度。
+          旧发送端这两个字节总是0，即标志位为空、消息体为JSON，完全兼容。
+
+压缩（可选，需先握手）:
+          握手帧中带 "compression": ["zlib"]，支持的接收端在回复的窗口字段最高字节置特性位，
+          之后发送端可以对单帧消息体做zlib压缩并置 FLAG_ZLIB 标志位，codec不变（指解压后的格式）。
+          只请求压缩、不切换v2时握手帧的protocol为1，接收端回复 "HELO" + 窗口1，连接仍按v1逐帧ACK；
+          不认识压缩的接收端回复 ACK 或不带特性位的 HELO，发送端不压缩。
+
+续传（可选，需先握手）:
+          握手帧中带 "resume": [队列名称, ...]，启用了续传的接收端在回复的窗口字段置 FEATURE_RESUME 特性位，
+          并在 "HELO" + 窗口字段之后追加 长度(4) + JSON {队列名称: 已提交的最大队列序号}（没有记录为0）。
+          之后发送端可以置 FLAG_QUEUE_SEQ 标志位，在消息体前加12字节扩展头: 队列序号(8) + 消息体CRC32(4)。
+          队列序号按队列名称单调递增（与v2的连接内序号无关），发送端断线重连后从已提交序号之后续传。
+          CRC不符时接收端丢弃该帧，先确认同一批中已处理的帧，然后断开连接（v1的ACK没有否定确认，
+          继续接收后面的帧会越过损坏的帧提交）；发送端重连握手后从已提交序号之后续传，损坏的帧随之重发。
+          序号不大于已提交序号的重复帧只确认不处理。
+
+所有整数均为大端序
+"""
+
+import json
+import struct
+import zlib
+from collections import namedtuple
+
+ACK = b'ACK\x00'
+ACK2 = b'ACK2'
+HELLO_REPLY = b'HELO'
+HELLO_QUEUE = '__mq_hello__'
+
+PROTOCOL_V1 = 1
+PROTOCOL_V2 = 2
+
+DEFAULT_WINDOW = 32
+MAX_WINDOW = 1024
+
+# 异步模式下累积ACK的最大延迟（秒），没有后续数据时到期发送
+ACK_DELAY = 0.002
+
+# 消息体编码（codec），见 mq_codec.py
+CODEC_JSON = 0
+CODEC_REALTIME_COLUMNAR = 1
+
+# 帧标志位（队列名称长度字段最高字节）
+FLAG_ZLIB = 0x01
+FLAG_QUEUE_SEQ = 0x02   # 消息体前有队列序号扩展头，分帧时去掉（见 split_queue_seq）
+KNOWN_FLAGS = FLAG_ZLIB
+
+# 握手回复中窗口字段最高字节的特性位
+FEATURE_ZLIB = 0x01
+FEATURE_RESUME = 0x02
+COMPRESSION_ZLIB = 'zlib'
+
+# 队列序号扩展头: 队列序号(8) + 消息体CRC32(4)
+QUEUE_SEQ_HEADER = struct.Struct('>QI')
+
+# 压缩启发式：小于阈值的帧（实时行情等）不压缩；压缩后节省不到MIN_COMPRESS_SAVING时发送原文
+DEFAULT_COMPRESS_THRESHOLD = 64 * 1024
+DEFAULT_COMPRESS_LEVEL = 1
+MIN_COMPRESS_SAVING = 0.1
+
+# FrameDecoder缓冲区初始大小，以及每次recv至少预留的空间
+DECODER_BUFFER_SIZE = 256 * 1024
+DECODER_MIN_RECV = 64 * 1024
+
+
+# 解码后的一帧：v1帧的seq为None，body为消息体（FrameDecoder返回memoryview，压缩帧为压缩数据）
+# queue_seq为续传的队列序号（没有扩展头时为None），扩展头已从body和flags中去掉
+Frame = namedtuple('Frame', ['queue_name', 'seq', 'codec', 'body', 'message_length', 'flags', 'queue_seq'],
+                   defaults=(0, None))
+
+
+class ChecksumError(ValueError):
+    """消息体CRC与队列序号扩展头中的不符"""
+
+
+def pack_name_field(queue_name_length, codec=CODEC_JSON, flags=0):
+    """组合队列名称长度字段：标志位(8位) + codec(8位) + 队列名称长度(16位)"""
+    return (flags << 24) | (codec << 16) | queue_name_length
+
+
+def unpack_name_field(value):
+    """拆分队列名称长度字段，返回 (标志位, codec, 队列名称长度)"""
+    return value >> 24, (value >> 16) & 0xFF, value & 0xFFFF
+
+
+def build_frame(queue_name, body, seq=None, codec=CODEC_JSON, flags=0, queue_seq=None):
+    """
+    构建一帧数据
+    :param queue_name: 队列名称
+    :param body: 消息体（bytes）
+    :param seq: v2序号，None表示v1帧
+    :param codec: 消息体编码，默认JSON
+    :param flags: 帧标志位（如 FLAG_ZLIB，body须已压缩）
+    :param queue_seq: 续传的队列序号，不为None时加扩展头（须已握手启用续传）
+    """
+    if queue_seq is not None:
+        body = QUEUE_SEQ_HEADER.pack(queue_seq, zlib.crc32(body)) + body
+        flags |= FLAG_QUEUE_SEQ
+    queue_name_bytes = queue_name.encode('utf-8')
+    header_size = 8 if seq is None else 12
+    message_length = header_size + len(queue_name_bytes) + len(body)
+    name_field = pack_name_field(len(queue_name_bytes), codec, flags)
+
+    message = bytearray()
+    if seq is None:
+        message.extend(struct.pack('>II', message_length, name_field))
+    else:
+        message.extend(struct.pack('>III', message_length, seq, name_field))
+    message.extend(queue_name_bytes)
+    message.extend(body)
+    return bytes(message)
+
+
+def get_queue_type(queue_name):
+    """
+    根据队列名称判断数据类型：daily / realtime / ex_rights / market_table，无法识别返回None
+    minute_bar 是接收端自己生成的分钟K线（见 mq_minute_bars.py）
+    """
+    if 'daily' in queue_name:
+        return 'daily'
+    elif 'realtime' in queue_name:
+        return 'realtime'
+    elif 'ex_rights' in queue_name:
+        return 'ex_rights'
+    elif 'market_table' in queue_name or 'code_table' in queue_name:
+        return 'market_table'
+    elif 'minute_bar' in queue_name:
+        return 'minute_bar'
+    return None
+
+
+def build_hello(window, compression=False, protocol=PROTOCOL_V2, resume=()):
+    """
+    构建握手帧
+    :param compression: 是否请求zlib压缩
+    :param protocol: PROTOCOL_V2 切换到窗口确认；PROTOCOL_V1 只请求压缩/续传
+    :param resume: 请求续传的队列名称，接收端在回复中返回各队列已提交的序号
+    """
+    hello = {"protocol": protocol, "window": window}
+    if compression:
+        hello["compression"] = [COMPRESSION_ZLIB]
+    if resume:
+        hello["resume"] = list(resume)
+    return build_frame(HELLO_QUEUE, json.dumps(hello).encode('utf-8'))
+
+
+def accept_hello(body, max_window=MAX_WINDOW, committed=None):
+    """
+    解析握手帧，返回 (协议版本, 窗口大小, 回复数据)
+    不支持的协议版本返回 (PROTOCOL_V1, 1, ACK)，连接继续按v1处理；
+    请求了压缩的握手在回复的窗口字段最高字节带上特性位（接收端总能解压，不需要记录协商结果）
+    :param committed: 启用续传时为 committed(队列名称列表) -> {队列名称: 已提交序号}，请求了续传的握手
+                      在回复中带上特性位和各队列的已提交序号；None表示不支持续传
+    """
+    try:
+        hello = json.loads(str(body, 'utf-8'))
+        protocol = int(hello.get('protocol', PROTOCOL_V1))
+        window = int(hello.get('window', DEFAULT_WINDOW))
+        features = FEATURE_ZLIB if COMPRESSION_ZLIB in (hello.get('compression') or ()) else 0
+        resume = [str(name) for name in hello.get('resume') or ()]
+    except (ValueError, TypeError, AttributeError):
+        return PROTOCOL_V1, 1, ACK
+
+    extra = b''
+    if resume and committed is not None:
+        features |= FEATURE_RESUME
+        values = json.dumps(committed(resume)).encode('utf-8')
+        extra = struct.pack('>I', len(values)) + values
+
+    if protocol != PROTOCOL_V2:
+        if features:
+            return PROTOCOL_V1, 1, HELLO_REPLY + struct.pack('>I', (features << 24) | 1) + extra
+        return PROTOCOL_V1, 1, ACK
+
+    window = max(1, min(window, max_window))
+    return PROTOCOL_V2, window, HELLO_REPLY + struct.pack('>I', (features << 24) | window) + extra
+
+
+def parse_hello_reply(reply):
+    """解析握手回复 "HELO" + 窗口字段，返回 (窗口大小, 特性位)；不是HELO回复返回None"""
+    if reply is None or reply[:4] != HELLO_REPLY:
+        return None
+    value = struct.unpack('>I', reply[4:8])[0]
+    return value & 0xFFFFFF, value >> 24
+
+
+def compress_body(body, threshold=DEFAULT_COMPRESS_THRESHOLD, level=DEFAULT_COMPRESS_LEVEL):
+    """
+    按启发式压缩消息体，返回 (消息体, 标志位)
+    小于threshold的不压缩；压缩后节省不到MIN_COMPRESS_SAVING的（如已是二进制列式）发送原文
+    """
+    if len(body) < threshold:
+        return body, 0
+    compressed = zlib.compress(body, level)
+    if len(compressed) > len(body) * (1 - MIN_COMPRESS_SAVING):
+        return body, 0
+    return compressed, FLAG_ZLIB
+
+
+def split_queue_seq(flags, body):
+    """
+    去掉消息体前的队列序号扩展头并校验CRC，返回 (标志位, 队列序号, 消息体)
+    没有扩展头时原样返回，队列序号为None；CRC不符抛出ChecksumError，扩展头不完整抛出ValueError
+    """
+    if not flags & FLAG_QUEUE_SEQ:
+        return flags, None, body
+    if len(body) < QUEUE_SEQ_HEADER.size:
+        raise ValueError("队列序号扩展头不完整")
+    queue_seq, crc = QUEUE_SEQ_HEADER.unpack_from(body)
+    body = body[QUEUE_SEQ_HEADER.size:]
+    if zlib.crc32(body) != crc:
+        raise ChecksumError(f"CRC校验失败（队列序号 {queue_seq}）")
+    return flags & ~FLAG_QUEUE_SEQ, queue_seq, body
+
+
+def decompress_body(flags, body):
+    """按帧标志位还原消息体；未知标志位或数据损坏抛出ValueError"""
+    if flags & ~KNOWN_FLAGS:
+        raise ValueError(f"未知的帧标志位: {flags:#04x}")
+    if flags & FLAG_ZLIB:
+        try:
+            return zlib.decompress(body)
+        except zlib.error as e:
+            raise ValueError(f"解压失败: {e}") from None
+    return body
+
+
+class AckWindow:
+    """v2累积确认：记录已处理的最大序号，积累到半个窗口或者没有后续数据时发送一次ACK"""
+
+    def __init__(self, window):
+        self.window = window
+        self.ack_every = max(1, window // 2)
+        self.last_seq = 0
+        self.acked_seq = 0
+
+    def update(self, seq):
+        """记录已处理的序号，返回是否应立即发送ACK"""
+        self.last_seq = seq
+        return self.last_seq - self.acked_seq >= self.ack_every
+
+    @property
+    def pending(self):
+        """是否有尚未确认的帧"""
+        return self.last_seq != self.acked_seq
+
+    def take(self):
+        """生成累积ACK并标记为已确认"""
+        self.acked_seq = self.last_seq
+        return ACK2 + struct.pack('>I', self.acked_seq)
+
+
+class FrameDecoder:
+    """
+    增量分帧解码器
+    使用预分配的bytearray和recv_into接收数据，一次recv可以解出多个完整帧，
+    跨recv的半帧保留在缓冲区中等待后续数据。消息体以memoryview切片返回（不复制），
+    切片只在下一次 recv_into()/feed() 之前有效，需要保留时请自行 bytes() 复制。
+    """
+
+    def __init__(self, buffer_size=DECODER_BUFFER_SIZE, protocol=PROTOCOL_V1):
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0      # 未解析数据的起点
+        self.end = 0        # 已接收数据的终点
+        self.needed = 0     # 当前半帧需要的总字节数（0表示未知）
+        self.protocol = protocol
+
+    @property
+    def buffered(self):
+        """缓冲区中尚未解析的字节数"""
+        return self.end - self.start
+
+    def reserve(self, size):
+        """保证缓冲区尾部至少有size字节空闲空间"""
+        pending = self.end - self.start
+        if pending == 0:
+            self.start = self.end = 0
+
+        if len(self.buffer) - self.end >= size:
+            return
+
+        if pending + size > len(self.buffer):
+            # 半帧比缓冲区还大：分配更大的新缓冲区（不在原对象上扩容，已交出的切片仍然有效）
+            new_buffer = bytearray(max(pending + size, len(self.buffer) * 2))
+            new_buffer[:pending] = self.view[self.start:self.end]
+            self.buffer = new_buffer
+            self.view = memoryview(new_buffer)
+        else:
+            # 把未解析数据移到缓冲区开头
+            self.buffer[:pending] = bytes(self.view[self.start:self.end])
+        self.start, self.end = 0, pending
+
+    def recv_into(self, sock):
+        """从套接字读取一次数据，返回读取的字节数，0表示连接已关闭"""
+        want = max(DECODER_MIN_RECV, self.needed - self.buffered)
+        self.reserve(want)
+        n = sock.recv_into(self.view[self.end:])
+        self.end += n
+        return n
+
+    def feed(self, data):
+        """写入一段已接收的数据（不经过套接字时使用）"""
+        self.reserve(len(data))
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def frames(self):
+        """
+        解析缓冲区中所有完整的帧，逐个生成 Frame
+        迭代过程中可以修改 self.protocol（例如收到握手帧后切换到v2），对后续帧立即生效
+        带队列序号扩展头的帧去掉扩展头并校验CRC，不符时抛出ChecksumError（该帧之前的帧已正常生成）
+        """
+        buffer = self.buffer
+        while True:
+            header_size = 8 if self.protocol == PROTOCOL_V1 else 12
+            available = self.end - self.start
+            if available < header_size:
+                self.needed = header_size
+                return
+
+            start = self.start
+            if self.protocol == PROTOCOL_V1:
+                message_length, name_field = struct.unpack_from('>II', buffer, start)
+                seq = None
+            else:
+                message_length, seq, name_field = struct.unpack_from('>III', buffer, start)
+            flags, codec, queue_name_length = unpack_name_field(name_field)
+
+            if message_length < header_size + queue_name_length:
+                raise ValueError(f"消息长度非法: {message_length}")
+            if available < message_length:
+                self.needed = message_length
+                return
+
+            name_start = start + header_size
+            body_start = name_start + queue_name_length
+            queue_name = str(self.view[name_start:body_start], 'utf-8')
+            body = self.view[body_start:start + message_length]
+            flags, queue_seq, body = split_queue_seq(flags, body)
+
+            self.start = start + message_length
+            self.needed = 0
+            yield Frame(queue_name, seq, codec, body, message_length, flags, queue_seq)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+最新行情表
+由 realtime_data_queue 消息驱动，每只股票一行，存放在预分配的NumPy结构化数组中，
+股票代码到行号用dict索引（O(1)），market_table_queue 的码表消息可以预先为全部股票分配行。每批数据先整理成列，再按行号向量化写入，
+内存大小在创建时固定，不随推送次数增长。
+"""
+
+import threading
+from itertools import repeat
+
+import numpy as np
+
+from mq_codec import ORDER_BOOK_DEPTH, parse_update_time
+from mq_records import field_values
+
+DEFAULT_CAPACITY = 8192  # A股全市场约5500只股票，加上指数留有余量
+
+QUOTE_DTYPE = np.dtype([
+    ('stock_code', 'U12'),
+    ('stock_name', 'U16'),
+    ('market_code', '<u2'),
+    ('update_time', 'datetime64[s]'),
+    ('time_stamp', '<i4'),
+    ('last_close', '<f4'),
+    ('open', '<f4'),
+    ('high', '<f4'),
+    ('low', '<f4'),
+    ('new_price', '<f4'),
+    ('volume', '<f4'),
+    ('amount', '<f4'),
+    ('buy_price', '<f4', (ORDER_BOOK_DEPTH,)),
+    ('buy_volume', '<f4', (ORDER_BOOK_DEPTH,)),
+    ('sell_price', '<f4', (ORDER_BOOK_DEPTH,)),
+    ('sell_volume', '<f4', (ORDER_BOOK_DEPTH,)),
+])
+
+# 每批更新时写入的字段（stock_code在新增行时写入）
+UPDATE_FIELDS = [name for name in QUOTE_DTYPE.names if name != 'stock_code']
+
+
+def records_to_columns(records):
+    """把JSON解码得到的记录列表整理为 {字段: 数组}"""
+    columns = {}
+    for name in QUOTE_DTYPE.names:
+        if name == 'update_time':
+            # 同一批的更新时间通常只有少数几个取值，每个取值只解析一次
+            values = field_values(records, name)
+            parsed = {value: parse_update_time(value) for value in set(values)}
+            columns[name] = np.array([parsed[v] for v in values], dtype='<i8').view('datetime64[s]')
+        else:
+            columns[name] = np.array(field_values(records, name), dtype=QUOTE_DTYPE[name].base)
+    return columns
+
+
+class QuoteBook:
+    def __init__(self, capacity=DEFAULT_CAPACITY, table=None):
+        """
+        :param capacity: 最大股票数，超出的新股票会被丢弃并计数
+        :param table: 预先分配的结构化数组（至少包含QUOTE_DTYPE的字段，如共享内存中的表），默认新建
+        """
+        self.capacity = capacity
+        self.table = np.zeros(capacity, dtype=QUOTE_DTYPE) if table is None else table
+        self.index = {}     # 股票代码 -> 行号
+        self.size = 0
+        self.batches = 0
+        self.updates = 0
+        self.stale = 0      # 因时间戳比现有数据旧而忽略的记录数
+        self.overflow = 0   # 因容量已满而丢弃的记录数
+        self.lock = threading.Lock()  # 启用优先级调度时实时行情和码表在不同线程中处理
+
+    def __len__(self):
+        return self.size
+
+    def on_message(self, queue_name, data):
+        """接收器的处理函数：应用一条 realtime_data_queue 消息"""
+        if isinstance(data, dict) and 'columns' in data:
+            self.apply(data['columns'])
+        elif isinstance(data, dict) and data.get('records'):
+            self.apply(records_to_columns(data['records']))
+
+    def rows_for(self, codes):
+        """查找股票代码对应的行号，新股票分配新行，容量已满返回-1"""
+        index = self.index
+        codes = codes.tolist()
+        rows = np.fromiter(map(index.get, codes, repeat(-1, len(codes))), dtype=np.intp, count=len(codes))
+        missing = np.flatnonzero(rows < 0)
+        added = []
+        for i in missing.tolist():
+            code = codes[i]
+            row = index.get(code, -1)  # 同一批中可能重复出现
+            if row < 0 and self.size + len(added) < self.capacity:
+                row = self.size + len(added)
+                index[code] = row
+                added.append(code)
+            rows[i] = row
+        if added:
+            # 新行的代码一次写入，之后才增加已分配行数
+            self.table['stock_code'][self.size:self.size + len(added)] = added
+            self.size += len(added)
+        return rows
+
+    def apply(self, columns):
+        """
+        应用一批行情（{字段: 数组}，来自列式解码或records_to_columns）
+        同一批中同一股票出现多次时以最后一条为准；时间戳比已有数据旧的记录被忽略
+        """
+        codes = np.asarray(columns['stock_code'])
+        if len(codes) == 0:
+            return 0
+        with self.lock:
+            return self.apply_locked(codes, columns)
+
+    def apply_locked(self, codes, columns):
+        """apply的实现（调用方持有self.lock）"""
+        rows = self.rows_for(codes)
+        positions = np.arange(len(rows))
+        filtered = False
+
+        valid = rows >= 0
+        if not valid.all():
+            self.overflow += int((~valid).sum())
+            rows, positions = rows[valid], positions[valid]
+            filtered = True
+
+        # 同一批中的重复股票只保留最后一条
+        if len(np.unique(rows)) != len(rows):
+            _, last = np.unique(rows[::-1], return_index=True)
+            keep = np.sort(len(rows) - 1 - last)
+            rows, positions = rows[keep], positions[keep]
+            filtered = True
+
+        # 乱序到达的旧快照不覆盖新数据
+        time_stamp = np.asarray(columns['time_stamp'])[positions]
+        fresh = time_stamp >= self.table['time_stamp'][rows]
+        if not fresh.all():
+            self.stale += int((~fresh).sum())
+            rows, positions = rows[fresh], positions[fresh]
+            filtered = True
+
+        self.write(rows, columns, positions if filtered else None)
+        self.batches += 1
+        self.updates += len(rows)
+        return len(rows)
+
+    def write(self, rows, columns, positions=None, fields=UPDATE_FIELDS):
+        """把columns中的字段（positions为None时取整列）写入table的rows行，rows不重复"""
+        table = self.table
+        for name in fields:
+            column = columns.get(name)
+            if column is not None:
+                column = np.asarray(column)
+                table[name][rows] = column if positions is None else column[positions]
+
+    def on_market_table(self, queue_name, data):
+        """接收器的处理函数：码表消息为全部股票预先分配行，并写入名称和市场代码"""
+        records = data.get('records') if isinstance(data, dict) else None
+        if not records:
+            return
+        codes = np.array([r.get('stock_code') for r in records], dtype=QUOTE_DTYPE['stock_code'])
+        columns = {
+            'stock_name': np.array([r.get('stock_name') or '' for r in records], dtype=QUOTE_DTYPE['stock_name']),
+            'market_code': np.array([r.get('market_code') or 0 for r in records], dtype=QUOTE_DTYPE['market_code']),
+        }
+        with self.lock:
+            rows = self.rows_for(codes)
+            keep = np.flatnonzero(rows >= 0)
+            if len(keep) == 0:
+                return
+            # 码表中的重复代码以最后一条为准
+            _, last = np.unique(rows[keep][::-1], return_index=True)
+            keep = keep[len(keep) - 1 - last]
+            self.write(rows[keep], columns, keep, ('stock_name', 'market_code'))
+
+    def restore(self, rows):
+        """
+        从检查点恢复（rows为QUOTE_DTYPE结构化数组，如 mq_checkpoint 映射上的视图），按股票代码写入，
+        返回恢复的行数；写入时复制，rows之后可以释放
+        """
+        if len(rows) == 0:
+            return 0
+        columns = {name: rows[name] for name in UPDATE_FIELDS}
+        with self.lock:
+            target = self.rows_for(rows['stock_code'])
+            keep = np.flatnonzero(target >= 0)
+            self.overflow += len(target) - len(keep)
+            self.write(target[keep], columns, keep)
+        return len(keep)
+
+    def get(self, stock_code):
+        """获取一只股票的最新行情（结构化数组的一行副本），不存在返回None"""
+        row = self.index.get(stock_code)
+        if row is None:
+            return None
+        return self.table[row].copy()
+
+    def snapshot(self):
+        """全市场最新行情的副本"""
+        return self.table[:self.size].copy()
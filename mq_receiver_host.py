@@ -5,26 +5,333 @@ MQ消息接收程序（宿主机端）
 用于接收从虚拟机发送的MQ消息
 """
 
+import argparse
+import asyncio
 import socket
 import struct
 import json
-import sys
+import os
+import threading
+import time
+from collections.abc import Mapping
 from datetime import datetime
 
+from mq_capture import DEFAULT_SEGMENT_SIZE, CaptureWriter
+from mq_checkpoint import DEFAULT_CHECKPOINT_INTERVAL, Checkpoint, Checkpointer, quote_rows
+from mq_codec import columnar_row, decode_payload
+from mq_decode_pool import POOL_KINDS, DecodePipeline
+from mq_json_stream import DEFAULT_STREAM_THRESHOLD, STREAM_QUEUE_TYPES, RecordStream
+from mq_profile import DEFAULT_PROFILE_DIR, AdminServer, StageProfiler
+from mq_protocol import (ACK, ACK_DELAY, CODEC_JSON, DEFAULT_WINDOW, HELLO_QUEUE, PROTOCOL_V1, PROTOCOL_V2,
+                         AckWindow, ChecksumError, FrameDecoder, accept_hello, decompress_body, get_queue_type,
+                         split_queue_seq, unpack_name_field)
+from mq_reporter import DEFAULT_REPORT_INTERVAL, QueueCounters, QuietReporter
+
 class MQReceiverHost:
-    def __init__(self, host='0.0.0.0', port=5678):
+    def __init__(self, host='0.0.0.0', port=5678, max_connections=16, ack_window=DEFAULT_WINDOW):
         """
         初始化接收器
         :param host: 监听地址，0.0.0.0表示监听所有网络接口
         :param port: 监听端口
+        :param max_connections: 异步模式下允许同时处理的最大连接数（0表示不限制）
+        :param ack_window: v2协议允许的最大确认窗口（发送端请求的窗口会被限制在此值以内）
         """
         self.host = host
         self.port = port
+        self.max_connections = max_connections
+        self.ack_window = ack_window
         self.socket = None
+        self.server = None
         self.running = False
         self.total_messages = 0
         self.total_bytes = 0
         self.connections = 0
+        self.active_connections = 0
+        self.decode_pipeline = None
+        self.scheduler = None
+        self.stats_lock = threading.Lock()  # 启用优先级调度时两个调度线程都会更新统计
+        self.handlers = {}  # 队列类型 -> 处理函数列表
+        self.quote_book = None
+        self.daily_store = None
+        self.adjustment = None
+        self.broker = None
+        self.minute_bars = None
+        self.shard_pool = None
+        self.record_decoder = None
+        self.resume = None
+        self.checkpointer = None
+        self.capture = None
+        self.metrics = None
+        self.reporter = None
+        self.profiler = StageProfiler()  # 默认关闭，运行中由信号/管理套接字开启（见 mq_profile.py）
+        self.admin = None
+        self.stream_threshold = DEFAULT_STREAM_THRESHOLD  # 0表示总是整体解析
+    
+    def add_handler(self, queue_type, handler):
+        """
+        注册消息处理函数 handler(queue_name, data)，data为解码后的消息
+        :param queue_type: daily / realtime / ex_rights / market_table / minute_bar
+        """
+        self.handlers.setdefault(queue_type, []).append(handler)
+    
+    def enable_capture(self, directory, segment_size=DEFAULT_SEGMENT_SIZE):
+        """启用抓包日志：每个原始帧写入directory下的滚动段文件（后台批量写入）"""
+        self.capture = CaptureWriter(directory, segment_size=segment_size)
+        return self.capture
+    
+    def enable_metrics(self, port, host='127.0.0.1'):
+        """启用接收指标（各队列延迟/帧大小/解码耗时直方图和速率），在 http://host:port/metrics 输出"""
+        from mq_metrics import ReceiverMetrics
+        self.metrics = ReceiverMetrics()
+        self.metrics.scheduler = self.scheduler
+        port = self.metrics.serve(port, host)
+        print(f"[{datetime.now()}] ✓ 指标输出: http://{host}:{port}/metrics")
+        return self.metrics
+    
+    def enable_quiet(self, interval=DEFAULT_REPORT_INTERVAL, sample_every=0):
+        """
+        启用安静模式：不再逐条打印，后台线程每interval秒为每个队列输出一行汇总
+        :param sample_every: 每N帧仍输出一次详情（0表示不输出）
+        """
+        self.reporter = QuietReporter(interval, sample_every)
+        return self.reporter
+    
+    def enable_quote_book(self, capacity=None, shm_name=None):
+        """
+        启用最新行情表，由 realtime_data_queue 消息更新（需要NumPy）
+        :param shm_name: 放在该名称的共享内存段中供本机其他进程读取（见 mq_shm_quotes.py），
+                         并由 market_table_queue 的码表预先分配股票目录
+        """
+        from mq_quote_book import DEFAULT_CAPACITY, QuoteBook
+        if shm_name:
+            from mq_shm_quotes import SharedQuoteBook
+            self.quote_book = SharedQuoteBook(shm_name, capacity or DEFAULT_CAPACITY)
+            self.add_handler('market_table', self.quote_book.on_market_table)
+            print(f"[{datetime.now()}] ✓ 共享内存行情表: {shm_name}")
+        else:
+            self.quote_book = QuoteBook(capacity or DEFAULT_CAPACITY)
+        self.add_handler('realtime', self.quote_book.on_message)
+        return self.quote_book
+    
+    def enable_daily_store(self, directory):
+        """启用日线存储，daily_data_queue 消息按市场/月份分区去重写入directory（需要NumPy）"""
+        from mq_daily_store import DailyBarStore
+        self.daily_store = DailyBarStore(directory)
+        self.add_handler('daily', self.daily_store.on_message)
+        return self.daily_store
+    
+    def enable_adjustment(self):
+        """
+        启用复权因子引擎，由 ex_rights_data_queue 消息更新（需要NumPy）
+        已启用日线存储时用它读取日线，新日线到达时使对应股票的复权缓存失效
+        """
+        from mq_adjust import AdjustmentEngine
+        self.adjustment = AdjustmentEngine(self.daily_store.read_symbol if self.daily_store else None)
+        self.add_handler('ex_rights', self.adjustment.on_message)
+        self.add_handler('daily', self.adjustment.on_daily)
+        return self.adjustment
+    
+    def enable_minute_bars(self, grace=None):
+        """启用1分钟K线聚合（需要NumPy），收盘的K线以 minute_bar_queue 消息交给处理函数和抓包日志"""
+        from mq_minute_bars import DEFAULT_GRACE, MinuteBarAggregator
+        self.minute_bars = MinuteBarAggregator(grace=DEFAULT_GRACE if grace is None else grace,
+                                               on_bars=self.emit_message)
+        self.add_handler('realtime', self.minute_bars.on_message)
+        self.minute_bars.start()
+        return self.minute_bars
+    
+    def enable_shards(self, workers, factory=None):
+        """
+        启用按股票代码分片的多进程处理（见 mq_shard_pool.py）：实时行情按股票分给workers个工作进程，
+        由factory在各进程中创建有状态的处理函数（默认1分钟K线），结果发回后与 emit_message 相同处理
+        """
+        from mq_shard_pool import ShardPool, minute_bar_handlers
+        self.shard_pool = ShardPool(workers, factory or minute_bar_handlers, on_emit=self.emit_message)
+        self.add_handler('realtime', self.shard_pool.on_message)
+        print(f"[{datetime.now()}] ✓ 分片处理: {workers} 个工作进程")
+        return self.shard_pool
+    
+    def enable_compact_records(self):
+        """
+        启用紧凑记录表示（见 mq_records.py）：JSON消息的记录转换为按列存放的RecordBatch，股票代码/名称
+        由码表建立的符号表统一保存，处理函数收到的 data['records'] 仍可按下标/迭代取出记录并用get读取字段
+        """
+        from mq_records import RecordDecoder
+        self.record_decoder = RecordDecoder()
+        return self.record_decoder
+    
+    def emit_message(self, queue_name, data):
+        """接收端自己生成的消息（如收盘的分钟K线）：写入抓包日志，交给处理函数和订阅者"""
+        try:
+            if self.capture is not None:
+                body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                self.capture.append(queue_name, body, CODEC_JSON)
+            self.dispatch(queue_name, data)
+        except Exception as e:
+            print(f"[{datetime.now()}] ✗ 处理 {queue_name} 时出错: {e}")
+    
+    def enable_broker(self, path):
+        """启用本地转发：在Unix域套接字path上把收到的数据转发给订阅者（见 mq_broker.py）"""
+        from mq_broker import Broker
+        self.broker = Broker(path)
+        print(f"[{datetime.now()}] ✓ 转发套接字: {path}")
+        return self.broker
+    
+    def enable_decode_pool(self, workers=4, kind='process', max_in_flight=64):
+        """
+        启用流水线解码（同步模式）：读线程只分帧，解码交给线程池/进程池，
+        解码结果仍按各队列的到达顺序交给 handle_message
+        """
+        self.decode_pipeline = DecodePipeline(self.handle_message, self.report_decode_error,
+                                              workers=workers, kind=kind, max_in_flight=max_in_flight,
+                                              on_done=self.complete)
+    
+    def enable_priority(self, capacities=None, weights=None):
+        """
+        启用按队列类型的优先级调度（见 mq_scheduler.py）：读线程只把帧放进各类型的有界队列，
+        实时行情由专用线程优先处理，其他类型按权重轮转，大批日线同步时实时行情不再排在后面。
+        同步模式下每个连接改为一个读线程，各发送端的连接可以同时接收
+        """
+        from mq_scheduler import PriorityScheduler
+        self.scheduler = PriorityScheduler(self.process_message, capacities, weights, on_done=self.complete)
+        if self.metrics is not None:
+            self.metrics.scheduler = self.scheduler
+        return self.scheduler
+    
+    def enable_resume(self, path=None):
+        """
+        启用续传（见 mq_resume.py）：记录各队列已提交的队列序号，握手时返回给请求续传的发送端，
+        重复帧只确认不处理；path为状态文件，接收端重启后仍可续传
+        """
+        from mq_resume import ResumeState
+        self.resume = ResumeState(path)
+        print(f"[{datetime.now()}] ✓ 续传状态: {path or '仅内存'}"
+              + (f" ({len(self.resume.committed)} 个队列)" if self.resume.committed else ""))
+        return self.resume
+    
+    def accept_hello(self, body):
+        """解析握手帧（启用续传时在回复中带上已提交序号）"""
+        return accept_hello(body, self.ack_window, self.resume.committed_for if self.resume is not None else None)
+    
+    def is_duplicate(self, queue_name, queue_seq):
+        """续传：队列序号不大于已提交序号的帧是重复帧，只确认不处理"""
+        return queue_seq is not None and self.resume is not None and not self.resume.check(queue_name, queue_seq)
+    
+    def begin(self, queue_name, queue_seq):
+        """续传：该帧已交给解码池/优先级调度（已回复ACK），处理完成前不提交"""
+        if queue_seq is not None and self.resume is not None:
+            self.resume.begin(queue_name, queue_seq)
+    
+    def commit(self, queue_name, queue_seq):
+        """续传：该帧已处理"""
+        if queue_seq is not None and self.resume is not None:
+            self.resume.commit(queue_name, queue_seq)
+    
+    def complete(self, queue_name, queue_seq):
+        """解码池/优先级调度处理完一帧（在处理线程中调用）：提交并按间隔写入续传状态"""
+        if queue_seq is not None and self.resume is not None:
+            self.resume.commit(queue_name, queue_seq)
+            self.resume.flush()
+    
+    def enable_checkpoint(self, path, interval=None):
+        """
+        启用检查点（见 mq_checkpoint.py）：后台线程每interval秒把符号表、最新行情表、累计统计和续传序号写入path，
+        启动时先从path恢复。须在启用行情表、紧凑记录、续传和安静模式之后调用，只恢复已启用的部分
+        """
+        if os.path.exists(path):
+            self.restore_checkpoint(path)
+        self.checkpointer = Checkpointer(path, self.capture_state,
+                                         DEFAULT_CHECKPOINT_INTERVAL if interval is None else interval)
+        self.checkpointer.saved = self.total_messages  # 恢复后没有新消息时不必重写
+        self.checkpointer.start()
+        print(f"[{datetime.now()}] ✓ 检查点: {path} (每 {self.checkpointer.interval:g} 秒)")
+        return self.checkpointer
+    
+    def capture_state(self):
+        """复制写入检查点的状态（各部分在各自的锁内复制，序列化和写盘在锁外）"""
+        with self.stats_lock:
+            meta = {"messages": self.total_messages, "bytes": self.total_bytes, "connections": self.connections}
+            if self.reporter is not None:
+                meta["queues"] = {name: [c.frames, c.records, c.bytes, c.last_symbol]
+                                  for name, c in list(self.reporter.queues.items())}
+        if self.resume is not None:
+            with self.resume.lock:
+                meta["committed"] = dict(self.resume.committed)
+        symbols = quotes = None
+        if self.record_decoder is not None:
+            table = self.record_decoder.table
+            with table.lock:
+                symbols = [list(table.codes), list(table.names), list(table.markets)]
+        if self.quote_book is not None:
+            from mq_quote_book import QUOTE_DTYPE
+            book = self.quote_book
+            with book.lock:
+                quotes = book.snapshot()
+                meta["quote_book"] = {"batches": book.batches, "updates": book.updates}
+            quotes = quote_rows(quotes)
+            meta["quote_dtype"] = str(QUOTE_DTYPE.descr)
+        return {"meta": meta, "symbols": symbols, "quotes": quotes}
+    
+    def restore_checkpoint(self, path):
+        """
+        从检查点恢复已启用部分的状态，返回是否恢复
+        续传序号只补充状态文件中没有的队列（状态文件更新，以它为准）
+        """
+        started = time.perf_counter()
+        try:
+            checkpoint = Checkpoint(path)
+        except (OSError, ValueError) as e:
+            print(f"[{datetime.now()}] ⚠ 忽略检查点 {path}: {e}")
+            return False
+        symbols = quotes = 0
+        try:
+            meta = checkpoint.meta
+            self.total_messages += meta.get("messages", 0)
+            self.total_bytes += meta.get("bytes", 0)
+            self.connections += meta.get("connections", 0)
+            if self.reporter is not None:
+                for name, (frames, records, size, symbol) in meta.get("queues", {}).items():
+                    counters = self.reporter.queues[name] = QueueCounters()
+                    counters.frames, counters.records, counters.bytes = frames, records, size
+                    counters.last_symbol = symbol
+                    self.reporter.previous[name] = (frames, records, size)  # 第一次汇总不把恢复的计数算作速率
+            if self.resume is not None:
+                for name, seq in meta.get("committed", {}).items():
+                    self.resume.committed.setdefault(name, seq)
+            if self.record_decoder is not None and checkpoint.symbols:
+                self.record_decoder.table.restore(*checkpoint.symbols)
+                symbols = len(self.record_decoder.table)
+            if self.quote_book is not None:
+                from mq_quote_book import QUOTE_DTYPE
+                rows = checkpoint.quotes(QUOTE_DTYPE)
+                if rows is not None:
+                    quotes = self.quote_book.restore(rows)
+                    del rows
+                    self.quote_book.batches = meta.get("quote_book", {}).get("batches", 0)
+                    self.quote_book.updates = meta.get("quote_book", {}).get("updates", 0)
+        finally:
+            checkpoint.close()
+        print(f"[{datetime.now()}] ✓ 从检查点恢复 ({datetime.fromtimestamp(checkpoint.created)}): "
+              f"{meta.get('messages', 0)} 条消息, 符号表 {symbols} 只, 行情 {quotes} 只, "
+              f"耗时 {(time.perf_counter() - started) * 1000:.1f} ms")
+        return True
+    
+    def enable_admin(self, path):
+        """在Unix域套接字path上接受管理命令（分阶段计时、cProfile/tracemalloc窗口，客户端: python mq_profile.py PATH 命令）"""
+        self.admin = AdminServer(path, self.profiler)
+        print(f"[{datetime.now()}] ✓ 管理套接字: {path}")
+        return self.admin
+    
+    def print_banner(self, mode):
+        """打印启动信息"""
+        print("=" * 70)
+        print("MQ消息接收程序（宿主机端）")
+        print("=" * 70)
+        print(f"监听地址: {self.host}:{self.port}")
+        print(f"运行模式: {mode}")
+        print(f"等待虚拟机连接...")
+        print("=" * 70)
+        print()
     
     def start(self):
         """启动接收器"""
@@ -33,15 +340,13 @@ class MQReceiverHost:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.socket.bind((self.host, self.port))
+            self.port = self.socket.getsockname()[1]  # 端口为0时取系统分配的端口
             self.socket.listen(5)
             
-            print("=" * 70)
-            print("MQ消息接收程序（宿主机端）")
-            print("=" * 70)
-            print(f"监听地址: {self.host}:{self.port}")
-            print(f"等待虚拟机连接...")
-            print("=" * 70)
-            print()
+            if self.scheduler is None:
+                self.print_banner("同步（逐个连接处理）")
+            else:
+                self.print_banner("同步（每个连接一个读线程，按队列优先级调度）")
             
             self.running = True
             
@@ -52,8 +357,12 @@ class MQReceiverHost:
                     self.connections += 1
                     print(f"[{datetime.now()}] ✓ 收到新连接: {addr[0]}:{addr[1]} (总连接数: {self.connections})")
                     
-                    # 处理连接
-                    self.handle_connection(conn, addr)
+                    # 处理连接（启用优先级调度时每个连接一个读线程，多个发送端同时接收）
+                    if self.scheduler is None:
+                        self.handle_connection(conn, addr)
+                    else:
+                        threading.Thread(target=self.handle_connection, args=(conn, addr),
+                                         name=f'mq-conn-{addr[0]}:{addr[1]}', daemon=True).start()
                     
                 except OSError:
                     # 套接字关闭时退出
@@ -68,122 +377,391 @@ class MQReceiverHost:
         finally:
             self.stop()
     
-    def handle_connection(self, conn, addr):
-        """处理单个连接"""
+    def start_async(self):
+        """以asyncio模式启动接收器，多个发送端连接并发处理"""
+        try:
+            asyncio.run(self.serve_async())
+        except KeyboardInterrupt:
+            print("\n\n正在关闭接收器...")
+        except Exception as e:
+            print(f"\n✗ 启动失败: {e}")
+        finally:
+            self.stop()
+    
+    async def serve_async(self):
+        """创建asyncio服务器并持续接受连接"""
+        self.server = await asyncio.start_server(
+            self.handle_connection_async, self.host, self.port,
+            reuse_address=True, backlog=max(5, self.max_connections))
+        self.port = self.server.sockets[0].getsockname()[1]  # 端口为0时取系统分配的端口
+        
+        limit = self.max_connections if self.max_connections > 0 else "不限"
+        self.print_banner(f"异步并发（最大连接数: {limit}）")
+        
+        self.running = True
+        async with self.server:
+            await self.server.serve_forever()
+    
+    async def handle_connection_async(self, reader, writer):
+        """处理单个连接（异步模式，使用readexactly分帧）"""
+        addr = writer.get_extra_info('peername')[:2]
+        
+        if self.max_connections > 0 and self.active_connections >= self.max_connections:
+            print(f"[{datetime.now()}] ⚠ 连接数已达上限 ({self.max_connections})，拒绝连接: {addr[0]}:{addr[1]}")
+            writer.close()
+            return
+        
+        self.connections += 1
+        self.active_connections += 1
+        received = 0
+        print(f"[{datetime.now()}] ✓ 收到新连接: {addr[0]}:{addr[1]} "
+              f"(总连接数: {self.connections}, 活动连接: {self.active_connections})")
+        
+        protocol = PROTOCOL_V1
+        ack_window = None
+        ack_timer = None
+        loop = asyncio.get_running_loop()
+        
+        def flush_ack():
+            nonlocal ack_timer
+            ack_timer = None
+            if ack_window is not None and ack_window.pending and not writer.is_closing():
+                writer.write(ack_window.take())
+        
         try:
             while True:
-                # 读取消息长度（4字节，大端序）
-                length_data = self.recv_all(conn, 4)
-                if not length_data:
+                # 读取消息长度（4字节，大端序），v2帧后面跟4字节序号
+                header_size = 8 if protocol == PROTOCOL_V1 else 12
+                started = self.profiler.start()
+                try:
+                    header = await reader.readexactly(header_size)
+                except asyncio.IncompleteReadError:
                     break
                 
-                message_length = struct.unpack('>I', length_data)[0]
+                if protocol == PROTOCOL_V1:
+                    message_length, name_field = struct.unpack('>II', header)
+                    seq = None
+                else:
+                    message_length, seq, name_field = struct.unpack('>III', header)
+                flags, codec, queue_name_length = unpack_name_field(name_field)
+                json_length = message_length - header_size - queue_name_length
+                if json_length < 0:
+                    raise ValueError(f"消息长度非法: {message_length}")
                 
-                # 读取队列名称长度（4字节，大端序）
-                queue_name_length_data = self.recv_all(conn, 4)
-                if not queue_name_length_data:
-                    break
+                # 读取队列名称和JSON数据
+                queue_name = (await reader.readexactly(queue_name_length)).decode('utf-8')
+                json_data = await reader.readexactly(json_length)
+                flags, queue_seq, json_data = split_queue_seq(flags, json_data)
+                self.profiler.record('frame', started)
                 
-                queue_name_length = struct.unpack('>I', queue_name_length_data)[0]
+                # 握手帧：切换到v2窗口确认模式
+                if protocol == PROTOCOL_V1 and queue_name == HELLO_QUEUE:
+                    protocol, window, reply = self.accept_hello(json_data)
+                    if protocol == PROTOCOL_V2:
+                        ack_window = AckWindow(window)
+                        print(f"[{datetime.now()}] ✓ {addr[0]}:{addr[1]} 启用v2窗口确认协议 (窗口: {window})")
+                    writer.write(reply)
+                    await writer.drain()
+                    continue
                 
-                # 读取队列名称
-                queue_name_data = self.recv_all(conn, queue_name_length)
-                if not queue_name_data:
-                    break
+                if self.is_duplicate(queue_name, queue_seq):
+                    if ack_window is None:
+                        writer.write(ACK)
+                    elif ack_window.update(seq):
+                        flush_ack()
+                    elif ack_timer is None:
+                        ack_timer = loop.call_later(ACK_DELAY, flush_ack)
+                    await writer.drain()
+                    continue
                 
-                queue_name = queue_name_data.decode('utf-8')
+                if self.capture is not None:
+                    self.capture.append(queue_name, json_data, codec, flags)
+                if self.broker is not None:
+                    self.broker.publish_frame(queue_name, json_data, codec, flags)
                 
-                # 读取JSON数据
-                json_length = message_length - 4 - 4 - queue_name_length
-                json_data = self.recv_all(conn, json_length)
-                if not json_data:
+                # 解析并处理消息（启用优先级调度时只入队，队列满时在线程中等待，不阻塞事件循环）
+                # 续传序号在处理完成后才提交（调度线程中），入队的帧只登记为在途
+                if self.scheduler is None:
+                    self.process_message(queue_name, json_data, message_length, codec, flags)
+                    self.commit(queue_name, queue_seq)
+                else:
+                    self.begin(queue_name, queue_seq)
+                    if not self.scheduler.submit(queue_name, json_data, message_length, codec, flags,
+                                                 block=False, queue_seq=queue_seq):
+                        await asyncio.to_thread(self.scheduler.submit, queue_name, json_data, message_length,
+                                                codec, flags, queue_seq=queue_seq)
+                received += 1
+                
+                # 回复ACK（v1每帧一个，v2累积确认）
+                if ack_window is None:
+                    writer.write(ACK)
+                elif ack_window.update(seq):
+                    flush_ack()
+                elif ack_timer is None:
+                    ack_timer = loop.call_later(ACK_DELAY, flush_ack)
+                await writer.drain()
+                if self.resume is not None:
+                    self.resume.flush()
+            
+            if ack_timer is not None:
+                ack_timer.cancel()
+            flush_ack()
+                
+        except asyncio.IncompleteReadError:
+            print(f"[{datetime.now()}] ⚠ 连接中断，消息不完整: {addr[0]}:{addr[1]}")
+        except ChecksumError as e:
+            # 丢弃损坏的帧，发出已处理帧的累积确认后断开（关闭时先发送缓冲区中的数据）
+            self.report_corrupt_frame(addr, e)
+            if ack_timer is not None:
+                ack_timer.cancel()
+            flush_ack()
+        except Exception as e:
+            print(f"[{datetime.now()}] ✗ 处理连接时出错 ({addr[0]}:{addr[1]}): {e}")
+        finally:
+            self.active_connections -= 1
+            if self.resume is not None:
+                self.resume.flush(force=True)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            print(f"[{datetime.now()}] 连接已关闭: {addr[0]}:{addr[1]} (本连接收到 {received} 条消息)")
+            print()
+    
+    def handle_connection(self, conn, addr):
+        """处理单个连接"""
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # ACK是小包，禁用Nagle算法避免确认延迟
+        decoder = FrameDecoder()
+        ack_window = None
+        acks = 0
+        try:
+            # 每次recv_into可能带来多个完整帧，也可能只是半帧
+            while True:
+                started = self.profiler.start()
+                if not decoder.recv_into(conn):
                     break
+                for frame in decoder.frames():
+                    self.profiler.record('frame', started)
+                    started = 0  # 一次recv的耗时只记在第一帧上
+                    # 握手帧：切换到v2窗口确认模式
+                    if decoder.protocol == PROTOCOL_V1 and frame.queue_name == HELLO_QUEUE:
+                        decoder.protocol, window, reply = self.accept_hello(frame.body)
+                        if decoder.protocol == PROTOCOL_V2:
+                            ack_window = AckWindow(window)
+                            print(f"[{datetime.now()}] ✓ {addr[0]}:{addr[1]} 启用v2窗口确认协议 (窗口: {window})")
+                        conn.sendall(reply)
+                        continue
+                    
+                    if self.is_duplicate(frame.queue_name, frame.queue_seq):
+                        if ack_window is None:
+                            acks += 1
+                        elif ack_window.update(frame.seq):
+                            conn.sendall(ack_window.take())
+                        continue
+                    
+                    if self.capture is not None:
+                        self.capture.append(frame.queue_name, frame.body, frame.codec, frame.flags)
+                    if self.broker is not None:
+                        self.broker.publish_frame(frame.queue_name, frame.body, frame.codec, frame.flags)
+                    
+                    # 解析并处理消息（启用解码池或优先级调度时只提交，不等待处理完成；
+                    # 续传序号在处理完成后由处理线程提交，这里只登记为在途）
+                    if self.decode_pipeline is not None:
+                        self.begin(frame.queue_name, frame.queue_seq)
+                        self.decode_pipeline.submit(frame.queue_name, frame.body, frame.message_length,
+                                                    frame.codec, frame.flags, queue_seq=frame.queue_seq)
+                    elif self.scheduler is not None:
+                        self.begin(frame.queue_name, frame.queue_seq)
+                        self.scheduler.submit(frame.queue_name, bytes(frame.body), frame.message_length,
+                                              frame.codec, frame.flags, queue_seq=frame.queue_seq)
+                    else:
+                        self.process_message(frame.queue_name, frame.body, frame.message_length,
+                                             frame.codec, frame.flags)
+                        self.commit(frame.queue_name, frame.queue_seq)
+                    
+                    # v1每帧一个ACK；v2累积确认，攒够半个窗口立即发送
+                    if ack_window is None:
+                        acks += 1
+                    elif ack_window.update(frame.seq):
+                        conn.sendall(ack_window.take())
                 
-                # 解析并处理消息
-                self.process_message(queue_name, json_data, message_length)
+                # 缓冲区中的完整帧已处理完，下一次recv可能阻塞，先把ACK发出去
+                self.send_acks(conn, acks, ack_window)
+                acks = 0
+                if self.resume is not None:
+                    self.resume.flush()
                 
         except socket.timeout:
             print(f"[{datetime.now()}] ⚠ 接收超时: {addr[0]}:{addr[1]}")
+        except ChecksumError as e:
+            # 丢弃损坏的帧，确认同一批中已处理的帧后断开，发送端重连后从已提交序号续传
+            self.report_corrupt_frame(addr, e)
+            try:
+                self.send_acks(conn, acks, ack_window)
+            except OSError:
+                pass
         except Exception as e:
             print(f"[{datetime.now()}] ✗ 处理连接时出错 ({addr[0]}:{addr[1]}): {e}")
         finally:
             conn.close()
+            if self.resume is not None:
+                self.resume.flush(force=True)
             print(f"[{datetime.now()}] 连接已关闭: {addr[0]}:{addr[1]}")
             print()
     
-    def recv_all(self, sock, n):
-        """接收指定数量的字节"""
-        data = b''
-        while len(data) < n:
-            try:
-                chunk = sock.recv(n - len(data))
-                if not chunk:
-                    return None
-                data += chunk
-            except socket.timeout:
-                return None
-            except Exception:
-                return None
-        return data
+    def send_acks(self, conn, acks, ack_window):
+        """发送一次recv中已处理帧的确认：v1为acks个ACK，v2为尚未发送的累积确认"""
+        if acks:
+            conn.sendall(ACK * acks)
+        if ack_window is not None and ack_window.pending:
+            conn.sendall(ack_window.take())
+    
+    def report_corrupt_frame(self, addr, error):
+        """续传帧CRC不符：计数并提示将断开连接"""
+        if self.resume is not None:
+            self.resume.corrupted += 1
+        print(f"[{datetime.now()}] ⚠ {addr[0]}:{addr[1]} {error}，丢弃该帧并断开连接，发送端重连后从已提交序号续传")
     
-    def process_message(self, queue_name, json_data_bytes, message_length):
+    def process_message(self, queue_name, json_data_bytes, message_length, codec=CODEC_JSON, flags=0):
         """处理接收到的消息"""
         try:
-            # 解析JSON
-            json_str = json_data_bytes.decode('utf-8')
-            data = json.loads(json_str)
+            start = time.perf_counter_ns()
+            body = decompress_body(flags, json_data_bytes) if flags else json_data_bytes
+            # 大的日线JSON不整体解析，处理函数迭代records时才从缓冲区逐条解析（按解压后的大小判断）
+            if (codec == CODEC_JSON and self.stream_threshold and len(body) >= self.stream_threshold
+                    and get_queue_type(queue_name) in STREAM_QUEUE_TYPES):
+                data = None
+            else:
+                # 解析消息体（JSON或二进制列式格式）
+                data = decode_payload(codec, body)
+            decode_ns = time.perf_counter_ns() - start
+        except ValueError as e:
+            self.report_decode_error(queue_name, json_data_bytes, e)
+            return
+        
+        if data is None:
+            self.handle_message(queue_name, {"records": RecordStream(body)}, message_length)
+        else:
+            self.handle_message(queue_name, data, message_length, decode_ns)
+    
+    def handle_message(self, queue_name, data, message_length, decode_ns=None):
+        """处理解码后的消息：更新统计并显示"""
+        profiler = self.profiler
+        try:
+            if self.record_decoder is not None:
+                start = time.perf_counter_ns()
+                data = self.record_decoder.decode(get_queue_type(queue_name), data)
+                if decode_ns is not None:
+                    decode_ns += time.perf_counter_ns() - start
+            if decode_ns is not None:
+                profiler.add('decode', decode_ns)
             
-            # 更新统计
-            self.total_messages += 1
-            self.total_bytes += message_length
+            # 流式解析的消息先交给处理函数（边解析边处理），之后记录数才确定
+            streamed = isinstance(data, dict) and isinstance(data.get('records'), RecordStream)
+            if streamed:
+                started = profiler.start()
+                self.dispatch(queue_name, data)
+                profiler.record('dispatch', started)
             
-            # 获取记录数
-            record_count = 0
-            if isinstance(data, dict) and 'records' in data:
-                record_count = len(data['records'])
-            elif isinstance(data, list):
-                record_count = len(data)
+            if self.metrics is not None:
+                self.metrics.record_message(queue_name, data, message_length, decode_ns)
             
-            # 显示接收信息
-            print(f"[{datetime.now()}] ✓ 收到消息")
-            print(f"   队列名称: {queue_name}")
-            print(f"   记录数量: {record_count}")
-            print(f"   消息大小: {message_length} 字节")
+            # 更新统计；安静模式下只计数，由后台线程汇总输出，逐条详情按抽样显示
+            with self.stats_lock:
+                self.total_messages += 1
+                self.total_bytes += message_length
+                verbose = self.reporter is None or self.reporter.record(queue_name, data, message_length)
+            if verbose:
+                started = profiler.start()
+                self.print_message(queue_name, data, message_length)
+                profiler.record('output', started)
             
-            # 显示数据摘要
-            if record_count > 0:
-                if isinstance(data, dict) and 'records' in data:
-                    first_record = data['records'][0]
-                    print(f"   第一条记录: {self.format_record(first_record)}")
-                elif isinstance(data, list):
-                    print(f"   第一条记录: {self.format_record(data[0])}")
+            if not streamed:
+                started = profiler.start()
+                self.dispatch(queue_name, data)
+                profiler.record('dispatch', started)
             
-            # 显示统计信息
-            print(f"   累计接收: {self.total_messages} 条消息, {self.total_bytes} 字节")
-            print()
-            
-            # 如果是测试消息，显示详细信息
-            if isinstance(data, dict) and data.get('type') == 'test':
-                print("   [测试消息] 内容:")
-                for i, record in enumerate(data.get('records', [])[:3]):  # 只显示前3条
-                    print(f"      {i+1}. {record}")
-                if len(data.get('records', [])) > 3:
-                    print(f"      ... 还有 {len(data.get('records', [])) - 3} 条记录")
-                print()
+            if verbose:
+                started = profiler.start()
+                self.print_totals(data)
+                profiler.record('output', started)
             
-        except json.JSONDecodeError as e:
-            print(f"[{datetime.now()}] ✗ JSON解析失败: {e}")
-            print(f"   队列名称: {queue_name}")
-            print(f"   数据长度: {len(json_data_bytes)} 字节")
-            print(f"   数据预览: {json_data_bytes[:100]}...")
-            print()
         except Exception as e:
             print(f"[{datetime.now()}] ✗ 处理消息时出错: {e}")
             print()
     
+    def dispatch(self, queue_name, data):
+        """交给注册的处理函数"""
+        for handler in self.handlers.get(get_queue_type(queue_name), ()):
+            handler(queue_name, data)
+        if self.broker is not None:
+            self.broker.publish(queue_name, data)
+    
+    def print_message(self, queue_name, data, message_length):
+        """显示一条消息的详情"""
+        # 获取记录数
+        record_count = 0
+        if isinstance(data, dict) and 'records' in data:
+            record_count = len(data['records'])
+        elif isinstance(data, dict) and 'columns' in data:
+            record_count = data['count']
+        elif isinstance(data, list):
+            record_count = len(data)
+        
+        # 显示接收信息
+        print(f"[{datetime.now()}] ✓ 收到消息")
+        print(f"   队列名称: {queue_name}")
+        print(f"   记录数量: {record_count}")
+        print(f"   消息大小: {message_length} 字节")
+        
+        # 显示数据摘要
+        if record_count > 0:
+            if isinstance(data, dict) and 'records' in data:
+                first_record = data['records'][0]
+                print(f"   第一条记录: {self.format_record(first_record)}")
+            elif isinstance(data, dict) and 'columns' in data:
+                print(f"   第一条记录: {self.format_record(columnar_row(data['columns'], 0))}")
+            elif isinstance(data, list):
+                print(f"   第一条记录: {self.format_record(data[0])}")
+    
+    def print_totals(self, data):
+        """显示累计统计（以及测试消息的内容）"""
+        print(f"   累计接收: {self.total_messages} 条消息, {self.total_bytes} 字节")
+        if self.quote_book is not None:
+            print(f"   行情表: {len(self.quote_book)} 只股票")
+        if self.daily_store is not None:
+            print(f"   日线存储: 新增 {self.daily_store.inserted} 条, 覆盖 {self.daily_store.updated} 条, "
+                  f"{len(self.daily_store.symbols)} 只股票"
+                  + (f", 丢弃无效记录 {self.daily_store.invalid} 条" if self.daily_store.invalid else ""))
+        if self.minute_bars is not None:
+            print(f"   分钟K线: {len(self.minute_bars)} 只股票, 已收盘 {self.minute_bars.bars} 根")
+        if self.adjustment is not None:
+            print(f"   复权因子: {len(self.adjustment.symbols)} 只股票, {self.adjustment.events} 个除权事件")
+        print()
+        
+        # 如果是测试消息，显示详细信息
+        if isinstance(data, dict) and data.get('type') == 'test':
+            print("   [测试消息] 内容:")
+            for i, record in enumerate(data.get('records', [])[:3]):  # 只显示前3条
+                print(f"      {i+1}. {record}")
+            if len(data.get('records', [])) > 3:
+                print(f"      ... 还有 {len(data.get('records', [])) - 3} 条记录")
+            print()
+    
+    def report_decode_error(self, queue_name, json_data_bytes, error):
+        """显示消息解析失败信息"""
+        if self.metrics is not None:
+            self.metrics.record_error(queue_name)
+        print(f"[{datetime.now()}] ✗ 消息解析失败: {error}")
+        print(f"   队列名称: {queue_name}")
+        print(f"   数据长度: {len(json_data_bytes)} 字节")
+        print(f"   数据预览: {bytes(json_data_bytes[:100])}...")
+        print()
+    
     def format_record(self, record):
         """格式化记录显示"""
-        if isinstance(record, dict):
+        if isinstance(record, Mapping):
             # 显示前几个字段
             items = list(record.items())[:3]
             return ", ".join([f"{k}={v}" for k, v in items])
@@ -194,35 +772,202 @@ class MQReceiverHost:
         """停止接收器"""
         self.running = False
         if self.socket:
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)  # 从其他线程停止时唤醒阻塞在accept的线程
+            except OSError:
+                pass
             try:
                 self.socket.close()
             except:
                 pass
+        if self.server:
+            try:
+                self.server.close()
+            except:
+                pass
+        if self.decode_pipeline:
+            self.decode_pipeline.close()
+            self.decode_pipeline = None
+        scheduler = self.scheduler
+        if scheduler:
+            scheduler.close()
+        if self.metrics:
+            self.metrics.close()
+        if self.reporter:
+            self.reporter.close()
+        if self.minute_bars:
+            self.minute_bars.close()
+        shard_stats = self.shard_pool.close() if self.shard_pool else None
+        if self.broker:
+            self.broker.close()
+        if self.checkpointer:
+            self.checkpointer.close()  # 解码池/调度器已处理完在途消息，写入最后一次检查点
+        if hasattr(self.quote_book, 'close'):
+            self.quote_book.close()  # 共享内存行情表：标记关闭并删除段
+        capture = self.capture
+        if capture:
+            capture.close()
+            self.capture = None
+        if self.resume:
+            self.resume.flush(force=True)
+        if self.admin:
+            self.admin.close()
         
         print()
         print("=" * 70)
         print("接收器已关闭")
         print(f"总计接收: {self.total_messages} 条消息, {self.total_bytes} 字节")
         print(f"总计连接: {self.connections} 次")
+        if scheduler:
+            for lane in scheduler.stats():
+                wait = lane['wait']
+                print(f"调度队列 {lane['name']}: 处理 {lane['served']} 帧, 最大深度 {lane['max_depth']}, "
+                      f"等待 p50 {wait.quantile(0.5) / 1000:.1f} ms / p99 {wait.quantile(0.99) / 1000:.1f} ms / "
+                      f"最大 {wait.max / 1000:.1f} ms"
+                      + (f", 丢弃 {lane['dropped']} 帧" if lane['dropped'] else "")
+                      + (f", 读线程阻塞 {lane['blocked']} 次" if lane['blocked'] else ""))
+        if self.resume:
+            print(f"续传: 接收 {self.resume.accepted} 帧, 重复丢弃 {self.resume.duplicates} 帧"
+                  + (f", 序号跳跃 {self.resume.gaps} 次" if self.resume.gaps else "")
+                  + (f", CRC不符断开 {self.resume.corrupted} 次" if self.resume.corrupted else ""))
+        if self.checkpointer:
+            print(self.checkpointer.summary())
+        if self.profiler.timing:
+            print(self.profiler.report())
+        if self.record_decoder:
+            print(f"紧凑记录: 转换 {self.record_decoder.converted} 条消息, 符号表 {len(self.record_decoder.table)} 只股票"
+                  + (f", 字段不符未转换 {self.record_decoder.skipped} 条" if self.record_decoder.skipped else ""))
+        for stats in shard_stats or ():
+            if stats:
+                print(f"分片进程 #{stats['shard']}: {stats['batches']} 批, {stats['records']} 条, "
+                      f"处理耗时 {stats['busy']:.2f} 秒")
+        if capture:
+            print(f"抓包日志: {capture.frames} 帧, {capture.bytes} 字节, {capture.segments} 个段文件"
+                  + (f", 丢弃 {capture.dropped} 帧" if capture.dropped else ""))
         print("=" * 70)
 
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="MQ消息接收程序（宿主机端）")
+    parser.add_argument('port', nargs='?', type=int, default=5678, help="监听端口（默认5678）")
+    parser.add_argument('host', nargs='?', default='0.0.0.0', help="监听地址（默认0.0.0.0，监听所有网络接口）")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="使用asyncio并发模式，同时处理多个发送端连接")
+    parser.add_argument('--max-connections', type=int, default=16,
+                        help="异步模式下的最大并发连接数，0表示不限制（默认16）")
+    parser.add_argument('--ack-window', type=int, default=DEFAULT_WINDOW,
+                        help=f"v2协议允许的最大确认窗口（默认{DEFAULT_WINDOW}）")
+    parser.add_argument('--decode-workers', type=int, default=0,
+                        help="流水线解码的工作线程/进程数，0表示在读线程中直接解码（默认0，仅同步模式）")
+    parser.add_argument('--decode-pool', choices=POOL_KINDS, default='process',
+                        help="流水线解码池类型（默认process）")
+    parser.add_argument('--max-in-flight', type=int, default=64,
+                        help="流水线解码的最大在途消息数（默认64）")
+    parser.add_argument('--priority', action='store_true',
+                        help="按队列类型优先级调度：实时行情优先处理，其他队列按权重轮转（不能与 --decode-workers 同用）")
+    parser.add_argument('--capture', metavar='DIR',
+                        help="把收到的每个原始帧写入DIR下的抓包日志（用mq_replay.py回放）")
+    parser.add_argument('--capture-segment-mb', type=int, default=DEFAULT_SEGMENT_SIZE // (1024 * 1024),
+                        help=f"抓包段文件大小上限MB（默认{DEFAULT_SEGMENT_SIZE // (1024 * 1024)}）")
+    parser.add_argument('--quiet', action='store_true',
+                        help="安静模式：不逐条打印消息，定时为每个队列输出一行汇总")
+    parser.add_argument('--report-interval', type=float, default=DEFAULT_REPORT_INTERVAL,
+                        help=f"安静模式的汇总输出间隔秒数（默认{DEFAULT_REPORT_INTERVAL:g}）")
+    parser.add_argument('--sample', type=int, default=0, metavar='N',
+                        help="安静模式下每N帧仍显示一次消息详情（默认0不显示）")
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help="在本机该端口输出Prometheus格式的接收指标 /metrics（0表示不启用）")
+    parser.add_argument('--stream-threshold-mb', type=float, default=DEFAULT_STREAM_THRESHOLD / 1024 / 1024,
+                        help=f"日线JSON消息超过该大小（MB）时流式逐条解析，0表示总是整体解析"
+                             f"（默认{DEFAULT_STREAM_THRESHOLD // 1024 // 1024}，不适用于 --decode-workers）")
+    parser.add_argument('--quote-book', action='store_true',
+                        help="维护全市场最新行情表（由realtime_data_queue更新）")
+    parser.add_argument('--shm-quotes', metavar='NAME',
+                        help="把最新行情表放在该名称的共享内存段中，供本机其他进程读取（读端见mq_shm_quotes.py）")
+    parser.add_argument('--daily-store', metavar='DIR',
+                        help="把daily_data_queue的日线按市场/月份分区去重写入DIR（用mq_daily_store.py查询）")
+    parser.add_argument('--minute-bars', action='store_true',
+                        help="由realtime_data_queue的快照聚合1分钟K线，收盘后以minute_bar_queue交给处理函数/抓包/订阅者")
+    parser.add_argument('--bar-grace', type=float, default=2.0,
+                        help="分钟结束后再等待的秒数，容忍发送端时钟偏差（默认2）")
+    parser.add_argument('--shard-workers', type=int, default=0, metavar='N',
+                        help="把有状态的实时行情处理放到N个按股票代码分片的工作进程中（默认0不启用）")
+    parser.add_argument('--shard-handler', default='mq_shard_pool:minute_bar_handlers', metavar='MODULE:FUNC',
+                        help="分片进程中创建处理函数的工厂（默认每个进程一个1分钟K线聚合器）")
+    parser.add_argument('--compact-records', action='store_true',
+                        help="把JSON消息的记录转换为按列存放的紧凑表示，股票代码/名称由码表统一保存（节省内存）")
+    parser.add_argument('--resume-state', metavar='FILE',
+                        help="启用续传：各队列已提交的队列序号保存在FILE中，发送端重连后从断点续传（见mq_resume.py）")
+    parser.add_argument('--checkpoint', metavar='FILE',
+                        help="定时把符号表、最新行情表、累计统计和续传序号写入FILE，重启时从FILE恢复（见mq_checkpoint.py）")
+    parser.add_argument('--checkpoint-interval', type=float, default=DEFAULT_CHECKPOINT_INTERVAL,
+                        help=f"检查点间隔秒数（默认{DEFAULT_CHECKPOINT_INTERVAL:g}）")
+    parser.add_argument('--broker', metavar='PATH',
+                        help="在Unix域套接字PATH上把收到的数据转发给本机订阅者（订阅端见mq_broker.py）")
+    parser.add_argument('--adjust', action='store_true',
+                        help="由ex_rights_data_queue维护复权因子（与 --daily-store 同用时可读取复权日线）")
+    parser.add_argument('--admin', metavar='PATH',
+                        help="在Unix域套接字PATH上接受管理命令：分阶段计时、cProfile/tracemalloc窗口（见mq_profile.py）")
+    parser.add_argument('--profile-dir', default=DEFAULT_PROFILE_DIR, metavar='DIR',
+                        help=f"cProfile/tracemalloc报告的目录（默认{DEFAULT_PROFILE_DIR}）")
+    parser.add_argument('--profile-stages', action='store_true',
+                        help="启动时即开启分阶段计时（运行中可用 kill -USR1 切换，关闭时打印各阶段分位数）")
+    return parser.parse_args(argv)
+
 def main():
     """主函数"""
-    # 默认配置
-    host = '0.0.0.0'  # 监听所有网络接口
-    port = 5678
-    
-    # 解析命令行参数
-    if len(sys.argv) > 1:
-        port = int(sys.argv[1])
-    if len(sys.argv) > 2:
-        host = sys.argv[2]
+    args = parse_args()
     
     # 创建并启动接收器
-    receiver = MQReceiverHost(host, port)
+    receiver = MQReceiverHost(args.host, args.port, max_connections=args.max_connections,
+                              ack_window=args.ack_window)
+    receiver.stream_threshold = int(args.stream_threshold_mb * 1024 * 1024)
+    receiver.profiler.report_dir = args.profile_dir
+    receiver.profiler.install_signals()
+    if args.profile_stages:
+        receiver.profiler.set_timing(True)
+    if args.admin:
+        receiver.enable_admin(args.admin)
+    if args.compact_records:
+        receiver.enable_compact_records()
+    if args.resume_state:
+        receiver.enable_resume(args.resume_state)
+    if args.quiet:
+        receiver.enable_quiet(args.report_interval, args.sample)
+    if args.metrics_port:
+        receiver.enable_metrics(args.metrics_port)
+    if args.capture:
+        receiver.enable_capture(args.capture, args.capture_segment_mb * 1024 * 1024)
+    if args.quote_book or args.shm_quotes:
+        receiver.enable_quote_book(shm_name=args.shm_quotes)
+    if args.daily_store:
+        receiver.enable_daily_store(args.daily_store)
+    if args.adjust:
+        receiver.enable_adjustment()
+    if args.shard_workers > 0:
+        receiver.enable_shards(args.shard_workers, args.shard_handler)
+    elif args.minute_bars:
+        receiver.enable_minute_bars(args.bar_grace)
+    if args.broker:
+        receiver.enable_broker(args.broker)
+    if args.priority:
+        if args.decode_workers > 0:
+            print("⚠ 优先级调度已包含解码，忽略 --decode-workers")
+            args.decode_workers = 0
+        receiver.enable_priority()
+    if args.decode_workers > 0:
+        if args.use_async:
+            print("⚠ 异步模式不使用流水线解码，忽略 --decode-workers")
+        else:
+            receiver.enable_decode_pool(args.decode_workers, args.decode_pool, args.max_in_flight)
+    if args.checkpoint:
+        receiver.enable_checkpoint(args.checkpoint, args.checkpoint_interval)
     
     try:
-        receiver.start()
+        if args.use_async:
+            receiver.start_async()
+        else:
+            receiver.start()
     except KeyboardInterrupt:
         print("\n\n程序被用户中断")
     except Exception as e:
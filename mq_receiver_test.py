@@ -5,17 +5,38 @@ MQ消息接收测试工具
 用于验证虚拟机发送的消息是否成功到达宿主机
 """
 
+import argparse
 import socket
-import struct
-import json
-import sys
+import time
 from datetime import datetime
 
+from mq_capture import CaptureWriter
+from mq_codec import columnar_row, decode_payload
+from mq_json_stream import DEFAULT_STREAM_THRESHOLD, STREAM_QUEUE_TYPES, RecordStream
+from mq_profile import DEFAULT_PROFILE_DIR, AdminServer, StageProfiler
+from mq_protocol import (ACK, CODEC_JSON, DEFAULT_WINDOW, HELLO_QUEUE, PROTOCOL_V1, PROTOCOL_V2,
+                         AckWindow, FrameDecoder, accept_hello, decompress_body, get_queue_type)
+from mq_records import RecordDecoder
+from mq_reporter import DEFAULT_REPORT_INTERVAL, QuietReporter
+
 class MQReceiver:
-    def __init__(self, host='0.0.0.0', port=5678):
+    def __init__(self, host='0.0.0.0', port=5678, ack_window=DEFAULT_WINDOW, capture_dir=None, metrics_port=0,
+                 quiet=False, report_interval=DEFAULT_REPORT_INTERVAL, sample_every=0, compact=False,
+                 admin_path=None, profile_dir=DEFAULT_PROFILE_DIR):
         self.host = host
         self.port = port
+        self.ack_window = ack_window
         self.socket = None
+        self.capture = CaptureWriter(capture_dir) if capture_dir else None
+        self.reporter = QuietReporter(report_interval, sample_every) if quiet else None
+        self.record_decoder = RecordDecoder() if compact else None  # 按队列类型转换为紧凑记录
+        self.profiler = StageProfiler(profile_dir)  # 分阶段计时，kill -USR1 或管理套接字开启
+        self.admin = AdminServer(admin_path, self.profiler) if admin_path else None
+        self.metrics = None
+        if metrics_port:
+            from mq_metrics import ReceiverMetrics
+            self.metrics = ReceiverMetrics()
+            print(f"指标输出: http://127.0.0.1:{self.metrics.serve(metrics_port)}/metrics")
         self.stats = {
             'daily': {'count': 0, 'bytes': 0, 'last_time': None},
             'realtime': {'count': 0, 'bytes': 0, 'last_time': None},
@@ -44,51 +65,81 @@ class MQReceiver:
         except KeyboardInterrupt:
             print("\n正在关闭接收器...")
             self.print_statistics()
+            if self.profiler.timing:
+                print(self.profiler.report())
         except Exception as e:
             print(f"错误: {e}")
         finally:
             if self.socket:
                 self.socket.close()
+            if self.reporter:
+                self.reporter.close()
+            if self.admin:
+                self.admin.close()
+            if self.capture:
+                self.capture.close()
+                print(f"抓包日志: {self.capture.frames} 帧, {self.capture.bytes} 字节")
     
     def handle_connection(self, conn, addr):
         """处理单个连接"""
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # ACK是小包，禁用Nagle算法避免确认延迟
+        decoder = FrameDecoder()
+        ack_window = None
         try:
+            # 每次recv_into可能带来多个完整帧，也可能只是半帧
             while True:
-                # 读取消息长度（4字节）
-                length_data = self.recv_all(conn, 4)
-                if not length_data:
-                    break
-                
-                message_length = struct.unpack('>I', length_data)[0]
-                
-                # 读取队列名称长度（4字节）
-                queue_name_length_data = self.recv_all(conn, 4)
-                if not queue_name_length_data:
-                    break
-                
-                queue_name_length = struct.unpack('>I', queue_name_length_data)[0]
-                
-                # 读取队列名称
-                queue_name_data = self.recv_all(conn, queue_name_length)
-                if not queue_name_data:
-                    break
-                
-                queue_name = queue_name_data.decode('utf-8')
-                
-                # 读取JSON数据
-                json_length = message_length - 4 - 4 - queue_name_length
-                json_data = self.recv_all(conn, json_length)
-                if not json_data:
+                started = self.profiler.start()
+                if not decoder.recv_into(conn):
                     break
+                acks = 0
+                for frame in decoder.frames():
+                    self.profiler.record('frame', started)
+                    started = 0  # 一次recv的耗时只记在第一帧上
+                    # 握手帧：切换到v2窗口确认模式
+                    if decoder.protocol == PROTOCOL_V1 and frame.queue_name == HELLO_QUEUE:
+                        decoder.protocol, window, reply = accept_hello(frame.body, self.ack_window)
+                        if decoder.protocol == PROTOCOL_V2:
+                            ack_window = AckWindow(window)
+                            print(f"[{datetime.now()}] 启用v2窗口确认协议，窗口: {window}")
+                        conn.sendall(reply)
+                        continue
+                    
+                    if self.capture is not None:
+                        self.capture.append(frame.queue_name, frame.body, frame.codec, frame.flags)
+                    
+                    # 解析消息体（JSON或二进制列式格式，压缩帧先解压）
+                    try:
+                        start = time.perf_counter_ns()
+                        body = decompress_body(frame.flags, frame.body) if frame.flags else frame.body
+                        if (frame.codec == CODEC_JSON and len(body) >= DEFAULT_STREAM_THRESHOLD
+                                and get_queue_type(frame.queue_name) in STREAM_QUEUE_TYPES):
+                            # 大的日线消息不整体解析，统计和显示时从帧缓冲区逐条解析
+                            data = {"records": RecordStream(body)}
+                        else:
+                            data = decode_payload(frame.codec, body)
+                        decode_ns = time.perf_counter_ns() - start
+                        self.profiler.add('decode', decode_ns)
+                        if self.metrics is not None:
+                            self.metrics.record_message(frame.queue_name, data, frame.message_length, decode_ns)
+                        self.process_message(frame.queue_name, data, frame.message_length)
+                    except ValueError as e:
+                        if self.metrics is not None:
+                            self.metrics.record_error(frame.queue_name)
+                        print(f"[{datetime.now()}] 消息解析失败: {e}")
+                        print(f"队列名称: {frame.queue_name}")
+                        print(f"数据长度: {len(frame.body)}")
+                    
+                    # v1每帧一个ACK；v2累积确认，攒够半个窗口立即发送
+                    if ack_window is None:
+                        acks += 1
+                    elif ack_window.update(frame.seq):
+                        conn.sendall(ack_window.take())
                 
-                # 解析JSON
-                try:
-                    data = json.loads(json_data.decode('utf-8'))
-                    self.process_message(queue_name, data, message_length)
-                except json.JSONDecodeError as e:
-                    print(f"[{datetime.now()}] JSON解析失败: {e}")
-                    print(f"队列名称: {queue_name}")
-                    print(f"数据长度: {json_length}")
+                # 缓冲区中的完整帧已处理完，下一次recv可能阻塞，先把ACK发出去
+                if acks:
+                    conn.sendall(ACK * acks)
+                if ack_window is not None and ack_window.pending:
+                    conn.sendall(ack_window.take())
                 
         except Exception as e:
             print(f"[{datetime.now()}] 处理连接时出错: {e}")
@@ -96,35 +147,41 @@ class MQReceiver:
             conn.close()
             print(f"[{datetime.now()}] 连接已关闭: {addr[0]}:{addr[1]}")
     
-    def recv_all(self, sock, n):
-        """接收指定数量的字节"""
-        data = b''
-        while len(data) < n:
-            chunk = sock.recv(n - len(data))
-            if not chunk:
-                return None
-            data += chunk
-        return data
-    
     def process_message(self, queue_name, data, message_length):
         """处理接收到的消息"""
+        queue_type = self.get_queue_type(queue_name)
+        profiler = self.profiler
+        if self.record_decoder is not None:
+            started = profiler.start()
+            data = self.record_decoder.decode(queue_type, data)
+            profiler.record('decode', started)
+        
+        started = profiler.start()
         record_count = 0
         if 'records' in data:
             record_count = len(data['records'])
+        elif 'columns' in data:
+            record_count = data['count']
         
         # 更新统计
-        queue_type = self.get_queue_type(queue_name)
         if queue_type:
             self.stats[queue_type]['count'] += record_count
             self.stats[queue_type]['bytes'] += message_length
             self.stats[queue_type]['last_time'] = datetime.now()
             
+            # 安静模式下只计数，由后台线程汇总输出，逐条详情按抽样显示
+            verbose = self.reporter is None or self.reporter.record(queue_name, data, message_length)
+            profiler.record('dispatch', started)
+            if not verbose:
+                return
+            
             # 显示接收信息
+            started = profiler.start()
             print(f"[{datetime.now()}] ✓ 收到消息 | 队列: {queue_name} | 记录数: {record_count} | 大小: {message_length}字节")
             
             # 显示第一条记录的示例（可选）
-            if record_count > 0 and 'records' in data:
-                first_record = data['records'][0]
+            if record_count > 0:
+                first_record = data['records'][0] if 'records' in data else columnar_row(data['columns'], 0)
                 if queue_type == 'daily':
                     print(f"  示例: {first_record.get('stock_code', 'N/A')} | {first_record.get('trade_date', 'N/A')}")
                 elif queue_type == 'realtime':
@@ -133,20 +190,13 @@ class MQReceiver:
                     print(f"  示例: {first_record.get('stock_code', 'N/A')} | {first_record.get('stock_name', 'N/A')}")
             
             # 每100条记录显示一次统计
-            if self.stats[queue_type]['count'] % 100 == 0:
+            if self.reporter is None and self.stats[queue_type]['count'] % 100 == 0:
                 self.print_statistics()
+            profiler.record('output', started)
     
     def get_queue_type(self, queue_name):
         """根据队列名称判断数据类型"""
-        if 'daily' in queue_name:
-            return 'daily'
-        elif 'realtime' in queue_name:
-            return 'realtime'
-        elif 'ex_rights' in queue_name:
-            return 'ex_rights'
-        elif 'market_table' in queue_name or 'code_table' in queue_name:
-            return 'market_table'
-        return None
+        return get_queue_type(queue_name)
     
     def print_statistics(self):
         """打印统计信息"""
@@ -156,15 +206,28 @@ class MQReceiver:
             if stats['count'] > 0:
                 print(f"  {queue_type}: {stats['count']}条记录, {stats['bytes']}字节, "
                       f"最后接收: {stats['last_time']}")
+        if self.record_decoder is not None:
+            print(f"  紧凑记录: 符号表 {len(self.record_decoder.table)} 只股票")
         print("="*60 + "\n")
 
 if __name__ == '__main__':
     # 默认监听所有接口的5678端口
     host = '0.0.0.0'
-    port = 5678
-    
-    if len(sys.argv) > 1:
-        port = int(sys.argv[1])
+    parser = argparse.ArgumentParser(description="MQ消息接收测试工具")
+    parser.add_argument('port', nargs='?', type=int, default=5678, help="监听端口（默认5678）")
+    parser.add_argument('--capture', metavar='DIR', help="把收到的每个原始帧写入DIR下的抓包日志")
+    parser.add_argument('--quiet', action='store_true', help="安静模式：不逐条打印消息，定时输出每个队列的汇总")
+    parser.add_argument('--report-interval', type=float, default=DEFAULT_REPORT_INTERVAL, help="汇总输出间隔秒数")
+    parser.add_argument('--sample', type=int, default=0, metavar='N', help="安静模式下每N帧仍显示一次消息详情")
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help="在本机该端口输出Prometheus格式的接收指标 /metrics（0表示不启用）")
+    parser.add_argument('--compact', action='store_true',
+                        help="把记录转换为按列存放的紧凑表示，股票代码/名称由码表统一保存（见mq_records.py）")
+    parser.add_argument('--admin', metavar='PATH',
+                        help="在Unix域套接字PATH上接受管理命令：分阶段计时、cProfile/tracemalloc窗口（见mq_profile.py）")
+    parser.add_argument('--profile-dir', default=DEFAULT_PROFILE_DIR, metavar='DIR',
+                        help=f"cProfile/tracemalloc报告的目录（默认{DEFAULT_PROFILE_DIR}）")
+    args = parser.parse_args()
     
     print("="*60)
     print("MQ消息接收测试工具")
@@ -172,6 +235,9 @@ if __name__ == '__main__':
     print("="*60)
     print()
     
-    receiver = MQReceiver(host, port)
+    receiver = MQReceiver(host, args.port, capture_dir=args.capture, metrics_port=args.metrics_port,
+                          quiet=args.quiet, report_interval=args.report_interval, sample_every=args.sample,
+                          compact=args.compact, admin_path=args.admin, profile_dir=args.profile_dir)
+    receiver.profiler.install_signals()
     receiver.start()
 
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑的记录表示
+JSON解码得到的每条记录是一个dict：股票代码/名称、时间字符串和每个数值都是独立的Python对象，
+盘口的4个数组又各是一个list，一个全市场快照（5000多只股票）就要占近10MB。这里把一条消息的记录改为
+按列存放在 array.array 中的 RecordBatch:
+    股票代码/名称/市场  由 SymbolTable 统一保存（market_table_queue 的码表预先建立，新代码随到随分配），
+                        记录中只存4字节的编号
+    时间/日期字符串     每批中不同的取值只保存一份，记录中存编号
+    数值                按JSON原值存为double（整数字段存int64），可为null的字段用哨兵值表示
+按下标或迭代取出的是 __slots__ 的 CompactRecord（只引用批和行号），它是只读Mapping，支持 record.get(字段) /
+record[字段]，现有按dict读取记录的处理函数不用修改；需要真正的dict（如序列化）时用 to_dict() / to_dicts()。
+各队列类型的字段见 RECORD_FIELDS，按 mq_protocol.get_queue_type 的结果选择；字段与C#发送端不一致的消息
+（多出字段、类型不符）保持原样。列式格式的实时行情本来就按列存放，也保持原样。
+"""
+
+import sys
+import threading
+from array import array
+from collections.abc import Mapping
+
+from mq_json_stream import DEFAULT_CHUNK_RECORDS
+
+SYMBOL = 'symbol'   # stock_code / stock_name / market_code：存在SymbolTable中
+STRING = 's'        # 批内去重的字符串（时间、日期）
+FLOAT = 'd'
+INT = 'q'
+NULLABLE_INT = 'n'  # 可为null的整数（日线的涨跌家数）
+
+INT_NULL = -2 ** 63
+
+# 各队列类型的字段（与C#各发送端SerializeToJson的输出顺序一致）: (字段, 类型[, 每条记录的元素个数])
+RECORD_FIELDS = {
+    'realtime': [
+        ('stock_code', SYMBOL), ('stock_name', SYMBOL), ('market_code', SYMBOL),
+        ('update_time', STRING), ('time_stamp', INT),
+        ('last_close', FLOAT), ('open', FLOAT), ('high', FLOAT), ('low', FLOAT), ('new_price', FLOAT),
+        ('volume', FLOAT), ('amount', FLOAT),
+        ('buy_price', FLOAT, 5), ('buy_volume', FLOAT, 5), ('sell_price', FLOAT, 5), ('sell_volume', FLOAT, 5),
+    ],
+    'daily': [
+        ('stock_code', SYMBOL), ('market_code', SYMBOL),
+        ('trade_date', STRING), ('trade_datetime', STRING), ('time_stamp', INT),
+        ('open_price', FLOAT), ('high_price', FLOAT), ('low_price', FLOAT), ('close_price', FLOAT),
+        ('volume', FLOAT), ('amount', FLOAT),
+        ('advance_count', NULLABLE_INT), ('decline_count', NULLABLE_INT),
+    ],
+    'ex_rights': [
+        ('stock_code', SYMBOL), ('market_code', SYMBOL),
+        ('ex_rights_date', STRING), ('ex_rights_datetime', STRING), ('time_stamp', INT),
+        ('give_per_10_shares', FLOAT), ('pei_per_10_shares', FLOAT), ('pei_price', FLOAT),
+        ('profit_per_share', FLOAT),
+    ],
+    'market_table': [
+        ('stock_code', SYMBOL), ('stock_name', SYMBOL), ('market_code', SYMBOL),
+        ('update_time', STRING),
+    ],
+}
+
+# 队列类型 -> {字段: (类型, 元素个数)}，各批共用
+LAYOUTS = {queue_type: {field[0]: (field[1], field[2] if len(field) > 2 else 1) for field in fields}
+           for queue_type, fields in RECORD_FIELDS.items()}
+
+
+class SymbolTable:
+    """股票代码 -> 编号（从0开始连续分配），同时保存最新的名称和市场代码"""
+
+    def __init__(self):
+        self.index = {}
+        self.codes = []
+        self.names = []
+        self.markets = []
+        self.lock = threading.Lock()  # 优先级调度时两个调度线程可能同时分配
+
+    def __len__(self):
+        return len(self.codes)
+
+    def add(self, code):
+        """分配code的编号（已存在时返回原编号）"""
+        with self.lock:
+            symbol = self.index.get(code)
+            if symbol is None:
+                symbol = len(self.codes)
+                self.codes.append(sys.intern(code))
+                self.names.append(None)
+                self.markets.append(None)
+                self.index[self.codes[symbol]] = symbol
+            return symbol
+
+    def intern(self, codes, names=None, markets=None):
+        """
+        一批股票代码 -> 编号数组，新代码分配编号；names/markets中非null的值更新名称和市场代码
+        :param codes: 股票代码列表（必须是字符串）
+        """
+        index = self.index
+        symbols = [index.get(code) for code in codes]
+        for i, symbol in enumerate(symbols):
+            if symbol is None:
+                if not isinstance(codes[i], str):
+                    raise TypeError(f"股票代码不是字符串: {codes[i]!r}")
+                symbols[i] = self.add(codes[i])
+        for values, table in ((names, self.names), (markets, self.markets)):
+            if values is not None:
+                for symbol, value in zip(symbols, values):
+                    if value is not None and table[symbol] != value:
+                        table[symbol] = value
+        return array('I', symbols)
+
+    def restore(self, codes, names, markets):
+        """从检查点恢复（按编号顺序的全部代码/名称/市场代码），空表直接整体载入，保持原编号；否则按intern合并"""
+        with self.lock:
+            if not self.codes:
+                self.codes = [sys.intern(code) for code in codes]
+                self.names = list(names)
+                self.markets = list(markets)
+                self.index = {code: symbol for symbol, code in enumerate(self.codes)}
+                return
+        self.intern(codes, names, markets)
+
+    def id_of(self, code):
+        """股票代码 -> 编号，没有返回None"""
+        return self.index.get(code)
+
+    def on_market_table(self, queue_name, data):
+        """接收器的处理函数：按 market_table_queue 的码表预先分配编号、更新名称"""
+        records = data.get('records') if isinstance(data, dict) else None
+        if records and not isinstance(records, RecordBatch):  # 已转换的批在转换时就更新过
+            self.intern([r.get('stock_code') for r in records], [r.get('stock_name') for r in records],
+                        [r.get('market_code') for r in records])
+
+
+class RecordBatch:
+    """一条消息的记录，按列存放，按下标/迭代取出CompactRecord"""
+    __slots__ = ('queue_type', 'layout', 'table', 'count', 'symbols', 'columns', 'strings')
+
+    def __init__(self, queue_type, table):
+        self.queue_type = queue_type
+        self.layout = LAYOUTS[queue_type]
+        self.table = table
+        self.count = 0
+        self.symbols = array('I')
+        self.columns = {}   # 字段 -> array（SYMBOL字段不在这里）
+        self.strings = []   # 批内字符串取值，STRING字段存下标
+        for name, (kind, _) in self.layout.items():
+            if kind == STRING:
+                self.columns[name] = array('I')
+            elif kind != SYMBOL:
+                self.columns[name] = array(INT if kind == NULLABLE_INT else kind)
+
+    def extend(self, records):
+        """追加一批记录dict，字段不符时抛出 TypeError / ValueError（此时本批内容不完整，不应再使用）"""
+        count = len(records)
+        if not count:
+            return
+        layout = self.layout
+        if not all(r.keys() <= layout.keys() for r in records):
+            raise ValueError("记录中有未知字段")
+        self.symbols.extend(self.table.intern(
+            [r.get('stock_code') for r in records],
+            [r.get('stock_name') for r in records] if 'stock_name' in layout else None,
+            [r.get('market_code') for r in records]))
+        strings = {value: i for i, value in enumerate(self.strings)}
+        for name, (kind, width) in layout.items():
+            if kind == SYMBOL:
+                continue
+            values = [r.get(name) for r in records]
+            column = self.columns[name]
+            if kind == STRING:
+                column.extend([strings.setdefault(value, len(strings)) for value in values])
+            elif kind == NULLABLE_INT:
+                column.extend([INT_NULL if value is None else value for value in values])
+            elif width > 1:
+                flat = [x for value in values for x in value]
+                if len(flat) != count * width:
+                    raise ValueError(f"{name} 应为 {width} 个元素")
+                column.extend(flat)
+            else:
+                column.extend(values)  # null或类型不符时抛出TypeError
+        self.strings = list(strings)
+        self.count += count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [CompactRecord(self, row) for row in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("记录下标越界")
+        return CompactRecord(self, index)
+
+    def __iter__(self):
+        for row in range(self.count):
+            yield CompactRecord(self, row)
+
+    def value(self, row, name):
+        """第row条记录的字段值（与JSON解码的结果相同，数值字段为float）"""
+        kind, width = self.layout[name]
+        if kind == SYMBOL:
+            symbol = self.symbols[row]
+            if name == 'stock_code':
+                return self.table.codes[symbol]
+            return (self.table.names if name == 'stock_name' else self.table.markets)[symbol]
+        column = self.columns[name]
+        if kind == STRING:
+            return self.strings[column[row]]
+        if width > 1:
+            return column[row * width:(row + 1) * width].tolist()
+        value = column[row]
+        if kind == NULLABLE_INT and value == INT_NULL:
+            return None
+        return value
+
+    def values(self, name):
+        """一个字段全部记录的值（列表），比逐条get快"""
+        kind, width = self.layout[name]
+        if kind == SYMBOL:
+            table = self.table
+            source = table.codes if name == 'stock_code' else table.names if name == 'stock_name' else table.markets
+            return [source[symbol] for symbol in self.symbols]
+        column = self.columns[name]
+        if kind == STRING:
+            strings = self.strings
+            return [strings[i] for i in column]
+        if width > 1:
+            flat = column.tolist()
+            return [flat[i:i + width] for i in range(0, len(flat), width)]
+        if kind == NULLABLE_INT:
+            return [None if value == INT_NULL else value for value in column]
+        return column.tolist()
+
+    def to_dicts(self):
+        """还原为记录dict列表（序列化、转发时使用）"""
+        names = list(self.layout)
+        return [dict(zip(names, row)) for row in zip(*(self.values(name) for name in names))]
+
+
+class CompactRecord(Mapping):
+    """RecordBatch中的一条记录（只引用批和行号），按只读dict的方式读取字段"""
+    __slots__ = ('batch', 'row')
+
+    def __init__(self, batch, row):
+        self.batch = batch
+        self.row = row
+
+    def __getitem__(self, name):
+        return self.batch.value(self.row, name)
+
+    def get(self, name, default=None):
+        if name not in self.batch.layout:
+            return default
+        return self.batch.value(self.row, name)
+
+    def __iter__(self):
+        return iter(self.batch.layout)
+
+    def __len__(self):
+        return len(self.batch.layout)
+
+    def __contains__(self, name):
+        return name in self.batch.layout
+
+    @property
+    def symbol(self):
+        """股票代码在SymbolTable中的编号"""
+        return self.batch.symbols[self.row]
+
+    def to_dict(self):
+        return {name: self.batch.value(self.row, name) for name in self.batch.layout}
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+def field_values(records, name):
+    """一批记录（dict列表或RecordBatch）中一个字段的值列表"""
+    if isinstance(records, RecordBatch):
+        return records.values(name)
+    return [r.get(name) for r in records]
+
+
+class RecordDecoder:
+    """按队列类型把解码后的消息转换为紧凑表示"""
+
+    def __init__(self, table=None):
+        self.table = table if table is not None else SymbolTable()
+        self.converted = 0  # 转换的消息数
+        self.skipped = 0    # 字段不符保持原样的消息数
+
+    def decode(self, queue_type, data):
+        """
+        {"records": [...]} -> {"records": RecordBatch}（消息中的其他键保留）
+        没有对应字段定义的队列类型、列式数据和字段不符的消息原样返回
+        流式解析的大日线消息分块转换，不会一次展开全部dict
+        """
+        if queue_type not in RECORD_FIELDS or not isinstance(data, dict):
+            return data
+        records = data.get('records')
+        if not records or isinstance(records, RecordBatch):
+            return data
+        batch = RecordBatch(queue_type, self.table)
+        try:
+            for chunk in records.chunks(DEFAULT_CHUNK_RECORDS) if hasattr(records, 'chunks') else (records,):
+                batch.extend(chunk)
+        except (TypeError, ValueError, AttributeError):
+            self.skipped += 1
+            return data
+        self.converted += 1
+        return dict(data, records=batch)
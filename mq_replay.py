@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抓包日志回放工具
+用mmap读取接收端写下的抓包段文件（mq_receiver_host.py --capture DIR），
+按队列和时间范围过滤后，按原始节奏或尽可能快地把帧重新发送给接收端，
+不指定目标地址时只打印帧摘要。
+
+用法:
+    python mq_replay.py capture_dir                                  # 打印摘要
+    python mq_replay.py capture_dir --host 127.0.0.1 --port 5678     # 按原始节奏回放
+    python mq_replay.py capture_dir --host 127.0.0.1 --fast --queue realtime_data_queue \\
+        --start "2025-12-29 09:30:00" --end "2025-12-29 10:00:00"
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from mq_capture import iter_captured_frames
+from mq_protocol import DEFAULT_WINDOW, FLAG_ZLIB
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_time(value):
+    """把 'yyyy-mm-dd HH:MM:SS'（本地时间）转换为纳秒"""
+    if value is None:
+        return None
+    return int(datetime.strptime(value, TIME_FORMAT).timestamp() * 1_000_000_000)
+
+
+def paced(frames, speed=1.0):
+    """按抓包时的时间间隔（除以speed）依次产出帧"""
+    first_ts = None
+    start = None
+    for frame in frames:
+        if first_ts is None:
+            first_ts, start = frame.timestamp_ns, time.perf_counter()
+        else:
+            delay = (frame.timestamp_ns - first_ts) / 1e9 / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        yield frame
+
+
+def replay(directory, host=None, port=5678, queues=None, start_ns=None, end_ns=None, fast=False,
+           speed=1.0, window=DEFAULT_WINDOW, compression=False):
+    """
+    回放抓包日志，返回回放的帧数
+    抓包中的压缩帧原样发送；未协商压缩（或接收端不支持）时由发送端先解压
+    """
+    frames = iter_captured_frames(directory, queues, start_ns, end_ns)
+    if not fast:
+        frames = paced(frames, speed)
+
+    if host is None:
+        count = 0
+        for frame in frames:
+            count += 1
+            received = datetime.fromtimestamp(frame.timestamp_ns / 1e9)
+            compressed = " | zlib" if frame.flags & FLAG_ZLIB else ""
+            print(f"[{received}] {frame.queue_name} | codec {frame.codec}{compressed} | {len(frame.body)} 字节")
+        return count
+
+    from test_mq_send import MQTestSender
+
+    sender = MQTestSender(host, port)
+    if not sender.connect() or not sender.enable_pipelining(window, compression):
+        sender.close()
+        return 0
+    try:
+        return sender.send_pipelined((f.queue_name, f.body, f.codec, f.flags) for f in frames)
+    finally:
+        sender.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抓包日志回放工具")
+    parser.add_argument('directory', help="抓包段文件目录")
+    parser.add_argument('--host', help="回放目标地址，不指定则只打印帧摘要")
+    parser.add_argument('--port', type=int, default=5678, help="回放目标端口（默认5678）")
+    parser.add_argument('--queue', action='append', help="只回放指定队列，可重复指定")
+    parser.add_argument('--start', help="开始时间 'yyyy-mm-dd HH:MM:SS'")
+    parser.add_argument('--end', help="结束时间 'yyyy-mm-dd HH:MM:SS'")
+    parser.add_argument('--fast', action='store_true', help="尽可能快地回放（默认按原始节奏）")
+    parser.add_argument('--speed', type=float, default=1.0, help="按原始节奏回放时的倍速（默认1.0）")
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help="v2流水线窗口大小")
+    parser.add_argument('--compress', action='store_true', help="握手请求zlib压缩")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    count = replay(args.directory, args.host, args.port, args.queue, parse_time(args.start),
+                   parse_time(args.end), args.fast, args.speed, args.window, args.compress)
+    elapsed = time.perf_counter() - started
+    print(f"回放完成: {count} 帧, 耗时 {elapsed:.2f} 秒")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n回放已取消")
+        sys.exit(1)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+安静模式汇总输出
+高负载时逐条print会让stdout成为瓶颈并拖慢socket读取。安静模式下接收线程只累加计数，
+后台线程每隔interval秒为每个队列打印一行汇总（帧/秒、条/秒、MB/秒、最新股票代码），
+逐条详情只按 1/N 抽样输出。
+"""
+
+import threading
+from collections.abc import Mapping
+from datetime import datetime
+
+from mq_metrics import record_count
+
+DEFAULT_REPORT_INTERVAL = 5.0
+
+
+def last_symbol(data):
+    """消息中最后一条记录的股票代码"""
+    if isinstance(data, dict):
+        records = data.get('records')
+        if records and isinstance(records[-1], Mapping):
+            return records[-1].get('stock_code')
+        columns = data.get('columns')
+        if columns is not None and len(columns['stock_code']):
+            return str(columns['stock_code'][-1])
+    return None
+
+
+class QueueCounters:
+    """一个队列的累计计数（只由接收线程写入，汇总线程只读）"""
+    __slots__ = ('frames', 'records', 'bytes', 'last_symbol')
+
+    def __init__(self):
+        self.frames = 0
+        self.records = 0
+        self.bytes = 0
+        self.last_symbol = None
+
+
+class QuietReporter:
+    def __init__(self, interval=DEFAULT_REPORT_INTERVAL, sample_every=0):
+        """
+        :param interval: 汇总输出间隔（秒）
+        :param sample_every: 每N帧输出一次逐条详情（0表示不输出）
+        """
+        self.interval = interval
+        self.sample_every = sample_every
+        self.queues = {}  # 队列名称 -> QueueCounters
+        self.frames = 0
+        self.previous = {}  # 队列名称 -> 上次输出时的 (帧数, 记录数, 字节数)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='mq-reporter', daemon=True)
+        self.thread.start()
+
+    def record(self, queue_name, data, message_length):
+        """
+        累加一帧（热路径，只做计数）
+        :return: 这一帧是否被抽中输出详情
+        """
+        counters = self.queues.get(queue_name)
+        if counters is None:
+            counters = self.queues[queue_name] = QueueCounters()
+        counters.frames += 1
+        counters.records += record_count(data)
+        counters.bytes += message_length
+        symbol = last_symbol(data)
+        if symbol:
+            counters.last_symbol = symbol
+        self.frames += 1
+        return self.sample_every > 0 and self.frames % self.sample_every == 0
+
+    def run(self):
+        """后台汇总线程"""
+        last = datetime.now()
+        while not self.stopped.wait(self.interval):
+            now = datetime.now()
+            self.report(now, (now - last).total_seconds())
+            last = now
+
+    def report(self, now, elapsed):
+        """每个队列打印一行：上次输出以来的速率和累计值"""
+        for queue_name, counters in list(self.queues.items()):
+            frames, records, size = counters.frames, counters.records, counters.bytes
+            previous = self.previous.get(queue_name, (0, 0, 0))
+            self.previous[queue_name] = (frames, records, size)
+            if frames == previous[0]:
+                continue
+            print(f"[{now}] {queue_name:<22} | {(frames - previous[0]) / elapsed:8.1f} 帧/秒"
+                  f" | {(records - previous[1]) / elapsed:10.0f} 条/秒"
+                  f" | {(size - previous[2]) / elapsed / 1024 / 1024:7.2f} MB/秒"
+                  f" | 累计 {frames} 帧 {records} 条 | 最新: {counters.last_symbol or '-'}", flush=True)
+
+    def close(self):
+        """停止后台线程"""
+        self.stopped.set()
+        self.thread.join()
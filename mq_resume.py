@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+续传状态
+记录每个队列已提交（已处理完）的最大队列序号，握手时返回给请求续传的发送端（协议见 mq_protocol.py），
+发送端断线重连后只补发之后的帧，不必整批重发日线。
+
+启用解码池或优先级调度时，帧入队就回复ACK，但入队时只登记为在途（begin），处理完成后才提交（commit）；
+已提交序号是"该序号及之前登记过的帧都已处理完"的连续前缀，在途的帧不会被提交，接收端崩溃时
+仍在队列里的帧由发送端重发。ACK只表示发送端可以继续发送，提交才是续传的断点。
+
+状态保存在一个JSON文件中 {队列名称: 已提交序号}，先写临时文件再替换；
+为了不在每帧都写盘，至多每 flush_interval 秒写一次，连接关闭和接收器停止时立即写入。
+接收端崩溃时最多丢失最近一小段时间的提交，发送端会重发这部分帧（重复处理一次），不会漏数据。
+"""
+
+import json
+import os
+import threading
+import time
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+class ResumeState:
+    def __init__(self, path=None, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        """
+        :param path: 状态文件，None表示只保存在内存中（接收端重启后从0开始）
+        :param flush_interval: 两次写盘的最小间隔（秒）
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.committed = {}
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()  # 连接线程和处理线程都可能写状态文件
+        self.in_flight = {}     # 队列名称 -> {已入队未处理完的队列序号: 次数}
+        self.done = {}          # 队列名称 -> 已处理完的最大队列序号
+        self.latest = {}        # 队列名称 -> 已接收的最大队列序号
+        self.dirty = False
+        self.last_flush = 0.0
+        self.accepted = 0
+        self.duplicates = 0     # 不大于已提交序号、只确认不处理的帧
+        self.gaps = 0           # 序号跳跃（中间的帧没有收到）的次数
+        self.corrupted = 0      # CRC不符而丢弃（并断开连接）的帧
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.committed = {str(name): int(seq) for name, seq in json.load(f).items()}
+
+    def committed_for(self, queue_names):
+        """握手回复：{队列名称: 已提交序号}，没有记录的队列为0"""
+        with self.lock:
+            return {name: self.committed.get(name, 0) for name in queue_names}
+
+    def check(self, queue_name, queue_seq):
+        """新帧返回True；重复帧返回False。序号跳跃时计数并照常接收"""
+        with self.lock:
+            committed = self.committed.get(queue_name, 0)
+            if queue_seq <= committed:
+                self.duplicates += 1
+                return False
+            # 与已接收的最大序号比较（在途的帧尚未提交）
+            if queue_seq > max(committed, self.latest.get(queue_name, 0)) + 1:
+                self.gaps += 1
+            self.latest[queue_name] = max(self.latest.get(queue_name, 0), queue_seq)
+            self.accepted += 1
+            return True
+
+    def begin(self, queue_name, queue_seq):
+        """该帧已入队（解码池/优先级调度），处理完成前已提交序号不会越过它"""
+        with self.lock:
+            pending = self.in_flight.setdefault(queue_name, {})
+            pending[queue_seq] = pending.get(queue_seq, 0) + 1
+
+    def commit(self, queue_name, queue_seq):
+        """该帧已处理完：已提交序号推进到在途的最小序号之前（没有在途的帧时推进到已处理的最大序号）"""
+        with self.lock:
+            pending = self.in_flight.get(queue_name)
+            if pending and queue_seq in pending:
+                if pending[queue_seq] > 1:
+                    pending[queue_seq] -= 1
+                else:
+                    del pending[queue_seq]
+            done = self.done[queue_name] = max(self.done.get(queue_name, 0), queue_seq)
+            if pending:
+                done = min(done, min(pending) - 1)
+            if done > self.committed.get(queue_name, 0):
+                self.committed[queue_name] = done
+                self.dirty = True
+
+    def flush(self, force=False):
+        """把已提交序号写入状态文件（没有变化或距上次写入不到flush_interval秒时跳过，force时立即写）"""
+        if self.path is None or not self.dirty:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_flush < self.flush_interval:
+            return
+        with self.write_lock:
+            with self.lock:
+                committed = dict(self.committed)
+                self.dirty = False
+                self.last_flush = now
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(committed, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
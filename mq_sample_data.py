@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模拟行情数据生成
+字段与C#各发送端的SerializeToJson输出一致，用于发送测试和性能测试
+"""
+
+import json
+import random
+from datetime import datetime, timedelta
+
+NAME_CHARS = "中国平安招商银行浦发万科科技电子医药能源汽车材料证券保险地产电力"
+
+
+def make_stock_codes(count):
+    """生成股票代码列表，沪市600000起、深市000001起交替"""
+    codes = []
+    for i in range(count):
+        if i % 2 == 0:
+            codes.append((f"SH{600000 + i // 2:06d}", 1))
+        else:
+            codes.append((f"SZ{1 + i // 2:06d}", 0))
+    return codes
+
+
+def make_stock_name(rng):
+    """生成4个汉字的股票名称"""
+    return "".join(rng.choice(NAME_CHARS) for _ in range(4))
+
+
+def make_realtime_records(count, seed=0, update_time=None):
+    """生成实时行情记录（RealTimeDataMQSender格式）"""
+    rng = random.Random(seed)
+    update_time = update_time or datetime.now()
+    update_time_str = update_time.strftime('%Y-%m-%d %H:%M:%S')
+    time_stamp = int(update_time.timestamp())
+
+    records = []
+    for stock_code, market_code in make_stock_codes(count):
+        last_close = round(rng.uniform(3, 200), 2)
+        new_price = round(last_close * rng.uniform(0.9, 1.1), 2)
+        tick = 0.01
+        records.append({
+            "stock_code": stock_code,
+            "stock_name": make_stock_name(rng),
+            "market_code": market_code,
+            "update_time": update_time_str,
+            "time_stamp": time_stamp,
+            "last_close": last_close,
+            "open": round(last_close * rng.uniform(0.97, 1.03), 2),
+            "high": round(max(new_price, last_close) * rng.uniform(1.0, 1.05), 2),
+            "low": round(min(new_price, last_close) * rng.uniform(0.95, 1.0), 2),
+            "new_price": new_price,
+            "volume": float(rng.randint(1000, 5000000)),
+            "amount": float(rng.randint(100000, 900000000)),
+            "buy_price": [round(new_price - tick * (i + 1), 2) for i in range(5)],
+            "buy_volume": [float(rng.randint(1, 5000)) for _ in range(5)],
+            "sell_price": [round(new_price + tick * (i + 1), 2) for i in range(5)],
+            "sell_volume": [float(rng.randint(1, 5000)) for _ in range(5)],
+        })
+    return records
+
+
+def to_json_payload(records):
+    """序列化为C#发送端使用的 {"records":[...]} 格式"""
+    return json.dumps({"records": records}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def make_daily_records(symbols, days, seed=0, start_date=None):
+    """生成日线记录（DailyDataMQSender格式），symbols只股票 x days个交易日"""
+    rng = random.Random(seed)
+    start_date = start_date or datetime(2024, 1, 2)
+    dates = []
+    day = start_date
+    while len(dates) < days:
+        if day.weekday() < 5:
+            dates.append(day)
+        day += timedelta(days=1)
+
+    records = []
+    for stock_code, market_code in make_stock_codes(symbols):
+        close_price = rng.uniform(3, 200)
+        # C#端只有涨跌家数大于0时才输出数值（一般是指数），否则为null
+        has_breadth = rng.random() < 0.02
+        for trade_date in dates:
+            open_price = close_price * rng.uniform(0.97, 1.03)
+            close_price = close_price * rng.uniform(0.95, 1.05)
+            high_price = max(open_price, close_price) * rng.uniform(1.0, 1.03)
+            low_price = min(open_price, close_price) * rng.uniform(0.97, 1.0)
+            records.append({
+                "stock_code": stock_code,
+                "market_code": market_code,
+                "trade_date": trade_date.strftime('%Y-%m-%d'),
+                "trade_datetime": trade_date.strftime('%Y-%m-%d 00:00:00'),
+                "time_stamp": int(trade_date.timestamp()),
+                "open_price": round(open_price, 2),
+                "high_price": round(high_price, 2),
+                "low_price": round(low_price, 2),
+                "close_price": round(close_price, 2),
+                "volume": float(rng.randint(10000, 50000000)),
+                "amount": float(rng.randint(1000000, 900000000)),
+                "advance_count": rng.randint(1, 3000) if has_breadth else None,
+                "decline_count": rng.randint(1, 3000) if has_breadth else None,
+            })
+    return records
+
+
+def make_ex_rights_records(count, seed=0, ex_rights_date=None):
+    """生成除权记录（ExRightsDataMQSender格式）"""
+    rng = random.Random(seed)
+    ex_rights_date = ex_rights_date or datetime(2024, 6, 14)
+    records = []
+    for stock_code, market_code in make_stock_codes(count):
+        records.append({
+            "stock_code": stock_code,
+            "market_code": market_code,
+            "ex_rights_date": ex_rights_date.strftime('%Y-%m-%d'),
+            "ex_rights_datetime": ex_rights_date.strftime('%Y-%m-%d 00:00:00'),
+            "time_stamp": int(ex_rights_date.timestamp()),
+            "give_per_10_shares": rng.choice([0.0, 0.0, 2.0, 3.0, 5.0]),
+            "pei_per_10_shares": rng.choice([0.0, 0.0, 0.0, 1.0]),
+            "pei_price": rng.choice([0.0, 0.0, 0.0, 8.5]),
+            "profit_per_share": round(rng.uniform(0, 1.5), 3),
+        })
+    return records
+
+
+def make_market_table_records(count, seed=0, update_time=None):
+    """生成码表记录（MarketTableDataMQSender格式）"""
+    rng = random.Random(seed)
+    update_time_str = (update_time or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+    return [{
+        "stock_code": stock_code,
+        "stock_name": make_stock_name(rng),
+        "market_code": market_code,
+        "update_time": update_time_str,
+    } for stock_code, market_code in make_stock_codes(count)]
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按队列类型的优先级调度
+读线程（或asyncio连接协程）只把帧放进按队列类型划分的有界队列，由两个调度线程解码并交给处理函数，
+大批日线同步时实时行情不再排在日线后面串行处理:
+    realtime    最高优先级，有专用的调度线程；队列满时丢弃最旧的帧（新快照会覆盖旧快照）
+    其他类型    market_table / ex_rights / daily（以及无法识别的队列）由另一个调度线程按权重轮转
+                （平滑加权轮询），只在实时队列为空时才开始处理下一帧；队列满时读线程阻塞，
+                压力通过TCP窗口传回发送端
+同一类型的帧按到达顺序逐个处理；实时行情和其他类型的处理函数可能在两个线程中同时执行。
+Python代码之间靠GIL切换（默认5毫秒）让出，超过流式解析阈值的日线边解析边处理，不会长时间占住GIL。
+
+每个队列记录深度、等待时间（入队到开始处理）直方图、丢弃帧数和读线程阻塞次数。
+"""
+
+import threading
+import time
+from collections import deque
+
+from mq_metrics import Histogram
+from mq_protocol import CODEC_JSON, get_queue_type
+
+PRIORITY_LANE = 'realtime'
+OTHER_LANE = 'other'    # 无法识别类型的队列
+DEFAULT_WEIGHTS = {'market_table': 4, 'ex_rights': 2, 'daily': 1, OTHER_LANE: 1}
+DEFAULT_CAPACITIES = {PRIORITY_LANE: 1024}
+DEFAULT_CAPACITY = 16   # 其他类型的队列容量（帧），日线单帧可能有几十MB
+
+
+class Lane:
+    """一个队列类型的有界队列及其统计"""
+
+    def __init__(self, name, capacity, weight):
+        self.name = name
+        self.capacity = capacity
+        self.weight = weight
+        self.current = 0    # 平滑加权轮询的当前权重
+        self.items = deque()
+        self.enqueued = 0
+        self.served = 0
+        self.dropped = 0    # 队列满时丢弃的最旧帧（只有实时队列）
+        self.blocked = 0    # 队列满时读线程阻塞等待的次数
+        self.max_depth = 0
+        self.wait = Histogram()  # 等待时间（微秒）
+
+
+class PriorityScheduler:
+    def __init__(self, process, capacities=None, weights=None, on_done=None):
+        """
+        :param process: 处理函数 process(queue_name, body, message_length, codec, flags)，在调度线程中调用
+        :param capacities: {队列类型: 容量（帧）}，未指定的类型为DEFAULT_CAPACITY
+        :param weights: {队列类型: 权重}，realtime不参与轮转
+        :param on_done: 带队列序号的帧处理完（或被丢弃）后调用 on_done(queue_name, queue_seq)，用于续传提交
+        """
+        self.process = process
+        self.on_done = on_done
+        self.capacities = dict(DEFAULT_CAPACITIES, **(capacities or {}))
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.lanes = {}     # 队列类型 -> Lane
+        self.cond = threading.Condition()
+        self.closed = False
+        self.threads = [
+            threading.Thread(target=self.run, args=(True,), name='mq-sched-realtime', daemon=True),
+            threading.Thread(target=self.run, args=(False,), name='mq-sched-bulk', daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def lane(self, name):
+        """获取队列类型对应的Lane，第一次出现时创建（调用方持有self.cond）"""
+        lane = self.lanes.get(name)
+        if lane is None:
+            lane = self.lanes[name] = Lane(name, self.capacities.get(name, DEFAULT_CAPACITY),
+                                           self.weights.get(name, 1))
+        return lane
+
+    def submit(self, queue_name, body, message_length, codec=CODEC_JSON, flags=0, block=True, queue_seq=None):
+        """
+        放入队列类型对应的有界队列（body须为bytes，调度线程处理时才解码）
+        实时队列满时丢弃最旧的帧；其他队列满时阻塞等待，block=False时不等待直接返回False
+        （asyncio连接协程据此改到线程中等待，不阻塞事件循环）
+        :param queue_seq: 续传的队列序号，处理完后交给on_done
+        """
+        item = (time.perf_counter_ns(), queue_name, body, message_length, codec, flags, queue_seq)
+        dropped = None
+        with self.cond:
+            lane = self.lane(get_queue_type(queue_name) or OTHER_LANE)
+            if len(lane.items) >= lane.capacity:
+                if lane.name == PRIORITY_LANE:
+                    dropped = lane.items.popleft()
+                    lane.dropped += 1
+                elif not block:
+                    return False
+                else:
+                    lane.blocked += 1
+                    while len(lane.items) >= lane.capacity and not self.closed:
+                        self.cond.wait()
+            lane.items.append(item)
+            lane.enqueued += 1
+            lane.max_depth = max(lane.max_depth, len(lane.items))
+            self.cond.notify_all()
+        if dropped is not None:
+            self.done(dropped[1], dropped[6])  # 丢弃的旧快照不再处理，视为完成
+        return True
+
+    def done(self, queue_name, queue_seq):
+        """带队列序号的帧处理完或被丢弃，交给on_done提交"""
+        if queue_seq is not None and self.on_done is not None:
+            self.on_done(queue_name, queue_seq)
+
+    def next_lane(self, priority):
+        """选出下一帧所在的Lane，没有可处理的返回None（调用方持有self.cond）"""
+        realtime = self.lanes.get(PRIORITY_LANE)
+        realtime_ready = realtime is not None and len(realtime.items) > 0
+        if priority:
+            return realtime if realtime_ready else None
+        if realtime_ready:
+            return None  # 实时队列有积压时不开始其他队列的下一帧
+        ready = [lane for lane in self.lanes.values() if lane.name != PRIORITY_LANE and lane.items]
+        if not ready:
+            return None
+        # 平滑加权轮询：权重为4:2:1时的顺序为 a a b a c a b ...，不会连续很长一段只服务一个队列
+        total = 0
+        for lane in ready:
+            lane.current += lane.weight
+            total += lane.weight
+        best = max(ready, key=lambda lane: lane.current)
+        best.current -= total
+        return best
+
+    def pending(self, priority):
+        """该调度线程负责的队列中是否还有帧（调用方持有self.cond）"""
+        return any(lane.items for lane in self.lanes.values() if (lane.name == PRIORITY_LANE) == priority)
+
+    def run(self, priority):
+        """调度线程：priority为True时只处理实时队列，否则按权重处理其他队列"""
+        while True:
+            with self.cond:
+                lane = self.next_lane(priority)
+                while lane is None:
+                    if self.closed and not self.pending(priority):
+                        return
+                    self.cond.wait()
+                    lane = self.next_lane(priority)
+                enqueued_ns, queue_name, body, message_length, codec, flags, queue_seq = lane.items.popleft()
+                lane.served += 1
+                lane.wait.record((time.perf_counter_ns() - enqueued_ns) // 1000)
+                self.cond.notify_all()  # 唤醒阻塞的读线程，以及等待实时队列清空的调度线程
+            try:
+                self.process(queue_name, body, message_length, codec, flags)
+            finally:
+                self.done(queue_name, queue_seq)
+
+    def stats(self):
+        """
+        各队列统计的副本，每个队列一个dict:
+        name, depth, max_depth, enqueued, served, dropped, blocked, wait（等待时间直方图，微秒）
+        """
+        with self.cond:
+            result = []
+            for lane in self.lanes.values():
+                wait = Histogram()
+                wait.merge(lane.wait)
+                result.append({'name': lane.name, 'depth': len(lane.items), 'max_depth': lane.max_depth,
+                               'enqueued': lane.enqueued, 'served': lane.served, 'dropped': lane.dropped,
+                               'blocked': lane.blocked, 'wait': wait})
+            return result
+
+    def close(self):
+        """处理完已入队的帧后停止调度线程"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
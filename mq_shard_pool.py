@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按股票代码分片的多进程处理
+每批实时行情按 stock_code 的稳定哈希（FNV-1a）分成N份，交给N个工作进程，同一只股票总是由同一个
+进程处理，它的状态（分钟K线、盘口分析等）只存在于这个进程中，可以用满多个CPU核。
+
+数据不经过pickle：每个工作进程有一段共享内存环形缓冲区，接收端把本分片的行按列连续写入缓冲区，
+通过管道只发送描述（队列名称、位置、各列的类型和偏移）；工作进程直接在共享内存上构造NumPy数组，
+以列式消息 {"count": N, "columns": {...}} 交给处理函数，处理完后回报已用完的位置，接收端复用这段空间。
+缓冲区满时接收端等待（压力传回读线程）。
+
+顺序：接收端在一个线程中按到达顺序分发，分片时稳定排序，每个进程的缓冲区先进先出，
+所以同一只股票的快照按到达顺序处理。
+
+处理函数在工作进程中由工厂函数创建: factory(shard, shards, emit) -> {队列类型: 处理函数}
+    emit(queue_name, data) 把结果（如收盘的K线）发回接收端，由接收端的 on_emit 处理；
+    处理函数所属对象有close()时在工作进程退出前调用。
+    factory 可以是可导入的函数，或 "模块:函数" 字符串（命令行使用）。
+处理函数收到的列只在调用期间有效（之后缓冲区会被覆盖），需要保留请复制。
+"""
+
+import importlib
+import os
+import threading
+import time
+from multiprocessing import get_context, shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from mq_protocol import get_queue_type
+from mq_quote_book import records_to_columns
+from mq_shm_quotes import attach
+
+DEFAULT_BUFFER_SIZE = 32 * 1024 * 1024  # 每个工作进程的环形缓冲区
+BLOCK_ALIGN = 64
+COLUMN_ALIGN = 8
+
+FNV_OFFSET = np.uint32(2166136261)
+FNV_PRIME = np.uint32(16777619)
+
+
+def align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+
+def shard_of(codes, shards):
+    """
+    股票代码 -> 分片号（按UCS4码点做FNV-1a，与进程和Python的hash随机化无关）
+    :param codes: 字符串数组（numpy U类型）或列表
+    """
+    codes = np.ascontiguousarray(codes)
+    if codes.dtype.kind != 'U':
+        codes = codes.astype('U')
+    points = codes.view('<u4').reshape(len(codes), -1) if len(codes) else np.zeros((0, 1), dtype='<u4')
+    h = np.full(len(codes), FNV_OFFSET, dtype=np.uint32)
+    for j in range(points.shape[1]):
+        column = points[:, j]
+        # 定长数组尾部补0，跳过补位，使同一代码在不同宽度的数组中得到相同结果
+        h = np.where(column != 0, (h ^ column) * FNV_PRIME, h)
+    return (h % np.uint32(shards)).astype(np.intp)
+
+
+def load_factory(factory):
+    """'模块:函数' 字符串 -> 函数"""
+    if callable(factory):
+        return factory
+    module_name, _, name = factory.partition(':')
+    return getattr(importlib.import_module(module_name), name)
+
+
+def minute_bar_handlers(shard, shards, emit):
+    """默认工厂：每个工作进程一个1分钟K线聚合器，收盘的K线发回接收端"""
+    from mq_minute_bars import MinuteBarAggregator
+    aggregator = MinuteBarAggregator(on_bars=emit)
+    aggregator.start()
+    return {'realtime': aggregator.on_message}
+
+
+def worker_main(shard, shards, factory, shm_name, inbox, outbox):
+    """工作进程：按描述从共享内存取出列，交给处理函数，回报已用完的位置"""
+    shm = attach(shm_name)
+    size = shm.size
+    send_lock = threading.Lock()  # 处理函数的后台线程（如K线收盘定时器）也会调用emit
+
+    def emit(queue_name, data):
+        with send_lock:
+            outbox.send(('emit', queue_name, data))
+
+    handlers = load_factory(factory)(shard, shards, emit)
+    batches = records = 0
+    busy = 0.0
+    while True:
+        try:
+            message = inbox.recv()
+        except EOFError:  # 接收端已退出
+            break
+        if message is None:
+            break
+        queue_name, start, end, count, layout = message
+        started = time.perf_counter()
+        offset = start % size
+        columns = {name: np.ndarray((count,) + shape, dtype=dtype, buffer=shm.buf, offset=offset + column_offset)
+                   for name, dtype, shape, column_offset in layout}
+        handler = handlers.get(get_queue_type(queue_name))
+        try:
+            if handler is not None:
+                handler(queue_name, {"count": count, "columns": columns})
+        except Exception as e:
+            print(f"✗ 分片进程 #{shard} 处理 {queue_name} 时出错: {e}")
+        del columns
+        busy += time.perf_counter() - started
+        batches += 1
+        records += count
+        with send_lock:
+            outbox.send(('done', end))
+
+    for owner in {getattr(handler, '__self__', None) for handler in handlers.values()}:
+        close = getattr(owner, 'close', None)
+        if close is not None:
+            close()
+    with send_lock:
+        outbox.send(('stats', {'shard': shard, 'pid': os.getpid(), 'batches': batches, 'records': records,
+                               'busy': busy}))
+    shm.close()
+
+
+class ShardWorker:
+    """接收端一侧的一个工作进程：环形缓冲区的写入位置和已用完的位置"""
+
+    def __init__(self, shard, shm, process, inbox, outbox):
+        self.shard = shard
+        self.shm = shm
+        self.size = shm.size
+        self.process = process
+        self.inbox = inbox      # 接收端 -> 工作进程（描述）
+        self.outbox = outbox    # 工作进程 -> 接收端（done/emit/stats）
+        self.head = 0           # 已写入的总字节数（单调递增，含回绕跳过的尾部）
+        self.tail = 0           # 工作进程已用完的位置
+        self.batches = 0
+        self.waits = 0          # 缓冲区满而等待的次数
+        self.stats = None
+
+
+class ShardPool:
+    def __init__(self, workers, factory=minute_bar_handlers, buffer_size=DEFAULT_BUFFER_SIZE, on_emit=None):
+        """
+        :param workers: 工作进程数
+        :param factory: 处理函数工厂（见模块说明）
+        :param buffer_size: 每个工作进程的共享内存缓冲区大小
+        :param on_emit: on_emit(queue_name, data) 接收工作进程发回的结果（在收集线程中调用）
+        """
+        self.on_emit = on_emit
+        self.cond = threading.Condition()
+        self.closed = False
+        self.records = 0
+        context = get_context('spawn')  # 接收端有多个线程，不用fork
+        self.workers = []
+        for shard in range(workers):
+            shm = shared_memory.SharedMemory(create=True, size=buffer_size)
+            inbox_reader, inbox_writer = context.Pipe(duplex=False)
+            outbox_reader, outbox_writer = context.Pipe(duplex=False)
+            process = context.Process(target=worker_main, name=f'mq-shard-{shard}', daemon=True,
+                                      args=(shard, workers, factory, shm.name, inbox_reader, outbox_writer))
+            process.start()
+            inbox_reader.close()
+            outbox_writer.close()
+            self.workers.append(ShardWorker(shard, shm, process, inbox_writer, outbox_reader))
+        self.collector = threading.Thread(target=self.collect, name='mq-shard-collector', daemon=True)
+        self.collector.start()
+
+    def __len__(self):
+        return len(self.workers)
+
+    def on_message(self, queue_name, data):
+        """接收器的处理函数：把一条实时行情消息按股票分片发给工作进程"""
+        if isinstance(data, dict) and 'columns' in data:
+            columns = data['columns']
+        elif isinstance(data, dict) and data.get('records'):
+            columns = records_to_columns(data['records'])
+        else:
+            return
+        self.submit(queue_name, columns)
+
+    def submit(self, queue_name, columns):
+        """
+        按股票代码分片写入各工作进程的缓冲区（同一时间只能由一个线程调用，以保证顺序）
+        :param columns: {列名: 数组}，必须包含 stock_code
+        """
+        columns = {name: np.asarray(column) for name, column in columns.items()}
+        count = len(columns['stock_code'])
+        if count == 0:
+            return
+        shards = shard_of(columns['stock_code'], len(self.workers))
+        order = np.argsort(shards, kind='stable')  # 稳定排序：同一股票保持到达顺序
+        bounds = np.searchsorted(shards[order], np.arange(len(self.workers) + 1))
+        for worker in self.workers:
+            rows = order[bounds[worker.shard]:bounds[worker.shard + 1]]
+            if len(rows):
+                self.write(worker, queue_name, columns, rows)
+        self.records += count
+
+    def write(self, worker, queue_name, columns, rows):
+        """把columns中rows行按列连续写入worker的缓冲区，并发送描述"""
+        count = len(rows)
+        layout = []
+        nbytes = 0
+        for name, column in columns.items():
+            shape = column.shape[1:]
+            layout.append((name, column.dtype.str, shape, nbytes))
+            nbytes = align(nbytes + count * column.dtype.itemsize * int(np.prod(shape, dtype=np.int64)),
+                           COLUMN_ALIGN)
+        nbytes = align(nbytes, BLOCK_ALIGN)
+        if nbytes > worker.size // 2:
+            # 超过缓冲区一半的大批数据拆开发送，保证总能放下
+            half = count // 2
+            self.write(worker, queue_name, columns, rows[:half])
+            self.write(worker, queue_name, columns, rows[half:])
+            return
+
+        start = self.reserve(worker, nbytes)
+        offset = start % worker.size
+        buf = worker.shm.buf
+        for name, dtype, shape, column_offset in layout:
+            target = np.ndarray((count,) + shape, dtype=dtype, buffer=buf, offset=offset + column_offset)
+            np.take(columns[name], rows, axis=0, out=target)
+        worker.inbox.send((queue_name, start, start + nbytes, count, layout))
+        worker.batches += 1
+
+    def reserve(self, worker, nbytes):
+        """在worker的缓冲区中分配nbytes连续空间（尾部放不下时回绕到开头），满时等待，返回起始位置"""
+        with self.cond:
+            head = worker.head
+            offset = head % worker.size
+            if offset + nbytes > worker.size:
+                head += worker.size - offset  # 跳过尾部，从头开始
+            if head + nbytes - worker.tail > worker.size:
+                worker.waits += 1
+                while head + nbytes - worker.tail > worker.size:
+                    if not worker.process.is_alive():
+                        raise RuntimeError(f"分片进程 #{worker.shard} 已退出")
+                    self.cond.wait(0.5)
+            worker.head = head + nbytes
+            return head
+
+    def collect(self):
+        """收集线程：更新各缓冲区已用完的位置，转发工作进程发回的结果"""
+        readers = {worker.outbox: worker for worker in self.workers}
+        while readers:
+            for reader in wait(list(readers)):
+                worker = readers[reader]
+                try:
+                    message = reader.recv()
+                except EOFError:
+                    del readers[reader]
+                    with self.cond:
+                        self.cond.notify_all()
+                    continue
+                kind = message[0]
+                if kind == 'done':
+                    with self.cond:
+                        worker.tail = message[1]
+                        self.cond.notify_all()
+                elif kind == 'emit':
+                    if self.on_emit is not None:
+                        try:
+                            self.on_emit(message[1], message[2])
+                        except Exception as e:
+                            print(f"✗ 处理分片进程 #{worker.shard} 的结果时出错: {e}")
+                elif kind == 'stats':
+                    worker.stats = message[1]
+
+    def drain(self, timeout=None):
+        """等待已提交的数据全部处理完，返回是否在超时前完成"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while any(worker.tail < worker.head for worker in self.workers):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                if not all(worker.process.is_alive() for worker in self.workers):
+                    return False
+                self.cond.wait(remaining if remaining is not None else 0.5)
+        return True
+
+    def close(self):
+        """处理完已提交的数据后停止工作进程并删除共享内存，返回各进程的统计"""
+        if self.closed:
+            return [worker.stats for worker in self.workers]
+        self.closed = True
+        for worker in self.workers:
+            try:
+                worker.inbox.send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join()
+        self.collector.join()
+        for worker in self.workers:
+            worker.inbox.close()
+            worker.shm.close()
+            worker.shm.unlink()
+        return [worker.stats for worker in self.workers]
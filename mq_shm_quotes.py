@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享内存最新行情表
+接收端把最新行情表（QuoteBook）放在 multiprocessing.shared_memory 段中，本机任意多个进程
+直接映射读取，不经过套接字、不需要再序列化。
+
+段布局:
+    头部(64字节)  magic "MQQT" + 版本 + 容量 + 行大小 + 已分配行数 + 状态 + 写入批次 ...
+    行情表       容量 x 定长行，每行 = 序号(8) + QUOTE_DTYPE的各字段（按8字节对齐）
+股票目录就是各行的 stock_code：行只追加不回收，已分配行的代码不再改变，
+market_table_queue 的码表消息会预先为全部股票分配行，读端按头部的已分配行数增量建立代码索引。
+
+每行用seqlock保护（单写多读）：写端在写入前把行序号加1（奇数表示正在写），写完再加1；
+读端先读序号，复制整行，再读一次序号，两次相同且为偶数才说明读到的是完整的一行，否则重读。
+读端不加锁、不做系统调用，写端一批行情只在前后各做一次向量化的序号更新。
+依赖x86的存储顺序（TSO）保证其他进程按写入顺序看到序号和数据。
+
+用法（查看某只股票的最新行情）:
+    python mq_shm_quotes.py [--name mq_quotes] [SH600000 ...]
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from mq_quote_book import DEFAULT_CAPACITY, QUOTE_DTYPE, UPDATE_FIELDS, QuoteBook
+
+DEFAULT_SHM_NAME = 'mq_quotes'
+
+SHM_MAGIC = b'MQQT'
+SHM_VERSION = 1
+STATE_RUNNING = 1
+STATE_CLOSED = 2
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u4'),
+    ('capacity', '<u4'),
+    ('row_size', '<u4'),
+    ('size', '<u4'),        # 已分配行数
+    ('state', '<u4'),
+    ('writer_pid', '<u4'),
+    ('reserved', '<u4'),
+    ('batches', '<u8'),     # 写入批次（读端可以据此判断有没有新数据）
+    ('padding', 'V24'),
+])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+
+SHM_DTYPE = np.dtype([('seq', '<u8')] + QUOTE_DTYPE.descr, align=True)
+ROW_SIZE = SHM_DTYPE.itemsize
+SEQ = struct.Struct('<Q')
+
+# 读端连续遇到正在写入的行时，每隔这么多次让出一次CPU（单核时写端不让出就不可能写完，立即让出）；
+# 超过MAX_READ_SECONDS视为写端已异常退出
+SPIN_YIELD = 100 if (os.cpu_count() or 1) > 1 else 1
+MAX_READ_SECONDS = 1.0
+
+
+# time.sleep(0) 在Linux上不一定让出CPU
+yield_cpu = getattr(os, 'sched_yield', lambda: time.sleep(0))
+
+
+def attach(name):
+    """附加到已有的共享内存段（不登记到resource_tracker，否则读端退出时会删除该段）"""
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:  # Python 3.13之前没有track参数，附加时临时跳过登记
+        pass
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+class SharedQuoteBook(QuoteBook):
+    def __init__(self, name=DEFAULT_SHM_NAME, capacity=DEFAULT_CAPACITY):
+        """
+        创建共享内存行情表（同名的旧段会被删除重建，例如接收端上次异常退出留下的段）
+        :param name: 共享内存段名称（Linux下为 /dev/shm/<name>）
+        """
+        size = HEADER_SIZE + capacity * ROW_SIZE
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            stale = attach(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        self.name = name
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        self.header['magic'] = SHM_MAGIC
+        self.header['version'] = SHM_VERSION
+        self.header['capacity'] = capacity
+        self.header['row_size'] = ROW_SIZE
+        self.header['writer_pid'] = os.getpid()
+        self.header['state'] = STATE_RUNNING
+        super().__init__(capacity, np.ndarray(capacity, dtype=SHM_DTYPE, buffer=self.shm.buf, offset=HEADER_SIZE))
+
+    def rows_for(self, codes):
+        """分配新行后更新头部的已分配行数（新行的代码已先写入，读端看到行数时代码已就绪）"""
+        rows = super().rows_for(codes)
+        if self.header['size'] != self.size:
+            self.header['size'] = self.size
+        return rows
+
+    def write(self, rows, columns, positions=None, fields=UPDATE_FIELDS):
+        """写入前后各把这些行的序号加1（seqlock）"""
+        seq = self.table['seq']
+        seq[rows] += 1
+        super().write(rows, columns, positions, fields)
+        seq[rows] += 1
+        self.header['batches'] += 1
+
+    def close(self):
+        """标记为已关闭并删除共享内存段；本进程中的行情表转为普通数组，仍可查询"""
+        if self.shm is None:
+            return
+        self.header['state'] = STATE_CLOSED
+        self.table = self.table.copy()
+        self.header = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+
+class QuoteReader:
+    def __init__(self, name=DEFAULT_SHM_NAME):
+        """
+        附加到接收端创建的共享内存行情表（只读使用）
+        段不存在抛出FileNotFoundError，格式不符抛出ValueError
+        """
+        self.shm = attach(name)
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        if self.header['magic'] != SHM_MAGIC or self.header['version'] != SHM_VERSION:
+            self.close()
+            raise ValueError(f"不是行情表共享内存段: {name}")
+        if self.header['row_size'] != ROW_SIZE:
+            self.close()
+            raise ValueError(f"行大小不符: 段中为 {int(self.header['row_size'])}, 本程序为 {ROW_SIZE}")
+        self.capacity = int(self.header['capacity'])
+        self.table = np.ndarray(self.capacity, dtype=SHM_DTYPE, buffer=self.shm.buf, offset=HEADER_SIZE)
+        self.seq = self.table['seq']
+        self.index = {}     # 股票代码 -> 行号
+        self.size = 0
+        self.retries = 0    # 遇到正在写入或被改写的行而重读的次数
+
+    def __len__(self):
+        self.refresh()
+        return self.size
+
+    @property
+    def closed(self):
+        """写端是否已关闭（之后需要重新附加到新建的段）"""
+        return self.header['state'] != STATE_RUNNING
+
+    @property
+    def batches(self):
+        """写端已写入的批次"""
+        return int(self.header['batches'])
+
+    def refresh(self):
+        """按头部的已分配行数补充代码索引"""
+        size = int(self.header['size'])
+        if size > self.size:
+            codes = self.table['stock_code'][self.size:size].tolist()
+            self.index.update(zip(codes, range(self.size, size)))
+            self.size = size
+
+    def read_row(self, row):
+        """seqlock读取一行，返回长度为1的结构化数组副本（按字节复制，比结构化数组切片复制快得多）"""
+        buf = self.shm.buf
+        offset = HEADER_SIZE + row * ROW_SIZE
+        attempts = 0
+        started = None
+        while True:
+            before = SEQ.unpack_from(buf, offset)[0]
+            if not before & 1:
+                value = bytes(buf[offset:offset + ROW_SIZE])
+                if SEQ.unpack_from(buf, offset)[0] == before:
+                    return np.frombuffer(value, dtype=SHM_DTYPE)
+            attempts += 1
+            self.retries += 1
+            if attempts % SPIN_YIELD == 0:
+                started = started or time.monotonic()
+                if time.monotonic() - started > MAX_READ_SECONDS:
+                    raise RuntimeError(f"第 {row} 行长时间处于写入状态，写端可能已异常退出")
+                yield_cpu()
+
+    def get(self, stock_code):
+        """一只股票的最新行情（结构化数组的一行副本），不存在返回None"""
+        row = self.index.get(stock_code)
+        if row is None:
+            self.refresh()
+            row = self.index.get(stock_code)
+            if row is None:
+                return None
+        return self.read_row(row)[0]
+
+    def snapshot(self):
+        """
+        全部股票的一致快照：整表复制一次，只对复制期间被改写的行单独重读
+        每一行都是完整的，但不同行可能来自写端的不同批次
+        """
+        self.refresh()
+        size = self.size
+        before = self.seq[:size].copy()
+        data = self.table[:size].copy()
+        after = self.seq[:size].copy()
+        for row in np.flatnonzero((before != after) | (before & 1).astype(bool)).tolist():
+            self.retries += 1
+            data[row] = self.read_row(row)[0]
+        return data
+
+    def close(self):
+        """解除映射（不删除共享内存段）"""
+        self.table = self.seq = self.header = None
+        self.shm.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看共享内存最新行情表")
+    parser.add_argument('codes', nargs='*', help="股票代码（不指定时输出汇总）")
+    parser.add_argument('--name', default=DEFAULT_SHM_NAME, help=f"共享内存段名称（默认{DEFAULT_SHM_NAME}）")
+    args = parser.parse_args()
+
+    try:
+        reader = QuoteReader(args.name)
+    except FileNotFoundError:
+        print(f"✗ 共享内存段不存在: {args.name}（接收端需使用 --shm-quotes 启动）")
+        sys.exit(1)
+    try:
+        if not args.codes:
+            table = reader.snapshot()
+            quoted = int((table['time_stamp'] > 0).sum())
+            print(f"股票: {len(table)} 只（有行情 {quoted} 只）, 写入批次: {reader.batches}, "
+                  f"状态: {'已关闭' if reader.closed else '运行中'}")
+        for code in args.codes:
+            row = reader.get(code)
+            if row is None:
+                print(f"{code}: 无数据")
+                continue
+            print(f"{code} {row['stock_name']} | {str(row['update_time']).replace('T', ' ')} | 最新 {row['new_price']:.2f} | "
+                  f"开 {row['open']:.2f} 高 {row['high']:.2f} 低 {row['low']:.2f} | 量 {row['volume']:.0f}")
+    finally:
+        reader.close()
+
+
+if __name__ == '__main__':
+    main()
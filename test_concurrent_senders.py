@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步模式多发送端并发检查
+在本机随机端口以异步模式启动 MQReceiverHost，打开四个 MQTestSender 连接（日线/实时/除权/码表各一个）
+并全部保持打开，四个线程同时逐帧发送并等待ACK，接收端用 add_handler 记录每帧的到达顺序。
+在任何连接关闭之前检查：每个队列的第一帧和最后一帧之间都穿插有其他三个队列的帧，
+每帧到达时四个连接都处于活动状态，且每个发送端都收到全部ACK。
+按连接逐个串行处理的接收端在第一个连接关闭前不会处理其他连接，检查不通过，以退出码1结束。
+
+用法: python test_concurrent_senders.py [--rounds 20] [--interval 0.01]
+"""
+
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from datetime import datetime
+
+from mq_receiver_host import MQReceiverHost
+from test_mq_send import MQTestSender
+
+QUEUE_NAMES = ["daily_data_queue", "realtime_data_queue", "ex_rights_data_queue", "market_table_queue"]
+STARTUP_TIMEOUT = 5.0
+
+
+def start_receiver():
+    """在后台线程的事件循环中启动异步接收器（端口0由系统分配），返回 (接收器, 事件循环, 线程)"""
+    receiver = MQReceiverHost(host='127.0.0.1', port=0)
+    receiver.enable_quiet(interval=3600)
+    loop = asyncio.new_event_loop()
+
+    def run():
+        try:
+            loop.run_until_complete(receiver.serve_async())
+        except asyncio.CancelledError:
+            pass    # server.close() 取消 serve_forever
+        finally:
+            loop.close()
+
+    thread = threading.Thread(target=run, name='mq-receiver', daemon=True)
+    thread.start()
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while not receiver.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    if not receiver.running:
+        raise RuntimeError("接收器启动超时")
+    return receiver, loop, thread
+
+
+def interleaved(arrivals):
+    """每个队列的第一帧和最后一帧之间是否都出现了其他全部队列的帧，返回不满足的队列列表"""
+    failed = []
+    for queue_name in QUEUE_NAMES:
+        positions = [i for i, (name, _) in enumerate(arrivals) if name == queue_name]
+        if not positions:
+            failed.append(queue_name)
+            continue
+        between = {name for name, _ in arrivals[positions[0]:positions[-1] + 1]}
+        if between != set(QUEUE_NAMES):
+            failed.append(queue_name)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="异步模式多发送端并发检查")
+    parser.add_argument('--rounds', type=int, default=20, help="每个连接发送的帧数（默认20）")
+    parser.add_argument('--interval', type=float, default=0.01, help="每帧之间的间隔秒数（默认0.01）")
+    args = parser.parse_args()
+
+    receiver, loop, thread = start_receiver()
+    arrivals = []   # (队列名称, 到达时的活动连接数)，只在事件循环线程中追加
+
+    def record(queue_name, data):
+        arrivals.append((queue_name, receiver.active_connections))
+
+    for queue_type in ('daily', 'realtime', 'ex_rights', 'market_table'):
+        receiver.add_handler(queue_type, record)
+
+    senders = [MQTestSender('127.0.0.1', receiver.port) for _ in QUEUE_NAMES]
+    ok = all(sender.connect() for sender in senders)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while ok and receiver.active_connections < len(senders) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    if receiver.active_connections < len(senders):
+        print(f"[{datetime.now()}] ✗ 只有 {receiver.active_connections}/{len(senders)} 个连接被接受")
+        ok = False
+
+    sent = [0] * len(senders)
+    if ok:
+        barrier = threading.Barrier(len(senders))
+
+        def worker(index):
+            barrier.wait()
+            for _ in range(args.rounds):
+                if not senders[index].send_test_message(QUEUE_NAMES[index], verbose=False):
+                    break
+                sent[index] += 1
+                time.sleep(args.interval)
+
+        workers = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(len(senders))]
+        for worker_thread in workers:
+            worker_thread.start()
+        for worker_thread in workers:
+            worker_thread.join()
+
+        # 连接仍然全部打开，此时的到达顺序就是并发处理的结果（v1每帧在处理后才回复ACK）
+        snapshot = list(arrivals)
+        for queue_name, count, sender in zip(QUEUE_NAMES, sent, senders):
+            received = sum(1 for name, _ in snapshot if name == queue_name)
+            print(f"[{datetime.now()}]   {queue_name:<24} 发送 {count}/{args.rounds}, "
+                  f"ACK {sender.acks_received}, ACK超时 {sender.ack_timeouts}, 接收端处理 {received}")
+            if count != args.rounds or sender.acks_received != args.rounds or received != args.rounds:
+                ok = False
+        if not ok:
+            print(f"[{datetime.now()}] ✗ 有发送端没有发完或没有收到全部ACK")
+
+        failed = interleaved(snapshot)
+        if failed:
+            print(f"[{datetime.now()}] ✗ 以下队列的帧没有与其他队列交错到达: {', '.join(failed)}")
+            ok = False
+        else:
+            print(f"[{datetime.now()}] ✓ 四个队列的帧在连接关闭前交错到达")
+        partial = sum(1 for _, active in snapshot if active < len(senders))
+        if partial:
+            print(f"[{datetime.now()}] ✗ {partial} 帧到达时活动连接不足 {len(senders)} 个")
+            ok = False
+
+    for sender in senders:
+        sender.close()
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while receiver.active_connections and time.monotonic() < deadline:
+        time.sleep(0.01)    # 等各连接的处理协程结束，再关闭服务器
+    if receiver.server is not None:
+        loop.call_soon_threadsafe(receiver.server.close)
+    thread.join(STARTUP_TIMEOUT)
+    receiver.stop()
+
+    if not ok:
+        sys.exit(1)
+    print(f"[{datetime.now()}] ✓ 全部通过")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FrameDecoder分帧检查
+构造一段v1帧 + 握手帧 + v2帧的数据流（含空消息体、续传扩展头和大于缓冲区的帧），分别按
+逐字节、随机切分点、整段一次写入 feed()，检查每一帧的队列名称、序号、续传序号和消息体。
+再检查超大帧迫使缓冲区整体替换时，之前交出的消息体切片（memoryview）仍然有效、内容不变。
+任何一项不符都以退出码1结束。
+
+用法: python test_frame_decoder.py [--rounds 200] [--seed 0]
+"""
+
+import argparse
+import json
+import random
+import sys
+from datetime import datetime
+
+from mq_protocol import (HELLO_QUEUE, PROTOCOL_V1, PROTOCOL_V2, FrameDecoder, build_frame, build_hello)
+
+BUFFER_SIZE = 4096  # 比默认缓冲区小，使大帧和随机切分更容易触发移动和替换
+
+
+def make_stream():
+    """返回 (数据流, 期望的帧列表)，期望帧为 (队列名称, 序号, 续传序号, 消息体)"""
+    frames = []
+    expected = []
+
+    def add(queue_name, body, seq=None, queue_seq=None):
+        frames.append(build_frame(queue_name, body, seq=seq, queue_seq=queue_seq))
+        expected.append((queue_name, seq, queue_seq, body))
+
+    # v1帧
+    add('realtime_data_queue', json.dumps({"records": [{"stock_code": "600000"}]}).encode('utf-8'))
+    add('daily_data_queue', b'')
+    add('ex_rights_data_queue', '除权除息'.encode('utf-8') * 50, queue_seq=7)
+    add('market_table_queue', bytes(range(256)) * 40)     # 大于缓冲区
+
+    # 握手后切换到v2
+    frames.append(build_hello(16))
+    expected.append((HELLO_QUEUE, None, None, None))
+    for seq in range(1, 21):
+        body = json.dumps({"seq": seq, "pad": "x" * (seq * 37)}).encode('utf-8')
+        add('realtime_data_queue' if seq % 3 else 'daily_data_queue', body, seq=seq,
+            queue_seq=100 + seq if seq % 4 == 0 else None)
+    add('daily_data_queue', b'0123456789' * 1500, seq=21)  # 大于缓冲区
+    add('market_table_queue', b'', seq=22)
+    return b''.join(frames), expected
+
+
+def decode(chunks, buffer_size=BUFFER_SIZE):
+    """把chunks依次写入解码器，返回解出的帧 (队列名称, 序号, 续传序号, 消息体副本)"""
+    decoder = FrameDecoder(buffer_size, protocol=PROTOCOL_V1)
+    result = []
+    for chunk in chunks:
+        decoder.feed(chunk)
+        for frame in decoder.frames():
+            if frame.queue_name == HELLO_QUEUE:
+                decoder.protocol = PROTOCOL_V2
+                result.append((frame.queue_name, frame.seq, frame.queue_seq, None))
+            else:
+                result.append((frame.queue_name, frame.seq, frame.queue_seq, bytes(frame.body)))
+    if decoder.buffered:
+        raise ValueError(f"数据流结束后缓冲区还有 {decoder.buffered} 字节未解析")
+    return result
+
+
+def compare(name, actual, expected):
+    """逐帧对比，返回是否一致（不一致时打印第一处差异）"""
+    if actual == expected:
+        return True
+    for i, (got, want) in enumerate(zip(actual, expected)):
+        if got != want:
+            print(f"[{datetime.now()}] ✗ {name}: 第 {i + 1} 帧不符，"
+                  f"得到 {got[:3]} {len(got[3] or b'')} 字节，应为 {want[:3]} {len(want[3] or b'')} 字节")
+            return False
+    print(f"[{datetime.now()}] ✗ {name}: 解出 {len(actual)} 帧，应为 {len(expected)} 帧")
+    return False
+
+
+def random_chunks(stream, rng):
+    """在随机位置切分数据流（切分点数量也随机）"""
+    points = sorted(rng.sample(range(1, len(stream)), rng.randint(1, 200)))
+    return [stream[a:b] for a, b in zip([0] + points, points + [len(stream)])]
+
+
+def check_buffer_replacement():
+    """超大帧迫使缓冲区替换：之前交出的切片仍指向旧缓冲区，内容不变"""
+    small = [(f'queue_{i}', bytes([i]) * 300) for i in range(8)]
+    large = bytes(range(251)) * 100     # 远大于缓冲区
+    large_frame = build_frame('daily_data_queue', large)
+    head = b''.join(build_frame(name, body) for name, body in small)
+
+    decoder = FrameDecoder(BUFFER_SIZE)
+    # 第一次写入：全部小帧 + 大帧的前100字节（头部已到，消息体未到）
+    decoder.feed(head + large_frame[:100])
+    views = [(frame.queue_name, frame.body) for frame in decoder.frames()]   # 不复制，保留切片
+    old_buffer = decoder.buffer
+    # 第二次写入：大帧其余部分，未解析的100字节加上新数据超过缓冲区大小
+    decoder.feed(large_frame[100:])
+    frames = [(frame.queue_name, bytes(frame.body)) for frame in decoder.frames()]
+
+    ok = True
+    if decoder.buffer is old_buffer:
+        print(f"[{datetime.now()}] ✗ 缓冲区替换: 写入超大帧后缓冲区没有替换")
+        ok = False
+    if [(name, bytes(view)) for name, view in views] != small:
+        print(f"[{datetime.now()}] ✗ 缓冲区替换: 替换前交出的切片内容已改变")
+        ok = False
+    if frames != [('daily_data_queue', large)]:
+        print(f"[{datetime.now()}] ✗ 缓冲区替换: 超大帧解析错误")
+        ok = False
+    for _, view in views:
+        view.release()
+    if ok:
+        print(f"[{datetime.now()}] ✓ 缓冲区替换: {len(views)} 个旧切片仍然有效，"
+              f"缓冲区 {BUFFER_SIZE} -> {len(decoder.buffer)} 字节")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FrameDecoder分帧检查")
+    parser.add_argument('--rounds', type=int, default=200, help="随机切分的轮数（默认200）")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子（默认0）")
+    args = parser.parse_args()
+
+    stream, expected = make_stream()
+    print(f"[{datetime.now()}] 数据流: {len(expected)} 帧, {len(stream)} 字节")
+    ok = True
+
+    for name, chunks in (('逐字节', [stream[i:i + 1] for i in range(len(stream))]),
+                         ('整段一次写入', [stream])):
+        if compare(name, decode(chunks), expected):
+            print(f"[{datetime.now()}] ✓ {name}: {len(chunks)} 次写入")
+        else:
+            ok = False
+
+    rng = random.Random(args.seed)
+    failed = 0
+    for round_number in range(args.rounds):
+        if not compare(f'随机切分 第 {round_number + 1} 轮', decode(random_chunks(stream, rng)), expected):
+            failed += 1
+    if failed:
+        print(f"[{datetime.now()}] ✗ 随机切分: {failed}/{args.rounds} 轮不符（种子 {args.seed}）")
+        ok = False
+    else:
+        print(f"[{datetime.now()}] ✓ 随机切分: {args.rounds} 轮")
+
+    ok = check_buffer_replacement() and ok
+
+    if not ok:
+        sys.exit(1)
+    print(f"[{datetime.now()}] ✓ 全部通过")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,17 +5,44 @@ MQ消息发送测试工具
 用于测试从虚拟机发送消息到宿主机
 """
 
+import argparse
 import socket
 import struct
 import json
-import sys
+import threading
+import time
+from collections import deque
 from datetime import datetime
 
+from mq_codec import encode_realtime_columnar
+from mq_protocol import (ACK, ACK2, CODEC_JSON, CODEC_REALTIME_COLUMNAR, DEFAULT_COMPRESS_LEVEL,
+                         DEFAULT_COMPRESS_THRESHOLD, DEFAULT_WINDOW, FEATURE_RESUME, FEATURE_ZLIB, HELLO_REPLY,
+                         PROTOCOL_V1, PROTOCOL_V2, build_frame, build_hello, compress_body, decompress_body,
+                         parse_hello_reply)
+from mq_sample_data import make_daily_records, make_realtime_records, to_json_payload
+
 class MQTestSender:
     def __init__(self, host='10.0.2.2', port=5678):
         self.host = host
         self.port = port
         self.socket = None
+        self.protocol = PROTOCOL_V1
+        self.window = 1
+        self.next_seq = 1
+        self.acks_received = 0
+        self.ack_timeouts = 0
+        self.ack_rtts = []  # ACK往返时间（秒）
+        self.ack_buffer = bytearray()
+        self.send_lags = []  # 按计划发送时落后于计划的时间（秒）
+        self.send_errors = 0
+        self.compression = False  # 接收端同意后才压缩
+        self.compress_threshold = DEFAULT_COMPRESS_THRESHOLD
+        self.compress_level = DEFAULT_COMPRESS_LEVEL
+        self.compressed_frames = 0
+        self.bytes_before_compression = 0
+        self.bytes_after_compression = 0
+        self.resume = False  # 接收端同意后才给帧加队列序号扩展头
+        self.committed = {}  # 握手时接收端返回的 {队列名称: 已提交序号}
     
     def connect(self):
         """连接到MQ服务器"""
@@ -37,54 +64,395 @@ class MQTestSender:
             print(f"[{datetime.now()}] ✗ 连接失败: {e}")
             return False
     
-    def send_test_message(self, queue_name="test_queue", message_count=1):
-        """发送测试消息"""
+    def recv_exact(self, n):
+        """接收指定数量的字节，连接关闭返回None"""
+        data = bytearray()
+        while len(data) < n:
+            chunk = self.socket.recv(n - len(data))
+            if not chunk:
+                return None
+            data.extend(chunk)
+        return bytes(data)
+    
+    def wait_ack(self, sent_time):
+        """等待v1 ACK（4字节），与C#发送端一致：超时只记录不报错"""
+        try:
+            ack = self.recv_exact(4)
+        except socket.timeout:
+            ack = None
+        if ack is not None and ack[:3] == ACK[:3]:
+            self.acks_received += 1
+            self.ack_rtts.append(time.perf_counter() - sent_time)
+            return True
+        self.ack_timeouts += 1
+        return False
+    
+    def enable_pipelining(self, window=DEFAULT_WINDOW, compression=False, resume=()):
+        """
+        握手切换到v2协议：帧带序号，接收端按窗口累积确认
+        :param compression: 同时请求zlib压缩（接收端支持时启用）
+        :param resume: 同时请求这些队列的续传（接收端支持时启用，已提交序号见 self.committed）
+        :return: 接收端同意的窗口大小，失败返回0
+        """
+        if not self.socket:
+            print("未连接，请先调用 connect()")
+            return 0
+        
+        try:
+            self.socket.sendall(build_hello(window, compression, resume=resume))
+            reply = self.recv_exact(8)
+        except socket.timeout:
+            reply = None
+        
+        parsed = parse_hello_reply(reply)
+        if parsed is None:
+            print(f"[{datetime.now()}] ✗ 接收端不支持v2窗口确认协议")
+            return 0
+        
+        self.protocol = PROTOCOL_V2
+        self.window, features = parsed
+        self.next_seq = 1
+        print(f"[{datetime.now()}] ✓ 已启用v2窗口确认协议，窗口: {self.window}")
+        if compression:
+            self.set_compression(features)
+        if resume and not self.set_resume(features):
+            return 0
+        return self.window
+    
+    def enable_resume(self, queues):
+        """
+        v1连接上只协商续传，不切换v2（仍逐帧ACK）
+        :param queues: 请求续传的队列名称
+        :return: 是否启用了续传
+        """
+        if not self.socket:
+            print("未连接，请先调用 connect()")
+            return False
+        
+        try:
+            self.socket.sendall(build_hello(1, protocol=PROTOCOL_V1, resume=queues))
+            reply = self.recv_exact(4)
+            if reply == HELLO_REPLY:
+                reply += self.recv_exact(4) or b''
+        except socket.timeout:
+            reply = None
+        
+        parsed = parse_hello_reply(reply)
+        return self.set_resume(parsed[1] if parsed else 0)
+    
+    def set_resume(self, features):
+        """根据握手回复的特性位启用续传，并读取回复中各队列的已提交序号"""
+        self.resume = bool(features & FEATURE_RESUME)
+        if not self.resume:
+            print(f"[{datetime.now()}] ⚠ 接收端未启用续传")
+            return False
+        try:
+            length = struct.unpack('>I', self.recv_exact(4))[0]
+            self.committed = json.loads(self.recv_exact(length))
+        except (socket.timeout, TypeError, ValueError) as e:
+            print(f"[{datetime.now()}] ✗ 读取续传位置失败: {e}")
+            self.resume = False
+            return False
+        print(f"[{datetime.now()}] ✓ 已启用续传，已提交序号: {self.committed}")
+        return True
+    
+    def enable_compression(self):
+        """
+        v1连接上只协商压缩，不切换v2（仍逐帧ACK）
+        旧接收端回复4字节ACK，新接收端回复 "HELO" + 窗口字段（带特性位）
+        :return: 是否启用了压缩
+        """
         if not self.socket:
             print("未连接，请先调用 connect()")
             return False
         
         try:
-            # 创建测试数据
-            test_records = []
-            for i in range(message_count):
-                test_records.append({
-                    "test_id": i + 1,
-                    "test_time": datetime.now().isoformat(),
-                    "test_message": f"这是第 {i + 1} 条测试消息",
-                    "source": "虚拟机测试工具"
-                })
+            self.socket.sendall(build_hello(1, compression=True, protocol=PROTOCOL_V1))
+            reply = self.recv_exact(4)
+            if reply == HELLO_REPLY:
+                reply += self.recv_exact(4) or b''
+        except socket.timeout:
+            reply = None
+        
+        parsed = parse_hello_reply(reply)
+        return self.set_compression(parsed[1] if parsed else 0)
+    
+    def set_compression(self, features):
+        """根据握手回复的特性位启用压缩"""
+        self.compression = bool(features & FEATURE_ZLIB)
+        if self.compression:
+            print(f"[{datetime.now()}] ✓ 已启用zlib压缩（不小于 {self.compress_threshold} 字节的帧，"
+                  f"级别 {self.compress_level}）")
+        else:
+            print(f"[{datetime.now()}] ⚠ 接收端不支持压缩，按原文发送")
+        return self.compression
+    
+    def build_message(self, queue_name, body, seq=None, codec=CODEC_JSON, flags=0, queue_seq=None):
+        """
+        构建一帧：已启用压缩时按启发式压缩消息体（小帧和压不动的帧发送原文）；
+        已压缩的消息体（如回放抓包）在未启用压缩的连接上先解压；
+        已启用续传时带上队列序号扩展头（CRC按实际发送的消息体计算）
+        """
+        if flags and not self.compression:
+            body, flags = decompress_body(flags, body), 0
+        elif not flags and self.compression:
+            size = len(body)
+            body, flags = compress_body(body, self.compress_threshold, self.compress_level)
+            if flags:
+                self.compressed_frames += 1
+                self.bytes_before_compression += size
+                self.bytes_after_compression += len(body)
+        return build_frame(queue_name, body, seq, codec, flags, queue_seq if self.resume else None)
+    
+    def compression_summary(self):
+        """压缩统计的一行说明，没有压缩过的帧返回None"""
+        if not self.compressed_frames:
+            return None
+        return (f"压缩 {self.compressed_frames} 帧: {self.bytes_before_compression} -> "
+                f"{self.bytes_after_compression} 字节 "
+                f"({self.bytes_before_compression / max(1, self.bytes_after_compression):.1f} 倍)")
+    
+    def send_pipelined(self, frames):
+        """
+        v2流水线发送：最多window帧未确认，收到累积ACK后继续发送
+        :param frames: (队列名称, 消息体bytes[, codec[, 帧标志位[, 队列序号]]]) 的可迭代对象
+        :return: 已确认的帧数
+        """
+        if self.protocol != PROTOCOL_V2:
+            print("未启用v2协议，请先调用 enable_pipelining()")
+            return 0
+        
+        in_flight = deque()  # (序号, 发送时间)
+        acked = 0
+        frames = iter(frames)
+        exhausted = False
+        
+        try:
+            while True:
+                # 窗口未满时继续发送
+                while not exhausted and len(in_flight) < self.window:
+                    try:
+                        queue_name, body, *extra = next(frames)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    seq = self.next_seq
+                    self.next_seq += 1
+                    self.socket.sendall(self.build_message(queue_name, body, seq, *extra))
+                    in_flight.append((seq, time.perf_counter()))
+                
+                if not in_flight:
+                    break
+                
+                # 等待累积ACK
+                try:
+                    reply = self.recv_exact(8)
+                except socket.timeout:
+                    reply = None
+                if reply is None or reply[:4] != ACK2:
+                    self.ack_timeouts += 1
+                    print(f"[{datetime.now()}] ✗ 等待ACK超时，仍有 {len(in_flight)} 帧未确认")
+                    break
+                
+                acked_seq = struct.unpack('>I', reply[4:8])[0]
+                now = time.perf_counter()
+                self.acks_received += 1
+                while in_flight and in_flight[0][0] <= acked_seq:
+                    _, sent_time = in_flight.popleft()
+                    self.ack_rtts.append(now - sent_time)
+                    acked += 1
+        except Exception as e:
+            print(f"[{datetime.now()}] ✗ 发送失败: {e}")
+        
+        return acked
+    
+    def send_resumable(self, queue_name, bodies, base, codec=CODEC_JSON):
+        """
+        可续传地发送一批消息：第i帧（从0起）的队列序号为 base + i + 1，接收端已提交的帧跳过不发
+        断线后重新连接并握手请求该队列续传，用同一个base再次调用即从断点继续
+        :param bodies: 消息体bytes列表
+        :param base: 这批消息之前的队列序号，新的一批取第一次握手时接收端返回的已提交序号
+        :return: 接收端已确认的帧数（跳过的 + 本次确认的）
+        """
+        if not self.resume:
+            print("未启用续传，请先调用 enable_pipelining(resume=...) 或 enable_resume()")
+            return 0
+        
+        skip = min(len(bodies), max(0, self.committed.get(queue_name, 0) - base))
+        if skip:
+            print(f"[{datetime.now()}] ✓ 接收端已有前 {skip} 帧，从第 {skip + 1} 帧续传")
+        frames = ((queue_name, bodies[i], codec, 0, base + i + 1) for i in range(skip, len(bodies)))
+        if self.protocol == PROTOCOL_V2:
+            return skip + self.send_pipelined(frames)
+        
+        acked = 0
+        try:
+            for queue_name, body, codec, flags, queue_seq in frames:
+                sent_time = time.perf_counter()
+                self.socket.sendall(self.build_message(queue_name, body, None, codec, flags, queue_seq))
+                if not self.wait_ack(sent_time):
+                    break
+                acked += 1
+        except Exception as e:
+            print(f"[{datetime.now()}] ✗ 发送失败: {e}")
+        return skip + acked
+    
+    def read_acks(self, in_flight, timeout):
+        """
+        读取timeout秒内到达的ACK（v1逐帧 / v2累积），按发送时间记录往返时间
+        :param in_flight: (序号, 发送时间) 队列，已确认的帧会被移除
+        :return: 本次确认的帧数
+        """
+        self.socket.settimeout(max(timeout, 0.0001))
+        try:
+            data = self.socket.recv(65536)
+        except socket.timeout:
+            return 0
+        if not data:
+            raise ConnectionError("连接已被接收端关闭")
+        self.ack_buffer.extend(data)
+        
+        now = time.perf_counter()
+        acked = 0
+        usable = len(self.ack_buffer) - len(self.ack_buffer) % (8 if self.protocol == PROTOCOL_V2 else 4)
+        for offset in range(0, usable, 8 if self.protocol == PROTOCOL_V2 else 4):
+            self.acks_received += 1
+            if self.protocol == PROTOCOL_V2:
+                acked_seq = struct.unpack_from('>I', self.ack_buffer, offset + 4)[0]
+                while in_flight and in_flight[0][0] <= acked_seq:
+                    self.ack_rtts.append(now - in_flight.popleft()[1])
+                    acked += 1
+            elif in_flight:
+                self.ack_rtts.append(now - in_flight.popleft()[1])
+                acked += 1
+        del self.ack_buffer[:usable]
+        return acked
+    
+    def send_scheduled(self, frames, ack_timeout=5.0):
+        """
+        按计划时间发送，用于压力测试
+        :param frames: (计划发送时间perf_counter, 队列名称, 消息体bytes, codec) 的可迭代对象
+        v1最多1帧、v2最多window帧未确认；等待下一帧计划时间的空闲里读取ACK，
+        落后于计划时立即发送，落后时间记入 send_lags
+        :return: 已确认的帧数
+        """
+        in_flight = deque()  # (序号, 发送时间)
+        self.ack_buffer = bytearray()
+        window = self.window if self.protocol == PROTOCOL_V2 else 1
+        acked = 0
+        
+        try:
+            for send_at, queue_name, body, codec in frames:
+                # 窗口已满时等待ACK，否则在计划时间之前读取已到达的ACK
+                while True:
+                    now = time.perf_counter()
+                    if len(in_flight) >= window:
+                        waited = self.read_acks(in_flight, ack_timeout)
+                        if not waited and time.perf_counter() - now >= ack_timeout:
+                            self.ack_timeouts += 1
+                            raise TimeoutError(f"等待ACK超时，仍有 {len(in_flight)} 帧未确认")
+                        acked += waited
+                    elif now < send_at:
+                        if in_flight:
+                            acked += self.read_acks(in_flight, send_at - now)
+                        else:
+                            time.sleep(send_at - now)
+                    else:
+                        break
+                
+                seq = None
+                if self.protocol == PROTOCOL_V2:
+                    seq = self.next_seq
+                    self.next_seq += 1
+                self.socket.settimeout(ack_timeout)  # read_acks可能留下很短的超时
+                sent_time = time.perf_counter()
+                self.socket.sendall(self.build_message(queue_name, body, seq, codec))
+                in_flight.append((seq, sent_time))
+                self.send_lags.append(sent_time - send_at)
             
-            # 构建JSON数据
-            json_data = json.dumps({
-                "type": "test",
-                "records": test_records,
-                "timestamp": datetime.now().isoformat()
-            }, ensure_ascii=False)
+            # 等待剩余的ACK
+            while in_flight:
+                waited = self.read_acks(in_flight, ack_timeout)
+                if not waited:
+                    self.ack_timeouts += 1
+                    raise TimeoutError(f"等待ACK超时，仍有 {len(in_flight)} 帧未确认")
+                acked += waited
+        except Exception as e:
+            self.send_errors += 1
+            print(f"[{datetime.now()}] ✗ 发送失败: {e}")
+        
+        return acked
+
+    def build_test_payload(self, message_count=1):
+        """构建测试消息的JSON数据"""
+        # 创建测试数据
+        test_records = []
+        for i in range(message_count):
+            test_records.append({
+                "test_id": i + 1,
+                "test_time": datetime.now().isoformat(),
+                "test_message": f"这是第 {i + 1} 条测试消息",
+                "source": "虚拟机测试工具"
+            })
+        
+        # 构建JSON数据
+        return json.dumps({
+            "type": "test",
+            "records": test_records,
+            "timestamp": datetime.now().isoformat()
+        }, ensure_ascii=False)
+    
+    def send_test_message(self, queue_name="test_queue", message_count=1, verbose=True):
+        """发送测试消息（v1协议，发送后等待ACK）"""
+        if not self.socket:
+            print("未连接，请先调用 connect()")
+            return False
+        
+        try:
+            json_data = self.build_test_payload(message_count)
             
             # 构建消息：消息长度(4字节) + 队列名称长度(4字节) + 队列名称 + JSON数据
-            queue_name_bytes = queue_name.encode('utf-8')
-            data_bytes = json_data.encode('utf-8')
-            
-            message_length = 4 + 4 + len(queue_name_bytes) + len(data_bytes)
-            message = bytearray()
-            
-            # 写入消息总长度（大端序）
-            message.extend(struct.pack('>I', message_length))
-            
-            # 写入队列名称长度（大端序）
-            message.extend(struct.pack('>I', len(queue_name_bytes)))
+            message = self.build_message(queue_name, json_data.encode('utf-8'))
             
-            # 写入队列名称
-            message.extend(queue_name_bytes)
+            # 发送消息并等待ACK
+            sent_time = time.perf_counter()
+            self.socket.sendall(message)
+            ack_received = self.wait_ack(sent_time)
+            if verbose:
+                print(f"[{datetime.now()}] ✓ 发送成功: {message_count} 条测试消息到队列 '{queue_name}'"
+                      + ("，已收到ACK" if ack_received else "，但未收到ACK确认"))
+                print(f"   消息大小: {len(message)} 字节")
+                print(f"   数据内容: {json_data[:100]}..." if len(json_data) > 100 else f"   数据内容: {json_data}")
+            return True
             
-            # 写入JSON数据
-            message.extend(data_bytes)
+        except Exception as e:
+            print(f"[{datetime.now()}] ✗ 发送失败: {e}")
+            return False
+    
+    def send_realtime_records(self, records, codec=CODEC_JSON, queue_name="realtime_data_queue", verbose=True):
+        """
+        发送实时行情记录（v1协议，发送后等待ACK）
+        :param codec: CODEC_JSON 与C#发送端相同的JSON格式；CODEC_REALTIME_COLUMNAR 二进制列式格式
+        """
+        if not self.socket:
+            print("未连接，请先调用 connect()")
+            return False
+        
+        try:
+            if codec == CODEC_REALTIME_COLUMNAR:
+                body = encode_realtime_columnar(records)
+            else:
+                body = to_json_payload(records)
+            message = self.build_message(queue_name, body, codec=codec)
             
-            # 发送消息
-            self.socket.sendall(bytes(message))
-            print(f"[{datetime.now()}] ✓ 发送成功: {message_count} 条测试消息到队列 '{queue_name}'")
-            print(f"   消息大小: {len(message)} 字节")
-            print(f"   数据内容: {json_data[:100]}..." if len(json_data) > 100 else f"   数据内容: {json_data}")
+            sent_time = time.perf_counter()
+            self.socket.sendall(message)
+            ack_received = self.wait_ack(sent_time)
+            if verbose:
+                codec_name = "列式二进制" if codec == CODEC_REALTIME_COLUMNAR else "JSON"
+                print(f"[{datetime.now()}] ✓ 发送成功: {len(records)} 条实时数据到队列 '{queue_name}' ({codec_name})"
+                      + ("，已收到ACK" if ack_received else "，但未收到ACK确认"))
+                print(f"   消息大小: {len(message)} 字节, 平均每条 {len(body) / max(1, len(records)):.1f} 字节")
             return True
             
         except Exception as e:
@@ -98,6 +466,140 @@ class MQTestSender:
             self.socket = None
             print(f"[{datetime.now()}] 连接已关闭")
 
+def run_concurrent(host, port, connections, rounds, message_count, interval=0.05, window=0):
+    """
+    并发测试：同时打开多个连接（模拟日线/实时/除权/码表四个发送端），
+    各连接交替发送消息并等待ACK，用于验证接收端能否同时处理多个连接
+    """
+    queue_names = ["daily_data_queue", "realtime_data_queue", "ex_rights_data_queue", "market_table_queue"]
+    senders = []
+    for i in range(connections):
+        sender = MQTestSender(host, port)
+        if not sender.connect() or (window > 0 and not sender.enable_pipelining(window)):
+            sender.close()
+            for _, s in senders:
+                s.close()
+            return False
+        senders.append((queue_names[i % len(queue_names)], sender))
+    
+    barrier = threading.Barrier(len(senders))
+    results = [None] * len(senders)
+    
+    def worker(index, queue_name, sender):
+        barrier.wait()
+        start = time.perf_counter()
+        if window > 0:
+            body = sender.build_test_payload(message_count).encode('utf-8')
+            sent = sender.send_pipelined((queue_name, body) for _ in range(rounds))
+        else:
+            sent = 0
+            for _ in range(rounds):
+                if not sender.send_test_message(queue_name, message_count, verbose=False):
+                    break
+                sent += 1
+                time.sleep(interval)
+        results[index] = (queue_name, sent, sender.acks_received, time.perf_counter() - start)
+    
+    threads = [threading.Thread(target=worker, args=(i, q, s), daemon=True)
+               for i, (q, s) in enumerate(senders)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    print()
+    print("并发发送结果:")
+    all_ok = True
+    for (queue_name, sent, acks, elapsed), (_, sender) in zip(results, senders):
+        print(f"  {queue_name:<24} 已发送 {sent}/{rounds} 帧, 收到ACK {acks} 个, "
+              f"ACK超时 {sender.ack_timeouts} 次, 耗时 {elapsed:.2f} 秒")
+        all_ok = all_ok and sent == rounds and sender.ack_timeouts == 0
+    
+    for _, sender in senders:
+        sender.close()
+    return all_ok
+
+def run_pipelined(sender, queue_name, rounds, message_count, window, compression=False):
+    """v2流水线发送测试，统计吞吐和ACK往返时间"""
+    if not sender.enable_pipelining(window, compression):
+        return False
+    
+    body = sender.build_test_payload(message_count).encode('utf-8')
+    start = time.perf_counter()
+    acked = sender.send_pipelined((queue_name, body) for _ in range(rounds))
+    elapsed = time.perf_counter() - start
+    
+    rtts = sorted(sender.ack_rtts)
+    print(f"[{datetime.now()}] ✓ 流水线发送完成: {acked}/{rounds} 帧已确认, 窗口 {sender.window}")
+    if elapsed > 0:
+        print(f"   吞吐: {acked / elapsed:.0f} 帧/秒, 耗时 {elapsed:.3f} 秒")
+    if rtts:
+        print(f"   ACK往返: 中位数 {rtts[len(rtts) // 2] * 1000:.2f} ms, "
+              f"最大 {rtts[-1] * 1000:.2f} ms")
+    if sender.compression_summary():
+        print(f"   {sender.compression_summary()}")
+    return acked == rounds
+
+def run_resume(host, port, queue_name, rounds, symbols, window=0, drop_after=0, attempts=3):
+    """
+    续传测试：可续传地发送rounds帧日线（每帧symbols只股票 x 20个交易日），连接断开后重连从断点继续
+    :param drop_after: 模拟断线，第一次连接只发送前N帧就断开（0表示不模拟）
+    """
+    bodies = [to_json_payload(make_daily_records(symbols, 20, seed=i)) for i in range(rounds)]
+    base = None
+    delivered = 0
+    for attempt in range(1, attempts + 1):
+        sender = MQTestSender(host, port)
+        if not sender.connect():
+            return False
+        if window > 0:
+            ok = sender.enable_pipelining(window, resume=[queue_name])
+        else:
+            ok = sender.enable_resume([queue_name])
+        if not ok:
+            sender.close()
+            return False
+        if base is None:
+            base = sender.committed.get(queue_name, 0)  # 新的一批接在已提交序号之后
+        
+        todo = bodies[:drop_after] if attempt == 1 and 0 < drop_after < rounds else bodies
+        delivered = sender.send_resumable(queue_name, todo, base)
+        sender.close()
+        print(f"[{datetime.now()}] 第 {attempt} 次连接: 接收端已有 {delivered}/{rounds} 帧 "
+              f"(队列序号 {base + 1}-{base + rounds})")
+        if delivered == rounds:
+            return True
+    return False
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="MQ消息发送测试工具")
+    parser.add_argument('host', nargs='?', default='10.0.2.2', help="目标地址（默认10.0.2.2）")
+    parser.add_argument('port', nargs='?', type=int, default=5678, help="目标端口（默认5678）")
+    parser.add_argument('message_count', nargs='?', type=int, default=1, help="每帧包含的测试记录数（默认1）")
+    parser.add_argument('--queue', default="test_queue", help="队列名称（默认test_queue）")
+    parser.add_argument('--concurrent', type=int, default=0,
+                        help="并发测试：同时打开的连接数（如4，模拟四个发送端）")
+    parser.add_argument('--rounds', type=int, default=20, help="并发测试时每个连接发送的帧数（默认20）")
+    parser.add_argument('--interval', type=float, default=0.05, help="并发测试时的发送间隔秒数（默认0.05）")
+    parser.add_argument('--realtime', type=int, default=0,
+                        help="发送一帧包含N条模拟实时行情的realtime_data_queue消息")
+    parser.add_argument('--codec', choices=['json', 'columnar'], default='json',
+                        help="实时行情的消息体编码：json（与C#相同）或columnar（二进制列式）")
+    parser.add_argument('--window', type=int, default=0,
+                        help="启用v2流水线协议的确认窗口大小（0表示v1逐帧ACK），发送 --rounds 帧")
+    parser.add_argument('--resume', action='store_true',
+                        help="续传测试：带队列序号和CRC可续传地发送 --rounds 帧日线到 --queue，断线后重连从断点继续")
+    parser.add_argument('--drop-after', type=int, default=0, metavar='N',
+                        help="续传测试时模拟断线：第一次连接只发送前N帧（默认0不模拟）")
+    parser.add_argument('--compress', action='store_true',
+                        help="握手请求zlib压缩，接收端支持时压缩不小于 --compress-threshold 的帧")
+    parser.add_argument('--compress-threshold', type=int, default=DEFAULT_COMPRESS_THRESHOLD,
+                        help=f"压缩阈值字节数（默认{DEFAULT_COMPRESS_THRESHOLD}）")
+    parser.add_argument('--compress-level', type=int, default=DEFAULT_COMPRESS_LEVEL, choices=range(1, 10),
+                        metavar='1-9', help=f"zlib压缩级别（默认{DEFAULT_COMPRESS_LEVEL}）")
+    return parser.parse_args(argv)
+
 def main():
     print("=" * 60)
     print("MQ消息发送测试工具")
@@ -105,27 +607,42 @@ def main():
     print("=" * 60)
     print()
     
-    # 默认配置
-    host = '10.0.2.2'
-    port = 5678
-    queue_name = "test_queue"
-    message_count = 1
-    
-    # 解析命令行参数
-    if len(sys.argv) > 1:
-        host = sys.argv[1]
-    if len(sys.argv) > 2:
-        port = int(sys.argv[2])
-    if len(sys.argv) > 3:
-        message_count = int(sys.argv[3])
+    args = parse_args()
+    host = args.host
+    port = args.port
+    queue_name = args.queue
+    message_count = args.message_count
     
     print(f"配置:")
     print(f"  目标地址: {host}:{port}")
     print(f"  队列名称: {queue_name}")
     print(f"  消息数量: {message_count}")
+    if args.concurrent > 0:
+        print(f"  并发连接: {args.concurrent} (每连接 {args.rounds} 帧)")
+    if args.window > 0:
+        print(f"  流水线窗口: {args.window} (v2协议, {args.rounds} 帧)")
     print()
     
+    if args.resume:
+        success = run_resume(host, port, queue_name, args.rounds, message_count, args.window, args.drop_after)
+        print()
+        print("=" * 60)
+        print("续传测试完成！" if success else "续传测试失败！")
+        print("=" * 60)
+        return
+    
+    if args.concurrent > 0:
+        success = run_concurrent(host, port, args.concurrent, args.rounds, message_count,
+                                 args.interval, args.window)
+        print()
+        print("=" * 60)
+        print("并发测试完成！" if success else "并发测试失败！")
+        print("=" * 60)
+        return
+    
     sender = MQTestSender(host, port)
+    sender.compress_threshold = args.compress_threshold
+    sender.compress_level = args.compress_level
     
     # 连接
     if not sender.connect():
@@ -136,10 +653,18 @@ def main():
         print("  3. 防火墙是否允许连接")
         return
     
+    if args.compress and args.window == 0:
+        sender.enable_compression()
     print()
     
     # 发送测试消息
-    success = sender.send_test_message(queue_name, message_count)
+    if args.realtime > 0:
+        codec = CODEC_REALTIME_COLUMNAR if args.codec == 'columnar' else CODEC_JSON
+        success = sender.send_realtime_records(make_realtime_records(args.realtime), codec)
+    elif args.window > 0:
+        success = run_pipelined(sender, queue_name, args.rounds, message_count, args.window, args.compress)
+    else:
+        success = sender.send_test_message(queue_name, message_count)
     
     print()
     if success:
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+续传帧CRC损坏检查
+在本机随机端口启动启用续传的 MQReceiverHost（同步和异步两种模式），发送端在v1和v2两种协议下
+把10帧日线一次性发出，其中第5帧的消息体被改坏一个字节（CRC不符）。检查:
+    接收端丢弃损坏的帧并断开连接，断开前确认了同一批中已处理的前4帧（v1为4个ACK，v2累积确认到4）
+    重连握手返回的已提交序号为4，发送端从第5帧续传后全部10帧各处理一次、按顺序
+任何一项不符都以退出码1结束。
+
+用法: python test_resume_crc.py
+"""
+
+import asyncio
+import json
+import socket
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+
+from mq_protocol import ACK, ACK2, CODEC_JSON, PROTOCOL_V2
+from mq_receiver_host import MQReceiverHost
+from test_mq_send import MQTestSender
+
+QUEUE_NAME = 'daily_data_queue'
+FRAMES = 10
+CORRUPT = 5     # 损坏的帧（队列序号）
+WINDOW = 32
+TIMEOUT = 5.0
+
+
+def start_receiver(use_async):
+    """在后台线程启动启用续传的接收器（端口0由系统分配），返回 (接收器, 停止函数)"""
+    receiver = MQReceiverHost(host='127.0.0.1', port=0)
+    receiver.enable_quiet(interval=3600)
+    receiver.enable_resume()
+    loop = asyncio.new_event_loop() if use_async else None
+
+    def run():
+        if not use_async:
+            receiver.start()
+            return
+        try:
+            loop.run_until_complete(receiver.serve_async())
+        except asyncio.CancelledError:
+            pass    # server.close() 取消 serve_forever
+        finally:
+            loop.close()
+
+    thread = threading.Thread(target=run, name='mq-receiver', daemon=True)
+    thread.start()
+    deadline = time.monotonic() + TIMEOUT
+    while not receiver.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    if not receiver.running:
+        raise RuntimeError("接收器启动超时")
+
+    def stop():
+        if use_async:
+            deadline = time.monotonic() + TIMEOUT
+            while receiver.active_connections and time.monotonic() < deadline:
+                time.sleep(0.01)
+            loop.call_soon_threadsafe(receiver.server.close)
+            thread.join(TIMEOUT)
+            receiver.stop()
+        else:
+            receiver.socket.shutdown(socket.SHUT_RDWR)  # 唤醒accept，start()退出时调用stop()
+            thread.join(TIMEOUT)
+
+    return receiver, stop
+
+
+def read_until_closed(sender):
+    """读取接收端在断开前发回的全部数据"""
+    data = bytearray()
+    sender.socket.settimeout(TIMEOUT)
+    while True:
+        try:
+            chunk = sender.socket.recv(4096)
+        except (socket.timeout, ConnectionResetError):
+            return bytes(data), False
+        if not chunk:
+            return bytes(data), True
+        data.extend(chunk)
+
+
+def acked_frames(data, v2):
+    """从确认数据中得到已确认的帧数：v1数ACK，v2取最后一个累积确认的序号"""
+    if not v2:
+        return data.count(ACK)
+    acked = 0
+    for offset in range(0, len(data) - 7, 8):
+        if data[offset:offset + 4] == ACK2:
+            acked = struct.unpack('>I', data[offset + 4:offset + 8])[0]
+    return acked
+
+
+def connect(port, v2):
+    """连接并握手请求续传，返回发送端，失败返回None"""
+    sender = MQTestSender('127.0.0.1', port)
+    if not sender.connect():
+        return None
+    ok = sender.enable_pipelining(WINDOW, resume=[QUEUE_NAME]) if v2 else sender.enable_resume([QUEUE_NAME])
+    if not ok:
+        sender.close()
+        return None
+    return sender
+
+
+def run_case(use_async, v2):
+    """一种接收模式和协议的组合，返回是否通过"""
+    name = f"{'异步' if use_async else '同步'}/{'v2' if v2 else 'v1'}"
+    receiver, stop = start_receiver(use_async)
+    seen = []
+    receiver.add_handler('daily', lambda queue_name, data: seen.append(data['records'][0]['n']))
+    bodies = [json.dumps({"records": [{"n": i}]}).encode('utf-8') for i in range(1, FRAMES + 1)]
+    ok = True
+    try:
+        # 第一次连接：一次发出全部帧，第CORRUPT帧的消息体末字节改坏
+        sender = connect(receiver.port, v2)
+        if sender is None:
+            print(f"[{datetime.now()}] ✗ {name}: 握手失败")
+            return False
+        frames = []
+        for i, body in enumerate(bodies, 1):
+            frame = sender.build_message(QUEUE_NAME, body, i if v2 else None, CODEC_JSON, 0, i)
+            if i == CORRUPT:
+                frame = frame[:-1] + bytes([frame[-1] ^ 0xFF])
+            frames.append(frame)
+        sender.socket.sendall(b''.join(frames))
+        data, closed = read_until_closed(sender)
+        sender.close()
+        acked = acked_frames(data, v2)
+        if not closed:
+            print(f"[{datetime.now()}] ✗ {name}: 接收端没有在CRC不符后断开连接")
+            ok = False
+        if acked != CORRUPT - 1:
+            print(f"[{datetime.now()}] ✗ {name}: 断开前确认了 {acked} 帧，应为 {CORRUPT - 1}")
+            ok = False
+
+        # 重连续传
+        sender = connect(receiver.port, v2)
+        if sender is None:
+            print(f"[{datetime.now()}] ✗ {name}: 重连握手失败")
+            return False
+        committed = sender.committed.get(QUEUE_NAME, 0)
+        delivered = sender.send_resumable(QUEUE_NAME, bodies, 0)
+        sender.close()
+        if committed != CORRUPT - 1:
+            print(f"[{datetime.now()}] ✗ {name}: 重连后已提交序号为 {committed}，应为 {CORRUPT - 1}")
+            ok = False
+        if delivered != FRAMES:
+            print(f"[{datetime.now()}] ✗ {name}: 续传后接收端确认 {delivered}/{FRAMES} 帧")
+            ok = False
+    finally:
+        stop()
+
+    if seen != list(range(1, FRAMES + 1)):
+        print(f"[{datetime.now()}] ✗ {name}: 处理的帧为 {seen}，应为 1-{FRAMES} 各一次")
+        ok = False
+    if receiver.resume.corrupted != 1:
+        print(f"[{datetime.now()}] ✗ {name}: CRC不符计数为 {receiver.resume.corrupted}，应为 1")
+        ok = False
+    if ok:
+        print(f"[{datetime.now()}] ✓ {name}: 损坏的第 {CORRUPT} 帧被丢弃，断开前确认 {acked} 帧，"
+              f"续传后 {FRAMES} 帧各处理一次")
+    return ok
+
+
+def main():
+    results = [run_case(use_async, v2) for use_async in (False, True) for v2 in (False, True)]
+    if not all(results):
+        sys.exit(1)
+    print(f"[{datetime.now()}] ✓ 全部通过")
+
+
+if __name__ == '__main__':
+    main()